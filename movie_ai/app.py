@@ -8,14 +8,26 @@ import os
 # 添加项目根目录到 Python 路径
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
+# 启动耗时分析模式：在导入其他模块之前开始记录导入耗时（结果见 GET /ai/ready）
+from src.warmup import ImportProfiler, warmup
+import_profiler = ImportProfiler() if os.getenv('PROFILE_STARTUP', 'False').lower() == 'true' else None
+if import_profiler is not None:
+    import_profiler.install()
+
 from flask import Flask, jsonify, request, Response, stream_with_context
 from flask_cors import CORS
 from src.config import Config
 from src.rag import rag_chain
-from src.retriever import retriever
+from src.retriever import Retriever, retriever
+from src.fusion import FUSION_METHODS
+from src.keyword_extractor import keyword_extractor
+from src.search_filter import SearchFilter
 from src.rerank import reranker
+from src.rerank_cascade import rerank_cascade
+from src.response_cache import response_cache
+from src.embeddeding import embedding_service
+from utils.translator import cache_stats as translation_cache_stats
 import json
-from datetime import datetime
 
 app = Flask(__name__)
 
@@ -32,6 +44,14 @@ CORS(app, resources={
 app.config['JSON_AS_ASCII'] = False
 app.config['JSONIFY_MIMETYPE'] = "application/json;charset=utf-8"
 
+if import_profiler is not None:
+    import_profiler.uninstall()
+
+# 检索器、重排序器、RAG 链和 embedding 模型在后台线程中预热，进程导入后即可接收请求
+# （spawn 方式启动的子进程会以 __mp_main__ 重新导入本模块，不在其中预热）
+if Config.WARMUP_ON_START and __name__ != '__mp_main__':
+    warmup.start()
+
 
 @app.route('/ai/health', methods=['GET'])
 def health_check():
@@ -44,6 +64,21 @@ def health_check():
     }), 200
 
 
+@app.route('/ai/ready', methods=['GET'])
+def readiness_check():
+    """就绪检查接口：必要组件都已预热时返回 200，否则返回 503（附各组件状态）"""
+    data = warmup.status()
+    if import_profiler is not None:
+        data['imports'] = [
+            {'module': name, 'cumulative_ms': round(cumulative * 1000, 1), 'self_ms': round(own * 1000, 1)}
+            for name, cumulative, own in import_profiler.top(30)
+        ]
+    return jsonify({
+        'success': data['ready'],
+        'data': data
+    }), 200 if data['ready'] else 503
+
+
 @app.route('/ai/recommend', methods=['POST'])
 def recommend_movies():
     """
@@ -53,7 +88,8 @@ def recommend_movies():
     {
         "query": "我想看科幻电影",
         "top_k": 5,  // 可选，检索数量
-        "rerank_top_n": 3  // 可选，重排序后返回数量
+        "rerank_top_n": 3,  // 可选，重排序后返回数量
+        "use_cache": true  // 可选，false 时不使用语义响应缓存
     }
     
     响应:
@@ -65,7 +101,8 @@ def recommend_movies():
             "recommended_movie_ids": [...],
             "llm_content": "...",
             "timestamp": "...",
-            "status": "success"
+            "status": "success",
+            "cached": false
         }
     }
     """
@@ -88,14 +125,15 @@ def recommend_movies():
         # 获取可选参数
         top_k = data.get('top_k')
         rerank_top_n = data.get('rerank_top_n')
+        use_cache = data.get('use_cache', True) is not False
         
         # 创建 RAG 实例（如果提供了参数）
         if top_k or rerank_top_n:
             from src.rag import RAGChain
             chain = RAGChain(top_k=top_k, rerank_top_n=rerank_top_n)
-            response = chain.get_full_response(query)
+            response = chain.get_full_response(query, use_cache=use_cache)
         else:
-            response = rag_chain.get_full_response(query)
+            response = rag_chain.get_full_response(query, use_cache=use_cache)
         
         return jsonify({
             'success': True,
@@ -120,7 +158,8 @@ def recommend_movies_stream():
     {
         "query": "我想看科幻电影",
         "top_k": 5,
-        "rerank_top_n": 3
+        "rerank_top_n": 3,
+        "use_cache": true
     }
     
     响应: Server-Sent Events (SSE) 流
@@ -143,66 +182,19 @@ def recommend_movies_stream():
         
         top_k = data.get('top_k')
         rerank_top_n = data.get('rerank_top_n')
+        use_cache = data.get('use_cache', True) is not False
         
         def generate():
-            """生成流式响应"""
+            """生成流式响应（RAGChain.stream_events 的 SSE 适配）"""
             try:
-                # 1. 先执行检索和重排序
                 from src.rag import RAGChain
                 if top_k or rerank_top_n:
                     chain = RAGChain(top_k=top_k, rerank_top_n=rerank_top_n)
                 else:
                     chain = rag_chain
                 
-                # 获取检索结果
-                search_results = retriever.hybrid_search(query, top_k=chain.top_k, separate=True)
-                vector_results = search_results['vector_results']
-                bm25_results = search_results['bm25_results']
-                combined_results = search_results['combined_results']
-                
-                # 重排序
-                rerank_results = []
-                if combined_results:
-                    doc_texts = [doc['document'] for doc in combined_results]
-                    rerank_results = reranker.rerank(query=query, documents=doc_texts, top_n=chain.rerank_top_n)
-                
-                # 发送检索结果
-                retrieval_data = {
-                    'type': 'retrieval',
-                    'data': {
-                        'rerank_results': rerank_results,
-                        'recommended_movie_ids': [item['metadata']['movie_id'] for item in 
-                                                 [combined_results[r['id']] for r in rerank_results]]
-                    }
-                }
-                yield f"data: {json.dumps(retrieval_data, ensure_ascii=False)}\n\n"
-                
-                # 2. 流式生成 LLM 内容
-                context = chain._get_context(combined_results, rerank_results)
-                messages = chain._build_messages(context, query)
-                
-                llm_content = ""
-                for chunk in chain.llm.stream(messages):
-                    if chunk.choices and len(chunk.choices) > 0:
-                        content = chunk.choices[0].delta.content
-                        if content:
-                            llm_content += content
-                            chunk_data = {
-                                'type': 'llm_chunk',
-                                'data': {'content': content}
-                            }
-                            yield f"data: {json.dumps(chunk_data, ensure_ascii=False)}\n\n"
-                
-                # 3. 发送完成信号
-                complete_data = {
-                    'type': 'complete',
-                    'data': {
-                        'query': query,
-                        'llm_content': llm_content,
-                        'timestamp': datetime.now().isoformat()
-                    }
-                }
-                yield f"data: {json.dumps(complete_data, ensure_ascii=False)}\n\n"
+                for event in chain.stream_events(query, use_cache=use_cache):
+                    yield event.to_sse()
                 
             except Exception as e:
                 error_data = {
@@ -237,7 +229,8 @@ def vector_search():
     请求体:
     {
         "query": "科幻电影",
-        "top_k": 5
+        "top_k": 5,
+        "filters": {"genres": ["Sci-Fi"], "year_max": 1989, "rating_min": 4.0}  // 可选，检索前过滤
     }
     """
     try:
@@ -252,7 +245,15 @@ def vector_search():
         query = data['query'].strip()
         top_k = data.get('top_k', 5)
         
-        results = retriever.vector_search(query, top_k)
+        try:
+            filters = SearchFilter.from_dict(data.get('filters'))
+        except ValueError as e:
+            return jsonify({
+                'success': False,
+                'message': f'过滤条件无效: {str(e)}'
+            }), 400
+        
+        results = retriever.vector_search(query, top_k, filters=filters)
         
         return jsonify({
             'success': True,
@@ -279,7 +280,8 @@ def bm25_search():
     请求体:
     {
         "query": "科幻电影",
-        "top_k": 5
+        "top_k": 5,
+        "filters": {"genres": ["Sci-Fi"], "year_max": 1989, "rating_min": 4.0}  // 可选，检索前过滤
     }
     """
     try:
@@ -294,7 +296,15 @@ def bm25_search():
         query = data['query'].strip()
         top_k = data.get('top_k', 5)
         
-        results = retriever.bm25_search(query, top_k)
+        try:
+            filters = SearchFilter.from_dict(data.get('filters'))
+        except ValueError as e:
+            return jsonify({
+                'success': False,
+                'message': f'过滤条件无效: {str(e)}'
+            }), 400
+        
+        results = retriever.bm25_search(query, top_k, filters=filters)
         
         return jsonify({
             'success': True,
@@ -323,7 +333,9 @@ def hybrid_search():
         "query": "科幻电影",
         "top_k": 5,
         "alpha": 0.5,  // 可选，向量检索权重
-        "separate": false  // 可选，是否分别返回向量和BM25结果
+        "fusion": "weighted",  // 可选，融合方式 weighted / rrf
+        "separate": false,  // 可选，是否分别返回向量和BM25结果
+        "filters": {"genres": ["Sci-Fi"], "year_max": 1989, "rating_min": 4.0}  // 可选，检索前过滤
     }
     """
     try:
@@ -338,9 +350,25 @@ def hybrid_search():
         query = data['query'].strip()
         top_k = data.get('top_k', 5)
         alpha = data.get('alpha', 0.5)
+        fusion = data.get('fusion')
         separate = data.get('separate', False)
         
-        results = retriever.hybrid_search(query, top_k, alpha, separate)
+        if fusion is not None and fusion not in FUSION_METHODS:
+            return jsonify({
+                'success': False,
+                'message': f"fusion 仅支持: {', '.join(FUSION_METHODS)}"
+            }), 400
+        
+        try:
+            filters = SearchFilter.from_dict(data.get('filters'))
+        except ValueError as e:
+            return jsonify({
+                'success': False,
+                'message': f'过滤条件无效: {str(e)}'
+            }), 400
+        
+        # 始终分别获取，以便返回部分结果标记
+        results = retriever.hybrid_search(query, top_k, alpha, separate=True, fusion=fusion, filters=filters)
         
         if separate:
             return jsonify({
@@ -348,6 +376,9 @@ def hybrid_search():
                 'data': {
                     'query': query,
                     'method': 'hybrid',
+                    'partial': results['partial'],
+                    'missing_legs': results['missing_legs'],
+                    'fusion': results['fusion'],
                     'vector_results': results['vector_results'],
                     'bm25_results': results['bm25_results'],
                     'combined_results': results['combined_results'],
@@ -362,8 +393,10 @@ def hybrid_search():
                 'data': {
                     'query': query,
                     'method': 'hybrid',
-                    'results': results,
-                    'count': len(results)
+                    'partial': results['partial'],
+                    'missing_legs': results['missing_legs'],
+                    'results': results['combined_results'],
+                    'count': len(results['combined_results'])
                 }
             }), 200
         
@@ -374,6 +407,83 @@ def hybrid_search():
         }), 500
 
 
+@app.route('/ai/search/batch', methods=['POST'])
+def batch_search():
+    """
+    批量检索接口（一次请求检索多个查询）
+    
+    请求体:
+    {
+        "queries": ["科幻电影", "爱情喜剧"],
+        "method": "hybrid",  // 可选，vector / bm25 / hybrid
+        "top_k": 5,
+        "alpha": 0.5,  // 可选，混合检索的向量检索权重
+        "fusion": "weighted",  // 可选，融合方式 weighted / rrf
+        "filters": {"genres": ["Sci-Fi"]}  // 可选，对所有查询生效
+    }
+    """
+    try:
+        data = request.get_json()
+        
+        if not data or not isinstance(data.get('queries'), list) or len(data['queries']) == 0:
+            return jsonify({
+                'success': False,
+                'message': '请提供查询列表 (queries)'
+            }), 400
+        
+        queries = [str(query).strip() for query in data['queries']]
+        if len(queries) > Config.SEARCH_BATCH_MAX_QUERIES:
+            return jsonify({
+                'success': False,
+                'message': f'单次最多 {Config.SEARCH_BATCH_MAX_QUERIES} 个查询'
+            }), 400
+        
+        method = data.get('method', 'hybrid')
+        top_k = data.get('top_k', 5)
+        alpha = data.get('alpha', 0.5)
+        fusion = data.get('fusion')
+        
+        if method not in ('vector', 'bm25', 'hybrid'):
+            return jsonify({
+                'success': False,
+                'message': 'method 仅支持: vector, bm25, hybrid'
+            }), 400
+        if fusion is not None and fusion not in FUSION_METHODS:
+            return jsonify({
+                'success': False,
+                'message': f"fusion 仅支持: {', '.join(FUSION_METHODS)}"
+            }), 400
+        
+        try:
+            filters = SearchFilter.from_dict(data.get('filters'))
+        except ValueError as e:
+            return jsonify({
+                'success': False,
+                'message': f'过滤条件无效: {str(e)}'
+            }), 400
+        
+        batch = retriever.search_many(queries, method=method, top_k=top_k, alpha=alpha,
+                                      fusion=fusion, filters=filters)
+        
+        return jsonify({
+            'success': True,
+            'data': {
+                'method': method,
+                'results': [
+                    {'query': query, 'results': results, 'count': len(results)}
+                    for query, results in zip(queries, batch)
+                ],
+                'count': len(batch)
+            }
+        }), 200
+        
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'message': f'批量检索失败: {str(e)}'
+        }), 500
+
+
 @app.route('/ai/rerank', methods=['POST'])
 def rerank_documents():
     """
@@ -433,6 +543,124 @@ def rerank_documents():
         }), 500
 
 
+@app.route('/ai/index/events', methods=['POST'])
+def apply_catalog_events():
+    """
+    电影库变更事件接口（由后端在创建/更新/删除电影后发布）
+    
+    请求体:
+    {
+        "events": [
+            {"op": "upsert", "id": "12", "metadata": {...}},  // metadata 可选
+            {"op": "delete", "id": "13"}
+        ]
+    }
+    也可以直接提交单个事件对象
+    """
+    try:
+        data = request.get_json()
+        
+        if not data:
+            return jsonify({
+                'success': False,
+                'message': '请提供变更事件'
+            }), 400
+        
+        events = data.get('events', [data]) if isinstance(data, dict) else data
+        if not isinstance(events, list) or len(events) == 0:
+            return jsonify({
+                'success': False,
+                'message': '变更事件不能为空'
+            }), 400
+        
+        # 整批校验通过后写入变更日志并应用；其他 worker 从变更日志同步
+        records = retriever.apply_catalog_events(events)
+        
+        return jsonify({
+            'success': True,
+            'data': {
+                'received': len(events),
+                'applied': len(records),
+                # 与 events 一一对应；ChromaDB 中已不存在的 upsert 按 delete 应用
+                'results': [{'id': record['id'], 'op': record['op']} for record in records],
+                'index': retriever.bm25.status() if retriever.bm25 else None
+            }
+        }), 200
+        
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'message': str(e)
+        }), 400
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'message': f'变更事件处理失败: {str(e)}'
+        }), 500
+
+
+@app.route('/ai/index/status', methods=['GET'])
+def index_status():
+    """BM25 索引状态（基础段、增量段、墓碑数），以及向量索引、文档存储、过滤位图、关键词提取和检索线程池的状态"""
+    if retriever.bm25 is None:
+        return jsonify({
+            'success': False,
+            'message': 'BM25 索引未加载'
+        }), 503
+    
+    data = retriever.bm25.status()
+    data['vector'] = retriever.vector_index.status() if retriever.vector_index else None
+    data['documents'] = retriever.doc_store.status() if retriever.doc_store else None
+    data['filters'] = Retriever._filter_index_cache.status() if Retriever._filter_index_cache else None
+    data['keywords'] = keyword_extractor.stats()
+    data['executor'] = Retriever.executor_stats()
+    return jsonify({
+        'success': True,
+        'data': data
+    }), 200
+
+
+@app.route('/ai/cache/status', methods=['GET'])
+def cache_status():
+    """检索结果缓存、翻译 / 关键词提取缓存、embedding 缓存、重排序分数缓存和语义响应缓存的状态（条目数、命中 / 未命中 / 淘汰计数）"""
+    return jsonify({
+        'success': True,
+        'data': {
+            'retrieval': retriever.cache_stats(),
+            'translation': translation_cache_stats(),
+            'embedding': embedding_service.cache_stats(),
+            'rerank': reranker.cache_stats(),
+            'response': response_cache.stats() if response_cache is not None else None
+        }
+    }), 200
+
+
+@app.route('/ai/rerank/status', methods=['GET'])
+def rerank_status():
+    """重排序后端的时限、超时 / 失败 / 降级计数、熔断器状态和级联剪枝统计（重排序器尚未初始化时只返回组件状态）"""
+    if not warmup.is_warm('reranker'):
+        return jsonify({'success': True, 'data': {'state': warmup.status()['components']['reranker']['state']}}), 200
+    return jsonify({
+        'success': True,
+        'data': dict(reranker.status(), cascade=rerank_cascade.stats())
+    }), 200
+
+
+@app.route('/ai/embedding/status', methods=['GET'])
+def embedding_status():
+    """Embedding 推理后端、微批处理（队列深度、批大小、排队等待时间直方图）和长度分桶的填充统计"""
+    return jsonify({
+        'success': True,
+        'data': {
+            'backend': embedding_service.backend,
+            'variant': embedding_service.variant,
+            'model_loaded': embedding_service.model is not None,
+            'batching': embedding_service.batch_stats(),
+            'length_bucketing': embedding_service.padding_stats()
+        }
+    }), 200
+
+
 # ============================================================================
 # 动态推荐系统路由
 # ============================================================================
@@ -897,10 +1125,8 @@ if __name__ == '__main__':
         print(f"❌ 配置错误: {e}")
         sys.exit(1)
     
-    # 预加载 BM25 索引
-    print("🔄 预加载 BM25 索引...")
-    retriever.preload_bm25()
-    print("✅ BM25 索引加载完成")
+    if Config.WARMUP_ON_START:
+        print("🔄 组件在后台预热中（就绪状态: GET /ai/ready）")
     
     # 启动服务
     print(f"\n{'='*60}")
@@ -909,13 +1135,20 @@ if __name__ == '__main__':
     print(f"📍 地址: http://{Config.FLASK_HOST}:{Config.FLASK_PORT}")
     print(f"\n📡 RAG 推荐:")
     print(f"  🏥 健康检查: http://localhost:{Config.FLASK_PORT}/ai/health")
+    print(f"  🚦 就绪检查: http://localhost:{Config.FLASK_PORT}/ai/ready")
     print(f"  🎬 电影推荐: POST http://localhost:{Config.FLASK_PORT}/ai/recommend")
     print(f"  🌊 流式推荐: POST http://localhost:{Config.FLASK_PORT}/ai/recommend/stream")
     print(f"\n🔍 检索:")
     print(f"  📊 向量检索: POST http://localhost:{Config.FLASK_PORT}/ai/search/vector")
     print(f"  📝 BM25检索: POST http://localhost:{Config.FLASK_PORT}/ai/search/bm25")
     print(f"  🔀 混合检索: POST http://localhost:{Config.FLASK_PORT}/ai/search/hybrid")
+    print(f"  📦 批量检索: POST http://localhost:{Config.FLASK_PORT}/ai/search/batch")
     print(f"  🎯 重排序: POST http://localhost:{Config.FLASK_PORT}/ai/rerank")
+    print(f"  🔄 索引变更: POST http://localhost:{Config.FLASK_PORT}/ai/index/events")
+    print(f"  📈 索引状态: GET http://localhost:{Config.FLASK_PORT}/ai/index/status")
+    print(f"  💾 缓存状态: GET http://localhost:{Config.FLASK_PORT}/ai/cache/status")
+    print(f"  🔀 重排序状态: GET http://localhost:{Config.FLASK_PORT}/ai/rerank/status")
+    print(f"  🧮 Embedding 状态: GET http://localhost:{Config.FLASK_PORT}/ai/embedding/status")
     print(f"\n🎯 动态推荐系统:")
     print(f"  👤 个性化推荐: GET http://localhost:{Config.FLASK_PORT}/ai/recommendation/personalized")
     print(f"  📝 记录行为: POST http://localhost:{Config.FLASK_PORT}/ai/recommendation/behavior")
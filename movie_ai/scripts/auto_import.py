@@ -1,10 +1,11 @@
 """
-自动将 MovieLens 数据导入 ChromaDB（非交互模式）
+自动将 MovieLens 数据导入 ChromaDB（非交互模式，增量导入，不清空已有数据）
 """
 import sys
 import os
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
+from src.config import Config
 from scripts.import_to_chroma import ChromaDBImporter
 
 def main():
@@ -14,7 +15,7 @@ def main():
     print("=" * 60)
 
     # 配置路径
-    json_path = r'D:\code\vue\movie_ai\datasets\chroma_movies_with_descriptions.json'
+    json_path = Config.IMPORT_DATA_PATH
 
     # 检查文件是否存在
     if not os.path.exists(json_path):
@@ -27,25 +28,9 @@ def main():
     # 连接数据库
     importer.connect()
 
-    # 如果集合为空，直接导入；否则先清空
-    if importer.collection.count() > 0:
-        print(f"\n集合中已有 {importer.collection.count()} 条记录，清空后重新导入...")
-        importer.clear_collection()
-
-    # 加载数据
-    data = importer.load_data(json_path)
-
-    # 生成 embeddings
-    embeddings = importer.generate_embeddings(data['documents'])
-
-    # 导入数据
-    importer.import_data(
-        ids=data['ids'],
-        documents=data['documents'],
-        metadatas=data['metadatas'],
-        embeddings=embeddings,
-        batch_size=100
-    )
+    # 不清空集合：按 ID upsert，内容未变的记录跳过；上次中断时从断点继续
+    print(f"\n集合中已有 {importer.collection.count()} 条记录，增量导入...")
+    importer.import_file(json_path)
 
     # 显示样本
     importer.show_sample()
@@ -0,0 +1,146 @@
+"""
+Embedding 推理后端对比：PyTorch vs ONNX Runtime（fp32 / 动态 int8）
+
+对每个后端测量单条查询延迟（p50 / p95）和批量编码吞吐（docs/sec），
+并以 PyTorch 结果为基准计算余弦一致性和向量检索 top-k 重合度。
+
+用法:
+    python scripts/benchmark_embedding.py
+    python scripts/benchmark_embedding.py --docs 2000 --queries 200 --threads 4
+    python scripts/benchmark_embedding.py --backends torch,onnx-int8
+
+文档默认取自 ChromaDB 集合，不可用时使用内置样例文本。
+"""
+import os
+import sys
+import time
+
+import numpy as np
+
+# 添加项目根目录到 Python 路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.config import Config
+from src.embedding_cache import model_fingerprint
+from src.onnx_embedding import PARITY_SAMPLES, OnnxEncoder, cosine_agreement, export_onnx
+
+
+SAMPLE_QUERIES = [
+    '科幻电影', '爱情喜剧', '动作片', '恐怖片', '经典黑色电影', '适合全家看的动画',
+    '战争题材的电影', '悬疑惊悚片', '音乐剧', '西部片', '纪录片', '犯罪片',
+    '浪漫爱情故事', '冒险电影', '奇幻电影', '儿童电影',
+]
+
+
+def load_documents(count: int):
+    """读取集合中的文档（不可用时循环使用样例文本）"""
+    try:
+        from scripts.db_connection import db_connection
+
+        db_connection.connect()
+        documents = db_connection.get_collection().get(limit=count, include=['documents'])['documents']
+        if documents:
+            return documents
+    except Exception as e:
+        print(f"⚠️  无法读取 ChromaDB 文档，使用样例文本: {e}")
+    return [PARITY_SAMPLES[i % len(PARITY_SAMPLES)] + f" #{i}" for i in range(count)]
+
+
+def load_backends(names, threads: int):
+    """按名称加载后端：torch / onnx-fp32 / onnx-int8"""
+    backends = {}
+    if 'torch' in names:
+        from sentence_transformers import SentenceTransformer
+        backends['torch'] = SentenceTransformer(Config.EMBEDDING_MODEL_NAME, device='cpu')
+
+    onnx_names = [name for name in names if name.startswith('onnx')]
+    if onnx_names:
+        output_dir = os.path.join(
+            Config.EMBEDDING_ONNX_DIR,
+            model_fingerprint(Config.EMBEDDING_MODEL_NAME, Config.EMBEDDING_DIMENSION)
+        )
+        paths = export_onnx(Config.EMBEDDING_MODEL_NAME, output_dir, quantize='onnx-int8' in onnx_names)
+        for name in onnx_names:
+            backends[name] = OnnxEncoder(Config.EMBEDDING_MODEL_NAME, paths[name.split('-')[1]], threads=threads)
+    return backends
+
+
+def _encode(model, texts, batch_size: int) -> np.ndarray:
+    return np.asarray(model.encode(texts, batch_size=batch_size, show_progress_bar=False,
+                                   convert_to_numpy=True, normalize_embeddings=True), dtype=np.float32)
+
+
+def benchmark(backend_names, doc_count: int = 1000, query_count: int = 100,
+              batch_size: int = 32, threads: int = 0, top_k: int = 10):
+    """
+    对比各后端的延迟、吞吐和一致性
+
+    Args:
+        backend_names: 后端名称列表
+        doc_count: 批量编码的文档数
+        query_count: 单条查询次数
+        batch_size: 批量编码的批大小
+        threads: ONNX Runtime intra-op 线程数（0 为默认）
+        top_k: 检索重合度的 k
+    """
+    documents = load_documents(doc_count)
+    queries = [SAMPLE_QUERIES[i % len(SAMPLE_QUERIES)] for i in range(query_count)]
+    backends = load_backends(backend_names, threads)
+
+    print("=" * 78)
+    print(f"Embedding 后端对比 (文档数={len(documents)}, 查询数={query_count}, "
+          f"batch_size={batch_size}, ONNX 线程={threads or '默认'})")
+    print("=" * 78)
+    print(f"{'后端':<12} {'p50 ms':>8} {'p95 ms':>8} {'docs/s':>9} {'最小余弦':>9} {'平均余弦':>9} {f'top{top_k}重合':>9}")
+
+    reference_docs = reference_queries = None
+    for name, model in backends.items():
+        _encode(model, queries[:2], batch_size)  # 预热
+
+        latencies = []
+        for query in queries:
+            start = time.perf_counter()
+            _encode(model, [query], 1)
+            latencies.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        doc_vectors = _encode(model, documents, batch_size)
+        docs_per_sec = len(documents) / (time.perf_counter() - start)
+        query_vectors = _encode(model, SAMPLE_QUERIES, batch_size)
+
+        if reference_docs is None:
+            reference_docs, reference_queries = doc_vectors, query_vectors
+        agreement = cosine_agreement(reference_docs, doc_vectors)
+
+        # 以第一个后端为基准的检索 top-k 重合度
+        reference_top = np.argsort(-(reference_queries @ reference_docs.T), axis=1)[:, :top_k]
+        candidate_top = np.argsort(-(query_vectors @ doc_vectors.T), axis=1)[:, :top_k]
+        overlap = np.mean([len(set(a) & set(b)) / top_k for a, b in zip(reference_top, candidate_top)])
+
+        print(f"{name:<12} {np.percentile(latencies, 50) * 1000:8.2f} {np.percentile(latencies, 95) * 1000:8.2f} "
+              f"{docs_per_sec:9.1f} {agreement['min_cosine']:9.4f} {agreement['mean_cosine']:9.4f} {overlap:9.3f}")
+
+    print(f"\n一致性以 {next(iter(backends))} 为基准；服务中 ONNX 后端需满足最小余弦 ≥ {Config.EMBEDDING_ONNX_MIN_COSINE}")
+
+
+def main():
+    """主函数"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Embedding 推理后端对比（PyTorch vs ONNX Runtime）')
+    parser.add_argument('--backends', default='torch,onnx-fp32,onnx-int8',
+                        help='逗号分隔：torch / onnx-fp32 / onnx-int8（第一个作为一致性基准）')
+    parser.add_argument('--docs', type=int, default=1000, help='批量编码的文档数')
+    parser.add_argument('--queries', type=int, default=100, help='单条查询次数')
+    parser.add_argument('--batch-size', type=int, default=32, help='批量编码的批大小')
+    parser.add_argument('--threads', type=int, default=Config.EMBEDDING_ONNX_THREADS,
+                        help='ONNX Runtime intra-op 线程数（0 为默认）')
+    parser.add_argument('--top-k', type=int, default=10, help='检索重合度的 k')
+
+    args = parser.parse_args()
+    benchmark(args.backends.split(','), doc_count=args.docs, query_count=args.queries,
+              batch_size=args.batch_size, threads=args.threads, top_k=args.top_k)
+
+
+if __name__ == '__main__':
+    main()
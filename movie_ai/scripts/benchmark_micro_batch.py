@@ -0,0 +1,131 @@
+"""
+Embedding 微批处理压测：并发单条查询编码，对比逐条调用模型与动态微批处理
+
+每个线程循环编码单条查询（不经过 embedding 缓存），统计总吞吐（queries/sec）
+和单次请求延迟（p50 / p99），微批处理模式下同时输出批大小和队列深度分布。
+
+用法:
+    python scripts/benchmark_micro_batch.py
+    python scripts/benchmark_micro_batch.py --threads 16 --requests 2000
+    python scripts/benchmark_micro_batch.py --max-batch 16 --wait-ms 2
+"""
+import os
+import sys
+import threading
+import time
+
+import numpy as np
+
+# 添加项目根目录到 Python 路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.config import Config
+from src.embeddeding import EmbeddingService
+from src.micro_batcher import MicroBatcher
+
+
+SAMPLE_QUERIES = [
+    '科幻电影', '爱情喜剧', '动作片', '恐怖片', '经典黑色电影', '适合全家看的动画',
+    '战争题材的电影', '悬疑惊悚片', '音乐剧', '西部片', '纪录片', '犯罪片',
+    '浪漫爱情故事', '冒险电影', '奇幻电影', '儿童电影',
+]
+
+
+def run_load(encode_one, threads: int, requests: int):
+    """
+    多线程并发调用 encode_one，每个请求一条查询
+
+    Returns:
+        (吞吐 queries/sec, 各请求延迟列表（秒）)
+    """
+    latencies = []
+    lock = threading.Lock()
+    counter = iter(range(requests))
+
+    def worker():
+        local = []
+        while True:
+            with lock:
+                i = next(counter, None)
+            if i is None:
+                break
+            query = f"{SAMPLE_QUERIES[i % len(SAMPLE_QUERIES)]} {i}"
+            start = time.perf_counter()
+            encode_one(query)
+            local.append(time.perf_counter() - start)
+        with lock:
+            latencies.extend(local)
+
+    start = time.perf_counter()
+    workers = [threading.Thread(target=worker) for _ in range(threads)]
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    return requests / (time.perf_counter() - start), latencies
+
+
+def _print_histogram(title: str, snapshot):
+    print(f"  {title}: 平均 {snapshot['mean']:.2f}，最大 {snapshot['max']:g}")
+    for label, count in snapshot['buckets'].items():
+        if count:
+            print(f"    {label:>6} {count:6d}")
+
+
+def benchmark(threads: int = 8, requests: int = 1000, max_batch: int = 32, wait_ms: float = 3.0):
+    """
+    对比逐条编码与微批处理
+
+    Args:
+        threads: 并发线程数
+        requests: 总请求数
+        max_batch: 微批处理的最大批大小
+        wait_ms: 微批处理的等待时间窗口（毫秒）
+    """
+    service = EmbeddingService()
+    service.load_model()
+    service._encode(SAMPLE_QUERIES[:2], 2)  # 预热
+
+    batcher = MicroBatcher(lambda texts: service._encode(texts, max_batch), max_batch_size=max_batch,
+                           max_wait=wait_ms / 1000, max_queue=max(requests, 1), name='benchmark-batcher')
+
+    def batched(query):
+        return batcher.submit(query).result()
+
+    modes = [
+        ('逐条编码', lambda query: service._encode([query], 1)),
+        (f'微批处理 ({max_batch}/{wait_ms:g}ms)', batched),
+    ]
+
+    print("=" * 70)
+    print(f"Embedding 微批处理压测 (后端={service.backend}, 线程数={threads}, 请求数={requests})")
+    print("=" * 70)
+    print(f"{'模式':<24} {'queries/s':>10} {'p50 ms':>9} {'p99 ms':>9}")
+    for name, encode_one in modes:
+        throughput, latencies = run_load(encode_one, threads, requests)
+        print(f"{name:<24} {throughput:10.1f} {np.percentile(latencies, 50) * 1000:9.2f} "
+              f"{np.percentile(latencies, 99) * 1000:9.2f}")
+
+    stats = batcher.stats()
+    print("\n微批处理分布:")
+    _print_histogram('批大小', stats['batch_size'])
+    _print_histogram('入队时队列深度', stats['queue_depth'])
+    print(f"  排队等待: p50 ≤ {stats['wait_ms']['p50']:g} ms，p99 ≤ {stats['wait_ms']['p99']:g} ms")
+
+
+def main():
+    """主函数"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Embedding 微批处理压测')
+    parser.add_argument('--threads', type=int, default=8, help='并发线程数')
+    parser.add_argument('--requests', type=int, default=1000, help='总请求数')
+    parser.add_argument('--max-batch', type=int, default=Config.EMBEDDING_BATCH_MAX_SIZE, help='最大批大小')
+    parser.add_argument('--wait-ms', type=float, default=Config.EMBEDDING_BATCH_MAX_WAIT_MS, help='等待时间窗口（毫秒）')
+
+    args = parser.parse_args()
+    benchmark(threads=args.threads, requests=args.requests, max_batch=args.max_batch, wait_ms=args.wait_ms)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,160 @@
+"""
+重排序后端对比：远程 Qwen Rerank（经本地桩服务）vs 本地 CrossEncoder
+
+远程路径使用 dashscope SDK，请求发往本机启动的桩服务（模拟网络往返和服务端耗时，
+返回按词重叠打分的结果），不需要 API Key 和外网；本地路径加载 Config.RERANK_LOCAL_MODEL。
+对每个后端测量单次调用延迟（p50 / p95 / p99）和吞吐（queries/sec、docs/sec）。
+
+用法:
+    python scripts/benchmark_rerank.py
+    python scripts/benchmark_rerank.py --backends dashscope,cross-encoder --queries 100 --candidates 10
+    python scripts/benchmark_rerank.py --remote-latency-ms 200 --concurrency 4
+"""
+import json
+import os
+import random
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+# 添加项目根目录到 Python 路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.config import Config
+from src.rerank import create_backend
+from scripts.benchmark_embedding import SAMPLE_QUERIES, load_documents
+
+
+class _StubHandler(BaseHTTPRequestHandler):
+    """模拟 DashScope 文本重排序接口（任何 POST 路径都按重排序请求处理）"""
+
+    latency = 0.15
+    jitter = 0.05
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+        query = body.get('input', {}).get('query', '')
+        documents = body.get('input', {}).get('documents', [])
+        top_n = body.get('parameters', {}).get('top_n', len(documents))
+
+        time.sleep(max(0.0, random.gauss(self.latency, self.jitter)))
+        terms = set(query)
+        scores = [len(terms & set(document)) / (len(terms) or 1) for document in documents]
+        order = sorted(range(len(documents)), key=lambda i: -scores[i])[:top_n]
+        payload = json.dumps({
+            'request_id': 'stub',
+            'output': {'results': [{'index': i, 'relevance_score': scores[i]} for i in order]},
+            'usage': {'total_tokens': sum(len(document) for document in documents)},
+        }).encode('utf-8')
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, *args):
+        pass
+
+
+def start_stub(latency: float, jitter: float) -> ThreadingHTTPServer:
+    """启动本地桩服务，并把 dashscope SDK 的请求地址指向它"""
+    import dashscope
+
+    _StubHandler.latency, _StubHandler.jitter = latency, jitter
+    server = ThreadingHTTPServer(('127.0.0.1', 0), _StubHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    dashscope.base_http_api_url = f'http://127.0.0.1:{server.server_address[1]}/api/v1'
+    dashscope.api_key = dashscope.api_key or 'stub'
+    return server
+
+
+def run(backend, requests, top_n: int, concurrency: int):
+    """
+    执行全部请求
+
+    Returns:
+        (总耗时秒数, 各请求延迟列表)
+    """
+    def call(request):
+        query, documents = request
+        start = time.perf_counter()
+        backend.rerank(query, documents, top_n)
+        return time.perf_counter() - start
+
+    start = time.perf_counter()
+    if concurrency <= 1:
+        latencies = [call(request) for request in requests]
+    else:
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            latencies = list(pool.map(call, requests))
+    return time.perf_counter() - start, latencies
+
+
+def benchmark(backend_names, query_count: int = 50, candidates: int = 10, top_n: int = 3,
+              concurrency: int = 1, remote_latency: float = 0.15, remote_jitter: float = 0.05):
+    """
+    对比各重排序后端的延迟和吞吐
+
+    Args:
+        backend_names: 后端名称列表（dashscope / cross-encoder）
+        query_count: 请求数
+        candidates: 每个请求的候选文档数
+        top_n: 返回的结果数
+        concurrency: 并发请求数
+        remote_latency: 桩服务的平均耗时（秒）
+        remote_jitter: 桩服务耗时的标准差（秒）
+    """
+    documents = load_documents(max(candidates * 20, 200))
+    rng = random.Random(0)
+    requests = [(SAMPLE_QUERIES[i % len(SAMPLE_QUERIES)], rng.sample(documents, candidates))
+                for i in range(query_count)]
+
+    server = start_stub(remote_latency, remote_jitter) if 'dashscope' in backend_names else None
+
+    print("=" * 74)
+    print(f"重排序后端对比 (请求数={query_count}, 候选数={candidates}, top_n={top_n}, 并发={concurrency})")
+    if server is not None:
+        print(f"远程路径经本地桩服务: 平均耗时 {remote_latency * 1000:.0f} ms ± {remote_jitter * 1000:.0f} ms")
+    print("=" * 74)
+    print(f"{'后端':<14} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'queries/s':>10} {'docs/s':>9}")
+
+    try:
+        for name in backend_names:
+            backend = create_backend(name)
+            backend.rerank(*requests[0], top_n)  # 预热（建立连接 / 首次推理）
+            seconds, latencies = run(backend, requests, top_n, concurrency)
+            latencies = np.asarray(latencies) * 1000
+            print(f"{name:<14} {np.percentile(latencies, 50):8.1f} {np.percentile(latencies, 95):8.1f} "
+                  f"{np.percentile(latencies, 99):8.1f} {query_count / seconds:10.1f} "
+                  f"{query_count * candidates / seconds:9.1f}")
+    finally:
+        if server is not None:
+            server.shutdown()
+
+
+def main():
+    """主函数"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description='重排序后端对比（远程桩服务 vs 本地 CrossEncoder）')
+    parser.add_argument('--backends', default='dashscope,cross-encoder', help='逗号分隔：dashscope / cross-encoder')
+    parser.add_argument('--queries', type=int, default=50, help='请求数')
+    parser.add_argument('--candidates', type=int, default=Config.TOP_K * 2, help='每个请求的候选文档数')
+    parser.add_argument('--top-n', type=int, default=Config.RERANK_TOP_N, help='返回的结果数')
+    parser.add_argument('--concurrency', type=int, default=1, help='并发请求数')
+    parser.add_argument('--remote-latency-ms', type=float, default=150, help='桩服务平均耗时（毫秒）')
+    parser.add_argument('--remote-jitter-ms', type=float, default=50, help='桩服务耗时标准差（毫秒）')
+
+    args = parser.parse_args()
+    benchmark(args.backends.split(','), query_count=args.queries, candidates=args.candidates, top_n=args.top_n,
+              concurrency=args.concurrency, remote_latency=args.remote_latency_ms / 1000,
+              remote_jitter=args.remote_jitter_ms / 1000)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,78 @@
+"""
+批量检索吞吐对比：逐条调用 Retriever.search 与一次调用 Retriever.search_many
+
+用法:
+    python scripts/benchmark_search_batch.py --method vector --count 256
+    python scripts/benchmark_search_batch.py --method hybrid --count 64
+
+注意：bm25 / hybrid 的关键词提取会调用 LLM，两种方式都计入耗时。
+"""
+import os
+import sys
+import time
+
+# 添加项目根目录到 Python 路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.retriever import retriever
+
+
+SAMPLE_QUERIES = [
+    '科幻电影', '爱情喜剧', '动作片', '恐怖片', '经典黑色电影', '适合全家看的动画',
+    '战争题材的电影', '悬疑惊悚片', '音乐剧', '西部片', '纪录片', '犯罪片',
+    '浪漫爱情故事', '冒险电影', '奇幻电影', '儿童电影',
+]
+
+
+def benchmark(method: str = 'vector', count: int = 256, top_k: int = 5):
+    """
+    对比逐条检索与批量检索的吞吐
+
+    Args:
+        method: 检索方法 ('vector', 'bm25', 'hybrid')
+        count: 查询数（循环使用 SAMPLE_QUERIES）
+        top_k: 每个查询返回数量
+    """
+    queries = [SAMPLE_QUERIES[i % len(SAMPLE_QUERIES)] for i in range(count)]
+
+    print("=" * 60)
+    print(f"批量检索吞吐对比 (method={method}, 查询数={count}, top_k={top_k})")
+    print("=" * 60)
+
+    # 预热（加载模型、索引）
+    retriever.search(queries[0], method=method, top_k=top_k)
+
+    start = time.perf_counter()
+    single = [retriever.search(query, method=method, top_k=top_k) for query in queries]
+    loop_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    batch = retriever.search_many(queries, method=method, top_k=top_k)
+    batch_seconds = time.perf_counter() - start
+
+    same = sum(
+        [item['id'] for item in a] == [item['id'] for item in b]
+        for a, b in zip(single, batch)
+    )
+
+    print(f"\n逐条检索: {loop_seconds:8.3f} s   {count / loop_seconds:9.1f} 查询/秒")
+    print(f"批量检索: {batch_seconds:8.3f} s   {count / batch_seconds:9.1f} 查询/秒")
+    print(f"加速比:   {loop_seconds / batch_seconds:8.1f}x")
+    print(f"结果一致: {same}/{count}")
+
+
+def main():
+    """主函数"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description='批量检索吞吐对比')
+    parser.add_argument('--method', choices=['vector', 'bm25', 'hybrid'], default='vector', help='检索方法')
+    parser.add_argument('--count', type=int, default=256, help='查询数')
+    parser.add_argument('--top-k', type=int, default=5, help='每个查询返回数量')
+
+    args = parser.parse_args()
+    benchmark(method=args.method, count=args.count, top_k=args.top_k)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,5 +1,11 @@
 """
 构建 BM25 索引脚本
+
+用法:
+    python scripts/build_bm25_index.py                    # 分词（复用分词缓存）并重建索引
+    python scripts/build_bm25_index.py --workers 8        # 指定分词进程数
+    python scripts/build_bm25_index.py --from-tokens --k1 1.2 --b 0.6
+                                                          # 只修改参数：从分词缓存重新统计，不分词
 """
 import os
 import sys
@@ -8,25 +14,45 @@ import sys
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from src.bm25_builder import bm25_builder
+from src.config import Config
 from src.retriever import retriever
 
 
 def main():
     """主函数"""
-    # 1. 获取 collection（retriever 已自动连接）
-    collection = retriever.collection
-
-    # 2. 构建索引
-    bm25, doc_ids, doc_texts = bm25_builder.build_or_load(
-        collection,
-        force_rebuild=True  # 强制重建以应用停用词过滤
-    )
+    import argparse
+
+    parser = argparse.ArgumentParser(description='构建 BM25 索引')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='分词进程数（默认 BM25_TOKENIZE_WORKERS，0 表示 CPU 核数）')
+    parser.add_argument('--from-tokens', action='store_true',
+                        help='从分词缓存重新统计（试验 k1 / b / 字段时使用，不读取 ChromaDB；服务启动时以 Config 为准）')
+    parser.add_argument('--k1', type=float, default=None, help='BM25 参数 k1（仅 --from-tokens）')
+    parser.add_argument('--b', type=float, default=None, help='BM25 参数 b（仅 --from-tokens）')
+    parser.add_argument('--fields', default=None, help='检索字段，逗号分隔（仅 --from-tokens）')
+    args = parser.parse_args()
+
+    if args.from_tokens:
+        fields = args.fields.split(',') if args.fields else None
+        bm25, doc_ids, doc_texts = bm25_builder.rebuild_from_tokens(k1=args.k1, b=args.b, fields=fields)
+    else:
+        # 1. 获取 collection（retriever 已自动连接）
+        collection = retriever.collection
+
+        # 2. 构建索引（强制重建以应用停用词过滤；未变化的文档复用分词缓存）
+        workers = Config.BM25_TOKENIZE_WORKERS if args.workers is None else args.workers
+        bm25, doc_ids, doc_texts = bm25_builder.build_from_collection(collection, workers=workers)
 
     # 3. 更新检索器
-    retriever.bm25 = bm25
-    retriever.doc_ids = doc_ids
-    retriever.doc_texts = doc_texts
-
+    retriever.set_bm25_index(bm25, doc_ids, doc_texts)
+
+    report = bm25_builder.last_report
+    print(f"\n构建报告: {report['docs']} 条文档，{report['seconds']:.2f}s，{report['docs_per_sec']:.0f} docs/s")
+    if report['tokenize']:
+        tokenize = report['tokenize']
+        print(f"   分词: {tokenize['workers']} 进程，{tokenize['docs_per_sec']:.0f} docs/s"
+              f"（重新分词 {tokenize['tokenized']} 段，复用 {tokenize['reused']} 段，"
+              f"词表 {tokenize['vocab_size']}，共 {tokenize['tokens']} 个词）")
     print("\n✅ 索引构建完成，检索器已更新！")
 
 
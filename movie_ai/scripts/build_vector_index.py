@@ -0,0 +1,29 @@
+"""
+构建进程内向量索引脚本（IVF + int8，复用 ChromaDB 中已有的 embedding）
+"""
+import os
+import sys
+
+# 添加项目根目录到 Python 路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.vector_builder import vector_builder
+from src.retriever import retriever
+
+
+def main():
+    """主函数"""
+    # 1. 获取 collection（retriever 已自动连接）
+    collection = retriever.collection
+
+    # 2. 构建索引
+    index = vector_builder.build_or_load(collection, force_rebuild=True)
+
+    # 3. 更新检索器（VECTOR_BACKEND=ivf 时生效）
+    retriever.set_vector_index(index)
+
+    print("\n✅ 向量索引构建完成，设置 VECTOR_BACKEND=ivf 启用")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,145 @@
+"""
+关键词提取离线对比：本地词典提取 vs LLM 提取
+
+读取查询日志（KEYWORD_QUERY_LOG 记录的 JSON Lines，或每行一个查询的文本文件），
+对每个查询分别用本地提取器和 LLM 提取关键词，比较分词后的词集合和 BM25 检索结果，
+输出本地命中率、与 LLM 一致的比例、BM25 top-k 重合度和两者的延迟。
+
+用法:
+    python scripts/compare_keyword_extractors.py --queries logs/keyword_queries.jsonl
+    python scripts/compare_keyword_extractors.py --queries queries.txt --limit 200 --show 20
+"""
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+# 添加项目根目录到 Python 路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from scripts.db_connection import db_connection
+from src.bm25_builder import TOKENIZER_SIGNATURE, preprocess_text
+from src.bm25_store import IndexFormatError, open_index
+from src.config import Config
+from src.keyword_extractor import keyword_extractor
+from utils.translator import get_translator
+
+
+def load_queries(path: str, limit: int = None):
+    """读取查询（JSON Lines 取 query 字段，否则每行一个查询），去重并保持顺序"""
+    queries = []
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            if line.startswith('{'):
+                line = json.loads(line).get('query', '')
+            if line:
+                queries.append(line)
+    queries = list(dict.fromkeys(queries))
+    return queries[:limit] if limit else queries
+
+
+def _timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - start
+
+
+def compare(path: str, limit: int = None, top_k: int = 10, show: int = 10):
+    """
+    对比两种提取方式
+
+    Args:
+        path: 查询日志路径
+        limit: 最多对比的查询数
+        top_k: BM25 结果重合度的 k
+        show: 打印的不一致样例数
+    """
+    queries = load_queries(path, limit)
+    if not queries:
+        print(f"❌ 没有可用的查询: {path}")
+        return
+
+    print("=" * 70)
+    print(f"关键词提取对比 (查询数={len(queries)}, BM25 top_k={top_k})")
+    print("=" * 70)
+
+    db_connection.connect()
+    keyword_extractor.load_from_collection(db_connection.get_collection())
+    print(f"词典: {keyword_extractor.stats()['gazetteer_patterns']} 个片名/导演，"
+          f"{keyword_extractor.stats()['genre_patterns']} 个类型词")
+
+    try:
+        bm25, doc_ids, _, _ = open_index(Config.BM25_INDEX_DIR, tokenizer_signature=TOKENIZER_SIGNATURE)
+    except IndexFormatError as e:
+        print(f"⚠️  BM25 索引不可用，跳过检索结果对比: {e}")
+        bm25 = None
+
+    translator = get_translator()
+    local_latencies, llm_latencies = [], []
+    hits, same_tokens, jaccards, overlaps = 0, 0, [], []
+    mismatches = []
+
+    for query in queries:
+        local, local_seconds = _timed(keyword_extractor.extract_local, query)
+        llm, llm_seconds = _timed(translator.extract_movie_keywords, query)
+        local_latencies.append(local_seconds)
+        llm_latencies.append(llm_seconds)
+        if local is None:
+            mismatches.append((query, None, llm))
+            continue
+
+        hits += 1
+        local_tokens, llm_tokens = set(preprocess_text(local)), set(preprocess_text(llm or ''))
+        union = local_tokens | llm_tokens
+        jaccards.append(len(local_tokens & llm_tokens) / len(union) if union else 1.0)
+        if local_tokens == llm_tokens:
+            same_tokens += 1
+        else:
+            mismatches.append((query, local, llm))
+
+        if bm25 is not None:
+            local_docs, _ = bm25.top_k(preprocess_text(local), top_k)
+            llm_docs, _ = bm25.top_k(preprocess_text(llm or ''), top_k)
+            if len(llm_docs):
+                overlaps.append(len(set(local_docs.tolist()) & set(llm_docs.tolist())) / len(llm_docs))
+
+    total = len(queries)
+    print(f"\n本地命中率:         {hits / total:.1%} ({hits}/{total})")
+    if hits:
+        print(f"命中时与 LLM 一致:  {same_tokens / hits:.1%}   平均 Jaccard {np.mean(jaccards):.3f}")
+    if overlaps:
+        print(f"BM25 top-{top_k} 重合度: {np.mean(overlaps):.3f}")
+    print(f"\n延迟（p50 / p95）:")
+    print(f"   本地: {np.percentile(local_latencies, 50) * 1000:8.3f} ms / {np.percentile(local_latencies, 95) * 1000:8.3f} ms")
+    print(f"   LLM:  {np.percentile(llm_latencies, 50) * 1000:8.3f} ms / {np.percentile(llm_latencies, 95) * 1000:8.3f} ms")
+
+    if show and mismatches:
+        print(f"\n不一致 / 未命中样例（前 {min(show, len(mismatches))} 条）:")
+        for query, local, llm in mismatches[:show]:
+            print(f"   {query!r}\n      本地: {local!r}\n      LLM:  {llm!r}")
+    print("\n提示: 未命中的查询可补充到 src/keyword_extractor.py 的 GENRE_ALIASES，"
+          "片名/导演词典随电影库自动更新")
+
+
+def main():
+    """主函数"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description='关键词提取离线对比（本地词典 vs LLM）')
+    parser.add_argument('--queries', default=Config.KEYWORD_QUERY_LOG or None, required=not Config.KEYWORD_QUERY_LOG,
+                        help='查询日志（JSON Lines 或每行一个查询），默认 KEYWORD_QUERY_LOG')
+    parser.add_argument('--limit', type=int, default=None, help='最多对比的查询数')
+    parser.add_argument('--top-k', type=int, default=10, help='BM25 结果重合度的 k')
+    parser.add_argument('--show', type=int, default=10, help='打印的不一致样例数')
+
+    args = parser.parse_args()
+    compare(args.queries, limit=args.limit, top_k=args.top_k, show=args.show)
+
+
+if __name__ == '__main__':
+    main()
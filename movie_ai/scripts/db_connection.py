@@ -7,8 +7,6 @@ import sys
 # 添加项目根目录到 Python 路径
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-import chromadb
-from chromadb.config import Settings
 from src.config import Config
 
 
@@ -36,6 +34,9 @@ class DBConnection:
         if db_path is None:
             db_path = Config.CHROMA_DB_PATH
         
+        import chromadb
+        from chromadb.config import Settings
+
         self.client = chromadb.PersistentClient(
             path=db_path,
             settings=Settings(
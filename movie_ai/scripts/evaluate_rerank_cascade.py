@@ -0,0 +1,99 @@
+"""
+重排序级联评估：余弦相似度剪枝后重排序 vs 全量重排序
+
+对每个样例查询执行混合检索（候选池为 --top-k），先对全部候选重排序得到参考 top-N，
+再对不同 (margin, top_m) 组合只重排序级联保留的候选，报告：
+    recall@N    级联 top-N 中有多少落在全量重排序的 top-N 中（平均）
+    prune       被剪枝的候选比例（平均），即节省的重排序打分量
+
+用法:
+    python scripts/evaluate_rerank_cascade.py
+    python scripts/evaluate_rerank_cascade.py --top-k 30 --top-n 3 --margins 0.05,0.1,0.15,0.2 --top-m 10,20
+    python scripts/evaluate_rerank_cascade.py --backend cross-encoder
+"""
+import os
+import sys
+
+import numpy as np
+
+# 添加项目根目录到 Python 路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.config import Config
+from src.rerank import create_backend
+from src.rerank_cascade import cascade_keep, cosine_similarities
+from src.retriever import Retriever
+from scripts.benchmark_embedding import SAMPLE_QUERIES
+
+
+def evaluate(backend_name: str = None, top_k: int = 30, top_n: int = 3, margins=(0.15,), top_ms=(20,)):
+    """
+    对比级联剪枝后的重排序结果与全量重排序结果
+
+    Args:
+        backend_name: 重排序后端（默认 Config.RERANK_BACKEND）
+        top_k: 混合检索每路检索的条数（决定候选池大小）
+        top_n: 重排序后保留的结果数
+        margins: 要评估的 margin 列表
+        top_ms: 要评估的 top_m 列表
+    """
+    retriever = Retriever()
+    backend = create_backend(backend_name)
+
+    # 每个查询只检索和全量重排序一次，所有参数组合共用同一批余弦相似度
+    samples = []
+    for query in SAMPLE_QUERIES:
+        results = retriever.hybrid_search(query, top_k=top_k, separate=True)
+        candidates = results['combined_results']
+        if results.get('query_embedding') is None or len(candidates) <= top_n:
+            continue
+        documents = [doc['document'] for doc in candidates]
+        vectors, found = retriever.document_embeddings([doc['id'] for doc in candidates])
+        scores = np.full(len(candidates), -np.inf)
+        for item in backend.rerank(query, documents, len(documents)):
+            scores[item['id']] = item['score']
+        samples.append((cosine_similarities(results['query_embedding'], vectors), found, scores))
+
+    if not samples:
+        print("❌ 没有可评估的查询（检索结果为空或缺少查询 embedding）")
+        return
+
+    pool = np.mean([len(scores) for _, _, scores in samples])
+    print("=" * 64)
+    print(f"重排序级联评估 (后端={backend.name}, 查询数={len(samples)}, 平均候选数={pool:.1f}, top_n={top_n})")
+    print("=" * 64)
+    print(f"{'margin':>8} {'top_m':>6} {'平均保留':>10} {'prune':>8} {f'recall@{top_n}':>10}")
+
+    for margin in margins:
+        for top_m in top_ms:
+            recalls, prunes, kept_counts = [], [], []
+            for similarities, found, scores in samples:
+                reference = set(np.argsort(-scores, kind='stable')[:top_n].tolist())
+                kept = cascade_keep(similarities, found, top_m, margin, min_keep=2 * top_n)
+                cascaded = kept[np.argsort(-scores[kept], kind='stable')][:top_n]
+                recalls.append(len(reference & set(cascaded.tolist())) / len(reference))
+                prunes.append(1 - len(kept) / len(scores))
+                kept_counts.append(len(kept))
+            print(f"{margin:8.2f} {top_m:6d} {np.mean(kept_counts):10.1f} {np.mean(prunes):8.1%} "
+                  f"{np.mean(recalls):10.3f}")
+
+
+def main():
+    """主函数"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description='重排序级联评估（剪枝后重排序 vs 全量重排序）')
+    parser.add_argument('--backend', default=None, help='重排序后端：dashscope / cross-encoder（默认按配置）')
+    parser.add_argument('--top-k', type=int, default=30, help='混合检索每路检索的条数')
+    parser.add_argument('--top-n', type=int, default=Config.RERANK_TOP_N, help='重排序后保留的结果数')
+    parser.add_argument('--margins', default='0.05,0.1,0.15,0.2,0.3', help='逗号分隔的 margin 列表')
+    parser.add_argument('--top-m', default=f'10,{Config.RERANK_CASCADE_TOP_M}', help='逗号分隔的 top_m 列表')
+
+    args = parser.parse_args()
+    evaluate(args.backend, top_k=args.top_k, top_n=args.top_n,
+             margins=[float(m) for m in args.margins.split(',')],
+             top_ms=[int(m) for m in args.top_m.split(',')])
+
+
+if __name__ == '__main__':
+    main()
@@ -4,8 +4,7 @@
 """
 import os
 import sys
-import json
-from typing import Dict, Any, List
+from typing import Dict, Any
 
 # 添加项目根目录到 Python 路径
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -14,6 +13,7 @@ import chromadb
 from chromadb.config import Settings
 from src.config import Config
 from src.embeddeding import embedding_service
+from src.import_pipeline import ImportCheckpoint, iter_records, stream_import
 
 
 class ChromaDBImporter:
@@ -61,102 +61,77 @@ class ChromaDBImporter:
             )
             print(f"✅ 创建新集合: {self.collection_name}")
     
-    def load_data(self, json_path: str) -> Dict[str, Any]:
-        """
-        加载 JSON 数据文件
-        
-        Args:
-            json_path: JSON 文件路径
-            
-        Returns:
-            数据字典
-        """
-        print(f"\n正在加载数据文件: {json_path}")
-        
-        with open(json_path, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-        
-        print(f"✅ 数据加载完成")
-        print(f"   - IDs: {len(data['ids'])} 个")
-        print(f"   - Documents: {len(data['documents'])} 个")
-        print(f"   - Metadatas: {len(data['metadatas'])} 个")
-        
-        return data
+    @property
+    def checkpoint_path(self) -> str:
+        """导入断点文件（每个集合一个）"""
+        return os.path.join(Config.IMPORT_CHECKPOINT_DIR, f'{self.collection_name}.json')
+    
     
-    def generate_embeddings(self, documents: List[str]) -> List[List[float]]:
+    def import_file(self, data_path: str, batch_size: int = None, resume: bool = True,
+                    skip_unchanged: bool = True) -> Dict[str, Any]:
         """
-        生成 embeddings
+        流式导入数据文件（逐条读取，编码与写入重叠，upsert 跳过未变化的记录）
         
         Args:
-            documents: 文档列表
+            data_path: 列式 JSON（ids / documents / metadatas）或 JSON Lines 文件
+            batch_size: 每批记录数
+            resume: 是否从上次中断的断点继续
+            skip_unchanged: 是否跳过集合中内容未变的记录
             
         Returns:
-            嵌入向量列表
+            导入统计
         """
-        print(f"\n正在生成 {len(documents)} 个文档的 embeddings...")
+        batch_size = batch_size or Config.IMPORT_BATCH_SIZE
+        checkpoint = ImportCheckpoint(self.checkpoint_path, data_path)
+        if not resume:
+            checkpoint.clear()
+        
+        print(f"\n正在流式导入: {data_path}")
         print(f"   模型: {Config.EMBEDDING_MODEL_NAME}")
         print(f"   设备: {Config.EMBEDDING_DEVICE}")
+        print(f"   批大小: {batch_size}")
+        resume_from = checkpoint.load()
+        if resume_from:
+            print(f"   从断点继续: 跳过前 {resume_from} 条已导入的记录")
         
-        embeddings = embedding_service.encode_documents(
-            documents=documents,
-            batch_size=32
-        )
+        def progress(stats):
+            print(f"   进度: 已处理 {stats['done']} 条（编码 {stats['embedded']}，"
+                  f"未变化 {stats['unchanged']}，已写入 {stats['written']}）")
         
-        print(f"✅ Embeddings 生成完成")
-        print(f"   - 维度: {Config.EMBEDDING_DIMENSION}")
-        
-        return embeddings
-    
-    def import_data(self, ids: List[str], documents: List[str], 
-                   metadatas: List[Dict[str, Any]], 
-                   embeddings: List[List[float]] = None,
-                   batch_size: int = 100):
-        """
-        导入数据到 ChromaDB
-        
-        Args:
-            ids: ID 列表
-            documents: 文档列表
-            metadatas: 元数据列表
-            embeddings: 嵌入向量列表（可选，不提供则由 ChromaDB 生成）
-            batch_size: 批处理大小
-        """
-        total = len(ids)
-        print(f"\n正在导入 {total} 条记录到 ChromaDB...")
-        
-        # 分批导入
-        for i in range(0, total, batch_size):
-            batch_end = min(i + batch_size, total)
-            batch_ids = ids[i:batch_end]
-            batch_docs = documents[i:batch_end]
-            batch_metas = metadatas[i:batch_end]
-            
-            if embeddings:
-                batch_embs = embeddings[i:batch_end]
-            else:
-                batch_embs = None
-            
-            # 添加到集合
-            self.collection.add(
-                ids=batch_ids,
-                documents=batch_docs,
-                metadatas=batch_metas,
-                embeddings=batch_embs
-            )
-            
-            print(f"   进度: {batch_end}/{total} ({batch_end/total*100:.1f}%)")
+        before = embedding_service.cache_stats()
+        stats = stream_import(
+            iter_records(data_path),
+            self.collection,
+            lambda documents: embedding_service.encode_documents(documents, batch_size=32),
+            batch_size=batch_size,
+            checkpoint=checkpoint,
+            skip_unchanged=skip_unchanged,
+            queue_batches=Config.IMPORT_QUEUE_BATCHES,
+            progress=progress
+        )
+        after = embedding_service.cache_stats()
         
         print(f"✅ 数据导入完成")
+        print(f"   - 读取: {stats['read']} 条，未变化跳过: {stats['unchanged']} 条，写入: {stats['written']} 条")
+        if before is not None and stats['embedded']:
+            # 内容未变的文档直接使用缓存的向量，不再经过模型
+            cached = (after['memory_hits'] + after['disk_hits']) - (before['memory_hits'] + before['disk_hits'])
+            print(f"   - Embedding 缓存命中: {cached}/{stats['embedded']} 个文档")
+        print(f"   - 耗时: {stats['seconds']:.1f}s（编码 {stats['embed_seconds']:.1f}s，"
+              f"写入 {stats['write_seconds']:.1f}s，两者重叠进行）")
         print(f"   - 集合记录总数: {self.collection.count()}")
+        return stats
     
     def clear_collection(self):
-        """清空集合"""
+        """清空集合（同时删除导入断点）"""
         try:
             self.client.delete_collection(self.collection_name)
             self.collection = self.client.create_collection(
                 name=self.collection_name,
                 metadata={"description": "MovieLens 电影数据库"}
             )
+            if os.path.exists(self.checkpoint_path):
+                os.remove(self.checkpoint_path)
             print(f"✅ 集合已清空")
         except Exception as e:
             print(f"❌ 清空集合失败: {e}")
@@ -183,16 +158,22 @@ class ChromaDBImporter:
 
 def main():
     """主函数"""
+    import argparse
+    
+    parser = argparse.ArgumentParser(description='MovieLens 数据导入 ChromaDB（流式，可断点续传）')
+    parser.add_argument('--data', default=Config.IMPORT_DATA_PATH, help='数据文件（列式 JSON 或 JSON Lines）')
+    parser.add_argument('--batch-size', type=int, default=Config.IMPORT_BATCH_SIZE, help='每批记录数')
+    parser.add_argument('--restart', action='store_true', help='忽略断点，从头导入')
+    parser.add_argument('--all', action='store_true', help='不跳过内容未变的记录，全部重新编码写入')
+    args = parser.parse_args()
+    
     print("=" * 60)
     print("MovieLens 数据导入 ChromaDB")
     print("=" * 60)
     
-    # 配置路径
-    json_path = r'D:\code\vue\movie_ai\datasets\chroma_movies_with_descriptions.json'
-    
     # 检查文件是否存在
-    if not os.path.exists(json_path):
-        print(f"\n❌ 错误: 文件不存在 - {json_path}")
+    if not os.path.exists(args.data):
+        print(f"\n❌ 错误: 文件不存在 - {args.data}")
         print("请先运行 llmdata.py 生成电影描述数据")
         return
     
@@ -202,25 +183,18 @@ def main():
     # 连接数据库
     importer.connect()
     
-    # 询问是否清空现有数据
+    # 询问是否清空现有数据（不清空时按 ID upsert，内容未变的记录跳过）
     print(f"\n当前集合中有 {importer.collection.count()} 条记录")
     clear_input = input("是否清空现有数据后导入? (y/n): ").strip().lower()
     if clear_input == 'y':
         importer.clear_collection()
     
-    # 加载数据
-    data = importer.load_data(json_path)
-    
-    # 生成 embeddings
-    embeddings = importer.generate_embeddings(data['documents'])
-    
-    # 导入数据
-    importer.import_data(
-        ids=data['ids'],
-        documents=data['documents'],
-        metadatas=data['metadatas'],
-        embeddings=embeddings,
-        batch_size=100
+    # 流式导入
+    importer.import_file(
+        args.data,
+        batch_size=args.batch_size,
+        resume=not args.restart,
+        skip_unchanged=not args.all
     )
     
     # 显示样本
@@ -0,0 +1,65 @@
+"""
+冷启动耗时分析：导入 app.py 的每个模块耗时 + 每个组件的初始化耗时
+
+用法:
+    python scripts/profile_startup.py
+    python scripts/profile_startup.py --top 40 --by self
+    python scripts/profile_startup.py --no-warmup      # 只分析导入
+"""
+import os
+import sys
+import time
+
+# 添加项目根目录到 Python 路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.warmup import ImportProfiler, warmup
+
+
+def main():
+    """主函数"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description='冷启动耗时分析')
+    parser.add_argument('--top', type=int, default=25, help='打印的模块数')
+    parser.add_argument('--by', choices=['cumulative', 'self'], default='cumulative', help='排序方式')
+    parser.add_argument('--no-warmup', action='store_true', help='不初始化组件，只分析导入')
+    args = parser.parse_args()
+
+    # 由本脚本同步预热，避免导入 app 时启动后台线程
+    os.environ['WARMUP_ON_START'] = 'False'
+
+    profiler = ImportProfiler()
+    start = time.perf_counter()
+    with profiler:
+        import app  # noqa: F401
+    import_seconds = time.perf_counter() - start
+
+    print("=" * 72)
+    print(f"导入 app.py: {import_seconds * 1000:.1f} ms（共 {len(profiler.records)} 个模块）")
+    print("=" * 72)
+    print(profiler.report(args.top, args.by))
+
+    if args.no_warmup:
+        return
+
+    warmup_profiler = ImportProfiler()
+    with warmup_profiler:
+        seconds = warmup.warm_all()
+    status = warmup.status()['components']
+    print("\n" + "=" * 72)
+    print(f"组件初始化（按预热顺序）: 共 {sum(s or 0 for s in seconds.values()) * 1000:.1f} ms")
+    print("=" * 72)
+    for name, component in status.items():
+        line = f"{name:<20} {component['state']:<8} {(component['seconds'] or 0) * 1000:10.1f} ms"
+        if component['error']:
+            line += f"   {component['error']}"
+        print(line)
+
+    print(f"\n预热期间导入的模块（前 {args.top} 个）:")
+    print(warmup_profiler.report(args.top, args.by))
+    print(f"\n进程可接收请求: {import_seconds:.2f}s；全部组件就绪: {time.perf_counter() - start:.2f}s")
+
+
+if __name__ == '__main__':
+    main()
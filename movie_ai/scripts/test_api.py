@@ -87,7 +87,10 @@ def test_recommend_stream():
                     event_data = json.loads(line_str[6:])
                     
                     if event_data['type'] == 'retrieval':
-                        print(f"📥 检索完成，推荐电影ID: {event_data['data']['recommended_movie_ids']}\n")
+                        print(f"📥 检索完成，候选数: {event_data['data']['candidate_count']}")
+                    
+                    elif event_data['type'] == 'rerank':
+                        print(f"📥 重排序完成，推荐电影ID: {event_data['data']['recommended_movie_ids']}\n")
                         print("🤖 LLM生成中: ", end='', flush=True)
                     
                     elif event_data['type'] == 'llm_chunk':
@@ -98,6 +101,7 @@ def test_recommend_stream():
                     elif event_data['type'] == 'complete':
                         print(f"\n\n✅ 生成完成!")
                         print(f"时间戳: {event_data['data']['timestamp']}")
+                        print(f"首个片段延迟: {event_data['data']['ttft_ms']} ms，总耗时: {event_data['data']['total_ms']} ms")
                     
                     elif event_data['type'] == 'error':
                         print(f"\n❌ 错误: {event_data['data']['message']}")
@@ -198,6 +202,36 @@ def test_hybrid_search():
         print(f"❌ 错误: {e}")
         return False
 
+def test_batch_search():
+    """测试批量检索接口"""
+    print_section("8. 测试批量检索")
+    
+    try:
+        data = {
+            'queries': ['科幻电影', '爱情喜剧', '动作片'],
+            'method': 'hybrid',
+            'top_k': 3
+        }
+        
+        print(f"请求: {json.dumps(data, ensure_ascii=False, indent=2)}\n")
+        
+        response = requests.post(f'{BASE_URL}/ai/search/batch', json=data)
+        print(f"状态码: {response.status_code}")
+        
+        result = response.json()
+        if result['success']:
+            print(f"\n✅ 检索成功! 共 {result['data']['count']} 个查询\n")
+            for entry in result['data']['results']:
+                titles = [item['metadata']['title'] for item in entry['results']]
+                print(f"{entry['query']}: {', '.join(titles)}")
+        else:
+            print(f"❌ 检索失败: {result['message']}")
+        
+        return result['success']
+    except Exception as e:
+        print(f"❌ 错误: {e}")
+        return False
+
 def test_rerank():
     """测试重排序接口"""
     print_section("7. 测试重排序")
@@ -251,7 +285,8 @@ def main():
         ("向量检索", test_vector_search),
         ("BM25检索", test_bm25_search),
         ("混合检索", test_hybrid_search),
-        ("重排序", test_rerank)
+        ("重排序", test_rerank),
+        ("批量检索", test_batch_search)
     ]
     
     results = []
@@ -0,0 +1,192 @@
+"""
+向量索引召回率 / 延迟报告
+
+以 ChromaDB 的查询结果为基准，比较不同 nlist / nprobe / refine 下 IVF + int8
+索引的 recall@k 和单次查询延迟，用于为更大的电影库选择参数。
+
+--scale N 会在真实 embedding 上加噪声合成 N 倍规模的电影库（例如 ml-100k 的
+1000 倍），此时 ChromaDB 中没有这些向量，基准改为精确暴力检索。
+
+用法:
+    python scripts/vector_index_report.py
+    python scripts/vector_index_report.py --nlist 64,128,256 --nprobe 1,4,16,64 --refine 0,4
+    python scripts/vector_index_report.py --scale 100 --queries 200
+"""
+import os
+import sys
+import time
+
+import numpy as np
+
+# 添加项目根目录到 Python 路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from scripts.db_connection import db_connection
+from src.vector_builder import collection_space, fetch_embeddings
+from src.vector_index import IVFIndex, default_nlist
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    return vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+
+
+def make_queries(vectors: np.ndarray, count: int, noise: float, rng) -> np.ndarray:
+    """从库中抽样向量并加噪声作为查询（避免查询与文档完全重合）"""
+    picked = vectors[rng.choice(len(vectors), count, replace=len(vectors) < count)]
+    return _normalize(picked + noise * rng.standard_normal(picked.shape).astype(np.float32)).astype(np.float32)
+
+
+def synthesize_catalog(vectors: np.ndarray, scale: int, noise: float, rng):
+    """在真实 embedding 上加噪声合成 scale 倍规模的向量库"""
+    copies = [vectors]
+    for _ in range(scale - 1):
+        jitter = noise * rng.standard_normal(vectors.shape).astype(np.float32)
+        copies.append(_normalize(vectors + jitter).astype(np.float32))
+    synthetic = np.concatenate(copies)
+    doc_ids = [str(i) for i in range(len(synthetic))]
+    return doc_ids, synthetic
+
+
+def exact_ground_truth(vectors: np.ndarray, doc_ids, queries: np.ndarray, k: int, chunk_size: int = 16384):
+    """精确暴力检索（分块计算内积）"""
+    best_scores = np.full((len(queries), k), -np.inf, dtype=np.float32)
+    best_rows = np.zeros((len(queries), k), dtype=np.int64)
+    for start in range(0, len(vectors), chunk_size):
+        scores = queries @ vectors[start:start + chunk_size].T
+        merged_scores = np.concatenate([best_scores, scores], axis=1)
+        merged_rows = np.concatenate([best_rows, np.arange(start, start + scores.shape[1])[None, :].repeat(len(queries), 0)], axis=1)
+        top = np.argpartition(-merged_scores, k - 1, axis=1)[:, :k]
+        best_scores = np.take_along_axis(merged_scores, top, axis=1)
+        best_rows = np.take_along_axis(merged_rows, top, axis=1)
+    return [{doc_ids[row] for row in rows} for rows in best_rows]
+
+
+def chroma_ground_truth(collection, queries: np.ndarray, k: int):
+    """ChromaDB 查询结果作为基准，并记录每次查询的延迟"""
+    truth, latencies = [], []
+    for query in queries:
+        start = time.perf_counter()
+        result = collection.query(query_embeddings=[query.tolist()], n_results=k, include=[])
+        latencies.append(time.perf_counter() - start)
+        truth.append(set(result['ids'][0]))
+    return truth, np.array(latencies)
+
+
+def _latency_summary(latencies: np.ndarray) -> str:
+    return f"p50 {np.percentile(latencies, 50) * 1000:7.3f} ms   p95 {np.percentile(latencies, 95) * 1000:7.3f} ms"
+
+
+def evaluate(index: IVFIndex, queries: np.ndarray, truth, k: int, nprobe: int, refine: int):
+    """计算 recall@k 和单次查询延迟"""
+    recalls, latencies = [], []
+    for query, expected in zip(queries, truth):
+        start = time.perf_counter()
+        hits = index.search(query, k, nprobe=nprobe, refine=refine)
+        latencies.append(time.perf_counter() - start)
+        recalls.append(len({doc_id for doc_id, _ in hits} & expected) / max(len(expected), 1))
+    return float(np.mean(recalls)), np.array(latencies)
+
+
+def report(nlists=None, nprobes=(1, 4, 8, 16, 32, 64), refines=(0, 4), k: int = 10,
+           num_queries: int = 200, scale: int = 1, noise: float = 0.05, seed: int = 0):
+    """
+    生成召回率 / 延迟报告
+
+    Args:
+        nlists: 待比较的簇数列表，默认以 default_nlist 为中心取 0.5x / 1x / 2x
+        nprobes: 待比较的扫描簇数列表
+        refines: 待比较的精确重排倍数列表（0 表示只用 int8 近似分数）
+        k: recall@k
+        num_queries: 查询数
+        scale: 合成库规模倍数（1 表示使用真实集合并以 ChromaDB 为基准）
+        noise: 查询 / 合成向量的噪声强度
+        seed: 随机种子
+    """
+    rng = np.random.default_rng(seed)
+
+    print("=" * 80)
+    print("向量索引召回率 / 延迟报告 (IVF + int8)")
+    print("=" * 80)
+
+    db_connection.connect()
+    collection = db_connection.get_collection()
+    doc_ids, vectors = fetch_embeddings(collection)
+    if not doc_ids:
+        print("❌ 集合为空")
+        return
+    space = collection_space(collection)
+    queries = make_queries(vectors, num_queries, noise, rng)
+
+    if scale > 1:
+        doc_ids, vectors = synthesize_catalog(vectors, scale, noise, rng)
+        print(f"\n合成向量库: {len(doc_ids)} 条（真实集合 x{scale}），基准: 精确暴力检索")
+        start = time.perf_counter()
+        truth = exact_ground_truth(vectors, doc_ids, queries, k)
+        print(f"   暴力检索平均耗时: {(time.perf_counter() - start) / num_queries * 1000:.3f} ms/查询")
+    else:
+        print(f"\n向量库: {len(doc_ids)} 条，维度 {vectors.shape[1]}，距离 {space}，基准: ChromaDB")
+        truth, chroma_latencies = chroma_ground_truth(collection, queries, k)
+        exact = exact_ground_truth(vectors, doc_ids, queries, k)
+        chroma_recall = np.mean([len(t & e) / k for t, e in zip(truth, exact)])
+        print(f"   ChromaDB: {_latency_summary(chroma_latencies)}   recall@{k}(相对精确检索) {chroma_recall:.4f}")
+
+    if not nlists:
+        base = default_nlist(len(doc_ids))
+        nlists = sorted({max(1, base // 2), base, base * 2})
+
+    float_bytes = vectors.nbytes
+    print(f"\n{'nlist':>7} {'nprobe':>7} {'refine':>7} {'recall@' + str(k):>10}   {'延迟':<36} {'构建(s)':>8}")
+    print("-" * 88)
+    for nlist in nlists:
+        start = time.perf_counter()
+        index = IVFIndex.build(vectors, doc_ids, nlist=nlist, space=space)
+        build_seconds = time.perf_counter() - start
+        for nprobe in nprobes:
+            if nprobe > index.nlist:
+                continue
+            for refine in refines:
+                recall, latencies = evaluate(index, queries, truth, k, nprobe, refine)
+                print(f"{index.nlist:>7} {nprobe:>7} {refine:>7} {recall:>10.4f}   "
+                      f"{_latency_summary(latencies):<36} {build_seconds:>8.2f}")
+        print("-" * 88)
+
+    code_bytes = len(doc_ids) * vectors.shape[1]
+    print(f"\n索引大小: int8 码 {code_bytes / 1e6:.1f} MB，float16 重排向量 {code_bytes * 2 / 1e6:.1f} MB"
+          f"（内存映射，只读取候选行；float32 原始向量 {float_bytes / 1e6:.1f} MB）")
+    print("提示: 选择 recall 达标的最小 nprobe / refine，写入 VECTOR_IVF_NPROBE / VECTOR_IVF_REFINE；"
+          "库规模变化后按 4*sqrt(N) 调整 nlist")
+
+
+def main():
+    """主函数"""
+    import argparse
+
+    def int_list(value):
+        return [int(v) for v in value.split(',') if v]
+
+    parser = argparse.ArgumentParser(description='向量索引召回率 / 延迟报告')
+    parser.add_argument('--nlist', type=int_list, default=None, help='簇数列表，如 64,128,256（默认自动）')
+    parser.add_argument('--nprobe', type=int_list, default=[1, 4, 8, 16, 32, 64], help='扫描簇数列表')
+    parser.add_argument('--refine', type=int_list, default=[0, 4], help='精确重排倍数列表')
+    parser.add_argument('--k', type=int, default=10, help='recall@k')
+    parser.add_argument('--queries', type=int, default=200, help='查询数')
+    parser.add_argument('--scale', type=int, default=1, help='合成库规模倍数（>1 时以暴力检索为基准）')
+    parser.add_argument('--noise', type=float, default=0.05, help='查询 / 合成向量的噪声强度')
+    parser.add_argument('--seed', type=int, default=0, help='随机种子')
+
+    args = parser.parse_args()
+
+    report(
+        nlists=args.nlist,
+        nprobes=args.nprobe,
+        refines=args.refine,
+        k=args.k,
+        num_queries=args.queries,
+        scale=args.scale,
+        noise=args.noise,
+        seed=args.seed
+    )
+
+
+if __name__ == '__main__':
+    main()
@@ -3,44 +3,45 @@
 """
 import os
 import sys
-import pickle
+
+import numpy as np
 
 # 添加项目根目录到 Python 路径
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from src.config import Config
+from src.bm25_builder import preprocess_text
+from src.bm25_store import IndexFormatError, open_index
 
 
-def view_bm25_index(cache_path: str = None):
+def view_bm25_index(index_dir: str = None):
     """查看 BM25 索引内容
 
     Args:
-        cache_path: 索引缓存文件路径
+        index_dir: 索引目录
     """
-    if cache_path is None:
-        cache_path = Config.BM25_CACHE_FILE
-
-    if not os.path.exists(cache_path):
-        print(f"❌ 索引文件不存在: {cache_path}")
-        return
+    if index_dir is None:
+        index_dir = Config.BM25_INDEX_DIR
 
     print("=" * 60)
     print("BM25 索引内容查看")
     print("=" * 60)
 
     # 加载索引
-    print(f"\n📂 加载索引: {cache_path}")
-    with open(cache_path, 'rb') as f:
-        cache_data = pickle.load(f)
-
-    bm25 = cache_data['bm25']
-    doc_ids = cache_data['doc_ids']
-    doc_texts = cache_data['doc_texts']
-    tokenized_corpus = cache_data.get('tokenized_corpus')
+    print(f"\n📂 加载索引: {index_dir}")
+    try:
+        bm25, doc_ids, doc_texts, header = open_index(index_dir, verify=True)
+    except IndexFormatError as e:
+        print(f"❌ 索引不可用: {e}")
+        return
 
     print(f"✅ 加载成功！")
+    print(f"   - 版本: {header['build_id']} (格式 v{header['format_version']})")
+    print(f"   - 分词器签名: {header['tokenizer_signature']}")
     print(f"   - 文档数量: {len(doc_ids)}")
-    print(f"   - 词汇表大小: {len(bm25.idf)}")
+    print(f"   - 词汇表大小: {len(bm25.vocab)}")
+    print(f"   - 倒排项数量: {len(bm25.doc_indices)}")
+    print(f"   - k1={bm25.k1}, b={bm25.b}, avgdl={bm25.avgdl:.2f}")
 
     # 显示前5个文档
     print("\n" + "=" * 60)
@@ -55,8 +56,9 @@ def view_bm25_index(cache_path: str = None):
     print("\n" + "=" * 60)
     print("词汇表统计:")
     print("=" * 60)
-    idf_scores = bm25.idf
-    sorted_vocab = sorted(idf_scores.items(), key=lambda x: x[1], reverse=True)
+    terms = bm25.terms
+    idf_scores = zip(terms, bm25.idf.tolist())
+    sorted_vocab = sorted(idf_scores, key=lambda x: x[1], reverse=True)
 
     print(f"\nIDF 最高的 10 个词:")
     for word, idf in sorted_vocab[:10]:
@@ -66,41 +68,34 @@ def view_bm25_index(cache_path: str = None):
     for word, idf in sorted_vocab[-10:]:
         print(f"   {word}: {idf:.3f}")
 
-    # 词频统计
+    # 词频统计（由倒排表汇总）
     print("\n" + "=" * 60)
     print("词频统计:")
     print("=" * 60)
-    if tokenized_corpus:
-        from collections import Counter
-        word_freq = Counter()
-        for tokens in tokenized_corpus:
-            word_freq.update(tokens)
-
-        sorted_freq = sorted(word_freq.items(), key=lambda x: x[1], reverse=True)
+    non_empty = np.diff(bm25.indptr) > 0
+    term_totals = np.zeros(len(terms), dtype=np.int64)
+    if non_empty.any():
+        term_totals[non_empty] = np.add.reduceat(np.asarray(bm25.term_freqs), bm25.indptr[:-1][non_empty])
+    sorted_freq = sorted(zip(terms, term_totals.tolist()), key=lambda x: x[1], reverse=True)
 
-        print(f"\n词频最高的 20 个词:")
-        total_words = sum(word_freq.values())
-        for word, freq in sorted_freq[:20]:
-            percentage = (freq / total_words) * 100
-            print(f"   {word}: {freq} 次 ({percentage:.2f}%)")
+    print(f"\n词频最高的 20 个词:")
+    total_words = int(term_totals.sum())
+    for word, freq in sorted_freq[:20]:
+        percentage = (freq / total_words) * 100
+        print(f"   {word}: {freq} 次 ({percentage:.2f}%)")
 
-        print(f"\n词汇总数: {total_words}")
-        print(f"不同词数: {len(word_freq)}")
-    else:
-        print("   (旧缓存，无分词数据)")
+    print(f"\n词汇总数: {total_words}")
+    print(f"不同词数: {len(terms)}")
 
     # 分词后的文档示例
     print("\n" + "=" * 60)
     print("分词示例 (前3个文档):")
     print("=" * 60)
-    if tokenized_corpus:
-        for i in range(min(3, len(tokenized_corpus))):
-            print(f"\n文档 {i + 1}:")
-            tokens = tokenized_corpus[i]
-            print(f"   分词结果: {tokens}")
-            print(f"   词数: {len(tokens)}")
-    else:
-        print("   (旧缓存，无分词数据)")
+    for i in range(min(3, len(doc_texts))):
+        print(f"\n文档 {i + 1}:")
+        tokens = preprocess_text(doc_texts[i])
+        print(f"   分词结果: {tokens}")
+        print(f"   词数: {len(tokens)}")
 
     print("\n" + "=" * 60)
 
@@ -1,14 +1,22 @@
 """
 BM25 索引构建器
+
+构建分两步：分词（src.bm25_tokens，多进程 + 分词缓存）和统计（由词 ID 直接构建倒排表）。
+只修改 k1 / b / 检索字段时，从分词缓存重新统计即可，不需要重新分词。
 """
 import os
 import re
-import pickle
-from rank_bm25 import BM25Okapi
+import time
+import zlib
 import jieba
-from typing import List, Dict, Any
+from typing import Any, Dict, Sequence
 
 from src.config import Config
+from src.bm25_index import BM25Index
+from src.bm25_store import IndexFormatError, open_index, write_index
+from src.index_store import index_exists
+from src.bm25_tokens import FIELD_KEYS, field_text, open_tokens, tokenize_corpus, write_tokens
+from src.warmup import warmup
 
 
 # 停用词列表（中文）
@@ -34,6 +42,14 @@ ENGLISH_STOPWORDS = {
 # 合并停用词
 STOPWORDS = CHINESE_STOPWORDS.union(ENGLISH_STOPWORDS)
 
+# 分词器版本（修改 preprocess_text 的规则时递增，已有索引会被视为过期）
+TOKENIZER_VERSION = 1
+TOKENIZER_SIGNATURE = "v{}-jieba{}-{:08x}".format(
+    TOKENIZER_VERSION,
+    jieba.__version__,
+    zlib.crc32("\n".join(sorted(STOPWORDS)).encode('utf-8'))
+)
+
 
 def preprocess_text(text):
     """预处理文本
@@ -55,116 +71,190 @@ def preprocess_text(text):
     return tokens
 
 
+def build_search_text(metadata: Dict[str, Any], fields: Sequence[str] = None) -> str:
+    """构建 BM25 检索文本（默认只使用标题 + 类型，确保精确查找）
+
+    Args:
+        metadata: 电影元数据（导入脚本使用 genres，后端使用 genre）
+        fields: 检索字段（默认 Config.BM25_FIELDS）
+
+    Returns:
+        检索文本
+    """
+    parts = [field_text(metadata, field) for field in (fields or Config.BM25_FIELDS)]
+    return " ".join(part for part in parts if part)
+
+
 class BM25Builder:
     """BM25 索引构建器"""
     
-    def __init__(self, cache_path: str = None):
+    def __init__(self, index_dir: str = None, token_cache_dir: str = None):
         """
         初始化构建器
         
         Args:
-            cache_path: 缓存文件路径
+            index_dir: 索引目录
+            token_cache_dir: 分词缓存目录
         """
-        if cache_path is None:
-            cache_path = Config.BM25_CACHE_FILE
-        self.cache_path = cache_path
+        if index_dir is None:
+            index_dir = Config.BM25_INDEX_DIR
+        if token_cache_dir is None:
+            token_cache_dir = Config.BM25_TOKEN_CACHE_DIR
+        self.index_dir = index_dir
+        self.token_cache_dir = token_cache_dir
+        self.last_report = None  # 最近一次构建的耗时与吞吐量
     
-    def build_from_collection(self, collection):
+    def _open_token_cache(self):
+        """打开分词缓存，不存在或已过期时返回 None"""
+        try:
+            corpus, _ = open_tokens(self.token_cache_dir, tokenizer_signature=TOKENIZER_SIGNATURE, verify=False)
+            return corpus
+        except IndexFormatError:
+            return None
+
+    def build_from_collection(self, collection, workers: int = 1):
         """
         从 ChromaDB 集合构建 BM25 索引
 
         Args:
             collection: ChromaDB 集合对象
+            workers: 分词进程数（默认 1：在当前进程内分词，服务内构建不启动进程池；
+                离线构建脚本传入 Config.BM25_TOKENIZE_WORKERS，0 表示 CPU 核数）
 
         Returns:
-            (BM25Okapi 模型, doc_ids, tokenized_corpus)
+            (BM25Index 索引, doc_ids, doc_texts)
         """
         print("\n" + "=" * 50)
         print("开始构建 BM25 索引")
         print("=" * 50)
+        started = time.perf_counter()
         
         # 从 ChromaDB 导出数据
         print("\n1. 从 ChromaDB 导出数据...")
         all_data = collection.get(
-            include=["documents", "metadatas"]
+            include=["metadatas"]
         )
         
         doc_ids = all_data["ids"]
         print(f"   ✓ 导入 {len(doc_ids)} 条记录")
         
-        # 构建搜索文本（只使用标题 + 类型，确保精确查找）
-        print("\n2. 构建搜索文本（标题 + 类型）...")
-        doc_texts = []
-        for doc, meta in zip(all_data["documents"], all_data["metadatas"]):
-            parts = []
-            if meta.get('title'):
-                parts.append(meta['title'])
-            if meta.get('genres'):
-                parts.append(meta['genres'])
-            doc_texts.append(" ".join(parts))
-        
-        print(f"   ✓ 文本构建完成（共 {len(doc_texts)} 个文档）")
-        
-        # 中文分词（带预处理）
-        print(f"\n3. 中文分词（带预处理）...")
-        tokenized_corpus = [
-            preprocess_text(text) 
-            for text in doc_texts
-        ]
-        print(f"   ✓ 分词完成")
-        
-        # 构建 BM25 模型
-        print(f"\n4. 构建 BM25 模型...")
-        bm25 = BM25Okapi(tokenized_corpus)
-        print(f"   ✓ 模型构建完成（使用精简索引：标题+类型）")
-        
-        # 保存到缓存
-        print(f"\n5. 保存缓存...")
-        os.makedirs(os.path.dirname(self.cache_path), exist_ok=True)
-
-        cache_data = {
-            'bm25': bm25,
-            'doc_ids': doc_ids,
-            'doc_texts': doc_texts,
-            'tokenized_corpus': tokenized_corpus
+        # 中文分词（带预处理）：缓存全部可选字段，之后切换检索字段无需重新分词
+        print(f"\n2. 中文分词（字段 {', '.join(FIELD_KEYS)}）...")
+        field_texts = {
+            field: [field_text(meta or {}, field) for meta in all_data["metadatas"]]
+            for field in FIELD_KEYS
         }
+        corpus, stats = tokenize_corpus(
+            doc_ids, field_texts, preprocess_text,
+            previous=self._open_token_cache(),
+            workers=workers,
+            chunk_size=Config.BM25_TOKENIZE_CHUNK_SIZE
+        )
+        write_tokens(self.token_cache_dir, corpus, TOKENIZER_SIGNATURE)
+        print(f"   ✓ 分词完成：{stats['tokenized']} 段文本重新分词，{stats['reused']} 段复用缓存"
+              f"（{stats['workers']} 进程，{stats['seconds']:.2f}s，{stats['docs_per_sec']:.0f} docs/s）")
+
+        bm25, doc_ids, doc_texts = self._build_index(corpus, step=3)
+        self._report(len(doc_ids), stats, time.perf_counter() - started)
+        return bm25, doc_ids, doc_texts
+
+    def rebuild_from_tokens(self, k1: float = None, b: float = None, fields: Sequence[str] = None):
+        """
+        从分词缓存重新统计索引（修改 k1 / b / 检索字段时使用，不读取 ChromaDB、不分词）
+
+        Args:
+            k1: BM25 参数 k1（默认 Config.BM25_K1）
+            b: BM25 参数 b（默认 Config.BM25_B）
+            fields: 检索字段（默认 Config.BM25_FIELDS）
+
+        Returns:
+            (BM25Index 索引, doc_ids, doc_texts)
+
+        Raises:
+            IndexFormatError: 分词缓存不存在或已过期
+        """
+        print("\n从分词缓存重新构建 BM25 索引...")
+        started = time.perf_counter()
+        corpus, _ = open_tokens(self.token_cache_dir, tokenizer_signature=TOKENIZER_SIGNATURE,
+                                verify=Config.BM25_VERIFY_CHECKSUM)
+        bm25, doc_ids, doc_texts = self._build_index(corpus, k1=k1, b=b, fields=fields)
+        self._report(len(doc_ids), None, time.perf_counter() - started)
+        return bm25, doc_ids, doc_texts
+
+    def _build_index(self, corpus, k1: float = None, b: float = None,
+                     fields: Sequence[str] = None, step: int = 1):
+        """由分词结果构建倒排表并写入索引目录"""
+        k1 = Config.BM25_K1 if k1 is None else k1
+        b = Config.BM25_B if b is None else b
+        fields = list(fields or Config.BM25_FIELDS)
+
+        # 构建 BM25 倒排索引
+        print(f"\n{step}. 构建 BM25 倒排索引（字段 {' + '.join(fields)}，k1={k1}，b={b}）...")
+        token_docs, token_ids = corpus.postings(fields)
+        bm25 = BM25Index.from_token_ids(corpus.terms, token_docs, token_ids, corpus.num_docs, k1=k1, b=b)
+        doc_ids = list(corpus.doc_ids)
+        doc_texts = corpus.search_texts(fields)
+        print(f"   ✓ 索引构建完成（词表 {len(bm25.vocab)}，倒排项 {len(bm25.doc_indices)}）")
         
-        with open(self.cache_path, 'wb') as f:
-            pickle.dump(cache_data, f, protocol=pickle.HIGHEST_PROTOCOL)
-        
-        print(f"   ✓ 缓存已保存到: {self.cache_path}")
+        # 写入索引目录
+        print(f"\n{step + 1}. 写入索引...")
+        os.makedirs(self.index_dir, exist_ok=True)
+        version_dir = write_index(self.index_dir, bm25, doc_ids, doc_texts, TOKENIZER_SIGNATURE, fields=fields)
+        print(f"   ✓ 索引已写入: {version_dir}")
+        return bm25, doc_ids, doc_texts
 
+    def _report(self, num_docs: int, tokenize_stats: Dict = None, seconds: float = 0.0):
+        """打印并记录构建耗时与吞吐量"""
+        self.last_report = {
+            'docs': num_docs,
+            'seconds': seconds,
+            'docs_per_sec': num_docs / seconds if seconds > 0 else 0.0,
+            'tokenize': tokenize_stats,
+        }
         print("\n" + "=" * 50)
-        print("✅ BM25 索引构建完成 (精简模式：标题+类型)")
-        print("="*50)
+        print(f"✅ BM25 索引构建完成：{num_docs} 条文档，{seconds:.2f}s，"
+              f"{self.last_report['docs_per_sec']:.0f} docs/s")
+        print("=" * 50)
 
-        return bm25, doc_ids, tokenized_corpus
+    def is_current(self, header: Dict) -> bool:
+        """索引的 k1 / b / 检索字段是否与当前配置一致"""
+        return (header.get('k1') == Config.BM25_K1 and header.get('b') == Config.BM25_B
+                and header.get('fields', ['title', 'genres']) == list(Config.BM25_FIELDS))
     
-    def load_from_cache(self) -> BM25Okapi:
+    def load_from_cache(self, verify: bool = None):
         """
-        从缓存加载 BM25 索引
+        从索引目录加载 BM25 索引（内存映射，不复制数据）
+        
+        Args:
+            verify: 是否校验全文件 CRC32（默认 Config.BM25_VERIFY_CHECKSUM；否则只校验大小和头部）
         
         Returns:
-            BM25Okapi 模型
+            (bm25, doc_ids, doc_texts, header)，header 中的 path 为版本目录、catalog_offset 为已包含的变更日志位置
+
+        Raises:
+            IndexFormatError: 索引不存在、未写完、损坏或已过期
         """
-        if not os.path.exists(self.cache_path):
-            raise FileNotFoundError(f"缓存文件不存在: {self.cache_path}")
+        print(f"\n正在加载 BM25 索引...")
+        print(f"   路径: {self.index_dir}")
         
-        print(f"\n正在从缓存加载 BM25 索引...")
-        print(f"   路径: {self.cache_path}")
-        
-        with open(self.cache_path, 'rb') as f:
-            cache_data = pickle.load(f)
+        verify = Config.BM25_VERIFY_CHECKSUM if verify is None else verify
+        bm25, doc_ids, doc_texts, header = open_index(
+            self.index_dir, tokenizer_signature=TOKENIZER_SIGNATURE, verify=verify
+        )
         
-        print(f"✅ 缓存加载成功 ({len(cache_data['doc_ids'])} 条文档)")
-
-        # 兼容旧缓存：如果没有 tokenized_corpus，则使用预处理生成
-        if 'tokenized_corpus' in cache_data:
-            return cache_data['bm25'], cache_data['doc_ids'], cache_data['doc_texts']
-        else:
-            from src.bm25_builder import preprocess_text
-            tokenized_corpus = [preprocess_text(text) for text in cache_data['doc_texts']]
-            return cache_data['bm25'], cache_data['doc_ids'], cache_data['doc_texts']
+        if not self.is_current(header):
+            print("   索引参数与配置不一致（k1 / b / 检索字段），从分词缓存重新统计...")
+            try:
+                self.rebuild_from_tokens()
+            except IndexFormatError as e:
+                raise IndexFormatError(f"索引参数已变化且分词缓存不可用: {e}")
+            # 以内存映射方式重新打开刚写入的版本
+            bm25, doc_ids, doc_texts, header = open_index(
+                self.index_dir, tokenizer_signature=TOKENIZER_SIGNATURE, verify=False
+            )
+
+        print(f"✅ 索引加载成功 ({len(doc_ids)} 条文档，版本 {header['build_id']})")
+        return bm25, doc_ids, doc_texts, header
     
     def build_or_load(self, collection, force_rebuild: bool = False):
         """
@@ -177,11 +267,19 @@ class BM25Builder:
         Returns:
             (bm25, doc_ids, doc_texts)
         """
-        if force_rebuild or not os.path.exists(self.cache_path):
+        if force_rebuild or not index_exists(self.index_dir):
+            return self.build_from_collection(collection)
+
+        try:
+            bm25, doc_ids, doc_texts, _ = self.load_from_cache()
+            return bm25, doc_ids, doc_texts
+        except IndexFormatError as e:
+            print(f"⚠️  现有索引不可用（{e}），重新构建...")
             return self.build_from_collection(collection)
-        else:
-            return self.load_from_cache()
 
 
 # 创建全局实例
 bm25_builder = BM25Builder()
+
+# jieba 词典在第一次分词时加载（约 1 秒），由预热提前完成
+warmup.register('jieba', lambda: jieba.initialize() or jieba)
@@ -0,0 +1,443 @@
+"""
+BM25 倒排索引 - 基于 CSR 结构的稀疏 BM25 检索引擎
+
+倒排表以 CSR 形式存储为 numpy 数组：
+    indptr[t] : indptr[t + 1]  为词 t 的倒排表区间
+    doc_indices                 倒排表中的文档下标（每个词内部升序）
+    term_freqs                  对应的词频
+    weights                     预计算的词频饱和权重 tf*(k1+1)/(tf+norm)
+
+查询时只累加包含查询词的文档，代价与倒排表长度相关，与语料规模无关。
+批量查询时把多个查询组成 (查询数 x 词表) 的稀疏矩阵，与 (词表 x 文档) 的
+权重矩阵做一次稀疏矩阵乘法得到全部分数。
+打分公式与 rank_bm25.BM25Okapi 保持一致。
+
+词 ID 按词的字典序分配，便于磁盘格式中以有序词表二分查找（见 bm25_store）。
+"""
+from collections import Counter
+from typing import Any, Dict, Iterable, List, Mapping, Optional, Sequence, Tuple
+
+import numpy as np
+
+
+class BM25Index:
+    """稀疏 BM25 索引（CSR 倒排表）"""
+
+    # 预计算的统计量（磁盘格式中与倒排表一起保存）
+    STATISTICS = ('idf', 'doc_norms', 'weights', 'max_impacts')
+
+    def __init__(self, vocab: Mapping[str, int], indptr: np.ndarray, doc_indices: np.ndarray,
+                 term_freqs: np.ndarray, doc_lens: np.ndarray,
+                 k1: float = 1.5, b: float = 0.75, epsilon: float = 0.25,
+                 statistics: Optional[Dict[str, Any]] = None):
+        """
+        初始化索引（通常通过 from_corpus 构建，或由 bm25_store 从磁盘打开）
+
+        Args:
+            vocab: 词 -> 词 ID（按字典序编号）
+            indptr: 倒排表偏移，长度为 词表大小 + 1
+            doc_indices: 倒排表文档下标
+            term_freqs: 倒排表词频
+            doc_lens: 每个文档的长度（词数）
+            k1: BM25 参数 k1
+            b: BM25 参数 b
+            epsilon: 负 IDF 的下限系数（与 BM25Okapi 一致）
+            statistics: 预计算的统计量（idf、doc_norms、weights、max_impacts、avgdl），
+                        提供时直接使用，不再重新计算
+        """
+        self.vocab = vocab
+        self.indptr = np.asarray(indptr, dtype=np.int64)
+        self.doc_indices = np.asarray(doc_indices, dtype=np.int32)
+        self.term_freqs = np.asarray(term_freqs, dtype=np.float32)
+        self.doc_lens = np.asarray(doc_lens, dtype=np.float32)
+        self.k1 = k1
+        self.b = b
+        self.epsilon = epsilon
+
+        self.num_docs = len(self.doc_lens)
+
+        if statistics is None:
+            self.avgdl = float(self.doc_lens.mean()) if self.num_docs else 0.0
+            self._compute_statistics()
+        else:
+            self.avgdl = float(statistics['avgdl'])
+            for name in self.STATISTICS:
+                setattr(self, name, statistics[name])
+
+        self._weight_matrix = None  # 批量查询使用的 (词表 x 文档) 稀疏权重矩阵，首次使用时构建
+
+    @classmethod
+    def from_corpus(cls, tokenized_corpus: Iterable[List[str]], k1: float = 1.5,
+                    b: float = 0.75, epsilon: float = 0.25) -> 'BM25Index':
+        """
+        从分词后的语料构建索引
+
+        Args:
+            tokenized_corpus: 分词后的文档列表
+            k1: BM25 参数 k1
+            b: BM25 参数 b
+            epsilon: 负 IDF 的下限系数
+
+        Returns:
+            BM25Index 实例
+        """
+        vocab: Dict[str, int] = {}
+        term_ids: List[int] = []
+        doc_ids: List[int] = []
+        freqs: List[int] = []
+        doc_lens: List[int] = []
+
+        for doc_idx, tokens in enumerate(tokenized_corpus):
+            doc_lens.append(len(tokens))
+            for term, tf in Counter(tokens).items():
+                term_ids.append(vocab.setdefault(term, len(vocab)))
+                doc_ids.append(doc_idx)
+                freqs.append(tf)
+
+        # 按字典序重新编号词 ID
+        sorted_terms = sorted(vocab)
+        remap = np.empty(len(vocab), dtype=np.int64)
+        remap[[vocab[term] for term in sorted_terms]] = np.arange(len(vocab))
+        vocab = {term: term_id for term_id, term in enumerate(sorted_terms)}
+        term_ids = remap[np.asarray(term_ids, dtype=np.int64)]
+
+        # 稳定排序：同一个词内部保持文档升序
+        order = np.argsort(term_ids, kind='stable')
+        counts = np.bincount(term_ids, minlength=len(vocab))
+        indptr = np.zeros(len(vocab) + 1, dtype=np.int64)
+        np.cumsum(counts, out=indptr[1:])
+
+        return cls(
+            vocab=vocab,
+            indptr=indptr,
+            doc_indices=np.asarray(doc_ids, dtype=np.int32)[order],
+            term_freqs=np.asarray(freqs, dtype=np.float32)[order],
+            doc_lens=np.asarray(doc_lens, dtype=np.float32),
+            k1=k1, b=b, epsilon=epsilon
+        )
+
+    @classmethod
+    def from_token_ids(cls, terms: Sequence[str], token_docs: np.ndarray, token_ids: np.ndarray,
+                       num_docs: int, k1: float = 1.5, b: float = 0.75,
+                       epsilon: float = 0.25) -> 'BM25Index':
+        """
+        从驻留词表上的词 ID 构建索引（不需要词字符串列表，结果与 from_corpus 一致）
+
+        Args:
+            terms: 驻留词表（词 ID -> 词，顺序任意，可以包含未出现的词）
+            token_docs: 每个词出现所属的文档下标
+            token_ids: 每个词出现的词 ID
+            num_docs: 文档数
+            k1: BM25 参数 k1
+            b: BM25 参数 b
+            epsilon: 负 IDF 的下限系数
+
+        Returns:
+            BM25Index 实例
+        """
+        token_docs = np.asarray(token_docs, dtype=np.int64)
+        token_ids = np.asarray(token_ids, dtype=np.int64)
+        doc_lens = np.bincount(token_docs, minlength=num_docs).astype(np.float32)
+
+        # (文档, 词) 去重计数，结果按文档、词 ID 有序
+        pairs, freqs = np.unique(token_docs * len(terms) + token_ids, return_counts=True)
+        pair_docs = pairs // max(len(terms), 1)
+        pair_terms = pairs % max(len(terms), 1)
+
+        # 只保留出现过的词，并按字典序重新编号
+        used = np.unique(pair_terms)
+        sorted_terms = sorted(range(len(used)), key=lambda i: terms[used[i]])
+        remap = np.empty(len(terms), dtype=np.int64)
+        remap[used[sorted_terms]] = np.arange(len(used))
+        vocab = {terms[used[i]]: term_id for term_id, i in enumerate(sorted_terms)}
+        pair_terms = remap[pair_terms]
+
+        # 稳定排序：同一个词内部保持文档升序
+        order = np.argsort(pair_terms, kind='stable')
+        counts = np.bincount(pair_terms, minlength=len(vocab))
+        indptr = np.zeros(len(vocab) + 1, dtype=np.int64)
+        np.cumsum(counts, out=indptr[1:])
+
+        return cls(
+            vocab=vocab,
+            indptr=indptr,
+            doc_indices=pair_docs[order].astype(np.int32),
+            term_freqs=freqs[order].astype(np.float32),
+            doc_lens=doc_lens,
+            k1=k1, b=b, epsilon=epsilon
+        )
+
+    def _compute_statistics(self):
+        """预计算 IDF、文档长度归一化项、倒排权重和每个词的分数上界"""
+        doc_freqs = np.diff(self.indptr).astype(np.float64)
+
+        # IDF（与 BM25Okapi 一致：负 IDF 替换为 epsilon * 平均 IDF）
+        idf = np.log(self.num_docs - doc_freqs + 0.5) - np.log(doc_freqs + 0.5)
+        if len(idf):
+            average_idf = idf.mean()
+            idf[idf < 0] = self.epsilon * average_idf
+        self.idf = idf.astype(np.float32)
+
+        # 文档长度归一化：k1 * (1 - b + b * dl / avgdl)
+        avgdl = self.avgdl if self.avgdl > 0 else 1.0
+        self.doc_norms = (self.k1 * (1 - self.b + self.b * self.doc_lens / avgdl)).astype(np.float32)
+
+        # 倒排权重（不含 IDF）
+        tf = self.term_freqs
+        self.weights = (tf * (self.k1 + 1) / (tf + self.doc_norms[self.doc_indices])).astype(np.float32)
+
+        # 每个词的分数上界（MaxScore 剪枝使用）
+        self.max_impacts = np.zeros(len(self.vocab), dtype=np.float32)
+        non_empty = doc_freqs > 0
+        if non_empty.any():
+            starts = self.indptr[:-1][non_empty]
+            self.max_impacts[non_empty] = np.maximum.reduceat(self.weights, starts) * self.idf[non_empty]
+
+    @property
+    def terms(self) -> List[str]:
+        """按词 ID 排列的词表"""
+        return list(self.vocab)
+
+    def postings(self, term_id: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        获取某个词的倒排表
+
+        Returns:
+            (文档下标数组, 权重数组)
+        """
+        start, end = self.indptr[term_id], self.indptr[term_id + 1]
+        return self.doc_indices[start:end], self.weights[start:end]
+
+    def _query_terms(self, query_tokens: Sequence[str],
+                     idf: Optional[Mapping[str, float]] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        查询词 -> (词 ID, 词系数)，忽略词表外的词
+
+        词系数 = IDF * 查询词频；提供 idf 时使用其中的 IDF（例如多段索引的全局 IDF），
+        idf 中没有的词（所有文档都已删除）系数为 0
+        """
+        counts = Counter(t for t in query_tokens if t in self.vocab)
+        term_ids = np.fromiter((self.vocab[t] for t in counts), dtype=np.int64, count=len(counts))
+        qtf = np.fromiter(counts.values(), dtype=np.float32, count=len(counts))
+        if idf is None:
+            term_idf = self.idf[term_ids]
+        else:
+            term_idf = np.fromiter((idf.get(t, 0.0) for t in counts), dtype=np.float32, count=len(counts))
+        return term_ids, (term_idf * qtf).astype(np.float32)
+
+    def get_scores(self, query_tokens: Sequence[str]) -> np.ndarray:
+        """
+        计算所有文档的 BM25 分数（稠密结果，兼容 BM25Okapi.get_scores）
+
+        Args:
+            query_tokens: 分词后的查询
+
+        Returns:
+            长度为文档数的分数数组
+        """
+        scores = np.zeros(self.num_docs, dtype=np.float32)
+        term_ids, coefs = self._query_terms(query_tokens)
+        for term_id, coef in zip(term_ids, coefs):
+            docs, weights = self.postings(term_id)
+            scores[docs] += weights * coef
+        return scores
+
+    def score_rows(self, query_tokens: Sequence[str], rows: Sequence[int],
+                   idf: Optional[Mapping[str, float]] = None) -> np.ndarray:
+        """
+        只计算指定文档的 BM25 分数（在每个查询词的倒排表中二分查找，倒排表按文档下标有序）
+
+        Args:
+            query_tokens: 分词后的查询
+            rows: 文档下标
+            idf: 词 -> IDF 的覆盖值（可选）
+
+        Returns:
+            与 rows 对齐的分数数组
+        """
+        rows = np.asarray(rows, dtype=np.int64)
+        scores = np.zeros(len(rows), dtype=np.float32)
+        term_ids, coefs = self._query_terms(query_tokens, idf)
+        for term_id, coef in zip(term_ids, coefs):
+            docs, weights = self.postings(term_id)
+            if len(docs) == 0:
+                continue
+            positions = np.minimum(np.searchsorted(docs, rows), len(docs) - 1)
+            hit = docs[positions] == rows
+            scores[hit] += weights[positions[hit]] * coef
+        return scores
+
+    def top_k(self, query_tokens: Sequence[str], k: int, pruning: Optional[str] = None,
+              idf: Optional[Mapping[str, float]] = None,
+              allowed: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        检索分数最高的 k 个文档（只返回分数大于 0 的文档）
+
+        Args:
+            query_tokens: 分词后的查询
+            k: 返回数量
+            pruning: 剪枝策略，None 为穷举累加，'maxscore' 为 MaxScore 剪枝
+            idf: 词 -> IDF 的覆盖值（可选，默认使用索引自身的 IDF）
+            allowed: 长度为文档数的布尔掩码（可选），False 的文档在倒排表中直接跳过
+
+        Returns:
+            (文档下标数组, 分数数组)，按分数降序
+        """
+        term_ids, coefs = self._query_terms(query_tokens, idf)
+        if k <= 0 or len(term_ids) == 0:
+            return np.empty(0, dtype=np.int32), np.empty(0, dtype=np.float32)
+
+        # MaxScore 依赖非负贡献，存在非正 IDF 时退化为穷举
+        if pruning == 'maxscore' and len(term_ids) > 1 and (coefs > 0).all() and (self.idf[term_ids] > 0).all():
+            docs, scores = self._accumulate_maxscore(term_ids, coefs, k, allowed)
+        elif pruning in (None, 'maxscore'):
+            docs, scores = self._accumulate(term_ids, coefs, allowed=allowed)
+        else:
+            raise ValueError(f"不支持的剪枝策略: {pruning}")
+
+        return self._select_top(docs, scores, k)
+
+    def top_k_many(self, queries: Sequence[Sequence[str]], k: int,
+                   idfs: Optional[Sequence[Optional[Mapping[str, float]]]] = None,
+                   allowed: Optional[np.ndarray] = None) -> List[Tuple[np.ndarray, np.ndarray]]:
+        """
+        批量检索：所有查询的分数由一次稀疏矩阵乘法得到
+
+        Args:
+            queries: 分词后的查询列表
+            k: 每个查询的返回数量
+            idfs: 每个查询的 IDF 覆盖值（可选，与 top_k 的 idf 参数含义相同）
+            allowed: 长度为文档数的布尔掩码（可选，对所有查询生效）
+
+        Returns:
+            每个查询的 (文档下标数组, 分数数组)，按分数降序
+        """
+        rows, cols, values = [], [], []
+        for row, tokens in enumerate(queries):
+            term_ids, coefs = self._query_terms(tokens, idfs[row] if idfs else None)
+            rows.append(np.full(len(term_ids), row, dtype=np.int64))
+            cols.append(term_ids)
+            values.append(coefs)
+
+        if not queries or k <= 0:
+            return [(np.empty(0, dtype=np.int32), np.empty(0, dtype=np.float32)) for _ in queries]
+
+        from scipy import sparse  # 只有批量查询使用，推迟导入以缩短启动时间
+
+        query_matrix = sparse.csr_matrix(
+            (np.concatenate(values), (np.concatenate(rows), np.concatenate(cols))),
+            shape=(len(queries), len(self.indptr) - 1), dtype=np.float32
+        )
+        scores = (query_matrix @ self.weight_matrix).tocsr()
+        scores.sort_indices()
+
+        results = []
+        for row in range(len(queries)):
+            start, end = scores.indptr[row], scores.indptr[row + 1]
+            docs = scores.indices[start:end].astype(np.int32)
+            row_scores = scores.data[start:end].astype(np.float32)
+            if allowed is not None:
+                keep = allowed[docs]
+                docs, row_scores = docs[keep], row_scores[keep]
+            results.append(self._select_top(docs, row_scores, k))
+        return results
+
+    @property
+    def weight_matrix(self) -> 'sparse.csr_matrix':
+        """(词表 x 文档) 的稀疏权重矩阵（倒排表即其 CSR 表示）"""
+        if self._weight_matrix is None:
+            from scipy import sparse
+
+            self._weight_matrix = sparse.csr_matrix(
+                (np.asarray(self.weights, dtype=np.float32), np.asarray(self.doc_indices), np.asarray(self.indptr)),
+                shape=(len(self.indptr) - 1, self.num_docs)
+            )
+        return self._weight_matrix
+
+    def _filtered_postings(self, term_id: int,
+                           allowed: Optional[np.ndarray]) -> Tuple[np.ndarray, np.ndarray]:
+        """获取倒排表并跳过掩码外的文档"""
+        term_docs, weights = self.postings(term_id)
+        if allowed is not None:
+            keep = allowed[term_docs]
+            term_docs, weights = term_docs[keep], weights[keep]
+        return term_docs, weights
+
+    def _accumulate(self, term_ids: np.ndarray, coefs: np.ndarray,
+                    docs: np.ndarray = None, scores: np.ndarray = None,
+                    allowed: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        累加若干个词的倒排表（可在已有累加器上继续累加）
+
+        Returns:
+            (文档下标数组（升序、去重）, 分数数组)
+        """
+        doc_parts = [] if docs is None else [docs]
+        score_parts = [] if scores is None else [scores]
+        for term_id, coef in zip(term_ids, coefs):
+            term_docs, weights = self._filtered_postings(term_id, allowed)
+            doc_parts.append(term_docs)
+            score_parts.append(weights * coef)
+
+        if not doc_parts:
+            return np.empty(0, dtype=np.int32), np.empty(0, dtype=np.float32)
+
+        all_docs = np.concatenate(doc_parts)
+        all_scores = np.concatenate(score_parts)
+        unique_docs, inverse = np.unique(all_docs, return_inverse=True)
+        return unique_docs, np.bincount(inverse, weights=all_scores).astype(np.float32)
+
+    def _accumulate_maxscore(self, term_ids: np.ndarray, coefs: np.ndarray, k: int,
+                             allowed: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        MaxScore 剪枝（按词累加）
+
+        按分数上界从大到小处理查询词。当剩余词的上界之和不超过当前第 k 名分数时，
+        未出现的文档已不可能进入 top-k，后续词只更新已有候选，并丢弃无望进入 top-k 的候选。
+        """
+        # max_impacts 含索引自身的 IDF，换算为当前词系数下的上界
+        bounds = self.max_impacts[term_ids] / self.idf[term_ids] * coefs
+        order = np.argsort(-bounds, kind='stable')
+        term_ids, coefs, bounds = term_ids[order], coefs[order], bounds[order]
+        remaining = np.concatenate([np.cumsum(bounds[::-1])[::-1][1:], [0.0]])
+
+        docs = np.empty(0, dtype=np.int32)
+        scores = np.empty(0, dtype=np.float32)
+        for i, (term_id, coef) in enumerate(zip(term_ids, coefs)):
+            threshold = self._kth_score(scores, k)
+            if remaining[i] + bounds[i] > threshold:
+                # 新文档仍可能进入 top-k：合并整条倒排表
+                docs, scores = self._accumulate(term_ids[i:i + 1], coefs[i:i + 1], docs, scores, allowed)
+                continue
+
+            # 只更新已有候选（已有候选都在掩码内，无需再过滤）
+            term_docs, weights = self.postings(term_id)
+            positions = np.searchsorted(term_docs, docs)
+            positions[positions >= len(term_docs)] = 0
+            matched = term_docs[positions] == docs if len(term_docs) else np.zeros(len(docs), dtype=bool)
+            scores = scores.copy()
+            scores[matched] += weights[positions[matched]] * coef
+
+            # 丢弃上界不足以进入 top-k 的候选
+            keep = scores + remaining[i] >= self._kth_score(scores, k)
+            docs, scores = docs[keep], scores[keep]
+
+        return docs, scores
+
+    @staticmethod
+    def _kth_score(scores: np.ndarray, k: int) -> float:
+        """当前第 k 大的分数（候选不足 k 个时为 0）"""
+        if len(scores) < k:
+            return 0.0
+        return float(np.partition(scores, len(scores) - k)[len(scores) - k])
+
+    @staticmethod
+    def _select_top(docs: np.ndarray, scores: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """使用 argpartition 选出 top-k 并按分数降序排列"""
+        positive = scores > 0
+        docs, scores = docs[positive], scores[positive]
+        if len(scores) > k:
+            part = np.argpartition(-scores, k - 1)[:k]
+            docs, scores = docs[part], scores[part]
+        order = np.argsort(-scores, kind='stable')
+        return docs[order], scores[order]
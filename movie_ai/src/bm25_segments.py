@@ -0,0 +1,486 @@
+"""
+BM25 分段索引 - 不可变基础段 + 可变增量段
+
+基础段是磁盘上内存映射的 BM25Index；增量段在内存中吸收新增/更新的文档，
+删除和被更新覆盖的基础段文档以墓碑标记。查询时两段共用全局统计量
+（文档数、文档频率）计算 IDF，结果合并后取 top-k。
+
+增量段达到阈值后在后台线程中与基础段合并为新的基础段并写入新版本目录，
+合并期间到达的变更会记录下来，在切换后重放到新的基础段上。多个进程共用索引目录时，
+同一时间只有一个进程合并（<index_dir>/MERGE 文件锁），且只在 CURRENT 仍是合并所基于的版本时切换；
+其他进程通过 switch_base 切换到新版本并重放电影库变更日志中之后的变更。
+
+注意：基础段文档的长度归一化项在构建时已固化，增量变更后使用的平均文档长度
+与全局值存在轻微偏差，合并后恢复精确。
+"""
+import math
+import os
+import threading
+from collections import Counter, OrderedDict
+from typing import Callable, Dict, List, NamedTuple, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+from src.bm25_index import BM25Index
+from src.bm25_store import IndexFormatError, open_index, read_header, write_index
+from src.index_store import current_version, file_lock
+
+
+MERGE_LOCK_FILE = 'MERGE'
+
+
+class DeltaDocument(NamedTuple):
+    """增量段中的文档"""
+    term_freqs: Counter
+    length: int
+    text: str
+
+
+class SegmentedBM25Index:
+    """支持增量更新的 BM25 索引（基础段 + 增量段）"""
+
+    def __init__(self, base: BM25Index, doc_ids: Sequence[str], doc_texts: Sequence[str],
+                 tokenizer: Callable[[str], List[str]], index_dir: str = None,
+                 tokenizer_signature: str = '', merge_threshold: int = 1000,
+                 base_version: str = '', position: int = 0, on_merged: Callable[[], None] = None):
+        """
+        初始化分段索引
+
+        Args:
+            base: 基础段索引
+            doc_ids: 基础段文档 ID
+            doc_texts: 基础段文档文本
+            tokenizer: 分词函数（与构建基础段时一致）
+            index_dir: 索引目录（提供时合并结果会写入新版本目录）
+            tokenizer_signature: 分词器签名（写入新版本时使用）
+            merge_threshold: 增量段文档数 + 墓碑数达到该值时触发后台合并
+            base_version: 基础段的版本目录名（合并时据此判断其他进程是否已切换版本）
+            position: 当前内容已包含的电影库变更日志位置（应用变更后由调用方通过 advance 更新）
+            on_merged: 合并结果写入新版本后的回调（例如压缩变更日志）
+        """
+        self.tokenizer = tokenizer
+        self.index_dir = index_dir
+        self.tokenizer_signature = tokenizer_signature
+        self.merge_threshold = merge_threshold
+        self.on_merged = on_merged
+
+        self._lock = threading.RLock()
+        self._merging = False
+        self._merge_log: Optional[List[Tuple[str, str, Optional[str]]]] = None
+        self.version = 0
+        self.position = position
+
+        self._reset_base(base, doc_ids, doc_texts, base_version)
+
+    def _reset_base(self, base: BM25Index, doc_ids: Sequence[str], doc_texts: Sequence[str],
+                    base_version: str = ''):
+        """切换基础段并清空增量段"""
+        self.base = base
+        self.base_version = base_version
+        self.base_doc_ids = doc_ids
+        self.base_doc_texts = doc_texts
+        self._base_rows: Optional[Dict[str, int]] = None
+        self._base_total_len = float(np.asarray(base.doc_lens).sum())
+        self._idf_floor = base.epsilon * float(np.asarray(base.idf).mean()) if len(base.vocab) else 0.0
+
+        self._delta: 'OrderedDict[str, DeltaDocument]' = OrderedDict()
+        self._delta_df: Counter = Counter()
+        self._delta_total_len = 0
+        self._tombstones = np.zeros(base.num_docs, dtype=bool)
+        self._num_tombstones = 0
+        self._tombstone_total_len = 0.0
+
+    # ------------------------------------------------------------------
+    # 状态
+    # ------------------------------------------------------------------
+
+    @property
+    def num_docs(self) -> int:
+        """当前可见的文档总数"""
+        return self.base.num_docs - self._num_tombstones + len(self._delta)
+
+    @property
+    def pending(self) -> int:
+        """尚未合并的变更数（增量文档数 + 墓碑数）"""
+        return len(self._delta) + self._num_tombstones
+
+    def status(self) -> Dict:
+        """索引状态（用于监控接口）"""
+        with self._lock:
+            return {
+                'version': self.version,
+                'num_docs': self.num_docs,
+                'base_docs': self.base.num_docs,
+                'delta_docs': len(self._delta),
+                'tombstones': self._num_tombstones,
+                'merging': self._merging,
+                'merge_threshold': self.merge_threshold,
+                'base_version': self.base_version,
+                'catalog_position': self.position
+            }
+
+    def _base_row(self, doc_id: str) -> int:
+        """文档 ID -> 基础段行号（不存在返回 -1）"""
+        if self._base_rows is None:
+            self._base_rows = {did: row for row, did in enumerate(self.base_doc_ids)}
+        return self._base_rows.get(doc_id, -1)
+
+    # ------------------------------------------------------------------
+    # 变更
+    # ------------------------------------------------------------------
+
+    def upsert(self, doc_id: str, text: str):
+        """
+        新增或更新文档
+
+        Args:
+            doc_id: 文档 ID
+            text: 检索文本
+        """
+        with self._lock:
+            self._apply('upsert', doc_id, text)
+
+    def delete(self, doc_id: str):
+        """
+        删除文档
+
+        Args:
+            doc_id: 文档 ID
+        """
+        with self._lock:
+            self._apply('delete', doc_id, None)
+
+    def advance(self, position: int):
+        """记录当前内容已包含的电影库变更日志位置（合并时写入新版本的 header）"""
+        with self._lock:
+            self.position = max(self.position, position)
+
+    def switch_base(self, base: BM25Index, doc_ids: Sequence[str], doc_texts: Sequence[str],
+                    base_version: str, changes: Sequence[Tuple[str, str, Optional[str]]], position: int):
+        """
+        切换到其他进程合并写入的新版本，并重放新版本之后的变更
+
+        Args:
+            base: 新版本的基础段
+            doc_ids: 新版本的文档 ID
+            doc_texts: 新版本的文档文本
+            base_version: 新版本目录名
+            changes: 新版本 header 记录的日志位置之后、本进程已应用的变更 [(op, 文档 ID, 文本)]
+            position: 重放后内容已包含的日志位置
+        """
+        with self._lock:
+            self._reset_base(base, doc_ids, doc_texts, base_version)
+            for op, doc_id, text in changes:
+                self._apply(op, doc_id, text, replay=True)
+            self.position = position
+            self.version += 1
+
+    def _apply(self, op: str, doc_id: str, text: Optional[str], replay: bool = False):
+        """应用一次变更（调用方持有锁）"""
+        self._tombstone(doc_id)
+        self._remove_delta(doc_id)
+
+        if op == 'upsert':
+            tokens = self.tokenizer(text or '')
+            doc = DeltaDocument(Counter(tokens), len(tokens), text or '')
+            self._delta[doc_id] = doc
+            self._delta_df.update(doc.term_freqs.keys())
+            self._delta_total_len += doc.length
+
+        self.version += 1
+        if self._merge_log is not None and not replay:
+            self._merge_log.append((op, doc_id, text))
+        elif not replay:
+            self._maybe_schedule_merge()
+
+    def _tombstone(self, doc_id: str):
+        """标记基础段中的文档为已删除"""
+        row = self._base_row(doc_id)
+        if row >= 0 and not self._tombstones[row]:
+            self._tombstones[row] = True
+            self._num_tombstones += 1
+            self._tombstone_total_len += float(self.base.doc_lens[row])
+
+    def _remove_delta(self, doc_id: str):
+        """从增量段中移除文档"""
+        doc = self._delta.pop(doc_id, None)
+        if doc is not None:
+            self._delta_df.subtract(doc.term_freqs.keys())
+            self._delta_df += Counter()  # 清除计数为 0 的词
+            self._delta_total_len -= doc.length
+
+    # ------------------------------------------------------------------
+    # 检索
+    # ------------------------------------------------------------------
+
+    def _global_idf(self, terms) -> Dict[str, float]:
+        """基于两段合计的文档频率计算 IDF（与 BM25Okapi 公式一致）"""
+        num_docs = self.num_docs
+        idf = {}
+        for term in terms:
+            df = self._delta_df.get(term, 0)
+            if term in self.base.vocab:
+                term_docs, _ = self.base.postings(self.base.vocab[term])
+                df += len(term_docs) - int(self._tombstones[term_docs].sum())
+            if df == 0:
+                continue
+            value = math.log(num_docs - df + 0.5) - math.log(df + 0.5)
+            idf[term] = value if value >= 0 else self._idf_floor
+        return idf
+
+    def search(self, query_tokens: Sequence[str], k: int, pruning: Optional[str] = None,
+               allowed: Optional[Union[np.ndarray, Callable[[Sequence[str]], np.ndarray]]] = None,
+               accept: Optional[Callable[[str], bool]] = None) -> List[Tuple[str, float]]:
+        """
+        检索分数最高的 k 个文档
+
+        Args:
+            query_tokens: 分词后的查询
+            k: 返回数量
+            pruning: 基础段的剪枝策略
+            allowed: 基础段文档掩码，或由基础段文档 ID 生成掩码的函数（在锁内调用，
+                     合并切换基础段时保持一致；可选）
+            accept: 增量段文档的过滤函数（文档 ID -> 是否允许，可选）
+
+        Returns:
+            [(文档 ID, 分数), ...]，按分数降序
+        """
+        with self._lock:
+            if callable(allowed):
+                allowed = allowed(self.base_doc_ids)
+            if not self._delta and not self._num_tombstones:
+                docs, scores = self.base.top_k(query_tokens, k, pruning=pruning, allowed=allowed)
+                return [(self.base_doc_ids[i], float(s)) for i, s in zip(docs, scores)]
+
+            idf = self._global_idf(set(query_tokens))
+            base_idf = {term: value for term, value in idf.items() if term in self.base.vocab}
+            mask = ~self._tombstones if allowed is None else (allowed & ~self._tombstones)
+            docs, scores = self.base.top_k(query_tokens, k, pruning=pruning, idf=base_idf, allowed=mask)
+            hits = [(self.base_doc_ids[i], float(s)) for i, s in zip(docs, scores)]
+            hits.extend(self._score_delta(query_tokens, idf, accept))
+
+        hits.sort(key=lambda hit: hit[1], reverse=True)
+        return hits[:k]
+
+    def search_many(self, queries: Sequence[Sequence[str]], k: int,
+                    allowed: Optional[Union[np.ndarray, Callable[[Sequence[str]], np.ndarray]]] = None,
+                    accept: Optional[Callable[[str], bool]] = None) -> List[List[Tuple[str, float]]]:
+        """
+        批量检索（基础段一次稀疏矩阵乘法，增量段逐查询打分）
+
+        Args:
+            queries: 分词后的查询列表
+            k: 每个查询的返回数量
+            allowed: 基础段文档掩码或生成掩码的函数（同 search，可选）
+            accept: 增量段文档的过滤函数（可选）
+
+        Returns:
+            每个查询的 [(文档 ID, 分数), ...]，按分数降序
+        """
+        with self._lock:
+            if callable(allowed):
+                allowed = allowed(self.base_doc_ids)
+            if not self._delta and not self._num_tombstones:
+                results = self.base.top_k_many(queries, k, allowed=allowed)
+                return [[(self.base_doc_ids[i], float(s)) for i, s in zip(docs, scores)]
+                        for docs, scores in results]
+
+            idfs = [self._global_idf(set(tokens)) for tokens in queries]
+            base_idfs = [{term: value for term, value in idf.items() if term in self.base.vocab}
+                         for idf in idfs]
+            mask = ~self._tombstones if allowed is None else (allowed & ~self._tombstones)
+            results = self.base.top_k_many(queries, k, idfs=base_idfs, allowed=mask)
+
+            batch = []
+            for tokens, idf, (docs, scores) in zip(queries, idfs, results):
+                hits = [(self.base_doc_ids[i], float(s)) for i, s in zip(docs, scores)]
+                hits.extend(self._score_delta(tokens, idf, accept))
+                hits.sort(key=lambda hit: hit[1], reverse=True)
+                batch.append(hits[:k])
+        return batch
+
+    def score(self, query_tokens: Sequence[str], doc_ids: Sequence[str]) -> Dict[str, float]:
+        """
+        只计算指定文档的分数（与 search 的打分一致，融合时随机读取使用）
+
+        Returns:
+            {文档 ID: 分数}（只包含分数大于 0 的文档；不存在或已删除的文档不返回）
+        """
+        with self._lock:
+            if not self._delta and not self._num_tombstones:
+                idf, base_idf = None, None
+            else:
+                idf = self._global_idf(set(query_tokens))
+                base_idf = {term: value for term, value in idf.items() if term in self.base.vocab}
+
+            scores = {}
+            delta = [doc_id for doc_id in doc_ids if doc_id in self._delta]
+            if delta:
+                scores.update(self._score_delta(query_tokens, idf, doc_ids=delta))
+            base = [(doc_id, row) for doc_id, row in ((d, self._base_row(d)) for d in doc_ids
+                                                        if d not in self._delta)
+                    if row >= 0 and not self._tombstones[row]]
+            if base:
+                rows = self.base.score_rows(query_tokens, [row for _, row in base], idf=base_idf)
+                scores.update((doc_id, float(value)) for (doc_id, _), value in zip(base, rows) if value > 0)
+        return scores
+
+    def _score_delta(self, query_tokens: Sequence[str], idf: Dict[str, float],
+                     accept: Optional[Callable[[str], bool]] = None,
+                     doc_ids: Optional[Sequence[str]] = None) -> List[Tuple[str, float]]:
+        """对增量段逐文档打分（增量段规模受合并阈值约束；提供 doc_ids 时只对这些文档打分）"""
+        query = Counter(t for t in query_tokens if self._delta_df.get(t))
+        if not query:
+            return []
+
+        k1, b = self.base.k1, self.base.b
+        num_docs = self.num_docs
+        total_len = self._base_total_len - self._tombstone_total_len + self._delta_total_len
+        avgdl = total_len / num_docs if num_docs and total_len > 0 else 1.0
+
+        docs = self._delta.items() if doc_ids is None else ((doc_id, self._delta[doc_id]) for doc_id in doc_ids)
+        hits = []
+        for doc_id, doc in docs:
+            if accept is not None and not accept(doc_id):
+                continue
+            norm = k1 * (1 - b + b * doc.length / avgdl)
+            score = 0.0
+            for term, qtf in query.items():
+                tf = doc.term_freqs.get(term)
+                if tf:
+                    score += idf.get(term, 0.0) * qtf * tf * (k1 + 1) / (tf + norm)
+            if score > 0:
+                hits.append((doc_id, score))
+        return hits
+
+    # ------------------------------------------------------------------
+    # 合并
+    # ------------------------------------------------------------------
+
+    def _maybe_schedule_merge(self):
+        """增量段超过阈值时启动后台合并（调用方持有锁）"""
+        if self.pending >= self.merge_threshold and not self._merging:
+            threading.Thread(target=self.merge, name='bm25-merge', daemon=True).start()
+
+    def merge(self) -> bool:
+        """
+        将增量段与墓碑合并进新的基础段
+
+        Returns:
+            是否执行了合并
+        """
+        with self._lock:
+            if self._merging or not self.pending:
+                return False
+            self._merging = True
+            self._merge_log = []
+            base, base_ids, base_texts = self.base, self.base_doc_ids, self.base_doc_texts
+            base_version, position = self.base_version, self.position
+            tombstones = self._tombstones.copy()
+            delta = OrderedDict(self._delta)
+
+        try:
+            if self.index_dir:
+                with file_lock(os.path.join(self.index_dir, MERGE_LOCK_FILE), blocking=False) as acquired:
+                    if not acquired or current_version(self.index_dir) != base_version:
+                        # 其他进程正在合并或已写入新版本：同步变更日志时切换过去
+                        with self._lock:
+                            self._merge_log = None
+                        return False
+                    index, doc_ids, doc_texts = self._build_merged(base, base_ids, base_texts, tombstones, delta)
+                    version_dir = write_index(self.index_dir, index, doc_ids, doc_texts, self.tokenizer_signature,
+                                              fields=self._index_fields(), catalog_offset=position,
+                                              expected_current=base_version)
+                index, doc_ids, doc_texts, header = open_index(
+                    self.index_dir, tokenizer_signature=self.tokenizer_signature, verify=False
+                )
+                base_version = os.path.basename(header['path'])
+                if base_version != os.path.basename(version_dir):
+                    # 写入后 CURRENT 又被其他进程切换：同步变更日志时再切换
+                    with self._lock:
+                        self._merge_log = None
+                    return False
+            else:
+                index, doc_ids, doc_texts = self._build_merged(base, base_ids, base_texts, tombstones, delta)
+
+            with self._lock:
+                log, self._merge_log = self._merge_log, None
+                self._reset_base(index, doc_ids, doc_texts, base_version)
+                for op, doc_id, text in log:
+                    self._apply(op, doc_id, text, replay=True)
+                self.version += 1
+            print(f"✅ BM25 增量段已合并（{len(doc_ids)} 条文档，合并期间新增变更 {len(log)} 条）")
+            if self.index_dir and self.on_merged is not None:
+                self.on_merged()
+            return True
+        except Exception as e:
+            print(f"❌ BM25 增量段合并失败: {e}")
+            with self._lock:
+                self._merge_log = None
+            return False
+        finally:
+            with self._lock:
+                self._merging = False
+
+    def _index_fields(self) -> Optional[List[str]]:
+        """当前索引记录的检索字段（合并后沿用）"""
+        try:
+            return read_header(self.index_dir).get('fields')
+        except IndexFormatError:
+            return None
+
+    @staticmethod
+    def _build_merged(base: BM25Index, base_ids: Sequence[str], base_texts: Sequence[str],
+                      tombstones: np.ndarray,
+                      delta: 'OrderedDict[str, DeltaDocument]') -> Tuple[BM25Index, List[str], List[str]]:
+        """由基础段倒排表（去掉墓碑）和增量段文档构建新的 BM25Index"""
+        live = ~tombstones
+        live_rows = np.flatnonzero(live)
+        new_rows = np.cumsum(live) - 1
+
+        # 展开基础段倒排表为 (词, 文档, 词频) 三元组
+        base_terms = list(base.vocab)
+        posting_terms = np.repeat(np.arange(len(base_terms)), np.diff(base.indptr))
+        posting_docs = np.asarray(base.doc_indices)
+        keep = live[posting_docs]
+
+        merged_terms = sorted(set(base_terms).union(*(doc.term_freqs.keys() for doc in delta.values())))
+        position = {term: term_id for term_id, term in enumerate(merged_terms)}
+        base_remap = np.fromiter((position[t] for t in base_terms), dtype=np.int64, count=len(base_terms))
+
+        term_parts = [base_remap[posting_terms[keep]]]
+        doc_parts = [new_rows[posting_docs[keep]]]
+        freq_parts = [np.asarray(base.term_freqs)[keep]]
+
+        first_delta_row = len(live_rows)
+        delta_terms, delta_docs, delta_freqs = [], [], []
+        for offset, doc in enumerate(delta.values()):
+            for term, tf in doc.term_freqs.items():
+                delta_terms.append(position[term])
+                delta_docs.append(first_delta_row + offset)
+                delta_freqs.append(tf)
+        term_parts.append(np.asarray(delta_terms, dtype=np.int64))
+        doc_parts.append(np.asarray(delta_docs, dtype=np.int64))
+        freq_parts.append(np.asarray(delta_freqs, dtype=np.float32))
+
+        term_ids = np.concatenate(term_parts)
+        # 稳定排序：同一个词内部基础段文档在前且升序，增量段文档行号更大
+        order = np.argsort(term_ids, kind='stable')
+        indptr = np.zeros(len(merged_terms) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(term_ids, minlength=len(merged_terms)), out=indptr[1:])
+
+        doc_lens = np.concatenate([
+            np.asarray(base.doc_lens)[live],
+            np.asarray([doc.length for doc in delta.values()], dtype=np.float32)
+        ])
+        index = BM25Index(
+            vocab=position,
+            indptr=indptr,
+            doc_indices=np.concatenate(doc_parts)[order],
+            term_freqs=np.concatenate(freq_parts)[order],
+            doc_lens=doc_lens,
+            k1=base.k1, b=base.b, epsilon=base.epsilon
+        )
+        doc_ids = [base_ids[row] for row in live_rows] + list(delta.keys())
+        doc_texts = [base_texts[row] for row in live_rows] + [doc.text for doc in delta.values()]
+        return index, doc_ids, doc_texts
@@ -0,0 +1,166 @@
+"""
+BM25 索引磁盘格式 - 版本化目录 + 内存映射数组（目录格式见 src.index_store）
+
+版本目录内容：
+    header.json         格式版本、统计量、每个文件的大小和 CRC32（最后写入）
+    indptr.npy ...      倒排表与预计算统计量
+    vocab.*.npy         有序词表（偏移 + UTF-8 字节）
+    doc_ids.*.npy       文档 ID 表
+    doc_texts.*.npy     文档文本表
+
+所有数组都以 np.load(mmap_mode='r') 打开，多个进程共享同一份页缓存。
+读取方除通用校验外，还会拒绝分词器签名不一致的索引。
+"""
+import bisect
+from collections.abc import Mapping
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+from src.bm25_index import BM25Index
+from src.index_store import (
+    IndexFormatError, StringTable, load_arrays,
+    read_header as _read_header, string_table_arrays, write_version
+)
+
+
+FORMAT_NAME = 'movie-ai-bm25'
+FORMAT_VERSION = 1
+
+# 倒排表数组及其数据类型
+POSTING_ARRAYS = {
+    'indptr': np.int64,
+    'doc_indices': np.int32,
+    'term_freqs': np.float32,
+    'doc_lens': np.float32,
+    'idf': np.float32,
+    'doc_norms': np.float32,
+    'weights': np.float32,
+    'max_impacts': np.float32,
+}
+
+# 字符串表（偏移 + UTF-8 字节）
+STRING_TABLES = ('vocab', 'doc_ids', 'doc_texts')
+
+
+class TermDictionary(Mapping):
+    """有序词表上的只读映射（词 -> 词 ID），通过二分查找定位"""
+
+    def __init__(self, table: StringTable):
+        self.table = table
+
+    def _find(self, term: str) -> int:
+        pos = bisect.bisect_left(self.table, term)
+        if pos < len(self.table) and self.table[pos] == term:
+            return pos
+        return -1
+
+    def __getitem__(self, term: str) -> int:
+        pos = self._find(term)
+        if pos < 0:
+            raise KeyError(term)
+        return pos
+
+    def __contains__(self, term) -> bool:
+        return isinstance(term, str) and self._find(term) >= 0
+
+    def __iter__(self):
+        return iter(self.table)
+
+    def __len__(self) -> int:
+        return len(self.table)
+
+
+def write_index(index_dir: str, index: BM25Index, doc_ids: List[str], doc_texts: List[str],
+                tokenizer_signature: str = '', fields: List[str] = None,
+                catalog_offset: int = 0, expected_current: str = None) -> str:
+    """
+    将索引写入新的版本目录，并原子切换 CURRENT
+
+    Args:
+        index_dir: 索引根目录
+        index: BM25 索引
+        doc_ids: 文档 ID 列表
+        doc_texts: 文档文本列表
+        tokenizer_signature: 分词器签名（停用词等变化时索引需重建）
+        fields: 检索文本使用的字段（记录在 header 中）
+        catalog_offset: 索引已包含的电影库变更日志位置（从集合全量构建时为 0，加载后重放全部日志）
+        expected_current: 期望的当前版本（增量合并时使用，其他进程已切换版本则放弃写入）
+
+    Returns:
+        新版本目录路径
+
+    Raises:
+        IndexFormatError: CURRENT 已被其他进程切换
+    """
+    arrays = {name: np.asarray(getattr(index, name), dtype=dtype) for name, dtype in POSTING_ARRAYS.items()}
+    tables = {'vocab': index.terms, 'doc_ids': doc_ids, 'doc_texts': doc_texts}
+    for name in STRING_TABLES:
+        arrays.update(string_table_arrays(name, tables[name]))
+
+    header = {
+        'tokenizer_signature': tokenizer_signature,
+        'num_docs': index.num_docs,
+        'vocab_size': len(index.vocab),
+        'num_postings': int(len(index.doc_indices)),
+        'k1': index.k1,
+        'b': index.b,
+        'epsilon': index.epsilon,
+        'avgdl': index.avgdl,
+        'catalog_offset': catalog_offset,
+    }
+    if fields is not None:
+        header['fields'] = list(fields)
+    return write_version(index_dir, FORMAT_NAME, FORMAT_VERSION, arrays, header, expected_current=expected_current)
+
+
+def read_header(index_dir: str) -> Dict:
+    """
+    读取并校验当前版本的 header
+
+    Raises:
+        IndexFormatError: 索引不存在、未写完、格式不兼容或 header 损坏
+    """
+    return _read_header(index_dir, FORMAT_NAME, FORMAT_VERSION)
+
+
+def open_index(index_dir: str, tokenizer_signature: str = None,
+               verify: bool = True) -> Tuple[BM25Index, StringTable, StringTable, Dict]:
+    """
+    以内存映射方式打开当前版本的索引
+
+    Args:
+        index_dir: 索引根目录
+        tokenizer_signature: 期望的分词器签名（不一致时视为过期）
+        verify: 是否校验每个文件的 CRC32（会顺序读取全部文件）
+
+    Returns:
+        (BM25Index, doc_ids, doc_texts, header)
+
+    Raises:
+        IndexFormatError: 索引缺失、未写完、损坏或过期
+    """
+    header = read_header(index_dir)
+    if tokenizer_signature is not None and header['tokenizer_signature'] != tokenizer_signature:
+        raise IndexFormatError("索引已过期：分词器签名不一致，请重建索引")
+
+    arrays = load_arrays(header, verify)
+
+    missing = [name for name in POSTING_ARRAYS if name not in arrays]
+    if missing:
+        raise IndexFormatError(f"索引缺少数组: {', '.join(missing)}")
+
+    tables = {name: StringTable.from_arrays(arrays, name) for name in STRING_TABLES}
+
+    statistics = {name: arrays[name] for name in BM25Index.STATISTICS}
+    statistics['avgdl'] = header['avgdl']
+    index = BM25Index(
+        vocab=TermDictionary(tables['vocab']),
+        indptr=arrays['indptr'],
+        doc_indices=arrays['doc_indices'],
+        term_freqs=arrays['term_freqs'],
+        doc_lens=arrays['doc_lens'],
+        k1=header['k1'], b=header['b'], epsilon=header['epsilon'],
+        statistics=statistics
+    )
+    return index, tables['doc_ids'], tables['doc_texts'], header
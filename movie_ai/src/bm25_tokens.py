@@ -0,0 +1,342 @@
+"""
+BM25 分词流水线 - 多进程分块分词 + 驻留词表 + 分词结果缓存
+
+    分词    待分词文本按块分发给进程池（spawn 方式启动，不继承调用进程的线程和锁），每个工作进程
+            启动时预加载一次 jieba 词典；文本较少或 workers=1 时在当前进程内分词（服务内构建均如此，
+            进程池只由离线构建脚本使用）
+    驻留    每个词只保存一次（词表），每个字段表示为 int32 词 ID 数组 + int64 文档偏移
+    缓存    分词结果按字段写入版本化目录（格式见 src.index_store），重建时文本未变的
+            文档直接复用；修改 k1 / b / 检索字段只需重新统计，不再分词
+
+缓存目录内容：
+    terms.*.npy             驻留词表
+    doc_ids.*.npy           文档 ID 表
+    <字段>.ids.npy          该字段全部文档的词 ID（int32，按文档顺序拼接）
+    <字段>.offsets.npy      每个文档在词 ID 数组中的区间（int64，长度为文档数 + 1）
+    <字段>.texts.*.npy      字段原文（用于判断是否需要重新分词，以及重建检索文本）
+"""
+import multiprocessing
+import os
+import time
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from src.index_store import (
+    IndexFormatError, StringTable, load_arrays, read_header, string_table_arrays, write_version
+)
+
+
+FORMAT_NAME = 'movie-ai-bm25-tokens'
+FORMAT_VERSION = 1
+
+# 每个字段对应的元数据键（导入脚本与后端使用的键名不同，取第一个非空值）
+FIELD_KEYS = {
+    'title': ('title',),
+    'genres': ('genres', 'genre'),
+    'director': ('director', 'directors'),
+}
+
+
+def field_text(metadata: Dict, field: str) -> str:
+    """取出元数据中某个字段的文本（缺失时为空字符串）"""
+    for key in FIELD_KEYS[field]:
+        value = metadata.get(key)
+        if value:
+            return value if isinstance(value, str) else str(value)
+    return ''
+
+
+# ----------------------------------------------------------------------
+# 多进程分词
+# ----------------------------------------------------------------------
+
+def _init_worker():
+    """工作进程初始化：预加载一次 jieba 词典，之后每个块直接分词"""
+    import jieba
+    jieba.initialize()
+
+
+def _tokenize_chunk(task: Tuple[Callable[[str], List[str]], Sequence[str]]):
+    """
+    对一个块分词，返回块内局部词表上的词 ID（减少进程间传输的字符串）
+
+    Returns:
+        (局部词表, int32 词 ID, int32 每个文本的词数)
+    """
+    tokenizer, texts = task
+    local: Dict[str, int] = {}
+    ids: List[int] = []
+    lengths = np.empty(len(texts), dtype=np.int32)
+    for i, text in enumerate(texts):
+        tokens = tokenizer(text)
+        lengths[i] = len(tokens)
+        ids.extend(local.setdefault(token, len(local)) for token in tokens)
+    return list(local), np.asarray(ids, dtype=np.int32), lengths
+
+
+def tokenize_texts(texts: Sequence[str], tokenizer: Callable[[str], List[str]],
+                   vocab: Dict[str, int], terms: List[str], workers: int = 0,
+                   chunk_size: int = 2000) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    分词并驻留到给定词表（新词追加到 vocab / terms）
+
+    Args:
+        texts: 待分词文本
+        tokenizer: 分词函数（多进程时必须是模块级函数，按引用传给工作进程）
+        vocab: 词 -> 词 ID（原地更新）
+        terms: 词 ID -> 词（原地更新）
+        workers: 进程数（0 表示 CPU 核数，1 表示在当前进程内分词）。多进程时工作进程以 spawn 方式启动，
+            会重新导入调用方的主模块，主模块的入口需以 if __name__ == '__main__' 保护
+        chunk_size: 每个块的文本数
+
+    Returns:
+        (int32 词 ID 数组, 每个文本的 int32 词数)
+    """
+    workers = workers or os.cpu_count() or 1
+    chunks = [texts[i:i + chunk_size] for i in range(0, len(texts), chunk_size)]
+
+    if workers <= 1 or len(chunks) <= 1:
+        results = map(_tokenize_chunk, ((tokenizer, chunk) for chunk in chunks))
+        return _intern(results, vocab, terms)
+
+    # fork 会复制调用进程中正在持有的锁（线程池、torch 等），统一使用 spawn
+    context = multiprocessing.get_context('spawn')
+    with context.Pool(min(workers, len(chunks)), initializer=_init_worker) as pool:
+        # imap 保持块的顺序，结果边产生边合并
+        results = pool.imap(_tokenize_chunk, ((tokenizer, chunk) for chunk in chunks))
+        return _intern(results, vocab, terms)
+
+
+def _intern(results, vocab: Dict[str, int], terms: List[str]) -> Tuple[np.ndarray, np.ndarray]:
+    """把各块的局部词 ID 映射到全局词表"""
+    id_parts, length_parts = [], []
+    for local_terms, ids, lengths in results:
+        remap = np.empty(len(local_terms), dtype=np.int32)
+        for i, term in enumerate(local_terms):
+            term_id = vocab.get(term)
+            if term_id is None:
+                term_id = vocab[term] = len(terms)
+                terms.append(term)
+            remap[i] = term_id
+        id_parts.append(remap[ids] if len(ids) else ids)
+        length_parts.append(lengths)
+    if not id_parts:
+        return np.zeros(0, dtype=np.int32), np.zeros(0, dtype=np.int32)
+    return np.concatenate(id_parts), np.concatenate(length_parts)
+
+
+# ----------------------------------------------------------------------
+# 分词结果
+# ----------------------------------------------------------------------
+
+class TokenizedCorpus:
+    """驻留词表上的分词结果：每个字段一组 (词 ID, 文档偏移, 原文)"""
+
+    def __init__(self, terms: Sequence[str], doc_ids: Sequence[str],
+                 fields: Dict[str, Tuple[np.ndarray, np.ndarray, Sequence[str]]]):
+        """
+        Args:
+            terms: 驻留词表（词 ID -> 词）
+            doc_ids: 文档 ID 列表
+            fields: {字段: (int32 词 ID, int64 偏移, 原文列表)}
+        """
+        self.terms = terms
+        self.doc_ids = doc_ids
+        self.fields = fields
+
+    @property
+    def num_docs(self) -> int:
+        return len(self.doc_ids)
+
+    @property
+    def num_tokens(self) -> int:
+        return sum(len(ids) for ids, _, _ in self.fields.values())
+
+    def postings(self, fields: Sequence[str]) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        拼接若干字段的词出现（BM25 只关心词袋，字段之间的顺序无关）
+
+        Returns:
+            (每个词出现所属的文档下标, 词 ID)
+        """
+        missing = [field for field in fields if field not in self.fields]
+        if missing:
+            raise KeyError(f"分词缓存缺少字段: {', '.join(missing)}")
+        docs, ids = [], []
+        for field in fields:
+            field_ids, offsets, _ = self.fields[field]
+            docs.append(np.repeat(np.arange(self.num_docs, dtype=np.int32), np.diff(offsets)))
+            ids.append(np.asarray(field_ids))
+        return np.concatenate(docs), np.concatenate(ids)
+
+    def search_texts(self, fields: Sequence[str]) -> List[str]:
+        """按字段拼接检索文本（与 build_search_text 一致：非空字段以空格连接）"""
+        texts = [self.fields[field][2] for field in fields]
+        return [" ".join(part for part in parts if part) for parts in zip(*texts)]
+
+
+def tokenize_corpus(doc_ids: Sequence[str], field_texts: Dict[str, Sequence[str]],
+                    tokenizer: Callable[[str], List[str]],
+                    previous: Optional[TokenizedCorpus] = None, workers: int = 0,
+                    chunk_size: int = 2000) -> Tuple[TokenizedCorpus, Dict]:
+    """
+    对语料的各字段分词；previous 中同一文档同一字段原文未变时直接复用
+
+    Args:
+        doc_ids: 文档 ID 列表
+        field_texts: {字段: 每个文档的原文}
+        tokenizer: 分词函数
+        previous: 上一次的分词结果（可为 None）
+        workers: 进程数（0 表示 CPU 核数）
+        chunk_size: 每个块的文本数
+
+    Returns:
+        (TokenizedCorpus, 统计信息)
+    """
+    start = time.perf_counter()
+    terms: List[str] = []
+    vocab: Dict[str, int] = {}
+    previous_rows = {}
+    if previous is not None:
+        # 沿用旧词表的编号，复用的词 ID 无需转换
+        previous_rows = {doc_id: row for row, doc_id in enumerate(previous.doc_ids)}
+        terms.extend(previous.terms)
+        vocab.update((term, term_id) for term_id, term in enumerate(terms))
+
+    # 1. 找出每个字段可复用的文档（原文未变），其余文本统一分词
+    reuse_plan, pending = {}, []
+    for field, texts in field_texts.items():
+        old = previous.fields.get(field) if previous is not None else None
+        rows = np.full(len(doc_ids), -1, dtype=np.int64)
+        for i, (doc_id, text) in enumerate(zip(doc_ids, texts)):
+            row = previous_rows.get(doc_id, -1) if old is not None else -1
+            if row >= 0 and old[2][row] == text:
+                rows[i] = row
+            else:
+                pending.append(text)
+        reuse_plan[field] = rows
+
+    new_ids, new_lengths = tokenize_texts(pending, tokenizer, vocab, terms, workers, chunk_size)
+    new_offsets = np.zeros(len(new_lengths) + 1, dtype=np.int64)
+    np.cumsum(new_lengths, out=new_offsets[1:])
+
+    # 2. 按文档顺序组装每个字段的词 ID 数组
+    fields, cursor = {}, 0
+    for field, texts in field_texts.items():
+        rows = reuse_plan[field]
+        old_ids, old_offsets = (previous.fields[field][:2] if (rows >= 0).any() else (None, None))
+        lengths = np.empty(len(doc_ids), dtype=np.int64)
+        sources = []
+        for i, row in enumerate(rows):
+            if row >= 0:
+                segment = old_ids[old_offsets[row]:old_offsets[row + 1]]
+            else:
+                segment = new_ids[new_offsets[cursor]:new_offsets[cursor + 1]]
+                cursor += 1
+            lengths[i] = len(segment)
+            sources.append(segment)
+        offsets = np.zeros(len(doc_ids) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=offsets[1:])
+        ids = np.concatenate(sources).astype(np.int32) if sources else np.zeros(0, dtype=np.int32)
+        fields[field] = (ids, offsets, list(texts))
+
+    corpus = _compact(TokenizedCorpus(terms, list(doc_ids), fields))
+
+    seconds = time.perf_counter() - start
+    total = len(doc_ids) * len(field_texts)
+    stats = {
+        'docs': len(doc_ids),
+        'fields': list(field_texts),
+        'tokenized': len(pending),
+        'reused': total - len(pending),
+        'tokens': corpus.num_tokens,
+        'vocab_size': len(corpus.terms),
+        'workers': workers or os.cpu_count() or 1,
+        'seconds': seconds,
+        'docs_per_sec': len(doc_ids) / seconds if seconds > 0 else 0.0,
+    }
+    return corpus, stats
+
+
+def _compact(corpus: TokenizedCorpus) -> TokenizedCorpus:
+    """去掉词表中不再出现的词（复用旧缓存时会带入已删除文档的词）"""
+    used = np.zeros(len(corpus.terms), dtype=bool)
+    for ids, _, _ in corpus.fields.values():
+        used[ids] = True
+    if used.all():
+        return corpus
+    remap = np.cumsum(used, dtype=np.int64).astype(np.int32) - 1
+    terms = [term for term, keep in zip(corpus.terms, used) if keep]
+    fields = {field: (remap[ids], offsets, texts) for field, (ids, offsets, texts) in corpus.fields.items()}
+    return TokenizedCorpus(terms, corpus.doc_ids, fields)
+
+
+# ----------------------------------------------------------------------
+# 磁盘格式
+# ----------------------------------------------------------------------
+
+def write_tokens(cache_dir: str, corpus: TokenizedCorpus, tokenizer_signature: str = '') -> str:
+    """
+    将分词结果写入新的版本目录，并原子切换 CURRENT
+
+    Returns:
+        新版本目录路径
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+    arrays = {}
+    arrays.update(string_table_arrays('terms', corpus.terms))
+    arrays.update(string_table_arrays('doc_ids', corpus.doc_ids))
+    for field, (ids, offsets, texts) in corpus.fields.items():
+        arrays[f"{field}.ids"] = np.asarray(ids, dtype=np.int32)
+        arrays[f"{field}.offsets"] = np.asarray(offsets, dtype=np.int64)
+        arrays.update(string_table_arrays(f"{field}.texts", texts))
+
+    header = {
+        'tokenizer_signature': tokenizer_signature,
+        'num_docs': corpus.num_docs,
+        'vocab_size': len(corpus.terms),
+        'num_tokens': corpus.num_tokens,
+        'fields': list(corpus.fields),
+    }
+    return write_version(cache_dir, FORMAT_NAME, FORMAT_VERSION, arrays, header)
+
+
+def open_tokens(cache_dir: str, tokenizer_signature: str = None,
+                verify: bool = True) -> Tuple[TokenizedCorpus, Dict]:
+    """
+    以内存映射方式打开分词缓存
+
+    Args:
+        cache_dir: 缓存根目录
+        tokenizer_signature: 期望的分词器签名（不一致时视为过期）
+        verify: 是否校验每个文件的 CRC32
+
+    Returns:
+        (TokenizedCorpus, header)
+
+    Raises:
+        IndexFormatError: 缓存缺失、未写完、损坏或过期
+    """
+    header = read_header(cache_dir, FORMAT_NAME, FORMAT_VERSION)
+    if tokenizer_signature is not None and header['tokenizer_signature'] != tokenizer_signature:
+        raise IndexFormatError("分词缓存已过期：分词器签名不一致")
+
+    arrays = load_arrays(header, verify)
+    try:
+        fields = {
+            field: (
+                arrays[f"{field}.ids"],
+                arrays[f"{field}.offsets"],
+                StringTable.from_arrays(arrays, f"{field}.texts"),
+            )
+            for field in header['fields']
+        }
+        corpus = TokenizedCorpus(
+            StringTable.from_arrays(arrays, 'terms'),
+            StringTable.from_arrays(arrays, 'doc_ids'),
+            fields
+        )
+    except KeyError as e:
+        raise IndexFormatError(f"分词缓存缺少数组: {e}")
+    return corpus, header
@@ -0,0 +1,213 @@
+"""
+电影库变更日志 - 多个 worker 进程共用的只追加事件日志
+
+    记录    每行一个 JSON：{"op": "upsert", "id": 电影ID, "metadata": {...}} 或 {"op": "delete", "id": 电影ID}；
+            记录的是已解析的事件（写入的元数据以 ChromaDB 为准），重放时不再依赖请求内容
+    位置    记录在日志中的字节偏移即其位置；BM25 索引和向量索引的 header 记录合并/构建时已包含的
+            位置（catalog_offset），加载后从该位置开始重放，其他结构从头重放（重复应用同一事件结果不变）
+    写入    在文件锁内追加：先读出其他 worker 已追加的记录，保证所有 worker 按日志顺序应用，
+            再截断中断写入留下的不完整尾行
+    读取    每个 worker 记录已应用到的位置，按间隔读取之后新增的完整行
+    压缩    两个索引都已包含的前缀（header 中 catalog_offset 的最小值）合并为每个文档的最后一条记录：
+            文件首行 {"op": "compact", "position": 前缀结束位置, "offset": 保留记录在文件中的起点}，
+            之后是快照（每条带原位置 pos），再之后是原样保留的记录（位置不变）。
+            从前缀内的位置读取时返回该位置之后变更过的文档的最后一条记录，结果与逐条重放一致
+"""
+import io
+import json
+import os
+from typing import Any, BinaryIO, Dict, List, Tuple
+
+from src.config import Config
+from src.index_store import file_lock, fsync_dir
+
+
+COMPACT_OP = 'compact'
+
+
+def _encode(record: Dict[str, Any]) -> bytes:
+    return json.dumps(record, ensure_ascii=False).encode('utf-8') + b'\n'
+
+
+def _decode(lines: List[bytes]) -> List[Dict[str, Any]]:
+    """解析记录行（跳过无法解析的行）"""
+    records = []
+    for line in lines:
+        try:
+            records.append(json.loads(line))
+        except ValueError:
+            print(f"⚠️  变更日志中有无法解析的记录，已跳过: {line[:80]!r}")
+    return records
+
+
+def _layout(f: BinaryIO) -> Tuple[int, int, int]:
+    """
+    读取文件布局
+
+    Returns:
+        (压缩掉的前缀结束位置, 保留记录在文件中的起点, 快照在文件中的起点)；未压缩过时均为 0
+    """
+    f.seek(0)
+    first = f.readline()
+    if first.startswith(b'{"op": "' + COMPACT_OP.encode() + b'"') and first.endswith(b'\n'):
+        meta = json.loads(first)
+        return meta['position'], meta['offset'], len(first)
+    return 0, 0, 0
+
+
+class CatalogLog:
+    """电影库变更日志（JSON Lines，只追加，多进程共用）"""
+
+    def __init__(self, path: str):
+        """
+        初始化日志
+
+        Args:
+            path: 日志文件路径（锁文件为 <path>.lock）
+        """
+        self.path = path
+        self.lock_path = path + '.lock'
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+
+    def _open(self) -> BinaryIO:
+        """打开日志读取（不存在时视为空日志；压缩替换文件后已打开的句柄仍读取旧文件，布局一致）"""
+        try:
+            return open(self.path, 'rb')
+        except FileNotFoundError:
+            return io.BytesIO()
+
+    def end(self, chunk_size: int = 1 << 16) -> int:
+        """日志末尾的位置（不含未写完的尾行）"""
+        with self._open() as f:
+            base, offset, _ = _layout(f)
+            position = f.seek(0, os.SEEK_END)
+            while position > offset:
+                chunk_start = max(offset, position - chunk_size)
+                f.seek(chunk_start)
+                newline = f.read(position - chunk_start).rfind(b'\n')
+                if newline >= 0:
+                    return base + chunk_start + newline + 1 - offset
+                position = chunk_start
+        return base
+
+    def read(self, start: int = 0, end: int = None) -> Tuple[List[Dict[str, Any]], int]:
+        """
+        读取 [start, end) 之间的完整记录
+
+        Args:
+            start: 起始位置（超过日志末尾时视为日志已被重置，从头读取）
+            end: 结束位置（默认读到日志末尾；start 在已压缩的前缀内时至少读到前缀末尾）
+
+        Returns:
+            (记录列表, 读到的位置)
+        """
+        with self._open() as f:
+            return self._read(f, start, end)
+
+    def _read(self, f: BinaryIO, start: int, end: int = None) -> Tuple[List[Dict[str, Any]], int]:
+        base, offset, snapshot_start = _layout(f)
+        size = base + f.seek(0, os.SEEK_END) - offset
+        if start > size:
+            print(f"⚠️  变更日志比记录的位置短（{size} < {start}），从头重放")
+            start = 0
+        end = size if end is None else min(end, size)
+        if end <= start:
+            return [], start
+
+        records = []
+        if start < base:
+            # 前缀已压缩：取 start 之后变更过的文档的最后一条记录，至少读到前缀末尾
+            f.seek(snapshot_start)
+            records = [record for record in _decode(f.read(offset - snapshot_start).splitlines())
+                       if record.pop('pos') >= start]
+            start, end = base, max(end, base)
+
+        f.seek(offset + start - base)
+        data = f.read(end - start)
+        complete = data.rfind(b'\n') + 1  # 最后一行未写完时留到下次读取
+        records.extend(_decode(data[:complete].splitlines()))
+        return records, start + complete
+
+    def append(self, records: List[Dict[str, Any]], start: int) -> Tuple[List[Dict[str, Any]], int]:
+        """
+        追加记录（文件锁内），并返回其他 worker 在 start 之后已追加的记录
+
+        Args:
+            records: 要追加的记录
+            start: 调用方已应用到的位置
+
+        Returns:
+            (start 之后、本次追加之前的记录, 追加后的位置)
+        """
+        payload = b''.join(_encode(record) for record in records)
+        with file_lock(self.lock_path), open(self.path, 'a+b') as f:
+            base, offset, _ = _layout(f)
+            size = base + f.seek(0, os.SEEK_END) - offset
+            earlier, position = self._read(f, start, size)
+            if position < size:
+                # 持有锁时不会有其他进程正在写入：不完整的尾行是中断的写入
+                print(f"⚠️  变更日志尾部有不完整的记录，已截断 {size - position} 字节")
+                f.truncate(offset + position - base)
+            f.write(payload)
+            f.flush()
+            os.fsync(f.fileno())
+            return earlier, position + len(payload)
+
+    def compact(self, position: int, min_bytes: int = 0) -> bool:
+        """
+        将 position 之前的记录合并为每个文档的最后一条记录（文件锁内重写，原子替换）
+
+        Args:
+            position: 所有索引都已包含的位置（各索引 header 中 catalog_offset 的最小值）
+            min_bytes: 可合并的记录不足该字节数时不重写
+
+        Returns:
+            是否执行了压缩
+        """
+        with file_lock(self.lock_path):
+            if not os.path.exists(self.path):
+                return False
+            with open(self.path, 'rb') as f:
+                base, offset, snapshot_start = _layout(f)
+                physical_size = f.seek(0, os.SEEK_END)
+                if position > base + physical_size - offset or position - base < max(min_bytes, 1):
+                    return False
+
+                # 旧快照按位置排列，之后的记录位置更大：先删除再插入保持位置顺序
+                latest: Dict[str, Dict[str, Any]] = {}
+                f.seek(snapshot_start)
+                for record in _decode(f.read(offset - snapshot_start).splitlines()):
+                    latest[record['id']] = record
+                pos = base
+                for line in f.read(position - base).splitlines(keepends=True):
+                    for record in _decode([line]):
+                        record['pos'] = pos
+                        latest.pop(record['id'], None)
+                        latest[record['id']] = record
+                    pos += len(line)
+                tail = f.read()
+                tail = tail[:tail.rfind(b'\n') + 1]  # 持有锁时不完整的尾行是中断的写入
+
+            snapshot = b''.join(_encode(record) for record in latest.values())
+            header = b''
+            while True:
+                line = _encode({'op': COMPACT_OP, 'position': position, 'offset': len(header) + len(snapshot)})
+                if len(line) == len(header):
+                    header = line
+                    break
+                header = line
+
+            tmp_path = self.path + '.tmp'
+            with open(tmp_path, 'wb') as f:
+                f.write(header + snapshot + tail)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.path)
+            fsync_dir(os.path.dirname(os.path.abspath(self.path)))
+
+        print(f"✅ 变更日志已压缩：{position - base} 字节的记录合并为 {len(latest)} 条快照")
+        return True
+
+
+# 创建全局实例
+catalog_log = CatalogLog(Config.CATALOG_LOG_PATH)
@@ -0,0 +1,99 @@
+"""
+熔断器 - 连续失败或慢调用后暂停调用上游，调用方直接走降级路径
+
+    closed      正常调用；连续 failure_threshold 次失败（异常、超时或超过 slow_call 秒）后熔断
+    open        不调用上游；reset_timeout 秒后进入 half_open
+    half_open   只放行一次试探调用：成功则恢复 closed，失败则重新 open
+
+状态转换按 "旧状态->新状态" 计数。
+"""
+import threading
+import time
+from collections import Counter
+from typing import Any, Callable, Dict
+
+
+class CircuitBreaker:
+    """连续失败 / 慢调用熔断器（线程安全）"""
+
+    def __init__(self, failure_threshold: int = 3, slow_call: float = None, reset_timeout: float = 30.0,
+                 clock: Callable[[], float] = time.monotonic):
+        """
+        初始化熔断器
+
+        Args:
+            failure_threshold: 连续失败多少次后熔断
+            slow_call: 超过该秒数的成功调用也计为失败（None 不限制）
+            reset_timeout: 熔断后多少秒进入半开状态
+            clock: 时钟函数（便于测试）
+        """
+        self.failure_threshold = failure_threshold
+        self.slow_call = slow_call
+        self.reset_timeout = reset_timeout
+        self._clock = clock
+        self._lock = threading.Lock()
+
+        self.state = 'closed'
+        self.consecutive_failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+
+        self.transitions: Counter = Counter()
+        self.rejected = 0  # 熔断期间被拒绝的调用数
+
+    def _transition(self, state: str):
+        """切换状态并计数（调用方持有锁）"""
+        if state != self.state:
+            self.transitions[f"{self.state}->{state}"] += 1
+            self.state = state
+        if state == 'open':
+            self._opened_at = self._clock()
+
+    def allow(self) -> bool:
+        """是否可以调用上游（半开状态只放行一次试探调用）"""
+        with self._lock:
+            if self.state == 'open' and self._clock() - self._opened_at >= self.reset_timeout:
+                self._transition('half_open')
+                self._probing = False
+            if self.state == 'closed':
+                return True
+            if self.state == 'half_open' and not self._probing:
+                self._probing = True
+                return True
+            self.rejected += 1
+            return False
+
+    def record_success(self, seconds: float = 0.0):
+        """记录一次成功调用（超过 slow_call 时计为失败）"""
+        if self.slow_call is not None and seconds > self.slow_call:
+            self.record_failure()
+            return
+        with self._lock:
+            if self.state == 'open':
+                return  # 熔断前发出、熔断后才返回的调用不影响状态
+            self.consecutive_failures = 0
+            self._probing = False
+            self._transition('closed')
+
+    def record_failure(self):
+        """记录一次失败调用"""
+        with self._lock:
+            self.consecutive_failures += 1
+            if self.state == 'open':
+                return
+            self._probing = False
+            if self.state == 'half_open' or self.consecutive_failures >= self.failure_threshold:
+                self._transition('open')
+
+    def stats(self) -> Dict[str, Any]:
+        """当前状态、连续失败次数和状态转换计数"""
+        with self._lock:
+            return {
+                'state': self.state,
+                'consecutive_failures': self.consecutive_failures,
+                'failure_threshold': self.failure_threshold,
+                'slow_call': self.slow_call,
+                'reset_timeout': self.reset_timeout,
+                'rejected': self.rejected,
+                'transitions': dict(self.transitions),
+            }
@@ -11,11 +11,33 @@ class Config:
     FLASK_HOST = os.getenv('FLASK_HOST', '0.0.0.0')
     FLASK_PORT = int(os.getenv('FLASK_PORT', 5001))
     FLASK_DEBUG = os.getenv('FLASK_DEBUG', 'False').lower() == 'true'
+    # 启动后在后台线程中预热检索器 / 重排序器 / embedding 模型等组件（关闭时在第一次使用时初始化）
+    WARMUP_ON_START = os.getenv('WARMUP_ON_START', 'True').lower() == 'true'
     
     # Embedding模型配置
     EMBEDDING_MODEL_NAME = 'D:/code/vue/movie_ai/models/bge-small-zh-v1.5'
     EMBEDDING_DEVICE = 'cpu'  # 'cuda' 或 'cpu'
     EMBEDDING_DIMENSION = 512
+    # 推理后端：'torch' 为 sentence-transformers（PyTorch）；'onnx' 导出为 ONNX 并用 onnxruntime 在 CPU 上推理
+    EMBEDDING_BACKEND = os.getenv('EMBEDDING_BACKEND', 'torch')
+    EMBEDDING_ONNX_DIR = os.path.join(os.path.dirname(__file__), '..', 'data', 'onnx')  # 导出的 ONNX 模型（按模型指纹分目录）
+    EMBEDDING_ONNX_QUANTIZE = os.getenv('EMBEDDING_ONNX_QUANTIZE', 'True').lower() == 'true'  # 动态 int8 量化
+    EMBEDDING_ONNX_THREADS = int(os.getenv('EMBEDDING_ONNX_THREADS', 0))  # intra-op 线程数，0 表示物理核数
+    EMBEDDING_ONNX_MIN_COSINE = 0.98  # 与 PyTorch 后端的最小余弦相似度（一致性校验未通过时回退到 PyTorch）
+    # Embedding 缓存：按文本内容哈希缓存向量（内存 LRU + 只追加的内存映射文件），按模型指纹分目录，换模型自动失效
+    EMBEDDING_CACHE_ENABLED = os.getenv('EMBEDDING_CACHE_ENABLED', 'True').lower() == 'true'
+    EMBEDDING_CACHE_DIR = os.getenv('EMBEDDING_CACHE_DIR', os.path.join(os.path.dirname(__file__), '..', 'data', 'embedding_cache'))
+    EMBEDDING_CACHE_MAX_BYTES = 32 * 1024 * 1024  # 内存 LRU 的字节上限
+    EMBEDDING_CACHE_DTYPE = 'float32'  # 磁盘存储类型，'float16' 占用减半
+    # 动态微批处理：并发的单条编码请求合并为一批调用模型
+    EMBEDDING_MICRO_BATCH = os.getenv('EMBEDDING_MICRO_BATCH', 'True').lower() == 'true'
+    EMBEDDING_BATCH_MAX_SIZE = int(os.getenv('EMBEDDING_BATCH_MAX_SIZE', 32))  # 每批最多合并的请求数
+    EMBEDDING_BATCH_MAX_WAIT_MS = float(os.getenv('EMBEDDING_BATCH_MAX_WAIT_MS', 3))  # 第一条请求入队后最多等待的毫秒数
+    EMBEDDING_BATCH_MAX_QUEUE = 256  # 队列容量，队列满时调用方直接编码
+    # 长度分桶：多条文本按 token 长度排序分批，每批填充后 token 数不超过预算（短文本批大、长文本批小）
+    EMBEDDING_LENGTH_BUCKETING = os.getenv('EMBEDDING_LENGTH_BUCKETING', 'True').lower() == 'true'
+    EMBEDDING_TOKEN_BUDGET = int(os.getenv('EMBEDDING_TOKEN_BUDGET', 8192))  # 每批填充后 token 数上限
+    EMBEDDING_BUCKET_MAX_BATCH = 256  # 每批最多条数
     
     # LLM配置 (Qwen3 Max)
     QWEN_API_KEY = os.getenv('QWEN_API_KEY', '')
@@ -26,6 +48,10 @@ class Config:
     QWEN_MAX_TOKENS = 1000
     QWEN_PRESENCE_PENALTY = 0.6  # 抑制重复主题
     QWEN_FREQUENCY_PENALTY = 0.6  # 抑制重复词语
+    QWEN_TIMEOUT = float(os.getenv('QWEN_TIMEOUT', 30.0))  # 秒
+    QWEN_MAX_RETRIES = 2
+    QWEN_MAX_CONNECTIONS = 16  # 翻译器共享客户端的连接池大小（keep-alive）
+    QWEN_KEEPALIVE_EXPIRY = 60.0  # 空闲连接保持时间（秒）
     
     # ChromaDB配置 (复用movie_back)
     # 使用持久化模式，共享movie_back的chroma_db目录
@@ -36,13 +62,108 @@ class Config:
     TOP_K = 5  # 检索Top-K相关文档（向量和BM25各检索TOP_K条）
     RERANK_TOP_N = 3  # 重排序后返回Top-N条推荐
     
+    # 重排序后端：'dashscope' 为远程 Qwen Rerank；'cross-encoder' 为本地 CrossEncoder（sentence-transformers 加载）
+    RERANK_BACKEND = os.getenv('RERANK_BACKEND', 'dashscope')
+    RERANK_MODEL = 'qwen3-rerank'  # 远程模型名
+    RERANK_LOCAL_MODEL = os.getenv('RERANK_LOCAL_MODEL', 'D:/code/vue/movie_ai/models/bge-reranker-base')
+    RERANK_DEVICE = 'cpu'  # 'cuda' 或 'cpu'
+    RERANK_MAX_LENGTH = 512  # 查询 + 文档的最大 token 数
+    RERANK_BATCH_SIZE = 16  # 每批打分的文档数
+    RERANK_THREADS = int(os.getenv('RERANK_THREADS', 0))  # PyTorch CPU 线程数（进程级设置，同时影响 embedding），0 表示默认
+    # 重排序分数缓存：按 (规范化查询, 文档内容哈希) 缓存分数，只把未命中的文档交给后端
+    RERANK_CACHE_ENABLED = os.getenv('RERANK_CACHE_ENABLED', 'True').lower() == 'true'
+    RERANK_CACHE_MAX_BYTES = int(os.getenv('RERANK_CACHE_MAX_BYTES', 8 * 1024 * 1024))
+    # 重排序时限和熔断：超时、失败或慢调用连续达到阈值后熔断，熔断期间直接使用融合检索顺序（响应标记为 degraded）
+    RERANK_TIMEOUT = float(os.getenv('RERANK_TIMEOUT', 2.0))  # 每次调用的时限（秒）
+    RERANK_SLOW_CALL = float(os.getenv('RERANK_SLOW_CALL', 1.0))  # 超过该秒数的成功调用也计为失败
+    RERANK_BREAKER_FAILURES = 3  # 连续失败多少次后熔断
+    RERANK_BREAKER_RESET = float(os.getenv('RERANK_BREAKER_RESET', 30.0))  # 熔断后多少秒放行一次试探调用
+    RERANK_MAX_WORKERS = 4  # 后端调用线程数
+    # 重排序级联：先用查询 embedding 与候选已存储 embedding 的余弦相似度剪枝，只把保留的候选交给重排序器
+    RERANK_CASCADE_ENABLED = os.getenv('RERANK_CASCADE_ENABLED', 'True').lower() == 'true'
+    RERANK_CASCADE_TOP_M = int(os.getenv('RERANK_CASCADE_TOP_M', 20))  # 最多交给重排序器的候选数
+    RERANK_CASCADE_MARGIN = float(os.getenv('RERANK_CASCADE_MARGIN', 0.15))  # 保留余弦相似度 >= 最高分 - margin 的候选
+    RERANK_CASCADE_MIN_CANDIDATES = 10  # 候选数不超过该值时不剪枝
+    
+    # 混合检索并行配置（两路检索各自的时限，超时则返回另一路的结果并标记为部分结果）
+    # 线程数按 并发请求数 × 2 路 × 2 估算：超过时限的检索路仍在后台运行并占用线程，直到 ChromaDB / LLM 返回
+    RETRIEVAL_MAX_WORKERS = int(os.getenv('RETRIEVAL_MAX_WORKERS', 32))
+    SEARCH_BATCH_TOKENIZE_WORKERS = int(os.getenv('SEARCH_BATCH_TOKENIZE_WORKERS', 4))  # 批量检索关键词提取的独立线程池
+    VECTOR_SEARCH_TIMEOUT = float(os.getenv('VECTOR_SEARCH_TIMEOUT', 2.0))  # 秒
+    BM25_SEARCH_TIMEOUT = float(os.getenv('BM25_SEARCH_TIMEOUT', 3.0))  # 秒（含关键词提取的 LLM 调用）
+    
+    # 混合检索融合配置（阈值算法，各路逐步加深直到 top_k 确定）
+    FUSION_METHOD = 'weighted'  # 'weighted'（按最高分归一化后以 alpha 加权）或 'rrf'（倒数排名融合）
+    FUSION_RRF_K = 60
+    FUSION_MAX_DEPTH = 100  # 每一路最多拉取的条数
+    
+    # 批量检索（/ai/search/batch）单次请求的最大查询数
+    SEARCH_BATCH_MAX_QUERIES = 256
+    
+    # 检索结果缓存（按规范化查询 + 检索方法 + top_k 缓存；电影库或索引版本变化时自动失效）
+    RESULT_CACHE_ENABLED = os.getenv('RESULT_CACHE_ENABLED', 'True').lower() == 'true'
+    RESULT_CACHE_MAX_BYTES = int(os.getenv('RESULT_CACHE_MAX_BYTES', 64 * 1024 * 1024))
+    RESULT_CACHE_TTL = float(os.getenv('RESULT_CACHE_TTL', 600))  # 秒
+    # 语义响应缓存：查询 embedding 余弦相似度不低于阈值且重排序后的电影 ID 一致时复用之前的 LLM 回答
+    RESPONSE_CACHE_ENABLED = os.getenv('RESPONSE_CACHE_ENABLED', 'True').lower() == 'true'
+    RESPONSE_CACHE_THRESHOLD = float(os.getenv('RESPONSE_CACHE_THRESHOLD', 0.92))
+    RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv('RESPONSE_CACHE_MAX_ENTRIES', 1000))
+    RESPONSE_CACHE_TTL = float(os.getenv('RESPONSE_CACHE_TTL', 3600))  # 秒
+    
+    # BM25 查询关键词提取：'local' 使用本地类型词表 + 片名/导演词典，未命中时回退到 LLM；'llm' 每次调用 LLM
+    KEYWORD_EXTRACTOR = os.getenv('KEYWORD_EXTRACTOR', 'local')
+    KEYWORD_LLM_FALLBACK = os.getenv('KEYWORD_LLM_FALLBACK', 'True').lower() == 'true'
+    KEYWORD_LLM_MAX_WORKERS = 2  # LLM 回退的并发数
+    KEYWORD_LLM_MAX_PENDING = 8  # LLM 回退的最大排队数（超出时直接使用原查询）
+    KEYWORD_LLM_TIMEOUT = float(os.getenv('KEYWORD_LLM_TIMEOUT', 2.0))  # 秒，超时使用原查询
+    KEYWORD_QUERY_LOG = os.getenv('KEYWORD_QUERY_LOG', '')  # 查询日志路径（JSON Lines，为空不记录），供离线对比工具使用
+    
     # 数据路径
     DATA_DIR = os.path.join(os.path.dirname(__file__), '..', 'data')
     LOG_DIR = os.path.join(os.path.dirname(__file__), '..', 'logs')
     
-    # BM25缓存文件
+    # 数据导入（流式：编码与写入重叠，upsert 跳过未变化的记录，中断后从断点继续）
+    IMPORT_DATA_PATH = os.getenv('IMPORT_DATA_PATH', r'D:\code\vue\movie_ai\datasets\chroma_movies_with_descriptions.json')
+    IMPORT_BATCH_SIZE = 256  # 每批编码 / 写入的记录数
+    IMPORT_QUEUE_BATCHES = 2  # 等待写入的最大批次数
+    IMPORT_CHECKPOINT_DIR = os.path.join(DATA_DIR, 'import_checkpoints')
+    
+    # BM25索引目录（版本化、内存映射格式）
     CACHE_DIR = os.path.join(os.path.dirname(__file__), '..', 'data')
-    BM25_CACHE_FILE = os.path.join(CACHE_DIR, 'bm25_index.pkl') 
+    BM25_INDEX_DIR = os.path.join(CACHE_DIR, 'bm25_index')
+    # 服务启动时只校验文件大小和头部；全文件 CRC32 要读完整个索引，留给构建 / 离线工具（scripts/view_bm25_index.py）
+    BM25_VERIFY_CHECKSUM = os.getenv('BM25_VERIFY_CHECKSUM', 'False').lower() == 'true'
+    BM25_TOKEN_CACHE_DIR = os.path.join(CACHE_DIR, 'bm25_tokens')  # 分词缓存（词 ID 数组），修改 k1 / b / 字段时无需重新分词
+    BM25_TOKENIZE_WORKERS = int(os.getenv('BM25_TOKENIZE_WORKERS', 0))  # 构建脚本的分词进程数，0 表示 CPU 核数，1 表示单进程（服务内构建始终单进程）
+    BM25_TOKENIZE_CHUNK_SIZE = 2000  # 每个分词任务的文本数
+
+    # 翻译 / 关键词提取的记忆缓存（内存 LRU + SQLite，重启后仍有效；路径为空时只用内存）
+    TRANSLATION_CACHE_PATH = os.getenv('TRANSLATION_CACHE_PATH', os.path.join(CACHE_DIR, 'translation_cache.sqlite3'))
+    TRANSLATION_CACHE_MAX_ENTRIES = 10000
+    TRANSLATION_CACHE_TTL = 30 * 86400  # 秒
+
+    # BM25 参数
+    BM25_K1 = 1.5
+    BM25_B = 0.75
+    BM25_FIELDS = ('title', 'genres')  # 检索文本使用的字段（可选 title / genres / director）
+    BM25_PRUNING = 'maxscore'  # None 为穷举累加，'maxscore' 为 MaxScore 剪枝
+    BM25_DELTA_MERGE_THRESHOLD = 1000  # 增量段变更数达到该值时后台合并进基础段
+
+    # 电影库变更日志：所有 worker 共用，加载索引时重放；运行中每隔 CATALOG_SYNC_INTERVAL 秒读取其他 worker 写入的变更
+    CATALOG_LOG_PATH = os.path.join(CACHE_DIR, 'catalog_events.jsonl')
+    CATALOG_SYNC_INTERVAL = float(os.getenv('CATALOG_SYNC_INTERVAL', 1.0))
+    # BM25 合并 / 向量索引构建后，两个索引都已包含的日志前缀达到该字节数时压缩为每部电影的最后一条记录
+    CATALOG_COMPACT_MIN_BYTES = int(os.getenv('CATALOG_COMPACT_MIN_BYTES', 1024 * 1024))
+
+    # 列式文档存储：启动时从 ChromaDB 读取全部文档和元数据，检索结果补充文档时不再读取 ChromaDB
+    DOC_STORE_ENABLED = os.getenv('DOC_STORE_ENABLED', 'True').lower() == 'true'
+
+    # 向量检索后端：'chroma' 直接查询 ChromaDB；'ivf' 使用进程内 IVF + int8 索引，ChromaDB 只用于读取文档
+    VECTOR_BACKEND = os.getenv('VECTOR_BACKEND', 'chroma')
+    VECTOR_INDEX_DIR = os.path.join(CACHE_DIR, 'vector_index')
+    VECTOR_IVF_NLIST = 0  # 簇数，0 表示自动（约 4 * sqrt(N)）
+    VECTOR_IVF_NPROBE = int(os.getenv('VECTOR_IVF_NPROBE', 16))  # 每次查询扫描的簇数（越大召回越高、越慢）
+    VECTOR_IVF_REFINE = 4  # 取 k * refine 个 int8 近似候选，用 float16 原始向量精确重排（0 关闭）
 
     @classmethod
     def validate(cls):
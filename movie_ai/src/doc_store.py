@@ -0,0 +1,214 @@
+"""
+列式文档存储 - 检索结果补充文档和元数据时不再读取 ChromaDB
+
+启动时从集合一次性读取全部文档和元数据，按列存放：
+    documents       所有文档的 UTF-8 字节连续存放 + 偏移数组（StringTable）
+    数值列          int64 / float64 数组 + 缺失掩码
+    其他列          字典编码：去重后的取值表 + int32 编码（-1 表示缺失）
+    id -> 行号      字典
+
+电影库变更（新增/更新/删除）写入覆盖表并标记墓碑，每次变更递增 version，
+依赖检索结果的缓存可以用 version 判断是否过期。
+"""
+import threading
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from src.index_store import StringTable
+
+
+class _Column:
+    """单个元数据列（数值列或字典编码列）"""
+
+    def __init__(self, values: List[Any]):
+        present = [v for v in values if v is not None]
+        numeric = bool(present) and all(
+            isinstance(v, (int, float)) and not isinstance(v, bool) for v in present
+        )
+        self.missing = np.fromiter((v is None for v in values), dtype=bool, count=len(values))
+
+        if numeric:
+            is_int = all(isinstance(v, int) for v in present)
+            self.dtype = int if is_int else float
+            self.data = np.array([0 if v is None else v for v in values],
+                                 dtype=np.int64 if is_int else np.float64)
+            self.table = None
+        else:
+            self.dtype = None
+            self.table: List[Any] = []
+            lookup: Dict[Any, int] = {}
+            codes = np.full(len(values), -1, dtype=np.int32)
+            for row, value in enumerate(values):
+                if value is None:
+                    continue
+                code = lookup.get(value)
+                if code is None:
+                    code = lookup[value] = len(self.table)
+                    self.table.append(value)
+                codes[row] = code
+            self.data = codes
+
+    def get(self, row: int) -> Tuple[bool, Any]:
+        """返回 (是否存在, 取值)"""
+        if self.missing[row]:
+            return False, None
+        if self.table is None:
+            return True, self.dtype(self.data[row])
+        return True, self.table[self.data[row]]
+
+    @property
+    def nbytes(self) -> int:
+        return int(self.data.nbytes + self.missing.nbytes)
+
+
+class DocumentStore:
+    """列式文档 / 元数据存储"""
+
+    def __init__(self, doc_ids: Sequence[str], documents: Sequence[str],
+                 metadatas: Sequence[Optional[Dict[str, Any]]]):
+        """
+        构建存储
+
+        Args:
+            doc_ids: 文档 ID
+            documents: 文档文本
+            metadatas: 元数据字典
+        """
+        offsets, data = StringTable.encode(doc or '' for doc in documents)
+        self._documents = StringTable(offsets, data)
+        self._rows: Dict[str, int] = {doc_id: row for row, doc_id in enumerate(doc_ids)}
+
+        keys: Dict[str, None] = {}
+        for metadata in metadatas:
+            keys.update(dict.fromkeys(metadata or ()))
+        self._columns: Dict[str, _Column] = {
+            key: _Column([(metadata or {}).get(key) for metadata in metadatas])
+            for key in keys
+        }
+
+        self._lock = threading.RLock()
+        self._overlay: Dict[str, Tuple[str, Dict[str, Any]]] = {}
+        self._tombstones = np.zeros(len(doc_ids), dtype=bool)
+        self._num_tombstones = 0
+        self._deleted: set = set()  # 已删除的非基础文档（防止被 fill 补回）
+        self.version = 0
+
+    @classmethod
+    def from_collection(cls, collection, page_size: int = 5000) -> 'DocumentStore':
+        """分页读取集合中的全部文档和元数据"""
+        doc_ids, documents, metadatas = [], [], []
+        offset = 0
+        while True:
+            page = collection.get(include=['documents', 'metadatas'], limit=page_size, offset=offset)
+            if not page['ids']:
+                break
+            doc_ids.extend(page['ids'])
+            documents.extend(page['documents'])
+            metadatas.extend(page['metadatas'])
+            offset += len(page['ids'])
+        return cls(doc_ids, documents, metadatas)
+
+    # ------------------------------------------------------------------
+    # 读取
+    # ------------------------------------------------------------------
+
+    def _base_record(self, row: int) -> Tuple[str, Dict[str, Any]]:
+        metadata = {}
+        for key, column in self._columns.items():
+            present, value = column.get(row)
+            if present:
+                metadata[key] = value
+        return self._documents[row], metadata
+
+    def get(self, doc_id: str) -> Optional[Tuple[str, Dict[str, Any]]]:
+        """
+        读取单个文档
+
+        Returns:
+            (文档, 元数据)，不存在时返回 None
+        """
+        with self._lock:
+            record = self._overlay.get(doc_id)
+            if record is not None:
+                return record[0], dict(record[1])
+            row = self._rows.get(doc_id)
+            if row is None or self._tombstones[row]:
+                return None
+        return self._base_record(row)
+
+    def get_many(self, doc_ids: Sequence[str]) -> Dict[str, Tuple[str, Dict[str, Any]]]:
+        """
+        批量读取文档
+
+        Returns:
+            {文档 ID: (文档, 元数据)}，不存在的 ID 不出现在结果中
+        """
+        records = {}
+        for doc_id in doc_ids:
+            record = self.get(doc_id)
+            if record is not None:
+                records[doc_id] = record
+        return records
+
+    def __contains__(self, doc_id: str) -> bool:
+        with self._lock:
+            if doc_id in self._overlay:
+                return True
+            row = self._rows.get(doc_id)
+            return row is not None and not self._tombstones[row]
+
+    # ------------------------------------------------------------------
+    # 变更
+    # ------------------------------------------------------------------
+
+    def _tombstone(self, doc_id: str):
+        row = self._rows.get(doc_id)
+        if row is not None and not self._tombstones[row]:
+            self._tombstones[row] = True
+            self._num_tombstones += 1
+
+    def upsert(self, doc_id: str, document: str, metadata: Dict[str, Any]):
+        """新增或更新文档（递增 version）"""
+        with self._lock:
+            self._tombstone(doc_id)
+            self._deleted.discard(doc_id)
+            self._overlay[doc_id] = (document or '', dict(metadata or {}))
+            self.version += 1
+
+    def delete(self, doc_id: str):
+        """删除文档（递增 version）"""
+        with self._lock:
+            self._tombstone(doc_id)
+            self._overlay.pop(doc_id, None)
+            if doc_id not in self._rows:
+                self._deleted.add(doc_id)
+            self.version += 1
+
+    def fill(self, records: Dict[str, Tuple[str, Dict[str, Any]]]):
+        """
+        补充存储构建后才出现、且尚未收到变更事件的文档（从 ChromaDB 读取，不递增 version）；
+        已被删除的文档不会被补回
+        """
+        with self._lock:
+            for doc_id, (document, metadata) in records.items():
+                if doc_id not in self._overlay and doc_id not in self._rows and doc_id not in self._deleted:
+                    self._overlay[doc_id] = (document or '', dict(metadata or {}))
+
+    # ------------------------------------------------------------------
+    # 状态
+    # ------------------------------------------------------------------
+
+    def status(self) -> Dict:
+        """存储状态"""
+        with self._lock:
+            return {
+                'version': self.version,
+                'num_docs': len(self._rows) - self._num_tombstones + len(self._overlay),
+                'base_docs': len(self._rows),
+                'overlay_docs': len(self._overlay),
+                'tombstones': self._num_tombstones,
+                'columns': len(self._columns),
+                'document_bytes': int(self._documents.data.nbytes + self._documents.offsets.nbytes),
+                'metadata_bytes': sum(column.nbytes for column in self._columns.values()),
+            }
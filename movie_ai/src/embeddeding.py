@@ -3,10 +3,14 @@ Embedding 处理模块
 负责将文本转换为向量表示
 """
 import os
-from typing import List, Union
+import threading
+from typing import Any, Dict, List, Optional, Union
 import numpy as np
-from sentence_transformers import SentenceTransformer
 from src.config import Config
+from src.embedding_cache import EmbeddingCache, model_fingerprint
+from src.length_batching import plan_batches
+from src.micro_batcher import MicroBatcher
+from src.warmup import warmup
 
 
 class EmbeddingService:
@@ -17,34 +21,186 @@ class EmbeddingService:
         self.model = None
         self.device = Config.EMBEDDING_DEVICE
         self.dimension = Config.EMBEDDING_DIMENSION
+        self.backend = Config.EMBEDDING_BACKEND  # 'torch' 或 'onnx'（ONNX 不可用时回退为 'torch'）
+        self._cache = None
+        self._cache_lock = threading.Lock()
+        self._batcher = None
+        self._real_tokens = 0  # 长度分桶编码的真实 token 数 / 填充后 token 数
+        self._padded_tokens = 0
         
     def load_model(self):
-        """加载 embedding 模型（仅从本地加载）"""
+        """加载 embedding 模型（仅从本地加载；ONNX 后端不可用时回退到 PyTorch）"""
+        if self.model is None and self.backend == 'onnx':
+            self.model = self._load_onnx()
+            if self.model is None:
+                self.backend = 'torch'
+                self._cache = None  # 向量来自不同后端，缓存按后端分开
         if self.model is None:
+            # 导入 sentence_transformers（含 torch）耗时较长，推迟到第一次加载模型时
+            from sentence_transformers import SentenceTransformer
             self.model = SentenceTransformer(
                 Config.EMBEDDING_MODEL_NAME,
                 device=self.device
             )
         return self.model
     
-    def encode(self, texts: Union[str, List[str]], batch_size: int = 32) -> np.ndarray:
+    def _load_onnx(self):
+        """导出（首次）并加载 ONNX Runtime 编码器，失败或未通过一致性校验时返回 None"""
+        try:
+            from src.onnx_embedding import load_checked_encoder
+            
+            return load_checked_encoder(
+                Config.EMBEDDING_MODEL_NAME,
+                os.path.join(Config.EMBEDDING_ONNX_DIR, model_fingerprint(Config.EMBEDDING_MODEL_NAME, self.dimension)),
+                quantize=Config.EMBEDDING_ONNX_QUANTIZE,
+                threads=Config.EMBEDDING_ONNX_THREADS,
+                min_cosine=Config.EMBEDDING_ONNX_MIN_COSINE
+            )
+        except Exception as e:
+            print(f"⚠️  ONNX 推理后端不可用，回退到 PyTorch: {e}")
+            return None
+    
+    @property
+    def variant(self) -> str:
+        """推理后端变体（PyTorch 为空字符串，ONNX 为 'onnx-int8' / 'onnx-fp32'）"""
+        if self.backend != 'onnx':
+            return ''
+        return 'onnx-int8' if Config.EMBEDDING_ONNX_QUANTIZE else 'onnx-fp32'
+    
+    def warm_up(self) -> 'EmbeddingService':
+        """加载模型并编码一条短文本（首次推理的初始化开销在预热时完成）"""
+        self.encode("warmup", use_cache=False)
+        return self
+    
+    @property
+    def cache(self) -> Optional[EmbeddingCache]:
+        """按内容哈希的 embedding 缓存（未启用时为 None；第一次使用时按模型指纹打开）"""
+        if not Config.EMBEDDING_CACHE_ENABLED:
+            return None
+        if self._cache is None:
+            with self._cache_lock:
+                if self._cache is None:
+                    self._cache = EmbeddingCache(
+                        Config.EMBEDDING_CACHE_DIR,
+                        model_fingerprint(Config.EMBEDDING_MODEL_NAME, self.dimension, variant=self.variant),
+                        self.dimension,
+                        max_bytes=Config.EMBEDDING_CACHE_MAX_BYTES,
+                        disk_dtype=Config.EMBEDDING_CACHE_DTYPE
+                    )
+        return self._cache
+    
+    def cache_stats(self) -> Optional[Dict[str, Any]]:
+        """embedding 缓存的命中 / 未命中计数（未启用时返回 None）"""
+        return self.cache.stats() if self.cache is not None else None
+    
+    @property
+    def batcher(self) -> Optional[MicroBatcher]:
+        """合并并发单条编码请求的微批处理器（未启用时为 None）"""
+        if not Config.EMBEDDING_MICRO_BATCH:
+            return None
+        if self._batcher is None:
+            with self._cache_lock:
+                if self._batcher is None:
+                    self._batcher = MicroBatcher(
+                        lambda texts: self._encode(texts, Config.EMBEDDING_BATCH_MAX_SIZE),
+                        max_batch_size=Config.EMBEDDING_BATCH_MAX_SIZE,
+                        max_wait=Config.EMBEDDING_BATCH_MAX_WAIT_MS / 1000,
+                        max_queue=Config.EMBEDDING_BATCH_MAX_QUEUE,
+                        name='embedding-batcher'
+                    )
+        return self._batcher
+    
+    def batch_stats(self) -> Optional[Dict[str, Any]]:
+        """微批处理的队列深度 / 批大小 / 排队等待时间直方图（未启用时返回 None）"""
+        return self.batcher.stats() if self.batcher is not None else None
+    
+    def padding_stats(self) -> Dict[str, Any]:
+        """长度分桶编码的填充统计（efficiency = 真实 token 数 / 填充后 token 数）"""
+        return {
+            'enabled': Config.EMBEDDING_LENGTH_BUCKETING,
+            'token_budget': Config.EMBEDDING_TOKEN_BUDGET,
+            'real_tokens': self._real_tokens,
+            'padded_tokens': self._padded_tokens,
+            'efficiency': self._real_tokens / self._padded_tokens if self._padded_tokens else None,
+        }
+    
+    def encode(self, texts: Union[str, List[str]], batch_size: int = 32,
+               use_cache: bool = True) -> np.ndarray:
         """
-        将文本转换为向量
+        将文本转换为向量（命中缓存的文本不再经过模型；只有一条需要编码时与其他并发请求合并成批）
         
         Args:
             texts: 单个文本或文本列表
-            batch_size: 批处理大小
+            batch_size: 批处理大小（启用长度分桶时批大小由 token 预算决定）
+            use_cache: 是否使用 embedding 缓存
             
         Returns:
             嵌入向量，形状为 (n_samples, embedding_dim)
         """
-        if self.model is None:
-            self.load_model()
-        
         # 转换为列表格式
         if isinstance(texts, str):
             texts = [texts]
         
+        cache = self.cache if use_cache else None
+        if cache is None:
+            return self._encode_pending(texts, batch_size)
+        
+        vectors, missing = cache.get_many(texts)
+        if missing:
+            # 同一批次中重复的文本只编码一次
+            pending = list(dict.fromkeys(texts[i] for i in missing))
+            embeddings = self._encode_pending(pending, batch_size)
+            # 加载模型时可能回退了后端（缓存随之切换），只写入与当前后端一致的缓存
+            if embeddings.shape[1] == cache.dimension and self.cache is cache:
+                cache.put_many(pending, embeddings)
+            computed = dict(zip(pending, embeddings))
+            for i in missing:
+                vectors[i] = computed[texts[i]]
+        
+        if not vectors:
+            return np.empty((0, self.dimension), dtype=np.float32)
+        return np.stack(vectors)
+    
+    def _encode_pending(self, texts: List[str], batch_size: int) -> np.ndarray:
+        """编码缓存未命中的文本：单条文本交给微批处理器，多条文本按长度分桶后调用模型"""
+        if len(texts) > 1:
+            if Config.EMBEDDING_LENGTH_BUCKETING:
+                return self._encode_bucketed(texts)
+            return self._encode(texts, batch_size)
+        batcher = self.batcher
+        future = batcher.submit(texts[0]) if batcher is not None else None
+        if future is None:
+            return self._encode(texts, batch_size)
+        return future.result()[None, :]
+    
+    def token_lengths(self, texts: List[str]) -> np.ndarray:
+        """每条文本的 token 长度（含特殊 token，按模型最大长度截断）"""
+        if self.model is None:
+            self.load_model()
+        if hasattr(self.model, 'token_lengths'):
+            return self.model.token_lengths(texts)  # ONNX 后端
+        encoded = self.model.tokenizer(list(texts), add_special_tokens=True, truncation=True,
+                                       max_length=self.model.max_seq_length)
+        return np.fromiter((len(ids) for ids in encoded['input_ids']), dtype=np.int64, count=len(texts))
+    
+    def _encode_bucketed(self, texts: List[str]) -> np.ndarray:
+        """按 token 长度排序分批（每批填充后 token 数不超过预算），结果按输入顺序返回"""
+        lengths = self.token_lengths(texts)
+        embeddings = None
+        for batch in plan_batches(lengths, Config.EMBEDDING_TOKEN_BUDGET, Config.EMBEDDING_BUCKET_MAX_BATCH):
+            vectors = self._encode([texts[i] for i in batch], len(batch))
+            if embeddings is None:
+                embeddings = np.empty((len(texts), vectors.shape[1]), dtype=np.float32)
+            embeddings[batch] = vectors
+            self._real_tokens += int(lengths[batch].sum())
+            self._padded_tokens += int(lengths[batch[0]]) * len(batch)
+        return embeddings
+    
+    def _encode(self, texts: List[str], batch_size: int) -> np.ndarray:
+        """调用模型编码（不经过缓存）"""
+        if self.model is None:
+            self.load_model()
+        
         # 生成 embeddings
         embeddings = self.model.encode(
             texts,
@@ -56,24 +212,20 @@ class EmbeddingService:
         
         return embeddings
     
-    def encode_documents(self, documents: List[str], batch_size: int = 32) -> List[List[float]]:
+    def encode_documents(self, documents: List[str], batch_size: int = 32) -> np.ndarray:
         """
-        编码文档列表为 ChromaDB 格式
+        编码文档列表（按长度分桶，结果顺序与输入一致）
         
         Args:
             documents: 文档列表
-            batch_size: 批处理大小
+            batch_size: 批处理大小（未启用长度分桶时使用）
             
         Returns:
-            嵌入向量列表
+            float32 向量矩阵，形状为 (len(documents), embedding_dim)，可直接写入 ChromaDB
         """
-        embeddings = self.encode(documents, batch_size)
-        
-        # 转换为列表格式
-        embedding_list = [emb.tolist() for emb in embeddings]
-        
-        return embedding_list
+        return np.asarray(self.encode(documents, batch_size), dtype=np.float32)
 
 
-# 创建全局实例
+# 创建全局实例（模型在预热或第一次编码时加载）
 embedding_service = EmbeddingService()
+warmup.register('embedding', embedding_service.warm_up)
@@ -0,0 +1,255 @@
+"""
+Embedding 缓存 - 按内容哈希缓存文本向量（内存 LRU + 只追加的内存映射文件）
+
+    键      文本的 SHA-1；存储按模型指纹分目录（模型名、模型目录文件的大小和修改时间、
+            向量维度），换模型后自动使用新的存储，旧向量不会被误用
+    一级    进程内 LRU，按向量占用字节数限制
+    二级    <cache_dir>/<模型指纹>/vectors.<类型>.bin：定长记录（20 字节键 + 向量）只追加写入，
+            以 np.memmap 读取；每次写入是一次 append，多个进程可以共用同一个文件：
+            追加在文件锁内进行，先把中断写入留下的不完整尾部截断到整条记录，
+            读取时忽略正在写入的尾部
+
+向量以 float32 返回；磁盘存储可选 float16（占用减半，余弦相似度误差约 1e-3）。
+"""
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from src.index_store import file_lock
+
+
+KEY_BYTES = 20  # SHA-1
+
+
+def model_fingerprint(model_name: str, dimension: int, normalize: bool = True, variant: str = '') -> str:
+    """
+    模型指纹：模型名 + 模型目录下文件的大小和修改时间 + 维度 + 是否归一化 + 推理后端
+
+    Args:
+        model_name: 模型名或本地模型目录
+        dimension: 向量维度
+        normalize: 是否归一化
+        variant: 推理后端变体（如 'onnx-int8'；PyTorch 后端为空字符串）
+
+    Returns:
+        16 位十六进制指纹
+    """
+    digest = hashlib.sha1()
+    digest.update(f"{model_name}\0{dimension}\0{int(normalize)}".encode('utf-8'))
+    if variant:
+        digest.update(f"\0{variant}".encode('utf-8'))
+    if os.path.isdir(model_name):
+        for root, _, files in sorted(os.walk(model_name)):
+            for name in sorted(files):
+                stat = os.stat(os.path.join(root, name))
+                relative = os.path.relpath(os.path.join(root, name), model_name)
+                digest.update(f"\0{relative}\0{stat.st_size}\0{int(stat.st_mtime)}".encode('utf-8'))
+    return digest.hexdigest()[:16]
+
+
+def content_key(text: str) -> bytes:
+    """文本的内容哈希（20 字节）"""
+    return hashlib.sha1(text.encode('utf-8')).digest()
+
+
+class EmbeddingCache:
+    """按内容哈希缓存 embedding（内存 LRU + 只追加的内存映射文件）"""
+
+    def __init__(self, cache_dir: Optional[str], fingerprint: str, dimension: int,
+                 max_bytes: int = 32 * 1024 * 1024, disk_dtype: str = 'float32'):
+        """
+        初始化缓存
+
+        Args:
+            cache_dir: 缓存根目录（None 或空字符串表示只使用内存缓存）
+            fingerprint: 模型指纹（见 model_fingerprint）
+            dimension: 向量维度
+            max_bytes: 内存 LRU 的最大字节数
+            disk_dtype: 磁盘存储的数据类型（'float32' 或 'float16'）
+        """
+        self.fingerprint = fingerprint
+        self.dimension = dimension
+        self.max_bytes = max_bytes
+        self.disk_dtype = np.dtype(disk_dtype)
+        self.record_dtype = np.dtype([('key', np.uint8, (KEY_BYTES,)), ('vector', self.disk_dtype, (dimension,))])
+
+        self._lock = threading.Lock()
+        self._memory: 'OrderedDict[bytes, np.ndarray]' = OrderedDict()
+        self._bytes = 0
+
+        # 磁盘存储：键 -> 行号，以及已映射的记录
+        self.path = None
+        self._rows: Dict[bytes, int] = {}
+        self._records = None
+        self._indexed_size = 0
+
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        if cache_dir:
+            try:
+                self._open(os.path.join(cache_dir, fingerprint))
+            except (OSError, ValueError) as e:
+                print(f"⚠️  Embedding 持久化缓存不可用，只使用内存缓存: {e}")
+                self.path = None
+
+    def _open(self, directory: str):
+        os.makedirs(directory, exist_ok=True)
+        meta_path = os.path.join(directory, 'meta.json')
+        meta = {'fingerprint': self.fingerprint, 'dimension': self.dimension}
+        if os.path.exists(meta_path):
+            with open(meta_path, 'r', encoding='utf-8') as f:
+                existing = json.load(f)
+            if existing != meta:
+                raise ValueError(f"缓存目录格式不一致: {existing}")
+        else:
+            with open(meta_path, 'w', encoding='utf-8') as f:
+                json.dump(meta, f)
+        self.path = os.path.join(directory, f'vectors.{self.disk_dtype.name}.bin')
+        if not os.path.exists(self.path):
+            open(self.path, 'ab').close()
+        self._refresh()
+
+    def _refresh(self):
+        """索引文件中新增的记录（包括其他进程追加的；调用方持有锁或在初始化时调用）"""
+        size = os.path.getsize(self.path)
+        rows = size // self.record_dtype.itemsize
+        if rows * self.record_dtype.itemsize <= self._indexed_size:
+            return
+        self._records = np.memmap(self.path, dtype=self.record_dtype, mode='r', shape=(rows,))
+        start = self._indexed_size // self.record_dtype.itemsize
+        for row, key in enumerate(self._records['key'][start:], start=start):
+            self._rows.setdefault(key.tobytes(), row)
+        self._indexed_size = rows * self.record_dtype.itemsize
+
+    # ------------------------------------------------------------------
+    # 读写
+    # ------------------------------------------------------------------
+
+    def _remember(self, key: bytes, vector: np.ndarray):
+        """写入内存 LRU（调用方持有锁）"""
+        if key in self._memory:
+            self._memory.move_to_end(key)
+            return
+        self._memory[key] = vector
+        self._bytes += vector.nbytes
+        while self._bytes > self.max_bytes and self._memory:
+            _, evicted = self._memory.popitem(last=False)
+            self._bytes -= evicted.nbytes
+            self.evictions += 1
+
+    def get_many(self, texts: Sequence[str]) -> Tuple[List[Optional[np.ndarray]], List[int]]:
+        """
+        批量读取
+
+        Args:
+            texts: 文本列表
+
+        Returns:
+            (每个文本的向量，未命中为 None；未命中的下标列表)
+        """
+        keys = [content_key(text) for text in texts]
+        vectors: List[Optional[np.ndarray]] = [None] * len(texts)
+        missing = []
+        with self._lock:
+            refreshed = False
+            for i, key in enumerate(keys):
+                vector = self._memory.get(key)
+                if vector is not None:
+                    self._memory.move_to_end(key)
+                    self.memory_hits += 1
+                    vectors[i] = vector
+                    continue
+                if self.path is not None:
+                    row = self._rows.get(key)
+                    if row is None and not refreshed:
+                        self._refresh()
+                        refreshed = True
+                        row = self._rows.get(key)
+                    if row is not None:
+                        vector = np.array(self._records['vector'][row], dtype=np.float32)
+                        self._remember(key, vector)
+                        self.disk_hits += 1
+                        vectors[i] = vector
+                        continue
+                self.misses += 1
+                missing.append(i)
+        return vectors, missing
+
+    def put_many(self, texts: Sequence[str], vectors: np.ndarray):
+        """
+        批量写入（磁盘上已有的键不重复追加）
+
+        Args:
+            texts: 文本列表
+            vectors: 形状为 (len(texts), dimension) 的向量
+        """
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if vectors.ndim != 2 or vectors.shape[1] != self.dimension:
+            raise ValueError(f"向量维度不一致: {vectors.shape}，需要 {self.dimension}")
+
+        records, pending = [], set()
+        with self._lock:
+            for text, vector in zip(texts, vectors):
+                key = content_key(text)
+                self._remember(key, vector.copy())
+                if self.path is not None and key not in self._rows and key not in pending:
+                    pending.add(key)
+                    records.append((key, vector))
+            if records:
+                self._append(records)
+
+    def _append(self, records: List[Tuple[bytes, np.ndarray]]):
+        """追加记录到磁盘文件（调用方持有锁）"""
+        block = np.empty(len(records), dtype=self.record_dtype)
+        block['key'] = np.frombuffer(b''.join(key for key, _ in records), dtype=np.uint8).reshape(-1, KEY_BYTES)
+        block['vector'] = np.stack([vector for _, vector in records]).astype(self.disk_dtype)
+        try:
+            # 整批记录一次 append 写入；行号由 _refresh 按文件内容确定（其他进程可能同时追加）
+            with file_lock(self.path), open(self.path, 'ab') as f:
+                # 持有锁时不会有其他进程正在写入：不完整的尾部是中断的写入，不截断会使之后的记录全部错位
+                size = os.fstat(f.fileno()).st_size
+                torn = size % self.record_dtype.itemsize
+                if torn:
+                    print(f"⚠️  Embedding 持久化缓存尾部有不完整的记录，已截断 {torn} 字节")
+                    f.truncate(size - torn)
+                f.write(block.tobytes())
+            self._refresh()
+        except OSError as e:
+            print(f"⚠️  Embedding 持久化缓存写入失败: {e}")
+
+    def clear_memory(self):
+        """清空内存 LRU（磁盘存储保留）"""
+        with self._lock:
+            self._memory.clear()
+            self._bytes = 0
+
+    # ------------------------------------------------------------------
+    # 状态
+    # ------------------------------------------------------------------
+
+    def stats(self) -> Dict:
+        """命中 / 未命中 / 淘汰计数"""
+        with self._lock:
+            lookups = self.memory_hits + self.disk_hits + self.misses
+            return {
+                'fingerprint': self.fingerprint,
+                'memory_entries': len(self._memory),
+                'memory_bytes': self._bytes,
+                'max_bytes': self.max_bytes,
+                'memory_hits': self.memory_hits,
+                'disk_hits': self.disk_hits,
+                'misses': self.misses,
+                'hit_rate': (self.memory_hits + self.disk_hits) / lookups if lookups else 0.0,
+                'evictions': self.evictions,
+                'persistent': self.path is not None,
+                'disk_entries': len(self._rows) if self.path is not None else 0,
+                'disk_dtype': self.disk_dtype.name,
+            }
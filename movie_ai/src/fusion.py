@@ -0,0 +1,228 @@
+"""
+融合模块 - 基于阈值算法的多路检索结果融合
+
+每一路检索是一个按分数降序、可逐步加深的流（RankedStream）。融合时每轮只拉取
+各路的前 depth 条，维护每个文档融合分数的下界（已见到的贡献之和）和上界
+（再加上各路当前末位分数对应的最大可能贡献）。当第 k 名的下界不小于
+其余文档的上界、也不小于未见文档的阈值时，top-k 集合已确定，提前停止拉取；
+否则 depth 翻倍继续拉取，直到达到上限或各路都已取尽。
+
+加深阶段不做随机访问（Fagin NRA，停止条件与 TA 相同地由各路末位分数构成的阈值决定）。
+停止后 top-k 集合已确定，但尚未在某一路出现的文档只有分数下界；此时补全这些文档
+缺失的贡献后按精确的融合分数排序：weighted 方式对提供 lookup 的流按文档 ID 随机读取
+分数；rrf 方式（贡献取决于名次）或没有 lookup 的流继续加深这些流，直到 top-k 文档
+都已出现或该路取尽 / 达到深度上限。
+
+融合方式：
+    weighted  各路分数除以该路最高分（最小值固定为 0，保证随深度增加归一化不变），
+              向量检索权重 alpha，BM25 权重 1 - alpha
+    rrf       倒数排名融合：weight / (rrf_k + rank)
+"""
+from typing import Any, Callable, Dict, List, Optional
+
+FUSION_METHODS = ('weighted', 'rrf')
+
+
+class RankedStream:
+    """按分数降序排列、可加深的检索结果流"""
+
+    def __init__(self, name: str, weight: float, fetch: Callable[[int], List[Dict[str, Any]]],
+                 lookup: Optional[Callable[[List[str]], Dict[str, float]]] = None):
+        """
+        初始化检索流
+
+        Args:
+            name: 检索路名称（'vector' / 'bm25'）
+            weight: 融合权重
+            fetch: fetch(depth) -> 前 depth 条结果（每项至少包含 'id' 和 'score'）
+            lookup: lookup(文档 ID 列表) -> {文档 ID: 这一路的分数}（不会出现在这一路的文档不返回，可选）
+        """
+        self.name = name
+        self.weight = weight
+        self.fetch = fetch
+        self.lookup = lookup
+        self.items: List[Dict[str, Any]] = []
+        self.depth = 0
+        self.exhausted = False
+        self.stalled = False  # 加深失败（超时等），无法再拉取
+
+    def extend(self, depth: int):
+        """拉取前 depth 条结果（返回不足 depth 条说明已取尽）"""
+        self.set_items(self.fetch(depth), depth)
+
+    def set_items(self, items: List[Dict[str, Any]], depth: int):
+        """设置已拉取的结果"""
+        self.items = items
+        self.depth = depth
+        self.exhausted = len(items) < depth
+
+    @property
+    def can_extend(self) -> bool:
+        return not self.exhausted and not self.stalled
+
+    def missing(self, doc_ids: List[str]) -> List[str]:
+        """给定文档中尚未在这一路出现的（这一路已取尽时为空：未出现即没有贡献）"""
+        if self.exhausted:
+            return []
+        seen = {item['id'] for item in self.items}
+        return [doc_id for doc_id in doc_ids if doc_id not in seen]
+
+    def contribution(self, rank: int, method: str, rrf_k: int) -> float:
+        """第 rank 名（从 0 开始）对融合分数的贡献"""
+        if method == 'rrf':
+            return self.weight / (rrf_k + rank + 1)
+        top_score = self.items[0]['score'] if self.items else 0.0
+        if top_score <= 0:
+            return 0.0
+        return self.weight * max(self.items[rank]['score'], 0.0) / top_score
+
+    def bound(self, method: str, rrf_k: int) -> float:
+        """尚未拉取到的文档在这一路上的最大可能贡献"""
+        if self.exhausted:
+            # 取尽后未出现的文档在这一路上没有贡献
+            return 0.0
+        if not self.items:
+            return self.weight / (rrf_k + 1) if method == 'rrf' else self.weight
+        if method == 'rrf':
+            return self.weight / (rrf_k + len(self.items) + 1)
+        return self.contribution(len(self.items) - 1, method, rrf_k)
+
+
+def threshold_fusion(streams: List[RankedStream], top_k: int, method: str = 'weighted',
+                     rrf_k: int = 60, max_depth: int = 100,
+                     deepen: Optional[Callable[[List[RankedStream], int], None]] = None) -> Dict[str, Any]:
+    """
+    阈值算法融合
+
+    Args:
+        streams: 已完成首轮拉取的检索流
+        top_k: 融合后返回数量
+        method: 融合方式 ('weighted' / 'rrf')
+        rrf_k: RRF 常数
+        max_depth: 每一路最多拉取的条数
+        deepen: deepen(streams, depth) 加深给定的检索流（可并行执行，失败的流应标记 stalled）；
+                默认依次调用 stream.extend
+
+    Returns:
+        {'results': 融合结果列表（每项附带 fused_score，按精确的融合分数降序）,
+         'stats': {'method', 'depth', 'rounds', 'final', 'lookups', 'fetched'}}
+    """
+    if method not in FUSION_METHODS:
+        raise ValueError(f"不支持的融合方式: {method}")
+    if deepen is None:
+        def deepen(targets, depth):
+            for stream in targets:
+                stream.extend(depth)
+
+    rounds = 1
+    while True:
+        ranked, final = _fuse_once(streams, top_k, method, rrf_k)
+        growable = [s for s in streams if s.can_extend and s.depth < max_depth]
+        if final or not growable:
+            break
+        depth = min(max(s.depth for s in growable) * 2, max_depth)
+        deepen(growable, depth)
+        rounds += 1
+
+    # top-k 集合已确定：补全缺失的贡献，按精确的融合分数排序
+    results, rounds, lookups = _exact_top_k(streams, ranked, top_k, method, rrf_k, max_depth, deepen, rounds)
+
+    return {
+        'results': results,
+        'stats': {
+            'method': method,
+            'depth': max((s.depth for s in streams), default=0),
+            'rounds': rounds,
+            'final': final,
+            'lookups': lookups,
+            'fetched': {s.name: len(s.items) for s in streams}
+        }
+    }
+
+
+def _exact_top_k(streams: List[RankedStream], ranked: List[Dict[str, Any]], top_k: int, method: str,
+                 rrf_k: int, max_depth: int, deepen: Callable[[List[RankedStream], int], None], rounds: int):
+    """
+    补全 top-k 文档在尚未出现的各路上的贡献
+
+    rrf 方式或没有 lookup 的流继续加深（top-k 集合不变，只是下界变为精确值）；
+    weighted 方式对有 lookup 的流按文档 ID 读取分数。停滞的流无法补全，保留下界。
+
+    Returns:
+        (按融合分数降序的 top-k 结果, 加深后的轮数, 随机读取的文档数)
+    """
+    def needs_deepening(stream, doc_ids):
+        return ((method == 'rrf' or stream.lookup is None) and stream.can_extend
+                and stream.depth < max_depth and stream.missing(doc_ids))
+
+    top_ids = [item['id'] for item in ranked[:top_k]]
+    while True:
+        pending = [s for s in streams if needs_deepening(s, top_ids)]
+        if not pending:
+            break
+        deepen(pending, min(max(s.depth for s in pending) * 2, max_depth))
+        rounds += 1
+        ranked, _ = _fuse_once(streams, top_k, method, rrf_k)
+        ranked = [item for item in ranked if item['id'] in top_ids]
+
+    results = ranked[:top_k]
+    lookups = 0
+    if method == 'weighted':
+        by_id = {item['id']: item for item in results}
+        for stream in streams:
+            if stream.lookup is None or stream.stalled or not stream.items or stream.items[0]['score'] <= 0:
+                continue
+            missing = stream.missing(top_ids)
+            if not missing:
+                continue
+            lookups += len(missing)
+            top_score = stream.items[0]['score']
+            for doc_id, score in stream.lookup(missing).items():
+                by_id[doc_id]['fused_score'] += stream.weight * max(score, 0.0) / top_score
+        results.sort(key=lambda item: item['fused_score'], reverse=True)
+    return results, rounds, lookups
+
+
+def _fuse_once(streams: List[RankedStream], top_k: int, method: str, rrf_k: int):
+    """
+    基于当前已拉取的前缀计算融合结果
+
+    Returns:
+        (按融合分数下界降序的结果列表, top-k 是否已确定)
+    """
+    lower: Dict[str, float] = {}
+    seen_in: Dict[str, set] = {}
+    best: Dict[str, Any] = {}  # 文档 -> (贡献最大的一路的结果项, 贡献)
+
+    for stream in streams:
+        for rank, item in enumerate(stream.items):
+            doc_id = item['id']
+            if stream.name in seen_in.get(doc_id, ()):
+                continue
+            contribution = stream.contribution(rank, method, rrf_k)
+            lower[doc_id] = lower.get(doc_id, 0.0) + contribution
+            seen_in.setdefault(doc_id, set()).add(stream.name)
+            if doc_id not in best or contribution > best[doc_id][1]:
+                best[doc_id] = (item, contribution)
+
+    bounds = {stream.name: stream.bound(method, rrf_k) for stream in streams}
+    unseen_threshold = sum(bounds.values())
+    upper = {
+        doc_id: score + sum(b for name, b in bounds.items() if name not in seen_in[doc_id])
+        for doc_id, score in lower.items()
+    }
+
+    order = sorted(lower, key=lambda doc_id: lower[doc_id], reverse=True)
+    results = []
+    for doc_id in order:
+        item = dict(best[doc_id][0])
+        item['fused_score'] = lower[doc_id]
+        results.append(item)
+
+    if len(order) < top_k:
+        final = unseen_threshold == 0
+    else:
+        kth = lower[order[top_k - 1]]
+        rest_upper = max((upper[doc_id] for doc_id in order[top_k:]), default=0.0)
+        final = kth >= max(rest_upper, unseen_threshold)
+    return results, final
@@ -0,0 +1,318 @@
+"""
+流式导入 - 增量读取数据文件，embedding 与 ChromaDB 写入流水线重叠，内存占用与数据集大小无关
+
+    读取    iter_records 逐条读取记录：JSON Lines（每行 {"id", "document", "metadata"}），
+            或列式 JSON（{"ids": [...], "documents": [...], "metadatas": [...]}，三个数组各用一个游标增量解析）
+    跳过    每批先按 ID 读取集合中已有的文档和元数据，内容未变的记录不再编码和写入
+    重叠    主线程编码第 N+1 批时，写入线程 upsert 第 N 批；两者之间是容量有限的队列，
+            在途批次数固定，总耗时约为 max(编码, 写入) 而不是两者之和
+    断点    每批写入完成后记录已处理的记录数（按数据文件的路径、大小和修改时间区分）；
+            中断后重新运行从断点继续，全部完成后删除断点文件
+"""
+import json
+import os
+import queue
+import threading
+import time
+from itertools import islice, zip_longest
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+
+Record = Tuple[str, str, Dict[str, Any]]  # (ID, 文档, 元数据)
+
+_MISSING = object()
+
+
+class _JsonReader:
+    """按块读取 JSON 文件并逐个解析值（只保留当前块和当前值）"""
+
+    def __init__(self, f, chunk_size: int = 1 << 16):
+        self._file = f
+        self._chunk_size = chunk_size
+        self._decoder = json.JSONDecoder()
+        self._buf = ''
+        self._pos = 0
+        self._eof = False
+
+    def _fill(self) -> bool:
+        if self._eof:
+            return False
+        data = self._file.read(self._chunk_size)
+        if not data:
+            self._eof = True
+            return False
+        self._buf = self._buf[self._pos:] + data
+        self._pos = 0
+        return True
+
+    def peek(self) -> str:
+        """跳过空白，返回下一个字符（文件结束时返回空字符串）"""
+        while True:
+            while self._pos < len(self._buf) and self._buf[self._pos] in ' \t\r\n':
+                self._pos += 1
+            if self._pos < len(self._buf):
+                return self._buf[self._pos]
+            if not self._fill():
+                return ''
+
+    def expect(self, char: str):
+        if self.peek() != char:
+            raise ValueError(f"JSON 格式错误：需要 {char!r}，实际为 {self.peek()!r}")
+        self._pos += 1
+
+    def value(self) -> Any:
+        """解析一个完整的值（值跨越块边界时继续读取）"""
+        self.peek()
+        while True:
+            try:
+                value, end = self._decoder.raw_decode(self._buf, self._pos)
+                # 数字可能恰好在块末尾被截断，读到下一块再确认
+                if end < len(self._buf) or self._eof:
+                    self._pos = end
+                    return value
+            except json.JSONDecodeError:
+                if self._eof:
+                    raise
+            self._fill()
+
+    def elements(self) -> Iterator[Any]:
+        """逐个读取数组元素"""
+        self.expect('[')
+        if self.peek() == ']':
+            self._pos += 1
+            return
+        while True:
+            yield self.value()
+            char = self.peek()
+            self._pos += 1
+            if char == ']':
+                return
+            if char != ',':
+                raise ValueError(f"JSON 格式错误：数组元素之间需要 ','，实际为 {char!r}")
+
+
+def iter_json_array(path: str, key: str, chunk_size: int = 1 << 16) -> Iterator[Any]:
+    """
+    增量读取 JSON 对象文件中某个顶层数组的元素（其他键的值逐个元素解析后丢弃）
+
+    Args:
+        path: JSON 文件路径
+        key: 顶层键
+        chunk_size: 每次读取的字符数
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        reader = _JsonReader(f, chunk_size)
+        reader.expect('{')
+        while reader.peek() not in ('}', ''):
+            name = reader.value()
+            reader.expect(':')
+            if name == key:
+                yield from reader.elements()
+                return
+            if reader.peek() == '[':
+                for _ in reader.elements():
+                    pass
+            else:
+                reader.value()
+            if reader.peek() == ',':
+                reader.expect(',')
+    raise ValueError(f"数据文件中没有 {key!r} 数组: {path}")
+
+
+def iter_records(path: str) -> Iterator[Record]:
+    """
+    逐条读取数据文件中的记录
+
+    Args:
+        path: .jsonl（每行 {"id", "document", "metadata"}）或列式 .json 文件
+
+    Returns:
+        (ID, 文档, 元数据) 迭代器
+    """
+    if path.endswith('.jsonl'):
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                if line.strip():
+                    record = json.loads(line)
+                    yield str(record['id']), record['document'], record.get('metadata') or {}
+        return
+
+    columns = [iter_json_array(path, key) for key in ('ids', 'documents', 'metadatas')]
+    try:
+        for doc_id, document, metadata in zip_longest(*columns, fillvalue=_MISSING):
+            if doc_id is _MISSING or document is _MISSING or metadata is _MISSING:
+                raise ValueError(f"ids / documents / metadatas 长度不一致: {path}")
+            yield str(doc_id), document, metadata or {}
+    finally:
+        for column in columns:
+            column.close()
+
+
+class ImportCheckpoint:
+    """导入断点：记录数据文件中已写入集合的记录数"""
+
+    def __init__(self, path: str, source: str):
+        """
+        Args:
+            path: 断点文件路径
+            source: 数据文件路径（路径、大小或修改时间变化后断点失效）
+        """
+        self.path = path
+        stat = os.stat(source)
+        self.source = {'path': os.path.abspath(source), 'size': stat.st_size, 'mtime': int(stat.st_mtime)}
+
+    def load(self) -> int:
+        """已完成的记录数（没有断点或数据文件已变化时为 0）"""
+        if not os.path.exists(self.path):
+            return 0
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return 0
+        return int(data.get('done', 0)) if data.get('source') == self.source else 0
+
+    def save(self, done: int):
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'source': self.source, 'done': done}, f)
+        os.replace(tmp_path, self.path)
+
+    def clear(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+def _batched(records: Iterable[Record], size: int) -> Iterator[List[Record]]:
+    iterator = iter(records)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+_ndarray_supported: Optional[bool] = None
+
+
+def store_embeddings(embeddings):
+    """
+    写入 ChromaDB 的向量：0.5 及以上版本直接接受 float32 ndarray；
+    旧版本只接受列表，在写入线程中整体转换一次（不占用编码线程）
+    """
+    global _ndarray_supported
+    if embeddings is None or isinstance(embeddings, list):
+        return embeddings
+    if _ndarray_supported is None:
+        try:
+            import chromadb
+            _ndarray_supported = tuple(int(part) for part in chromadb.__version__.split('.')[:2]) >= (0, 5)
+        except (ImportError, ValueError):
+            _ndarray_supported = False
+    return embeddings if _ndarray_supported else embeddings.tolist()
+
+
+def changed_records(collection, batch: List[Record]) -> List[Record]:
+    """过滤掉集合中文档和元数据都未变化的记录"""
+    existing = collection.get(ids=[doc_id for doc_id, _, _ in batch], include=['documents', 'metadatas'])
+    known = {
+        doc_id: (document, metadata or {})
+        for doc_id, document, metadata in zip(existing['ids'], existing['documents'], existing['metadatas'])
+    }
+    return [record for record in batch if known.get(record[0]) != (record[1], record[2])]
+
+
+def stream_import(records: Iterable[Record], collection, encode: Callable[[List[str]], Any],
+                  batch_size: int = 256, checkpoint: Optional[ImportCheckpoint] = None,
+                  skip_unchanged: bool = True, queue_batches: int = 2,
+                  progress: Optional[Callable[[Dict[str, Any]], None]] = None) -> Dict[str, Any]:
+    """
+    流式导入：编码与写入重叠，按批 upsert，写入后更新断点
+
+    Args:
+        records: (ID, 文档, 元数据) 迭代器
+        collection: ChromaDB 集合
+        encode: 文档列表 -> float32 向量矩阵（或向量列表）
+        batch_size: 每批记录数
+        checkpoint: 导入断点（None 表示不记录断点、从头导入）
+        skip_unchanged: 是否跳过集合中内容未变的记录
+        queue_batches: 等待写入的最大批次数（在途内存上限）
+        progress: 每批编码完成后的回调（参数为当前统计）
+
+    Returns:
+        统计：read / unchanged / embedded / written / resumed_from / embed_seconds / write_seconds / seconds
+    """
+    start = time.perf_counter()
+    resume_from = checkpoint.load() if checkpoint is not None else 0
+    stats = {
+        'resumed_from': resume_from, 'read': 0, 'unchanged': 0, 'embedded': 0, 'written': 0,
+        'embed_seconds': 0.0, 'write_seconds': 0.0, 'seconds': 0.0,
+    }
+    writes: 'queue.Queue' = queue.Queue(maxsize=queue_batches)
+    errors: List[BaseException] = []
+
+    def writer():
+        while True:
+            item = writes.get()
+            if item is None:
+                return
+            if errors:
+                continue  # 写入失败后只排空队列，断点停在最后一个成功的批次
+            done, batch, embeddings = item
+            try:
+                if batch:
+                    write_start = time.perf_counter()
+                    collection.upsert(
+                        ids=[doc_id for doc_id, _, _ in batch],
+                        documents=[document for _, document, _ in batch],
+                        metadatas=[metadata for _, _, metadata in batch],
+                        embeddings=store_embeddings(embeddings)
+                    )
+                    stats['write_seconds'] += time.perf_counter() - write_start
+                    stats['written'] += len(batch)
+                if checkpoint is not None:
+                    checkpoint.save(done)
+            except BaseException as e:
+                errors.append(e)
+
+    thread = threading.Thread(target=writer, name='chroma-import-writer', daemon=True)
+    thread.start()
+    try:
+        done = 0
+        for batch in _batched(records, batch_size):
+            done += len(batch)
+            if done <= resume_from:
+                continue
+            if done - len(batch) < resume_from:
+                batch = batch[resume_from - (done - len(batch)):]
+            if errors:
+                break
+
+            stats['read'] += len(batch)
+            if skip_unchanged:
+                pending = changed_records(collection, batch)
+                stats['unchanged'] += len(batch) - len(pending)
+                batch = pending
+
+            embeddings = None
+            if batch:
+                embed_start = time.perf_counter()
+                embeddings = encode([document for _, document, _ in batch])
+                stats['embed_seconds'] += time.perf_counter() - embed_start
+                stats['embedded'] += len(batch)
+
+            # 队列满时在这里等待写入线程，在途批次数保持不变
+            writes.put((done, batch, embeddings))
+            if progress is not None:
+                progress(dict(stats, done=done))
+    finally:
+        writes.put(None)
+        thread.join()
+
+    if errors:
+        raise errors[0]
+    if checkpoint is not None:
+        checkpoint.clear()
+    stats['seconds'] = time.perf_counter() - start
+    return stats
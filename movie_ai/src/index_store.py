@@ -0,0 +1,315 @@
+"""
+索引目录通用格式 - 版本化目录 + 内存映射数组
+
+目录结构：
+    <index_dir>/
+        CURRENT                 当前生效的版本目录名（原子替换）
+        v-<build_id>/
+            header.json         格式名、格式版本、每个文件的大小和 CRC32（最后写入）
+            <array>.npy         各个数组
+
+新版本写完 header.json 后才切换 CURRENT；读取方会拒绝缺失文件、大小不符、
+校验和不符或格式版本不一致的索引。BM25 索引和向量索引共用这一格式。
+
+多个进程共用同一个索引目录：切换 CURRENT 和清理旧版本在 <index_dir>/LOCK 文件锁内进行；
+旧版本在被替换后保留 VERSION_RETENTION 秒，其他进程在此期间切换到新版本。
+"""
+import json
+import os
+import shutil
+import time
+import uuid
+import zlib
+from collections.abc import Sequence
+from contextlib import contextmanager
+from typing import Dict, Iterable, Tuple
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows：不支持 flock，退化为不加锁
+    fcntl = None
+
+
+HEADER_FILE = 'header.json'
+CURRENT_FILE = 'CURRENT'
+LOCK_FILE = 'LOCK'
+VERSION_RETENTION = 600  # 旧版本被替换后至少保留的秒数（其他进程可能仍在映射）
+
+
+class IndexFormatError(ValueError):
+    """索引文件缺失、损坏或已过期"""
+
+
+class StringTable(Sequence):
+    """只读字符串表：offsets[i]:offsets[i+1] 为第 i 个字符串的 UTF-8 字节"""
+
+    def __init__(self, offsets: np.ndarray, data: np.ndarray):
+        self.offsets = offsets
+        self.data = data
+
+    @classmethod
+    def encode(cls, strings: Iterable[str]) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        将字符串列表编码为 (offsets, data) 数组
+
+        Returns:
+            (int64 偏移数组, uint8 字节数组)
+        """
+        encoded = [s.encode('utf-8') for s in strings]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(e) for e in encoded], out=offsets[1:])
+        data = np.frombuffer(b''.join(encoded), dtype=np.uint8)
+        return offsets, data
+
+    @classmethod
+    def from_arrays(cls, arrays: Dict[str, np.ndarray], name: str) -> 'StringTable':
+        """从 <name>.offsets / <name>.data 两个数组构造"""
+        return cls(arrays[f"{name}.offsets"], arrays[f"{name}.data"])
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError(i)
+        start, end = self.offsets[i], self.offsets[i + 1]
+        return self.data[start:end].tobytes().decode('utf-8')
+
+
+def string_table_arrays(name: str, strings: Iterable[str]) -> Dict[str, np.ndarray]:
+    """将字符串表编码为 {<name>.offsets, <name>.data} 两个数组"""
+    offsets, data = StringTable.encode(strings)
+    return {f"{name}.offsets": offsets, f"{name}.data": data}
+
+
+@contextmanager
+def file_lock(path: str, blocking: bool = True):
+    """
+    跨进程排他锁（flock；文件不存在时创建，进程退出时自动释放）
+
+    同一进程内不可嵌套获取同一个锁（flock 按打开的文件加锁，嵌套会互相等待）。
+
+    Args:
+        path: 用作锁的文件路径
+        blocking: 锁被占用时是否等待
+
+    Yields:
+        是否获得了锁（blocking=True 时总是 True）
+    """
+    with open(path, 'a') as f:
+        acquired = True
+        if fcntl is not None:
+            try:
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                acquired = False
+        try:
+            yield acquired
+        finally:
+            if fcntl is not None and acquired:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+
+def file_crc32(path: str, chunk_size: int = 1 << 20) -> int:
+    """计算文件的 CRC32"""
+    crc = 0
+    with open(path, 'rb') as f:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            crc = zlib.crc32(chunk, crc)
+    return crc
+
+
+def _header_checksum(header: Dict) -> int:
+    """header 自身的校验和（不含 checksum 字段）"""
+    body = {key: value for key, value in header.items() if key != 'checksum'}
+    return zlib.crc32(json.dumps(body, sort_keys=True, ensure_ascii=False).encode('utf-8'))
+
+
+def write_version(index_dir: str, format_name: str, format_version: int,
+                  arrays: Dict[str, np.ndarray], header: Dict, expected_current: str = None) -> str:
+    """
+    将数组写入新的版本目录，并原子切换 CURRENT
+
+    Args:
+        index_dir: 索引根目录
+        format_name: 格式名
+        format_version: 格式版本
+        arrays: {名称: 数组}
+        header: 额外写入 header 的字段（统计量、参数等）
+        expected_current: 期望的当前版本目录名（提供时，CURRENT 已被其他进程切换则放弃写入）
+
+    Returns:
+        新版本目录路径
+
+    Raises:
+        IndexFormatError: CURRENT 不是 expected_current
+    """
+    build_id = f"{time.strftime('%Y%m%dT%H%M%S')}-{uuid.uuid4().hex[:8]}"
+    version = f"v-{build_id}"
+    version_dir = os.path.join(index_dir, version)
+    os.makedirs(version_dir)
+
+    # 数组文件先落盘再写 header：启动时默认只校验大小，未落盘的数组（大小正确但内容为 0）无法被发现
+    files = {}
+    for name, array in arrays.items():
+        path = os.path.join(version_dir, f"{name}.npy")
+        with open(path, 'wb') as f:
+            np.save(f, array)
+            f.flush()
+            os.fsync(f.fileno())
+        files[name] = {
+            'size': os.path.getsize(path),
+            'crc32': file_crc32(path),
+        }
+
+    header = {
+        'format': format_name,
+        'format_version': format_version,
+        'build_id': build_id,
+        'created_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        **header,
+        'files': files,
+    }
+    header['checksum'] = _header_checksum(header)
+
+    # header 最后写入：没有 header 的目录视为未写完
+    header_tmp = os.path.join(version_dir, HEADER_FILE + '.tmp')
+    with open(header_tmp, 'w', encoding='utf-8') as f:
+        json.dump(header, f, ensure_ascii=False, indent=2)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(header_tmp, os.path.join(version_dir, HEADER_FILE))
+    fsync_dir(version_dir)
+
+    # 原子切换 CURRENT（文件锁内：比较当前版本、切换和清理旧版本在多个进程间串行）
+    with file_lock(os.path.join(index_dir, LOCK_FILE)):
+        previous = _read_current(index_dir)
+        if expected_current is not None and previous != expected_current:
+            shutil.rmtree(version_dir, ignore_errors=True)
+            raise IndexFormatError(f"索引已被其他进程更新: {previous}（期望 {expected_current}）")
+
+        current_tmp = os.path.join(index_dir, f"{CURRENT_FILE}.{uuid.uuid4().hex[:8]}.tmp")
+        with open(current_tmp, 'w', encoding='utf-8') as f:
+            f.write(version)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(current_tmp, os.path.join(index_dir, CURRENT_FILE))
+        fsync_dir(index_dir)
+
+        _cleanup_versions(index_dir, keep={version, previous})
+    return version_dir
+
+
+def fsync_dir(path: str):
+    """目录落盘（保证其中新建 / 替换的文件名在断电后仍然存在；Windows 不支持，跳过）"""
+    if os.name == 'nt':
+        return
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def _read_current(index_dir: str) -> str:
+    """读取 CURRENT 指向的版本目录名，不存在时返回空字符串"""
+    path = os.path.join(index_dir, CURRENT_FILE)
+    if not os.path.exists(path):
+        return ''
+    with open(path, 'r', encoding='utf-8') as f:
+        return f.read().strip()
+
+
+def current_version(index_dir: str) -> str:
+    """CURRENT 指向的版本目录名（其他进程切换版本后据此重新加载；不存在时返回空字符串）"""
+    return _read_current(index_dir)
+
+
+def _cleanup_versions(index_dir: str, keep: set, retention: float = VERSION_RETENTION):
+    """
+    删除旧版本目录（调用方持有 LOCK）
+
+    保留 keep 中的版本，以及被替换不足 retention 秒的版本：其他进程在同步间隔内才会切换到新版本。
+    版本被替换的时间取下一个版本 header 的写入时间。
+    """
+    versions = sorted(
+        (os.path.getmtime(os.path.join(index_dir, name)), name) for name in os.listdir(index_dir)
+        if name.startswith('v-') and os.path.isdir(os.path.join(index_dir, name))
+    )
+    now = time.time()
+    for (_, name), (_, successor) in zip(versions, versions[1:]):
+        if name in keep:
+            continue
+        successor_header = os.path.join(index_dir, successor, HEADER_FILE)
+        replaced_at = os.path.getmtime(successor_header) if os.path.exists(successor_header) else now
+        if now - replaced_at >= retention:
+            shutil.rmtree(os.path.join(index_dir, name), ignore_errors=True)
+
+
+def index_exists(index_dir: str) -> bool:
+    """索引根目录下是否存在已发布的版本"""
+    return bool(_read_current(index_dir))
+
+
+def read_header(index_dir: str, format_name: str, format_version: int) -> Dict:
+    """
+    读取并校验当前版本的 header
+
+    Raises:
+        IndexFormatError: 索引不存在、未写完、格式不兼容或 header 损坏
+    """
+    version = _read_current(index_dir)
+    if not version:
+        raise IndexFormatError(f"索引不存在: {index_dir}")
+
+    header_path = os.path.join(index_dir, version, HEADER_FILE)
+    if not os.path.exists(header_path):
+        raise IndexFormatError(f"索引未写完（缺少 header）: {version}")
+
+    try:
+        with open(header_path, 'r', encoding='utf-8') as f:
+            header = json.load(f)
+    except (OSError, json.JSONDecodeError) as e:
+        raise IndexFormatError(f"索引 header 读取失败: {e}")
+
+    if header.get('format') != format_name or header.get('format_version') != format_version:
+        raise IndexFormatError(
+            f"索引格式不兼容: {header.get('format')} v{header.get('format_version')}"
+            f"（需要 {format_name} v{format_version}）"
+        )
+    if header.get('checksum') != _header_checksum(header):
+        raise IndexFormatError("索引 header 校验和不一致")
+
+    header['path'] = os.path.join(index_dir, version)
+    return header
+
+
+def load_arrays(header: Dict, verify: bool = True) -> Dict[str, np.ndarray]:
+    """
+    以内存映射方式打开 header 中登记的全部数组
+
+    Args:
+        header: read_header 返回的 header
+        verify: 是否校验每个文件的 CRC32（会顺序读取全部文件）
+
+    Raises:
+        IndexFormatError: 文件缺失、大小不符或校验和不一致
+    """
+    arrays = {}
+    for name, meta in header['files'].items():
+        path = os.path.join(header['path'], f"{name}.npy")
+        if not os.path.exists(path) or os.path.getsize(path) != meta['size']:
+            raise IndexFormatError(f"索引文件缺失或大小不符: {name}")
+        if verify and file_crc32(path) != meta['crc32']:
+            raise IndexFormatError(f"索引文件校验和不一致: {name}")
+        arrays[name] = np.load(path, mmap_mode='r')
+    return arrays
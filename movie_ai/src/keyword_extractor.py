@@ -0,0 +1,402 @@
+"""
+本地电影关键词提取 - 代替每次 BM25 检索都调用 LLM 提取关键词
+
+    类型词表    提取提示词中的类型映射表（爱情片 -> Romance 等）及常见别名
+    片名/导演   加载索引时从集合元数据构建的词典（片名去掉年份和别名，"X, The" 还原为 "The X"）
+
+两者编译为一个 Aho-Corasick 自动机，一次扫描查询即可找出全部命中（最左最长、不重叠；
+英文词要求词边界）。只有一个都没有命中时才回退到 LLM：回退在独立的小线程池中执行，
+排队数和等待时间都有上限，超出时直接使用原查询，检索不会被 LLM 拖慢。
+"""
+import json
+import os
+import re
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from src.config import Config
+from src.result_cache import normalize_query
+
+
+# LLM 回退失败（排队已满 / 超时 / 出错）时使用原查询的来源标记：结果是临时降级的，调用方不应缓存
+DEGRADED_SOURCES = frozenset({'rejected', 'timeout', 'error'})
+
+# 类型映射表（同时用于 LLM 提取提示词，保持两种提取方式一致）
+GENRE_TABLE = [
+    ('爱情片/浪漫片', 'Romance'),
+    ('科幻片', 'Sci-Fi'),
+    ('动作片', 'Action'),
+    ('喜剧片', 'Comedy'),
+    ('恐怖片', 'Horror'),
+    ('惊悚片', 'Thriller'),
+    ('剧情片', 'Drama'),
+    ('动画片', 'Animation'),
+    ('冒险片', 'Adventure'),
+    ('犯罪片', 'Crime'),
+    ('战争片', 'War'),
+    ('奇幻片', 'Fantasy'),
+    ('音乐片', 'Musical'),
+    ('悬疑片', 'Mystery'),
+    ('西部片', 'Western'),
+    ('儿童片', "Children's"),
+    ('纪录片', 'Documentary'),
+    ('黑色电影', 'Film-Noir'),
+]
+
+# 本地匹配额外使用的别名（LLM 能理解，但映射表中没有列出的说法）
+GENRE_ALIASES = {
+    'Romance': ['爱情', '浪漫', '言情', 'romantic'],
+    'Sci-Fi': ['科幻', 'scifi', 'science fiction'],
+    'Action': ['动作'],
+    'Comedy': ['喜剧', '搞笑'],
+    'Horror': ['恐怖', '鬼片'],
+    'Thriller': ['惊悚'],
+    'Drama': ['剧情'],
+    'Animation': ['动画', '卡通', '动漫', 'animated'],
+    'Adventure': ['冒险'],
+    'Crime': ['犯罪'],
+    'War': ['战争'],
+    'Fantasy': ['奇幻', '魔幻'],
+    'Musical': ['音乐剧', '歌舞片'],
+    'Mystery': ['悬疑', '推理'],
+    'Western': ['西部'],
+    "Children's": ['儿童', '少儿', 'children', 'kids'],
+    'Documentary': ['纪录', '记录片'],
+    'Film-Noir': ['黑色电影', 'film noir', 'noir'],
+}
+
+_TRAILING_PARENS = re.compile(r'\s*\([^()]*\)\s*$')
+_ARTICLE_SUFFIX = re.compile(r'^(.*), (the|a|an|les|la|le|il|das|der|die|el)$', re.IGNORECASE)
+
+MIN_ASCII_PATTERN = 4  # 英文片名 / 导演名的最短长度（过滤 "Big"、"Ran" 这类常见词）
+
+
+def genre_prompt_table() -> str:
+    """LLM 提取提示词中的类型映射表"""
+    return "\n".join(f"   - {names} -> {genre}" for names, genre in GENRE_TABLE)
+
+
+def clean_title(title: str) -> str:
+    """
+    片名规范化：去掉末尾的年份 / 别名括号，"Shawshank Redemption, The" -> "The Shawshank Redemption"
+    """
+    title = str(title or '').strip()
+    while True:
+        stripped = _TRAILING_PARENS.sub('', title)
+        if stripped == title or not stripped:
+            break
+        title = stripped
+    match = _ARTICLE_SUFFIX.match(title)
+    if match:
+        title = f"{match.group(2)} {match.group(1)}"
+    return title
+
+
+def _is_word_char(char: str) -> bool:
+    return char.isascii() and char.isalnum()
+
+
+class KeywordMatcher:
+    """Aho-Corasick 多模式匹配（模式与查询都经过 normalize_query）"""
+
+    def __init__(self, patterns: Dict[str, str]):
+        """
+        构建自动机
+
+        Args:
+            patterns: {模式: 关键词}，模式命中时输出对应关键词
+        """
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._output: List[Optional[Tuple[int, str]]] = [None]  # (模式长度, 关键词)
+        self._output_link: List[int] = [0]  # 沿失败链最近的有输出的状态（0 表示没有）
+
+        for pattern, keyword in patterns.items():
+            pattern = normalize_query(pattern)
+            if not pattern:
+                continue
+            state = 0
+            for char in pattern:
+                nxt = self._goto[state].get(char)
+                if nxt is None:
+                    nxt = len(self._goto)
+                    self._goto[state][char] = nxt
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._output.append(None)
+                    self._output_link.append(0)
+                state = nxt
+            self._output[state] = (len(pattern), keyword)
+
+        # 广度优先计算失败链接
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, nxt in self._goto[state].items():
+                queue.append(nxt)
+                fail = self._fail[state]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                target = self._goto[fail].get(char, 0)
+                self._fail[nxt] = target if target != nxt else 0
+                self._output_link[nxt] = (
+                    self._fail[nxt] if self._output[self._fail[nxt]] else self._output_link[self._fail[nxt]]
+                )
+
+        self.num_patterns = sum(1 for output in self._output if output)
+
+    def find_all(self, text: str) -> List[Tuple[int, int, str]]:
+        """
+        查找全部命中（可能重叠）
+
+        Returns:
+            [(起始位置, 结束位置, 关键词), ...]
+        """
+        matches = []
+        state = 0
+        for end, char in enumerate(text, start=1):
+            while state and char not in self._goto[state]:
+                state = self._fail[state]
+            state = self._goto[state].get(char, 0)
+            hit = state if self._output[state] else self._output_link[state]
+            while hit:
+                length, keyword = self._output[hit]
+                matches.append((end - length, end, keyword))
+                hit = self._output_link[hit]
+        return matches
+
+    def find(self, text: str) -> List[Tuple[int, int, str]]:
+        """
+        最左最长、不重叠的命中；英文模式两侧必须是词边界
+
+        Returns:
+            [(起始位置, 结束位置, 关键词), ...]，按出现顺序
+        """
+        candidates = []
+        for start, end, keyword in self.find_all(text):
+            if _is_word_char(text[start]) and start > 0 and _is_word_char(text[start - 1]):
+                continue
+            if _is_word_char(text[end - 1]) and end < len(text) and _is_word_char(text[end]):
+                continue
+            candidates.append((start, end, keyword))
+        candidates.sort(key=lambda match: (match[0], match[0] - match[1]))
+
+        selected, covered = [], 0
+        for start, end, keyword in candidates:
+            if start >= covered:
+                selected.append((start, end, keyword))
+                covered = end
+        return selected
+
+
+class KeywordExtractor:
+    """本地关键词提取器（类型词表 + 片名/导演词典，未命中时有限制地回退到 LLM）"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._genre_patterns: Dict[str, str] = {}
+        for names, genre in GENRE_TABLE:
+            for name in names.split('/'):
+                self._genre_patterns[name] = genre
+            self._genre_patterns[genre] = genre
+        for genre, aliases in GENRE_ALIASES.items():
+            for alias in aliases:
+                self._genre_patterns[alias] = genre
+
+        self._gazetteer: Dict[str, str] = {}
+        self._matcher = KeywordMatcher(self._genre_patterns)
+        self._dirty = False
+
+        # LLM 回退：独立线程池 + 排队上限（超出时直接使用原查询）
+        self._llm_executor = ThreadPoolExecutor(
+            max_workers=Config.KEYWORD_LLM_MAX_WORKERS,
+            thread_name_prefix='keyword-llm'
+        )
+        self._llm_slots = threading.BoundedSemaphore(Config.KEYWORD_LLM_MAX_PENDING)
+        self._log_lock = threading.Lock()
+
+        self.queries = 0
+        self.local_hits = 0
+        self.llm_fallbacks = 0
+        self.llm_timeouts = 0
+        self.llm_rejected = 0
+        self.llm_errors = 0
+
+    # ------------------------------------------------------------------
+    # 词典
+    # ------------------------------------------------------------------
+
+    def _add_metadata(self, metadata: Dict[str, Any]):
+        """将一部电影的片名和导演加入词典（调用方持有锁）"""
+        names = []
+        title = clean_title(metadata.get('title'))
+        if title:
+            names.append((title, title))
+            # "The Shawshank Redemption" 也可以只说 "Shawshank Redemption"
+            parts = title.split(' ', 1)
+            if len(parts) == 2 and parts[0].lower() in ('the', 'a', 'an'):
+                names.append((parts[1], title))
+        for key in ('director', 'directors'):
+            value = metadata.get(key)
+            if isinstance(value, str):
+                names.extend((name.strip(), name.strip()) for name in value.split(',') if name.strip())
+
+        for pattern, keyword in names:
+            if pattern.isascii() and len(pattern) < MIN_ASCII_PATTERN:
+                continue
+            self._gazetteer[pattern] = keyword
+        self._dirty = True
+
+    def load_gazetteer(self, metadatas: Iterable[Optional[Dict[str, Any]]]):
+        """从电影元数据构建片名/导演词典（替换已有词典）"""
+        with self._lock:
+            self._gazetteer = {}
+            for metadata in metadatas:
+                self._add_metadata(metadata or {})
+            self._rebuild()
+
+    def load_from_collection(self, collection, page_size: int = 5000):
+        """分页读取集合元数据构建词典"""
+        metadatas = []
+        offset = 0
+        while True:
+            page = collection.get(include=['metadatas'], limit=page_size, offset=offset)
+            if not page['ids']:
+                break
+            metadatas.extend(page['metadatas'])
+            offset += len(page['ids'])
+        self.load_gazetteer(metadatas)
+
+    def add(self, metadata: Dict[str, Any]):
+        """电影库新增 / 更新时加入词典（下次提取时重建自动机）"""
+        with self._lock:
+            self._add_metadata(metadata or {})
+
+    def _rebuild(self):
+        """重建自动机（调用方持有锁）；类型词优先于同名片名"""
+        self._matcher = KeywordMatcher({**self._gazetteer, **self._genre_patterns})
+        self._dirty = False
+
+    # ------------------------------------------------------------------
+    # 提取
+    # ------------------------------------------------------------------
+
+    def extract_local(self, query: str) -> Optional[str]:
+        """
+        只用本地词典提取关键词
+
+        Returns:
+            关键词（空格分隔），没有命中返回 None
+        """
+        with self._lock:
+            if self._dirty:
+                self._rebuild()
+            matcher = self._matcher
+        keywords = list(dict.fromkeys(keyword for _, _, keyword in matcher.find(normalize_query(query))))
+        return " ".join(keywords) if keywords else None
+
+    def extract_movie_keywords(self, query: str) -> str:
+        """
+        提取电影关键词：本地命中直接返回，否则回退到 LLM（受线程数、排队数和时限约束）
+
+        Args:
+            query: 用户查询
+
+        Returns:
+            关键词，用空格隔开
+        """
+        return self.extract_with_source(query)[0]
+
+    def extract_with_source(self, query: str) -> Tuple[str, str]:
+        """
+        提取电影关键词并返回来源
+
+        Returns:
+            (关键词, 来源)：'local' 本地命中，'llm' LLM 提取，'raw' 未启用 LLM 回退时的原查询，
+            或 DEGRADED_SOURCES 中的一个（LLM 回退失败时的原查询）
+        """
+        if not query or not query.strip():
+            return query, 'raw'
+
+        keywords = self.extract_local(query)
+        with self._lock:
+            self.queries += 1
+            if keywords is not None:
+                self.local_hits += 1
+        source = 'local'
+        if keywords is None:
+            if Config.KEYWORD_LLM_FALLBACK:
+                keywords, source = self._llm_fallback(query)
+            else:
+                keywords, source = query, 'raw'
+        self._log_query(query, keywords, source)
+        return keywords, source
+
+    def _llm_fallback(self, query: str) -> Tuple[str, str]:
+        """在 LLM 线程池中提取关键词，超出排队上限、超时或出错时返回原查询（来源为 rejected / timeout / error）"""
+        if not self._llm_slots.acquire(blocking=False):
+            with self._lock:
+                self.llm_rejected += 1
+            return query, 'rejected'
+
+        def call():
+            try:
+                from utils.translator import extract_movie_keywords
+                return extract_movie_keywords(query)
+            finally:
+                self._llm_slots.release()
+
+        with self._lock:
+            self.llm_fallbacks += 1
+        future = self._llm_executor.submit(call)
+        try:
+            return future.result(timeout=Config.KEYWORD_LLM_TIMEOUT) or query, 'llm'
+        except FutureTimeoutError:
+            # 调用继续在后台完成并释放名额，本次检索使用原查询
+            with self._lock:
+                self.llm_timeouts += 1
+            return query, 'timeout'
+        except Exception as e:
+            print(f"⚠️  LLM 关键词提取失败: {e}")
+            with self._lock:
+                self.llm_errors += 1
+            return query, 'error'
+
+    def _log_query(self, query: str, keywords: str, source: str):
+        """记录查询（离线对比工具 scripts/compare_keyword_extractors.py 的输入）"""
+        if not Config.KEYWORD_QUERY_LOG:
+            return
+        line = json.dumps({'query': query, 'keywords': keywords, 'source': source}, ensure_ascii=False)
+        try:
+            with self._log_lock:
+                os.makedirs(os.path.dirname(Config.KEYWORD_QUERY_LOG), exist_ok=True)
+                with open(Config.KEYWORD_QUERY_LOG, 'a', encoding='utf-8') as f:
+                    f.write(line + "\n")
+        except OSError as e:
+            print(f"⚠️  查询日志写入失败: {e}")
+
+    # ------------------------------------------------------------------
+    # 状态
+    # ------------------------------------------------------------------
+
+    def stats(self) -> Dict[str, Any]:
+        """本地命中率和 LLM 回退计数"""
+        with self._lock:
+            return {
+                'extractor': Config.KEYWORD_EXTRACTOR,
+                'queries': self.queries,
+                'local_hits': self.local_hits,
+                'hit_rate': self.local_hits / self.queries if self.queries else 0.0,
+                'llm_fallbacks': self.llm_fallbacks,
+                'llm_timeouts': self.llm_timeouts,
+                'llm_rejected': self.llm_rejected,
+                'llm_errors': self.llm_errors,
+                'genre_patterns': len(self._genre_patterns),
+                'gazetteer_patterns': len(self._gazetteer),
+            }
+
+
+# 创建全局实例
+keyword_extractor = KeywordExtractor()
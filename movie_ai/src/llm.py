@@ -2,7 +2,6 @@
 LLM 模块 - 通用的 LLM 包装器
 """
 from typing import List, Dict, Iterator
-from openai import OpenAI
 from src.config import Config
 
 
@@ -10,6 +9,8 @@ class QwenLLM:
     """LLM 包装器 - 支持 Qwen 模型"""
     
     def __init__(self):
+        from openai import OpenAI
+
         self.client = OpenAI(
             api_key=Config.QWEN_API_KEY,
             base_url=Config.QWEN_API_URL
@@ -0,0 +1,199 @@
+"""
+两级记忆缓存 - 内存 LRU + SQLite 持久化，并合并同一输入的并发请求
+
+    一级    进程内 LRU（按条目数限制）
+    二级    SQLite 文件（WAL 模式，进程重启后仍然有效；每个条目有 TTL）
+    合并    同一个键已有请求在计算时，后到的请求等待同一个结果，上游只调用一次
+
+值必须是字符串（LLM 的文本结果）；计算函数返回 None 表示失败，不写入缓存。
+"""
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, Optional
+
+
+def memo_key(*parts: Any) -> str:
+    """由若干部分生成缓存键（SHA-256）"""
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(str(part).encode('utf-8'))
+        digest.update(b'\0')
+    return digest.hexdigest()
+
+
+class MemoCache:
+    """内存 LRU + SQLite 两级缓存（带并发请求合并）"""
+
+    def __init__(self, path: Optional[str], max_entries: int = 10000, ttl: float = 30 * 86400):
+        """
+        初始化缓存
+
+        Args:
+            path: SQLite 文件路径（None 或空字符串表示只使用内存缓存）
+            max_entries: 内存 LRU 的最大条目数
+            ttl: 条目有效期（秒）
+        """
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl = ttl
+
+        self._lock = threading.Lock()
+        self._memory: 'OrderedDict[str, str]' = OrderedDict()
+        self._inflight: Dict[str, Future] = {}
+        self._db: Optional[sqlite3.Connection] = None
+        self._db_lock = threading.Lock()
+
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.shared = 0  # 等待其他请求结果的次数
+        self.failures = 0
+
+        if path:
+            try:
+                self._open(path)
+            except sqlite3.Error as e:
+                print(f"⚠️  持久化缓存不可用，只使用内存缓存: {e}")
+                self._db = None
+
+    def _open(self, path: str):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute('PRAGMA synchronous=NORMAL')
+        self._db.execute(
+            'CREATE TABLE IF NOT EXISTS memo ('
+            'key TEXT PRIMARY KEY, value TEXT NOT NULL, created REAL NOT NULL)'
+        )
+        self._db.execute('DELETE FROM memo WHERE created < ?', (time.time() - self.ttl,))
+
+    # ------------------------------------------------------------------
+    # 读写
+    # ------------------------------------------------------------------
+
+    def _remember(self, key: str, value: str):
+        """写入内存 LRU（调用方持有锁）"""
+        self._memory[key] = value
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def _disk_get(self, key: str) -> Optional[str]:
+        if self._db is None:
+            return None
+        try:
+            with self._db_lock:
+                row = self._db.execute(
+                    'SELECT value, created FROM memo WHERE key = ?', (key,)
+                ).fetchone()
+        except sqlite3.Error as e:
+            print(f"⚠️  持久化缓存读取失败: {e}")
+            return None
+        if row is None or row[1] < time.time() - self.ttl:
+            return None
+        return row[0]
+
+    def _disk_put(self, key: str, value: str):
+        if self._db is None:
+            return
+        try:
+            with self._db_lock:
+                self._db.execute(
+                    'INSERT OR REPLACE INTO memo (key, value, created) VALUES (?, ?, ?)',
+                    (key, value, time.time())
+                )
+        except sqlite3.Error as e:
+            print(f"⚠️  持久化缓存写入失败: {e}")
+
+    def get(self, key: str) -> Optional[str]:
+        """依次读取内存和 SQLite，未命中返回 None"""
+        with self._lock:
+            value = self._memory.get(key)
+            if value is not None:
+                self._memory.move_to_end(key)
+                self.memory_hits += 1
+                return value
+        value = self._disk_get(key)
+        if value is not None:
+            with self._lock:
+                self.disk_hits += 1
+                self._remember(key, value)
+        return value
+
+    def put(self, key: str, value: str):
+        """写入两级缓存"""
+        with self._lock:
+            self._remember(key, value)
+        self._disk_put(key, value)
+
+    def get_or_compute(self, key: str, compute: Callable[[], Optional[str]]) -> Optional[str]:
+        """
+        读取缓存，未命中时计算；同一个键的并发请求只计算一次
+
+        Args:
+            key: 缓存键
+            compute: 计算函数（返回 None 表示失败，不缓存）
+
+        Returns:
+            结果，失败返回 None
+        """
+        value = self.get(key)
+        if value is not None:
+            return value
+
+        with self._lock:
+            future = self._inflight.get(key)
+            owner = future is None
+            if owner:
+                future = self._inflight[key] = Future()
+                self.misses += 1
+            else:
+                self.shared += 1
+        if not owner:
+            return future.result()
+
+        try:
+            value = compute()
+        finally:
+            # 计算抛出异常时 value 仍为 None，等待者得到 None
+            if value is not None:
+                self.put(key, value)
+            else:
+                with self._lock:
+                    self.failures += 1
+            with self._lock:
+                self._inflight.pop(key, None)
+            future.set_result(value)
+        return value
+
+    # ------------------------------------------------------------------
+    # 状态
+    # ------------------------------------------------------------------
+
+    def stats(self) -> Dict[str, Any]:
+        """命中 / 未命中 / 合并计数"""
+        with self._lock:
+            lookups = self.memory_hits + self.disk_hits + self.misses + self.shared
+            stats = {
+                'memory_entries': len(self._memory),
+                'max_entries': self.max_entries,
+                'memory_hits': self.memory_hits,
+                'disk_hits': self.disk_hits,
+                'misses': self.misses,
+                'shared': self.shared,
+                'failures': self.failures,
+                'hit_rate': (self.memory_hits + self.disk_hits) / lookups if lookups else 0.0,
+                'persistent': self._db is not None,
+            }
+        if self._db is not None:
+            try:
+                with self._db_lock:
+                    stats['disk_entries'] = self._db.execute('SELECT COUNT(*) FROM memo').fetchone()[0]
+            except sqlite3.Error:
+                stats['disk_entries'] = None
+        return stats
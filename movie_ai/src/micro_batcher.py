@@ -0,0 +1,158 @@
+"""
+动态微批处理 - 合并并发的单条请求，一次批量调用模型
+
+    入队    每个调用方提交一条输入并得到一个 Future；队列满时由调用方自行处理（不排队）
+    合并    后台线程取到第一条输入后，继续收集直到达到最大批大小或等待时间窗口（几毫秒）
+    返回    批量结果按行分发给各调用方的 Future；批量调用异常时所有调用方得到同一个异常
+
+统计队列深度、批大小和排队等待时间的直方图，用于调整批大小和时间窗口。
+"""
+import bisect
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+
+class Histogram:
+    """固定桶边界的直方图（线程安全）"""
+
+    def __init__(self, bounds: Sequence[float]):
+        """
+        Args:
+            bounds: 升序的桶上界（最后一个桶为 +inf）
+        """
+        self.bounds = list(bounds)
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        with self._lock:
+            self.counts[bisect.bisect_left(self.bounds, value)] += 1
+            self.count += 1
+            self.total += value
+            self.max = max(self.max, value)
+
+    def percentile(self, q: float) -> Optional[float]:
+        """按桶上界估计分位数（落在最后一个桶时返回观测到的最大值）"""
+        with self._lock:
+            if not self.count:
+                return None
+            target = q / 100 * self.count
+            seen = 0
+            for i, count in enumerate(self.counts):
+                seen += count
+                if seen >= target and count:
+                    return self.bounds[i] if i < len(self.bounds) else self.max
+            return self.max
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            labels = [f"<={bound:g}" for bound in self.bounds] + [f">{self.bounds[-1]:g}"]
+            return {
+                'buckets': dict(zip(labels, self.counts)),
+                'count': self.count,
+                'mean': self.total / self.count if self.count else 0.0,
+                'max': self.max,
+            }
+
+
+class MicroBatcher:
+    """动态微批处理器"""
+
+    def __init__(self, batch_fn: Callable[[List[Any]], Sequence[Any]], max_batch_size: int = 32,
+                 max_wait: float = 0.002, max_queue: int = 256, name: str = 'micro-batch'):
+        """
+        初始化
+
+        Args:
+            batch_fn: 批量处理函数（输入列表 -> 与之一一对应的结果序列）
+            max_batch_size: 最大批大小
+            max_wait: 第一条输入入队后最多等待的时间（秒）
+            max_queue: 队列容量（满时 submit 返回 None）
+            name: 后台线程名
+        """
+        self.batch_fn = batch_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.name = name
+        self._queue: 'queue.Queue' = queue.Queue(maxsize=max_queue)
+        self._thread: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+
+        self.queue_depth = Histogram([0, 1, 2, 4, 8, 16, 32, 64, 128])
+        self.batch_size = Histogram([1, 2, 4, 8, 16, 32, 64])
+        self.wait_ms = Histogram([0.5, 1, 2, 5, 10, 20, 50, 100])
+        self.rejected = 0
+        self.failed_batches = 0
+
+    def _ensure_started(self):
+        if self._thread is None:
+            with self._start_lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._loop, name=self.name, daemon=True)
+                    self._thread.start()
+
+    def submit(self, item: Any) -> Optional[Future]:
+        """
+        提交一条输入
+
+        Returns:
+            结果的 Future；队列已满时返回 None（调用方应直接处理）
+        """
+        self._ensure_started()
+        future = Future()
+        depth = self._queue.qsize()
+        try:
+            self._queue.put_nowait((item, future, time.perf_counter()))
+        except queue.Full:
+            self.rejected += 1
+            return None
+        self.queue_depth.observe(depth)
+        return future
+
+    def _loop(self):
+        while True:
+            first = self._queue.get()
+            batch = [first]
+            deadline = first[2] + self.max_wait
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - time.perf_counter()
+                try:
+                    batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            self._flush(batch)
+
+    def _flush(self, batch):
+        now = time.perf_counter()
+        self.batch_size.observe(len(batch))
+        for _, _, enqueued in batch:
+            self.wait_ms.observe((now - enqueued) * 1000)
+
+        try:
+            results = self.batch_fn([item for item, _, _ in batch])
+        except Exception as e:
+            self.failed_batches += 1
+            for _, future, _ in batch:
+                future.set_exception(e)
+            return
+        for (_, future, _), result in zip(batch, results):
+            future.set_result(result)
+
+    def stats(self) -> Dict[str, Any]:
+        """队列深度、批大小、排队等待时间的直方图"""
+        return {
+            'max_batch_size': self.max_batch_size,
+            'max_wait_ms': self.max_wait * 1000,
+            'pending': self._queue.qsize(),
+            'rejected': self.rejected,
+            'failed_batches': self.failed_batches,
+            'queue_depth': self.queue_depth.snapshot(),
+            'batch_size': self.batch_size.snapshot(),
+            'wait_ms': dict(self.wait_ms.snapshot(), p50=self.wait_ms.percentile(50), p99=self.wait_ms.percentile(99)),
+        }
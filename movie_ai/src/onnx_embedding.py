@@ -0,0 +1,229 @@
+"""
+ONNX Runtime 推理后端 - 导出 embedding 模型为 ONNX（可选动态 int8 量化），在 CPU 上推理
+
+    导出    由本地 sentence-transformers 模型目录导出 Transformer 部分（动态 batch / 序列长度），
+            池化方式（CLS / mean）读取模型目录的 1_Pooling/config.json，与原模型一致
+    量化    onnxruntime.quantization.quantize_dynamic，权重 int8，激活在推理时动态量化
+    校验    导出后与 PyTorch 后端在样例文本上比较余弦相似度，结果写入 parity.json；
+            未通过校验的导出不会被使用（EmbeddingService 回退到 PyTorch）
+    推理    InferenceSession 按 Config.EMBEDDING_ONNX_THREADS 设置 intra-op 线程数
+
+导出结果按模型指纹缓存在 <onnx_dir>/<指纹>/ 下，只需导出一次。
+依赖 onnx、onnxruntime（导出和校验时还需要 torch / transformers）。
+"""
+import json
+import os
+from typing import Dict, Optional, Sequence
+
+import numpy as np
+
+
+# 校验样例（查询和文档风格的短文本）
+PARITY_SAMPLES = [
+    "我想看科幻电影",
+    "适合周末和家人一起看的动画片",
+    "诺兰导演的悬疑电影",
+    "高分犯罪剧情片推荐",
+    "A young boy discovers he is a wizard and attends a school of magic.",
+    "一部关于太空探索和人类命运的史诗电影，讲述宇航员穿越虫洞寻找新家园的故事。",
+    "romantic comedy",
+    "恐怖 惊悚",
+]
+
+
+def _read_pooling(model_dir: str) -> str:
+    """读取 sentence-transformers 的池化配置（'cls' 或 'mean'，默认 'cls'）"""
+    path = os.path.join(model_dir, '1_Pooling', 'config.json')
+    if not os.path.exists(path):
+        return 'cls'
+    with open(path, 'r', encoding='utf-8') as f:
+        config = json.load(f)
+    return 'mean' if config.get('pooling_mode_mean_tokens') else 'cls'
+
+
+def _read_max_length(model_dir: str, default: int = 512) -> int:
+    """读取 sentence-transformers 的最大序列长度"""
+    path = os.path.join(model_dir, 'sentence_bert_config.json')
+    if not os.path.exists(path):
+        return default
+    with open(path, 'r', encoding='utf-8') as f:
+        return int(json.load(f).get('max_seq_length', default))
+
+
+def export_onnx(model_dir: str, output_dir: str, quantize: bool = True, opset: int = 14) -> Dict[str, str]:
+    """
+    导出 ONNX 模型（已存在时跳过）
+
+    Args:
+        model_dir: 本地 sentence-transformers 模型目录
+        output_dir: 输出目录
+        quantize: 是否同时生成动态 int8 量化模型
+        opset: ONNX opset 版本
+
+    Returns:
+        {'fp32': 路径, 'int8': 路径（quantize 时）}
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    paths = {'fp32': os.path.join(output_dir, 'model.onnx')}
+
+    if not os.path.exists(paths['fp32']):
+        import torch
+        from transformers import AutoModel, AutoTokenizer
+
+        tokenizer = AutoTokenizer.from_pretrained(model_dir)
+        model = AutoModel.from_pretrained(model_dir).eval()
+        sample = tokenizer(["导出样例", "export sample"], padding=True, return_tensors='pt')
+        input_names = [name for name in ('input_ids', 'attention_mask', 'token_type_ids') if name in sample]
+        dynamic_axes = {name: {0: 'batch', 1: 'sequence'} for name in input_names}
+        dynamic_axes['last_hidden_state'] = {0: 'batch', 1: 'sequence'}
+
+        tmp_path = paths['fp32'] + '.tmp'
+        with torch.no_grad():
+            torch.onnx.export(
+                model, tuple(sample[name] for name in input_names), tmp_path,
+                input_names=input_names,
+                output_names=['last_hidden_state'],
+                dynamic_axes=dynamic_axes,
+                opset_version=opset,
+                do_constant_folding=True
+            )
+        # 推理时用 tokenizers 直接读取 tokenizer.json，不依赖 torch / transformers
+        tokenizer.save_pretrained(output_dir)
+        os.replace(tmp_path, paths['fp32'])
+
+    if quantize:
+        paths['int8'] = os.path.join(output_dir, 'model.int8.onnx')
+        if not os.path.exists(paths['int8']):
+            from onnxruntime.quantization import QuantType, quantize_dynamic
+
+            tmp_path = paths['int8'] + '.tmp'
+            quantize_dynamic(paths['fp32'], tmp_path, weight_type=QuantType.QInt8)
+            os.replace(tmp_path, paths['int8'])
+    return paths
+
+
+class OnnxEncoder:
+    """ONNX Runtime 推理的句向量编码器（encode 接口与 SentenceTransformer 兼容）"""
+
+    def __init__(self, model_dir: str, onnx_path: str, threads: int = 0):
+        """
+        Args:
+            model_dir: 原模型目录（读取池化方式和最大长度）
+            onnx_path: ONNX 模型路径（其所在目录保存了分词器 tokenizer.json）
+            threads: intra-op 线程数（0 表示 onnxruntime 默认，即物理核数）
+        """
+        import onnxruntime as ort
+        from tokenizers import Tokenizer
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        options.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+        options.intra_op_num_threads = threads
+        options.inter_op_num_threads = 1
+        self.session = ort.InferenceSession(onnx_path, options, providers=['CPUExecutionProvider'])
+        self.input_names = {item.name for item in self.session.get_inputs()}
+        self.pooling = _read_pooling(model_dir)
+        self.max_length = _read_max_length(model_dir)
+        self.tokenizer = Tokenizer.from_file(os.path.join(os.path.dirname(onnx_path), 'tokenizer.json'))
+        self.tokenizer.enable_truncation(self.max_length)
+        self.tokenizer.enable_padding()
+        self.path = onnx_path
+
+    def token_lengths(self, texts: Sequence[str]) -> np.ndarray:
+        """每条文本的 token 长度（含特殊 token，按最大长度截断）"""
+        encodings = self.tokenizer.encode_batch(list(texts))
+        return np.array([sum(e.attention_mask) for e in encodings], dtype=np.int64)
+    
+    def encode(self, texts: Sequence[str], batch_size: int = 32, normalize_embeddings: bool = True,
+               **kwargs) -> np.ndarray:
+        """
+        编码文本（其余参数为兼容 SentenceTransformer.encode 而忽略）
+
+        Returns:
+            形状为 (len(texts), dim) 的 float32 向量
+        """
+        outputs = []
+        for start in range(0, len(texts), batch_size):
+            batch = list(texts[start:start + batch_size])
+            encodings = self.tokenizer.encode_batch(batch)
+            inputs = {
+                'input_ids': np.array([e.ids for e in encodings], dtype=np.int64),
+                'attention_mask': np.array([e.attention_mask for e in encodings], dtype=np.int64),
+                'token_type_ids': np.array([e.type_ids for e in encodings], dtype=np.int64),
+            }
+            feed = {name: inputs[name] for name in self.input_names}
+            hidden = self.session.run(None, feed)[0]
+            if self.pooling == 'mean':
+                mask = inputs['attention_mask'][..., None].astype(np.float32)
+                pooled = (hidden * mask).sum(axis=1) / np.maximum(mask.sum(axis=1), 1e-9)
+            else:
+                pooled = hidden[:, 0]
+            outputs.append(pooled.astype(np.float32))
+
+        embeddings = np.concatenate(outputs) if outputs else np.empty((0, 0), dtype=np.float32)
+        if normalize_embeddings and len(embeddings):
+            embeddings /= np.maximum(np.linalg.norm(embeddings, axis=1, keepdims=True), 1e-12)
+        return embeddings
+
+
+def cosine_agreement(reference: np.ndarray, candidate: np.ndarray) -> Dict[str, float]:
+    """两组向量逐行的余弦相似度（最小值 / 平均值）"""
+    reference = reference / np.maximum(np.linalg.norm(reference, axis=1, keepdims=True), 1e-12)
+    candidate = candidate / np.maximum(np.linalg.norm(candidate, axis=1, keepdims=True), 1e-12)
+    cosine = (reference * candidate).sum(axis=1)
+    return {'min_cosine': float(cosine.min()), 'mean_cosine': float(cosine.mean())}
+
+
+def parity_check(reference_model, encoder: OnnxEncoder, texts: Sequence[str] = None,
+                 min_cosine: float = 0.99) -> Dict:
+    """
+    与 PyTorch 后端比较余弦相似度
+
+    Args:
+        reference_model: SentenceTransformer 模型
+        encoder: ONNX 编码器
+        texts: 样例文本（默认 PARITY_SAMPLES）
+        min_cosine: 通过校验的最小余弦相似度
+
+    Returns:
+        {'min_cosine', 'mean_cosine', 'threshold', 'passed', 'samples'}
+    """
+    texts = list(texts or PARITY_SAMPLES)
+    reference = reference_model.encode(texts, convert_to_numpy=True, normalize_embeddings=True,
+                                       show_progress_bar=False)
+    result = cosine_agreement(np.asarray(reference, dtype=np.float32), encoder.encode(texts))
+    result.update({'threshold': min_cosine, 'passed': result['min_cosine'] >= min_cosine, 'samples': len(texts)})
+    return result
+
+
+def load_checked_encoder(model_dir: str, output_dir: str, quantize: bool, threads: int = 0,
+                         min_cosine: float = 0.99) -> Optional[OnnxEncoder]:
+    """
+    导出（首次）并加载 ONNX 编码器；首次导出后做一致性校验，结果保存在 parity.json
+
+    Returns:
+        通过校验的编码器；未通过校验时返回 None
+    """
+    paths = export_onnx(model_dir, output_dir, quantize=quantize)
+    variant = 'int8' if quantize else 'fp32'
+    encoder = OnnxEncoder(model_dir, paths[variant], threads=threads)
+
+    report_path = os.path.join(output_dir, 'parity.json')
+    reports = {}
+    if os.path.exists(report_path):
+        with open(report_path, 'r', encoding='utf-8') as f:
+            reports = json.load(f)
+    report = reports.get(variant)
+    if report is None or report.get('threshold') != min_cosine:
+        from sentence_transformers import SentenceTransformer
+
+        report = parity_check(SentenceTransformer(model_dir, device='cpu'), encoder, min_cosine=min_cosine)
+        reports[variant] = report
+        with open(report_path, 'w', encoding='utf-8') as f:
+            json.dump(reports, f, ensure_ascii=False, indent=2)
+
+    if not report['passed']:
+        print(f"⚠️  ONNX ({variant}) 与 PyTorch 的一致性校验未通过: "
+              f"最小余弦 {report['min_cosine']:.4f} < {min_cosine}")
+        return None
+    return encoder
@@ -1,12 +1,20 @@
 """
 RAG 模块 - 简化版：直接调用检索+重排序+LLM
+
+stream_events 按阶段产生事件（retrieval → rerank → llm_chunk ... → complete），
+LLM 内容逐段产生，complete 事件记录首个内容片段的延迟（TTFT）和总耗时。
 """
-from typing import List, Dict, Optional
+import time
+from typing import Iterator, List, Dict, Optional, Tuple
 from src.config import Config
+from src.embeddeding import embedding_service
 from src.llm import QwenLLM
 from src.retriever import retriever
 from src.rerank import reranker
-from utils.response import RAGResponse
+from src.rerank_cascade import rerank_cascade
+from src.response_cache import response_cache
+from src.warmup import warmup
+from utils.response import RAGEvent, RAGResponse
 
 
 class RAGChain:
@@ -18,10 +26,66 @@ class RAGChain:
         self.rerank_top_n = rerank_top_n if rerank_top_n is not None else Config.RERANK_TOP_N
         self.llm = QwenLLM()
 
+    def retrieve(self, query: str) -> Tuple[Dict, List[Dict], bool]:
+        """
+        混合检索 + 重排序
+
+        Returns:
+            (hybrid_search 的结果, 重排序结果, 是否降级)
+            重排序不可用（熔断、超时或失败）时降级为融合检索顺序的前 rerank_top_n 个；
+            启用级联时只把余弦相似度剪枝后的候选交给重排序器，结果中的 id 仍是 combined_results 的下标
+        """
+        search_results = self._search(query)
+        rerank_results, degraded = self._rerank(query, search_results)
+        return search_results, rerank_results, degraded
+
+    def _search(self, query: str) -> Dict:
+        """混合检索（separate=True 格式）"""
+        return retriever.hybrid_search(query, top_k=self.top_k, separate=True)
+
+    def _rerank(self, query: str, search_results: Dict) -> Tuple[List[Dict], bool]:
+        """对融合检索结果重排序，返回 (重排序结果, 是否降级)"""
+        candidates = search_results['combined_results']
+        if not Config.RERANK_CASCADE_ENABLED:
+            return reranker.rerank_candidates(query, candidates, top_n=self.rerank_top_n)
+
+        kept = rerank_cascade.select(
+            search_results.get('query_embedding'), candidates, self.rerank_top_n, retriever.document_embeddings
+        )
+        rerank_results, degraded = reranker.rerank_candidates(
+            query, [candidates[i] for i in kept], top_n=self.rerank_top_n
+        )
+        return [dict(item, id=kept[item['id']]) for item in rerank_results], degraded
+
+    @staticmethod
+    def response_status(search_results: Dict, degraded: bool) -> str:
+        """响应状态：'degraded'（重排序降级）、'partial'（有检索路超时）或 'success'"""
+        if degraded:
+            return 'degraded'
+        return 'partial' if search_results.get('partial') else 'success'
+
+    def _response_cache_key(self, query: str, search_results: Dict, rerank_results: List[Dict],
+                            degraded: bool, use_cache: bool) -> Optional[Tuple]:
+        """
+        语义响应缓存的 (查询 embedding, 重排序后的电影 ID)
+
+        只有完整结果（未降级、没有检索路超时）参与缓存；不使用缓存时返回 None
+        """
+        if response_cache is None or not use_cache or not rerank_results:
+            return None
+        if self.response_status(search_results, degraded) != 'success':
+            return None
+        embedding = search_results.get('query_embedding')
+        if embedding is None:
+            embedding = embedding_service.encode(query)[0]
+        combined_results = search_results['combined_results']
+        movie_ids = [combined_results[item['id']]['metadata'].get('movie_id') for item in rerank_results]
+        return embedding, movie_ids
+
     def get_retrieval_details(self, query: str) -> Dict:
         """获取检索和重排序的详细信息（兼容旧接口）"""
-        # 1. 分别执行向量检索和BM25检索
-        search_results = retriever.hybrid_search(query, top_k=self.top_k, separate=True)
+        # 1. 检索 + 重排序
+        search_results, rerank_results, degraded = self.retrieve(query)
 
         vector_results = search_results['vector_results']
         bm25_results = search_results['bm25_results']
@@ -34,36 +98,41 @@ class RAGChain:
                 'retrieval': [],
                 'rerank': [],
                 'final': [],
-                'recommended_movie_ids': []
+                'recommended_movie_ids': [],
+                'degraded': False
             }
 
-        # 2. 重排序（使用合并后的结果）
-        doc_texts = [doc['document'] for doc in combined_results]
-        rerank_results = reranker.rerank(query=query, documents=doc_texts, top_n=self.rerank_top_n)
-
-        # 3. 使用RAGResponse的静态方法构建详细信息
-        return RAGResponse.build_retrieval_details(
+        # 2. 使用RAGResponse的静态方法构建详细信息
+        details = RAGResponse.build_retrieval_details(
             vector_results, bm25_results, combined_results, rerank_results
         )
+        details['degraded'] = degraded
+        return details
+
+    def get_full_response(self, query: str, use_cache: bool = True) -> RAGResponse:
+        """
+        获取完整的RAG响应（包含所有中间结果）
 
-    def get_full_response(self, query: str) -> RAGResponse:
-        """获取完整的RAG响应（包含所有中间结果）"""
-        # 1. 分别执行向量检索和BM25检索
-        search_results = retriever.hybrid_search(query, top_k=self.top_k, separate=True)
+        Args:
+            query: 查询文本
+            use_cache: 是否使用语义响应缓存（语义相近且推荐电影一致的问题复用之前的回答）
+        """
+        # 1-2. 检索 + 重排序
+        search_results, rerank_results, degraded = self.retrieve(query)
         vector_results = search_results['vector_results']
         bm25_results = search_results['bm25_results']
         combined_results = search_results['combined_results']
 
-        # 2. 重排序
-        rerank_results = []
-        if combined_results:
-            doc_texts = [doc['document'] for doc in combined_results]
-            rerank_results = reranker.rerank(query=query, documents=doc_texts, top_n=self.rerank_top_n)
-
-        # 3. 生成LLM内容
-        context = self._get_context(combined_results, rerank_results)
-        messages = self._build_messages(context, query)
-        llm_content = self.llm.invoke(messages)
+        # 3. 生成LLM内容（命中语义响应缓存时不调用 LLM）
+        cache_key = self._response_cache_key(query, search_results, rerank_results, degraded, use_cache)
+        llm_content = response_cache.get(*cache_key) if cache_key else None
+        cached = llm_content is not None
+        if not cached:
+            context = self._get_context(combined_results, rerank_results)
+            messages = self._build_messages(context, query)
+            llm_content = self.llm.invoke(messages)
+            if cache_key and llm_content:
+                response_cache.put(*cache_key, llm_content)
 
         # 4. 构建响应对象
         return RAGResponse.from_search_results(
@@ -71,41 +140,104 @@ class RAGChain:
             vector_results=vector_results,
             bm25_results=bm25_results,
             rerank_results=rerank_results,
-            llm_content=llm_content
+            llm_content=llm_content,
+            status=self.response_status(search_results, degraded),
+            cached=cached
         )
 
-    def get_full_response_stream(self, query: str) -> RAGResponse:
-        """获取完整的RAG响应（流式生成LLM内容）"""
-        # 1. 分别执行向量检索和BM25检索
-        search_results = retriever.hybrid_search(query, top_k=self.top_k, separate=True)
-        vector_results = search_results['vector_results']
-        bm25_results = search_results['bm25_results']
+    def get_full_response_stream(self, query: str, use_cache: bool = True) -> RAGResponse:
+        """获取完整的RAG响应（流式生成LLM内容，消费 stream_events 直到完成）"""
+        for event in self.stream_events(query, use_cache=use_cache):
+            if event.type == 'complete':
+                return event.response
+
+    def stream_events(self, query: str, use_cache: bool = True) -> Iterator[RAGEvent]:
+        """
+        流式 RAG：每个阶段完成时立即产生事件，LLM 内容逐段产生
+
+        Args:
+            query: 查询文本
+            use_cache: 是否使用语义响应缓存（命中时只产生一个包含完整回答的 llm_chunk）
+
+        Yields:
+            RAGEvent：
+                retrieval   {'partial', 'missing_legs', 'vector_count', 'bm25_count', 'candidate_count', 'elapsed_ms'}
+                rerank      {'degraded', 'rerank_results', 'recommended_movie_ids', 'elapsed_ms'}
+                llm_chunk   {'content'}
+                complete    {'query', 'llm_content', 'status', 'cached', 'recommended_movie_ids',
+                             'ttft_ms', 'total_ms', 'timestamp'}，event.response 为完整的 RAGResponse
+        """
+        start = time.perf_counter()
+
+        def elapsed_ms():
+            return round((time.perf_counter() - start) * 1000, 1)
+
+        # 1. 混合检索
+        search_results = self._search(query)
         combined_results = search_results['combined_results']
+        yield RAGEvent('retrieval', {
+            'partial': search_results['partial'],
+            'missing_legs': search_results.get('missing_legs', []),
+            'vector_count': len(search_results['vector_results']),
+            'bm25_count': len(search_results['bm25_results']),
+            'candidate_count': len(combined_results),
+            'elapsed_ms': elapsed_ms()
+        })
 
-        # 2. 重排序
-        rerank_results = []
-        if combined_results:
-            doc_texts = [doc['document'] for doc in combined_results]
-            rerank_results = reranker.rerank(query=query, documents=doc_texts, top_n=self.rerank_top_n)
-
-        # 3. 生成LLM内容（流式）
-        context = self._get_context(combined_results, rerank_results)
-        messages = self._build_messages(context, query)
-        llm_content = ""
-        for chunk in self.llm.stream(messages):
-            if chunk.choices and len(chunk.choices) > 0:
-                content = chunk.choices[0].delta.content
-                if content:
-                    llm_content += content
+        # 2. 重排序（不可用时降级为融合检索顺序）
+        rerank_results, degraded = self._rerank(query, search_results)
+        recommended_movie_ids = [combined_results[item['id']]['metadata']['movie_id'] for item in rerank_results]
+        yield RAGEvent('rerank', {
+            'degraded': degraded,
+            'rerank_results': rerank_results,
+            'recommended_movie_ids': recommended_movie_ids,
+            'elapsed_ms': elapsed_ms()
+        })
 
-        # 4. 构建响应对象
-        return RAGResponse.from_search_results(
+        # 3. 流式生成 LLM 内容（命中语义响应缓存时一次产生缓存的回答）
+        cache_key = self._response_cache_key(query, search_results, rerank_results, degraded, use_cache)
+        llm_content = response_cache.get(*cache_key) if cache_key else None
+        cached = llm_content is not None
+        ttft_ms = None
+        if cached:
+            ttft_ms = elapsed_ms()
+            yield RAGEvent('llm_chunk', {'content': llm_content})
+        else:
+            context = self._get_context(combined_results, rerank_results)
+            messages = self._build_messages(context, query)
+            parts = []
+            for chunk in self.llm.stream(messages):
+                if chunk.choices and len(chunk.choices) > 0:
+                    content = chunk.choices[0].delta.content
+                    if content:
+                        if ttft_ms is None:
+                            ttft_ms = elapsed_ms()
+                        parts.append(content)
+                        yield RAGEvent('llm_chunk', {'content': content})
+            llm_content = ''.join(parts)
+            if cache_key and llm_content:
+                response_cache.put(*cache_key, llm_content)
+
+        # 4. 完成
+        response = RAGResponse.from_search_results(
             query=query,
-            vector_results=vector_results,
-            bm25_results=bm25_results,
+            vector_results=search_results['vector_results'],
+            bm25_results=search_results['bm25_results'],
             rerank_results=rerank_results,
-            llm_content=llm_content
+            llm_content=llm_content,
+            status=self.response_status(search_results, degraded),
+            cached=cached
         )
+        yield RAGEvent('complete', {
+            'query': query,
+            'llm_content': llm_content,
+            'status': response.status,
+            'cached': cached,
+            'recommended_movie_ids': response.recommended_movie_ids,
+            'ttft_ms': ttft_ms,
+            'total_ms': elapsed_ms(),
+            'timestamp': response.timestamp
+        }, response=response)
 
     def _get_context(self, combined_results: List[Dict], rerank_results: List[Dict]) -> str:
         """检索+重排序，返回格式化的上下文"""
@@ -160,5 +292,5 @@ class RAGChain:
         }
 
 
-# 创建全局实例
-rag_chain = RAGChain()
+# 创建全局实例（第一次使用或预热时初始化）
+rag_chain = warmup.register('rag_chain', RAGChain)
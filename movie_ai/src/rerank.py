@@ -1,21 +1,187 @@
 """
-Rerank 模块 - 使用 Qwen Rerank 模型对检索结果进行重排序
+Rerank 模块 - 对检索结果进行重排序
+
+    dashscope       远程 Qwen Rerank（qwen3-rerank），每次调用一次网络请求
+    cross-encoder   本地 CrossEncoder（如 bge-reranker，经 sentence-transformers 加载），
+                    按批打分，可设置最大序列长度和推理线程数，不依赖网络
+
+后端由 Config.RERANK_BACKEND 选择；两者都返回 [{'id': 文档下标, 'score': 相关性分数}]，按分数从高到低。
+启用分数缓存时，只把未命中缓存的文档交给后端打分，再与缓存的分数合并排序。
+每次后端调用有时限（Config.RERANK_TIMEOUT），连续失败或慢调用后熔断；重排序不可用时
+rerank_candidates 降级为融合检索顺序的前 N 个候选，调用方不必等待上游。
 """
-from typing import List, Dict, Any, Optional
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from typing import List, Dict, Any, Optional, Tuple
 from http import HTTPStatus
-import dashscope
 
+import numpy as np
+
+from src.circuit_breaker import CircuitBreaker
 from src.config import Config
+from src.rerank_cache import RerankScoreCache, score_key
+from src.warmup import warmup
 
 
-class Reranker:
-    """重排序器 - 对检索结果进行精细排序"""
+DEFAULT_INSTRUCT = "Given a web search query, retrieve relevant passages that answer the query."
+
+
+class RerankUnavailable(Exception):
+    """重排序不可用（熔断中、超过时限或后端调用失败）"""
+
+
+class RerankBackend:
+    """重排序后端接口"""
+
+    name = ''
+    signature = ''  # 后端 + 模型（分数缓存键的一部分，换模型后不会命中旧分数）
+
+    def rerank(self, query: str, documents: List[str], top_n: int,
+               instruct: Optional[str] = None) -> List[Dict[str, Any]]:
+        """
+        对文档打分并返回前 top_n 个
+
+        Returns:
+            [{'id': 文档下标, 'score': 分数}]，按分数从高到低；失败时抛出异常
+        """
+        raise NotImplementedError
+
+
+class DashScopeReranker(RerankBackend):
+    """远程 Qwen Rerank"""
+
+    name = 'dashscope'
+
+    def __init__(self, model: str = None):
+        import dashscope
 
-    def __init__(self):
-        """初始化重排序器"""
         # 设置 API Key
         dashscope.api_key = Config.QWEN_API_KEY
-        self.model = "qwen3-rerank"
+        self.model = model or Config.RERANK_MODEL
+        self.signature = f"{self.name}:{self.model}"
+
+    def rerank(self, query: str, documents: List[str], top_n: int,
+               instruct: Optional[str] = None) -> List[Dict[str, Any]]:
+        import dashscope
+
+        resp = dashscope.TextReRank.call(
+            model=self.model,
+            query=query,
+            documents=documents,
+            top_n=min(top_n, len(documents)),
+            return_documents=False,
+            instruct=instruct or DEFAULT_INSTRUCT
+        )
+        if resp.status_code != HTTPStatus.OK:
+            raise RuntimeError(resp.message)
+
+        output = resp.output
+        if not (hasattr(output, 'results') and output.results):
+            return []
+        return [{'id': item.index, 'score': item.relevance_score} for item in output.results]
+
+
+class CrossEncoderReranker(RerankBackend):
+    """本地 CrossEncoder（查询和文档拼接后整体打分）"""
+
+    name = 'cross-encoder'
+
+    def __init__(self, model_name: str = None, max_length: int = None, batch_size: int = None,
+                 threads: int = None, device: str = None):
+        """
+        Args:
+            model_name: 本地模型目录（如 bge-reranker-base）
+            max_length: 查询 + 文档的最大 token 数（超出截断）
+            batch_size: 每批打分的文档数
+            threads: PyTorch CPU 线程数（0 表示默认）
+            device: 'cpu' 或 'cuda'
+        """
+        # 导入 sentence_transformers（含 torch）耗时较长，推迟到创建后端时
+        from sentence_transformers import CrossEncoder
+
+        threads = Config.RERANK_THREADS if threads is None else threads
+        if threads:
+            import torch
+            torch.set_num_threads(threads)
+
+        self.model_name = model_name or Config.RERANK_LOCAL_MODEL
+        self.batch_size = batch_size or Config.RERANK_BATCH_SIZE
+        self.model = CrossEncoder(
+            self.model_name,
+            max_length=max_length or Config.RERANK_MAX_LENGTH,
+            device=device or Config.RERANK_DEVICE
+        )
+        self.signature = f"{self.name}:{self.model_name}:{self.model.max_length}"
+
+    def scores(self, query: str, documents: List[str]) -> np.ndarray:
+        """每个文档与查询的相关性分数"""
+        return np.asarray(self.model.predict(
+            [(query, document) for document in documents],
+            batch_size=self.batch_size,
+            show_progress_bar=False,
+            convert_to_numpy=True
+        ), dtype=np.float32).reshape(-1)
+
+    def rerank(self, query: str, documents: List[str], top_n: int,
+               instruct: Optional[str] = None) -> List[Dict[str, Any]]:
+        scores = self.scores(query, documents)
+        order = np.argsort(-scores, kind='stable')[:top_n]
+        return [{'id': int(i), 'score': float(scores[i])} for i in order]
+
+
+RERANK_BACKENDS = {
+    DashScopeReranker.name: DashScopeReranker,
+    CrossEncoderReranker.name: CrossEncoderReranker,
+}
+
+
+def create_backend(name: str = None) -> RerankBackend:
+    """按名称创建重排序后端（默认 Config.RERANK_BACKEND）"""
+    name = name or Config.RERANK_BACKEND
+    if name not in RERANK_BACKENDS:
+        raise ValueError(f"未知的重排序后端: {name}（可选 {', '.join(RERANK_BACKENDS)}）")
+    return RERANK_BACKENDS[name]()
+
+
+class Reranker:
+    """重排序器 - 对检索结果进行精细排序"""
+
+    def __init__(self, backend: RerankBackend = None):
+        """
+        初始化重排序器
+
+        Args:
+            backend: 重排序后端（默认按 Config.RERANK_BACKEND 创建）
+        """
+        self.backend = backend or create_backend()
+        self.cache = RerankScoreCache(Config.RERANK_CACHE_MAX_BYTES) if Config.RERANK_CACHE_ENABLED else None
+        self.breaker = CircuitBreaker(
+            failure_threshold=Config.RERANK_BREAKER_FAILURES,
+            slow_call=Config.RERANK_SLOW_CALL,
+            reset_timeout=Config.RERANK_BREAKER_RESET
+        )
+        # 后端调用在线程池中执行，超过时限后调用方不再等待（调用在后台完成后丢弃）
+        self._executor = ThreadPoolExecutor(max_workers=Config.RERANK_MAX_WORKERS, thread_name_prefix='rerank')
+        self._lock = threading.Lock()
+        self.timeouts = 0
+        self.failures = 0
+        self.degraded = 0
+
+    def cache_stats(self) -> Optional[Dict[str, Any]]:
+        """分数缓存的命中 / 未命中计数（未启用时返回 None）"""
+        return self.cache.stats() if self.cache is not None else None
+
+    def status(self) -> Dict[str, Any]:
+        """后端、时限、超时 / 失败 / 降级计数和熔断器状态"""
+        with self._lock:
+            counters = {'timeouts': self.timeouts, 'failures': self.failures, 'degraded': self.degraded}
+        return dict(
+            backend=self.backend.name,
+            timeout=Config.RERANK_TIMEOUT,
+            breaker=self.breaker.stats(),
+            **counters
+        )
 
     def rerank(
         self,
@@ -31,48 +197,96 @@ class Reranker:
             query: 查询文本
             documents: 文档列表
             top_n: 返回前 N 个结果
-            instruct: 重排序指令
+            instruct: 重排序指令（仅远程后端使用）
 
         Returns:
-            重排序后的结果列表，只包含 id 和 score
+            重排序后的结果列表，只包含 id 和 score（重排序不可用时为空列表）
         """
         if not documents:
             return []
 
-        # 默认指令
-        if instruct is None:
-            instruct = "Given a web search query, retrieve relevant passages that answer the query."
+        try:
+            return self._score(query, documents, min(top_n, len(documents)), instruct)
+        except RerankUnavailable as e:
+            print(f"❌ Rerank 不可用 ({self.backend.name}): {e}")
+            return []
+
+    def rerank_candidates(self, query: str, candidates: List[Dict[str, Any]], top_n: int = 5,
+                          instruct: Optional[str] = None) -> Tuple[List[Dict[str, Any]], bool]:
+        """
+        对融合检索的候选重排序；重排序不可用时立即降级为候选顺序的前 top_n 个
+
+        Args:
+            query: 查询文本
+            candidates: 融合检索结果（含 document 和 score）
+            top_n: 返回前 N 个结果
 
+        Returns:
+            ([{'id': 候选下标, 'score': 分数}], 是否降级)；降级时分数为检索分数
+        """
+        if not candidates:
+            return [], False
+
+        top_n = min(top_n, len(candidates))
         try:
-            resp = dashscope.TextReRank.call(
-                model=self.model,
-                query=query,
-                documents=documents,
-                top_n=min(top_n, len(documents)),
-                return_documents=False,
-                instruct=instruct
-            )
-
-            if resp.status_code == HTTPStatus.OK:
-                results = []
-                output = resp.output
-
-                if hasattr(output, 'results') and output.results:
-                    for item in output.results:
-                        results.append({
-                            'id': item.index,
-                            'score': item.relevance_score
-                        })
-                return results
-            else:
-                print(f"❌ Rerank 失败: {resp.message}")
-                return []
+            return self._score(query, [doc['document'] for doc in candidates], top_n, instruct), False
+        except RerankUnavailable as e:
+            print(f"⚠️  Rerank 不可用，使用检索顺序 ({self.backend.name}): {e}")
+            with self._lock:
+                self.degraded += 1
+            return [{'id': i, 'score': doc.get('score', 0.0)} for i, doc in enumerate(candidates[:top_n])], True
+
+    def _score(self, query: str, documents: List[str], top_n: int,
+               instruct: Optional[str]) -> List[Dict[str, Any]]:
+        """打分并返回前 top_n 个（经过分数缓存时只对未命中的文档调用后端）"""
+        if self.cache is None:
+            return self._call_backend(query, documents, top_n, instruct)
+        return self._rerank_cached(query, documents, top_n, instruct)
 
+    def _call_backend(self, query: str, documents: List[str], top_n: int,
+                      instruct: Optional[str]) -> List[Dict[str, Any]]:
+        """经过熔断器和时限调用后端，不可用时抛出 RerankUnavailable"""
+        if not self.breaker.allow():
+            raise RerankUnavailable("熔断中")
+
+        start = time.monotonic()
+        future = self._executor.submit(self.backend.rerank, query, documents, top_n, instruct)
+        try:
+            results = future.result(timeout=Config.RERANK_TIMEOUT)
+        except FutureTimeoutError:
+            future.cancel()  # 尚未开始则取消；已在运行的结果将被丢弃
+            with self._lock:
+                self.timeouts += 1
+            self.breaker.record_failure()
+            raise RerankUnavailable(f"超过时限 {Config.RERANK_TIMEOUT}s")
         except Exception as e:
-            print(f"❌ Rerank 调用异常: {e}")
-            return []
+            with self._lock:
+                self.failures += 1
+            self.breaker.record_failure()
+            raise RerankUnavailable(str(e)) from e
+        self.breaker.record_success(time.monotonic() - start)
+        return results
+
+    def _rerank_cached(self, query: str, documents: List[str], top_n: int,
+                       instruct: Optional[str]) -> List[Dict[str, Any]]:
+        """只对未命中缓存的文档调用后端，合并缓存的分数后按调用方的文档下标返回前 top_n 个"""
+        keys = [score_key(self.backend.signature, instruct, query, document) for document in documents]
+        scores, missing = self.cache.get_many(keys)
+        if missing:
+            # 候选中重复的文档只打分一次
+            first = {}
+            for i in missing:
+                first.setdefault(keys[i], i)
+            pending = list(first.values())
+            results = self._call_backend(query, [documents[i] for i in pending], len(pending), instruct)
+            fresh = {keys[pending[item['id']]]: item['score'] for item in results}
+            self.cache.put_many(fresh.items())
+            for i in missing:
+                scores[i] = fresh.get(keys[i])
 
+        ranked = sorted((i for i, score in enumerate(scores) if score is not None), key=lambda i: -scores[i])
+        return [{'id': i, 'score': scores[i]} for i in ranked[:top_n]]
 
-# 创建全局实例
-reranker = Reranker()
 
+# 创建全局实例（第一次使用或预热时初始化）
+reranker = warmup.register('reranker', Reranker)
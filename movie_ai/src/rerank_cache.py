@@ -0,0 +1,110 @@
+"""
+重排序分数缓存 - 按 (规范化查询, 文档内容哈希) 缓存单个文档的相关性分数
+
+    键      SHA-1(后端签名, 指令, 规范化查询, 文档文本)：同一查询和文档在任何候选集合中都能命中；
+            文档文本变化后键随之变化，旧分数不会再被使用，由 LRU 自然淘汰
+    淘汰    LRU，按估算的条目占用字节数限制容量
+    合并    调用方只把未命中的文档交给重排序后端，再与缓存的分数合并排序
+
+同一 (查询, 文档) 的分数是确定的，与候选集合中其他文档无关，可以跨请求复用。
+"""
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from src.result_cache import normalize_query
+
+
+KEY_BYTES = 20  # SHA-1
+ENTRY_BYTES = 160  # 单个条目的估算占用（键、分数和 OrderedDict 节点）
+
+
+def score_key(signature: str, instruct: Optional[str], query: str, document: str) -> bytes:
+    """分数缓存键"""
+    digest = hashlib.sha1()
+    for part in (signature, instruct or '', normalize_query(query), document):
+        digest.update(part.encode('utf-8'))
+        digest.update(b'\0')
+    return digest.digest()
+
+
+class RerankScoreCache:
+    """重排序分数的 LRU 缓存（按字节数限制容量）"""
+
+    def __init__(self, max_bytes: int = 8 * 1024 * 1024):
+        """
+        初始化缓存
+
+        Args:
+            max_bytes: 缓存总字节数上限（按每个条目 ENTRY_BYTES 估算）
+        """
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._scores: 'OrderedDict[bytes, float]' = OrderedDict()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.calls = 0
+        self.full_hits = 0  # 全部文档命中、没有调用后端的次数
+
+    @property
+    def max_entries(self) -> int:
+        return max(1, self.max_bytes // ENTRY_BYTES)
+
+    def get_many(self, keys: List[bytes]) -> Tuple[List[Optional[float]], List[int]]:
+        """
+        批量读取
+
+        Returns:
+            (每个键的分数，未命中为 None；未命中的下标列表)
+        """
+        scores: List[Optional[float]] = [None] * len(keys)
+        missing = []
+        with self._lock:
+            self.calls += 1
+            for i, key in enumerate(keys):
+                score = self._scores.get(key)
+                if score is None:
+                    missing.append(i)
+                    continue
+                self._scores.move_to_end(key)
+                scores[i] = score
+            self.hits += len(keys) - len(missing)
+            self.misses += len(missing)
+            if not missing:
+                self.full_hits += 1
+        return scores, missing
+
+    def put_many(self, items: Iterable[Tuple[bytes, float]]):
+        """批量写入（超过容量时按 LRU 淘汰）"""
+        with self._lock:
+            for key, score in items:
+                self._scores[key] = float(score)
+                self._scores.move_to_end(key)
+            while len(self._scores) > self.max_entries:
+                self._scores.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        """清空缓存"""
+        with self._lock:
+            self._scores.clear()
+
+    def stats(self) -> Dict:
+        """命中 / 未命中 / 淘汰计数（按文档计）"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._scores),
+                'bytes': len(self._scores) * ENTRY_BYTES,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'calls': self.calls,
+                'full_hits': self.full_hits,
+                'full_hit_rate': self.full_hits / self.calls if self.calls else 0.0,
+                'evictions': self.evictions,
+            }
@@ -0,0 +1,132 @@
+"""
+重排序级联 - 在调用重排序模型前用双塔余弦相似度剪枝候选
+
+    打分    查询 embedding（混合检索时已计算）与候选文档已存储的 embedding 一次矩阵乘得到余弦相似度，
+            不再调用 embedding 模型
+    保留    余弦相似度不低于 (最高分 - margin) 的候选，至多 top_m 个、至少 min_keep 个（min_keep 优先）；
+            没有存储 embedding 的候选（如只由 BM25 召回且索引中缺失）总是保留
+    顺序    保留的候选按原融合检索顺序交给重排序器，返回值是原候选下标
+
+候选数不超过 min_candidates 或没有查询 embedding 时不剪枝。
+剪枝对最终 top-N 的影响（与全量重排序相比的 recall@N）用 scripts/evaluate_rerank_cascade.py 评估。
+"""
+import threading
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from src.config import Config
+
+
+def cosine_similarities(query_embedding: np.ndarray, vectors: np.ndarray) -> np.ndarray:
+    """查询与每行向量的余弦相似度（一次矩阵乘）"""
+    query = np.asarray(query_embedding, dtype=np.float32).reshape(-1)
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1) * (np.linalg.norm(query) or 1.0)
+    norms[norms == 0] = 1.0
+    return (vectors @ query) / norms
+
+
+def cascade_keep(similarities: np.ndarray, found: np.ndarray, top_m: int, margin: float,
+                 min_keep: int) -> np.ndarray:
+    """
+    选出交给重排序器的候选
+
+    Args:
+        similarities: 每个候选的余弦相似度
+        found: 每个候选是否有存储的 embedding（没有的总是保留）
+        top_m: 最多保留多少个有 embedding 的候选
+        margin: 保留相似度不低于 (最高分 - margin) 的候选
+        min_keep: 至少保留多少个有 embedding 的候选（优先于 top_m）
+
+    Returns:
+        保留的候选下标（升序，即原融合检索顺序）
+    """
+    scored = np.flatnonzero(found)
+    if len(scored) == 0:
+        return np.arange(len(found))
+
+    order = scored[np.argsort(-similarities[scored], kind='stable')]
+    above = int(np.count_nonzero(similarities[scored] >= similarities[order[0]] - margin))
+    # min_keep 优先于 top_m：2 * top_n 超过 top_m 时仍至少保留 min_keep 个
+    count = min(max(min(above, top_m), min_keep), len(order))
+    keep = np.zeros(len(found), dtype=bool)
+    keep[order[:count]] = True
+    keep[~found] = True
+    return np.flatnonzero(keep)
+
+
+class RerankCascade:
+    """重排序前的余弦相似度剪枝（统计剪枝数量）"""
+
+    def __init__(self, top_m: int = None, margin: float = None, min_candidates: int = None):
+        """
+        初始化级联
+
+        Args:
+            top_m: 最多交给重排序器的候选数（不少于 2 * top_n）
+            margin: 相对最高余弦相似度的保留阈值
+            min_candidates: 候选数不超过该值时不剪枝
+        """
+        self.top_m = top_m or Config.RERANK_CASCADE_TOP_M
+        self.margin = Config.RERANK_CASCADE_MARGIN if margin is None else margin
+        self.min_candidates = Config.RERANK_CASCADE_MIN_CANDIDATES if min_candidates is None else min_candidates
+        self._lock = threading.Lock()
+
+        self.calls = 0
+        self.skipped = 0  # 候选太少或没有查询 embedding 未剪枝的次数
+        self.candidates = 0
+        self.forwarded = 0
+
+    def select(self, query_embedding: Optional[np.ndarray], candidates: List[Dict[str, Any]], top_n: int,
+               fetch_embeddings: Callable[[List[str]], Tuple[np.ndarray, np.ndarray]]) -> List[int]:
+        """
+        选出交给重排序器的候选
+
+        Args:
+            query_embedding: 查询 embedding（None 时不剪枝）
+            candidates: 融合检索结果（含 id）
+            top_n: 重排序后需要的结果数（至少保留 2 * top_n 个候选）
+            fetch_embeddings: 按文档 id 读取已存储的 embedding，返回 (向量, 是否找到)
+
+        Returns:
+            保留的候选下标（原融合检索顺序）
+        """
+        total = len(candidates)
+        if query_embedding is None or total <= self.min_candidates:
+            with self._lock:
+                self.calls += 1
+                self.skipped += 1
+                self.candidates += total
+                self.forwarded += total
+            return list(range(total))
+
+        vectors, found = fetch_embeddings([doc['id'] for doc in candidates])
+        similarities = cosine_similarities(query_embedding, vectors)
+        kept = cascade_keep(similarities, found, self.top_m, self.margin, min_keep=2 * top_n)
+        with self._lock:
+            self.calls += 1
+            self.candidates += total
+            self.forwarded += len(kept)
+        return kept.tolist()
+
+    def stats(self) -> Dict[str, Any]:
+        """剪枝参数和累计剪枝数量"""
+        with self._lock:
+            pruned = self.candidates - self.forwarded
+            return {
+                'enabled': Config.RERANK_CASCADE_ENABLED,
+                'top_m': self.top_m,
+                'margin': self.margin,
+                'min_candidates': self.min_candidates,
+                'calls': self.calls,
+                'skipped': self.skipped,
+                'candidates': self.candidates,
+                'forwarded': self.forwarded,
+                'pruned': pruned,
+                'prune_rate': pruned / self.candidates if self.candidates else 0.0,
+            }
+
+
+# 创建全局实例
+rerank_cascade = RerankCascade()
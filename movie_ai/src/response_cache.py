@@ -0,0 +1,156 @@
+"""
+语义响应缓存 - 措辞不同但语义相近的问题复用之前的 LLM 回答
+
+    查找    查询 embedding 与缓存中所有查询一次矩阵乘得到余弦相似度，按相似度从高到低取
+            不低于 threshold 的条目，且重排序后的电影 ID 与本次完全一致才算命中
+            （同一组电影、同一顺序，回答中推荐的电影与本次检索一致）
+    淘汰    条目有 TTL；条目数超过上限时淘汰最久未使用的条目
+    存储    查询向量放在预分配的矩阵中（按槽位复用），不随条目数重新拼接
+
+相似但电影 ID 不同的查找计为 id_mismatches，用于调整阈值。
+"""
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from src.config import Config
+
+
+class SemanticResponseCache:
+    """按查询语义相似度命中的 LLM 回答缓存（线程安全）"""
+
+    def __init__(self, max_entries: int = 1000, ttl: float = 3600, threshold: float = 0.92,
+                 clock: Callable[[], float] = time.monotonic):
+        """
+        初始化缓存
+
+        Args:
+            max_entries: 最多缓存的回答数
+            ttl: 条目有效期（秒）
+            threshold: 命中所需的最低余弦相似度
+            clock: 时钟函数（便于测试）
+        """
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.threshold = threshold
+        self._clock = clock
+        self._lock = threading.Lock()
+
+        self._vectors: Optional[np.ndarray] = None  # (max_entries, d)，第一次写入时按维度分配
+        self._expires = np.full(max_entries, -np.inf)  # 空槽位为 -inf
+        self._entries: List[Optional[Tuple[Tuple[str, ...], Any]]] = [None] * max_entries
+        self._lru: 'OrderedDict[int, None]' = OrderedDict()  # 已占用的槽位，最久未使用的在前
+
+        self.hits = 0
+        self.misses = 0
+        self.id_mismatches = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    @staticmethod
+    def _normalize(embedding: np.ndarray) -> np.ndarray:
+        vector = np.asarray(embedding, dtype=np.float32).reshape(-1)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _free(self, slot: int):
+        """释放槽位（调用方持有锁）"""
+        self._lru.pop(slot, None)
+        self._entries[slot] = None
+        self._expires[slot] = -np.inf
+
+    def _expire(self, now: float):
+        """释放过期的槽位（调用方持有锁）"""
+        for slot in np.flatnonzero((self._expires <= now) & (self._expires > -np.inf)):
+            self._free(int(slot))
+            self.expirations += 1
+
+    def get(self, embedding: np.ndarray, movie_ids: List[str]) -> Optional[Any]:
+        """
+        查找语义相近且电影 ID 一致的缓存回答
+
+        Args:
+            embedding: 查询 embedding
+            movie_ids: 本次重排序后的电影 ID（按顺序）
+
+        Returns:
+            缓存的值，未命中返回 None
+        """
+        query = self._normalize(embedding)
+        ids = tuple(movie_ids)
+        with self._lock:
+            self._expire(self._clock())
+            if not self._lru or self._vectors is None or self._vectors.shape[1] != len(query):
+                self.misses += 1
+                return None
+
+            slots = np.fromiter(self._lru, dtype=np.int64)
+            similarities = self._vectors[slots] @ query
+            similar = slots[similarities >= self.threshold]
+            order = np.argsort(-similarities[similarities >= self.threshold], kind='stable')
+            for slot in similar[order]:
+                cached_ids, value = self._entries[slot]
+                if cached_ids == ids:
+                    self._lru.move_to_end(int(slot))
+                    self.hits += 1
+                    return value
+            if len(similar):
+                self.id_mismatches += 1
+            self.misses += 1
+            return None
+
+    def put(self, embedding: np.ndarray, movie_ids: List[str], value: Any):
+        """写入回答（条目数超过上限时按 LRU 淘汰）"""
+        query = self._normalize(embedding)
+        with self._lock:
+            now = self._clock()
+            if self._vectors is None or self._vectors.shape[1] != len(query):
+                # 第一次写入或 embedding 维度变化（切换了模型）：重新分配
+                self._vectors = np.zeros((self.max_entries, len(query)), dtype=np.float32)
+                for slot in list(self._lru):
+                    self._free(slot)
+            self._expire(now)
+
+            if len(self._lru) >= self.max_entries:
+                oldest = next(iter(self._lru))
+                self._free(oldest)
+                self.evictions += 1
+            slot = int(np.flatnonzero(self._expires == -np.inf)[0])
+            self._vectors[slot] = query
+            self._entries[slot] = (tuple(movie_ids), value)
+            self._expires[slot] = now + self.ttl
+            self._lru[slot] = None
+
+    def clear(self):
+        """清空缓存"""
+        with self._lock:
+            for slot in list(self._lru):
+                self._free(slot)
+
+    def stats(self) -> Dict[str, Any]:
+        """命中 / 未命中 / ID 不一致 / 淘汰计数"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._lru),
+                'max_entries': self.max_entries,
+                'ttl': self.ttl,
+                'threshold': self.threshold,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'id_mismatches': self.id_mismatches,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+            }
+
+
+# 创建全局实例（所有 RAGChain 共用；未启用时为 None）
+response_cache = SemanticResponseCache(
+    max_entries=Config.RESPONSE_CACHE_MAX_ENTRIES,
+    ttl=Config.RESPONSE_CACHE_TTL,
+    threshold=Config.RESPONSE_CACHE_THRESHOLD
+) if Config.RESPONSE_CACHE_ENABLED else None
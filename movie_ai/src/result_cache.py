@@ -0,0 +1,162 @@
+"""
+检索结果缓存 - 按规范化查询缓存 Retriever 的检索结果
+
+    键        (检索方法, 规范化查询, top_k, 其他参数)
+    淘汰      LRU，总字节数超过上限时淘汰最久未使用的条目；每个条目有 TTL
+    失效      检索时传入当前索引版本（电影库版本、BM25 / 向量索引版本），
+              读取时版本变化则整个缓存清空；写入时版本已不是当前版本（慢请求基于旧索引
+              计算的结果）则不写入，不会把缓存切回旧版本
+
+条目以 pickle 字节保存：既能准确计量占用，命中时返回的也是新对象，
+调用方修改结果不会影响缓存。
+"""
+import pickle
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+
+_WHITESPACE = re.compile(r'\s+')
+
+
+def normalize_query(query: str) -> str:
+    """
+    规范化查询：全角转半角（NFKC）、大小写折叠、合并空白
+
+    例如 "科幻电影 " / "科幻电影" / "ＳＣＩ－ＦＩ" / "sci-fi" 分别得到相同的键
+    """
+    query = unicodedata.normalize('NFKC', query or '')
+    return _WHITESPACE.sub(' ', query).strip().casefold()
+
+
+class ResultCache:
+    """带版本的 LRU + TTL 缓存（按字节数限制容量）"""
+
+    def __init__(self, max_bytes: int, ttl: float, clock: Callable[[], float] = time.monotonic):
+        """
+        初始化缓存
+
+        Args:
+            max_bytes: 缓存条目总字节数上限
+            ttl: 条目有效期（秒）
+            clock: 时钟函数（便于测试）
+        """
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._entries: 'OrderedDict[Hashable, Tuple[bytes, float]]' = OrderedDict()
+        self._bytes = 0
+        self._version: Optional[Hashable] = None
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def _check_version(self, version: Hashable):
+        """版本变化时清空缓存（调用方持有锁）"""
+        if version != self._version:
+            if self._entries:
+                self.invalidations += 1
+            self._entries.clear()
+            self._bytes = 0
+            self._version = version
+
+    def _remove(self, key: Hashable):
+        payload, _ = self._entries.pop(key)
+        self._bytes -= len(payload)
+
+    def get(self, key: Hashable, version: Hashable = None) -> Optional[Any]:
+        """
+        读取缓存
+
+        Args:
+            key: 缓存键
+            version: 当前索引版本
+
+        Returns:
+            缓存的结果（新对象），未命中返回 None
+        """
+        with self._lock:
+            self._check_version(version)
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            payload, expires_at = entry
+            if expires_at <= self._clock():
+                self._remove(key)
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+        return pickle.loads(payload)
+
+    def put(self, key: Hashable, value: Any, version: Hashable = None):
+        """
+        写入缓存（超过容量时按 LRU 淘汰；单个条目超过上限、或 version 不是当前版本时不缓存）
+
+        只有 get 会推进版本：基于旧版本计算的结果直接丢弃
+        """
+        payload = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        if len(payload) > self.max_bytes:
+            return
+        with self._lock:
+            if version != self._version:
+                return
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (payload, self._clock() + self.ttl)
+            self._bytes += len(payload)
+            while self._bytes > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.evictions += 1
+
+    def get_or_compute(self, key: Hashable, compute: Callable[[], Any], version: Hashable = None,
+                       cacheable: Callable[[Any], bool] = None) -> Any:
+        """
+        读取缓存，未命中时计算并写入
+
+        Args:
+            key: 缓存键
+            compute: 计算结果的函数
+            version: 当前索引版本
+            cacheable: 判断结果是否可以缓存（例如部分结果不缓存）
+        """
+        value = self.get(key, version)
+        if value is not None:
+            return value
+        value = compute()
+        if cacheable is None or cacheable(value):
+            self.put(key, value, version)
+        return value
+
+    def clear(self):
+        """清空缓存"""
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        """命中 / 未命中 / 淘汰等计数"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'max_bytes': self.max_bytes,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'invalidations': self.invalidations,
+            }
@@ -1,15 +1,29 @@
 """
 检索模块 - 支持 Vector 检索、BM25 检索和混合检索
 """
-from typing import List, Dict, Any
-import numpy as np
-import pickle
+from typing import List, Dict, Any, Callable, Optional, Tuple, Union
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
 import os
-from rank_bm25 import BM25Okapi
+import threading
+import time
+import numpy as np
 
 from src.embeddeding import embedding_service
-from src.bm25_builder import preprocess_text
+from src.bm25_builder import bm25_builder, preprocess_text, build_search_text, TOKENIZER_SIGNATURE
+from src.bm25_index import BM25Index
+from src.bm25_segments import SegmentedBM25Index
+from src.bm25_store import IndexFormatError, read_header as read_bm25_header
+from src.catalog_log import catalog_log
 from src.config import Config
+from src.doc_store import DocumentStore
+from src.fusion import RankedStream, threshold_fusion
+from src.index_store import current_version, index_exists
+from src.keyword_extractor import DEGRADED_SOURCES, keyword_extractor
+from src.result_cache import ResultCache, normalize_query
+from src.search_filter import FilterIndex, SearchFilter
+from src.vector_builder import apply_catalog_events, collection_space, vector_builder
+from src.vector_index import IVFIndex, read_vector_header
+from src.warmup import warmup
 from utils.translator import extract_movie_keywords
 from scripts.db_connection import db_connection
 
@@ -17,33 +31,97 @@ class Retriever:
     """检索器类 - 只负责检索"""
     
     # 类变量 - 全局缓存（所有实例共享，只加载一次）
-    _bm25_cache = None
+    _bm25_cache = None  # SegmentedBM25Index（基础段 + 增量段）
     _doc_ids_cache = None
     _doc_texts_cache = None
     _cache_loaded = False
     
-    def __init__(self, bm25: BM25Okapi = None, doc_ids: List[str] = None, 
-                 doc_texts: List[str] = None):
+    # 进程内向量索引（Config.VECTOR_BACKEND == 'ivf' 时加载）
+    _vector_index_cache = None
+    _vector_index_loaded = False
+    
+    # 列式文档存储（检索结果补充文档时使用，不可用时回退到 ChromaDB）
+    _doc_store_cache = None
+    _doc_store_loaded = False
+    
+    # 本地关键词提取的片名/导演词典（Config.KEYWORD_EXTRACTOR == 'local' 时加载）
+    _gazetteer_loaded = False
+    
+    # 类型 / 年代 / 评分位图索引（第一次带过滤条件检索时构建）
+    _filter_index_cache = None
+    _filter_index_loaded = False
+    _filter_index_lock = threading.Lock()
+    
+    # 电影库变更日志（所有 worker 进程共用）：本进程已应用到的位置、上次同步时间。
+    # 加载检索结构、应用和同步变更都在 _catalog_lock 内进行，保证各结构与日志位置一致
+    _catalog_lock = threading.RLock()
+    _catalog_position = 0
+    _catalog_started = False
+    _catalog_synced_at = 0.0
+    
+    # 检索结果缓存（所有实例共享；条目以索引版本标记，版本变化时整体失效）
+    _result_cache = ResultCache(Config.RESULT_CACHE_MAX_BYTES, Config.RESULT_CACHE_TTL)
+    
+    # 混合检索各路的并行执行线程池（所有实例共享，线程数有上限）。超过时限的检索路仍在后台
+    # 运行并占用线程，线程数需按 并发请求数 × 2 路 × 2（超时后仍在运行的一轮）估算
+    _executor = ThreadPoolExecutor(
+        max_workers=Config.RETRIEVAL_MAX_WORKERS,
+        thread_name_prefix='retrieval'
+    )
+    # 批量检索的关键词提取使用独立的线程池，不占用在线检索各路的线程
+    _tokenize_executor = ThreadPoolExecutor(
+        max_workers=Config.SEARCH_BATCH_TOKENIZE_WORKERS,
+        thread_name_prefix='batch-tokenize'
+    )
+    _legs_lock = threading.Lock()
+    _legs_queued = 0
+    _legs_running = 0
+    _legs_abandoned = 0  # 超过时限、调用方不再等待但仍在运行的检索路
+    _legs_timeouts = 0
+    
+    def __init__(self, bm25: BM25Index = None, doc_ids: List[str] = None, 
+                 doc_texts: List[str] = None, vector_index: IVFIndex = None):
         """
         初始化检索器
         
         Args:
-            bm25: BM25 模型（用于 BM25 检索）
+            bm25: BM25 倒排索引（用于 BM25 检索，基础段会被包装为分段索引）
             doc_ids: 文档 ID 列表
             doc_texts: 文档文本列表
+            vector_index: 进程内向量索引（不提供时按 Config.VECTOR_BACKEND 加载）
         """
-        # 如果还没有加载全局缓存，则加载一次
-        if not Retriever._cache_loaded and bm25 is None:
-            Retriever._load_bm25_cache()
-        
-        # 使用提供的参数或使用缓存的数据
-        self.bm25 = bm25 or Retriever._bm25_cache
-        self.doc_ids = doc_ids or Retriever._doc_ids_cache or []
-        self.doc_texts = doc_texts or Retriever._doc_texts_cache or []
-        
-        # 连接数据库
-        db_connection.connect()
-        self.collection = db_connection.get_collection()
+        with Retriever._catalog_lock:
+            # 第一次加载时取变更日志末尾作为本进程的起点，各结构加载后重放到该位置
+            if not Retriever._catalog_started:
+                Retriever._catalog_position = catalog_log.end()
+                Retriever._catalog_synced_at = time.monotonic()
+                Retriever._catalog_started = True
+            
+            # 如果还没有加载全局缓存，则加载一次
+            if not Retriever._cache_loaded and bm25 is None:
+                Retriever._load_bm25_cache()
+            
+            # 使用提供的参数或使用缓存的数据
+            self.doc_ids = doc_ids or Retriever._doc_ids_cache or []
+            self.doc_texts = doc_texts or Retriever._doc_texts_cache or []
+            if isinstance(bm25, BM25Index):
+                bm25 = Retriever._segmented(bm25, self.doc_ids, self.doc_texts)
+            self.bm25 = bm25 or Retriever._bm25_cache
+            
+            # 连接数据库
+            db_connection.connect()
+            self.collection = db_connection.get_collection()
+            
+            if vector_index is None and Config.VECTOR_BACKEND == 'ivf':
+                Retriever._load_vector_index(self.collection)
+            self.vector_index = vector_index or Retriever._vector_index_cache
+            
+            if Config.DOC_STORE_ENABLED:
+                Retriever._load_doc_store(self.collection)
+            self.doc_store = Retriever._doc_store_cache
+            
+            if Config.KEYWORD_EXTRACTOR == 'local':
+                Retriever._load_gazetteer(self.collection)
     
     @classmethod
     def _load_bm25_cache(cls):
@@ -54,21 +132,193 @@ class Retriever:
             return
         
         try:
-            cache_file = Config.BM25_CACHE_FILE
-            if os.path.exists(cache_file):
-                with open(cache_file, 'rb') as f:
-                    data = pickle.load(f)
-                
-                cls._bm25_cache = data['bm25']
-                cls._doc_ids_cache = data['doc_ids']
-                cls._doc_texts_cache = data['doc_texts']
-            else:
-                print(f"⚠️  BM25 索引文件不存在: {cache_file}")
+            # 内存映射打开：多进程共享页缓存，不复制数据；经由构建器检查 k1 / b / 检索字段是否与配置一致
+            bm25, doc_ids, doc_texts, header = bm25_builder.load_from_cache()
+            cls._bm25_cache = cls._segmented(bm25, doc_ids, doc_texts, os.path.basename(header['path']),
+                                             start=header.get('catalog_offset', 0))
+            cls._doc_ids_cache = doc_ids
+            cls._doc_texts_cache = doc_texts
+        except IndexFormatError as e:
+            print(f"⚠️  BM25 索引不可用: {e}")
         except Exception as e:
             print(f"⚠️  BM25 索引加载失败: {e}")
         finally:
             cls._cache_loaded = True  # 标记已尝试加载，避免重复
     
+    @classmethod
+    def _load_vector_index(cls, collection):
+        """
+        加载进程内向量索引到全局缓存（只执行一次；不可用时回退到 ChromaDB 查询）
+        """
+        if cls._vector_index_loaded:
+            return
+        
+        try:
+            cls._vector_index_cache = vector_builder.build_or_load(collection, position=cls._catalog_position)
+            cls._compact_catalog()
+        except Exception as e:
+            print(f"⚠️  向量索引不可用，回退到 ChromaDB 查询: {e}")
+        finally:
+            cls._vector_index_loaded = True
+    
+    @classmethod
+    def _load_doc_store(cls, collection):
+        """
+        从集合构建列式文档存储到全局缓存（只执行一次）
+        """
+        if cls._doc_store_loaded:
+            return
+        
+        try:
+            cls._doc_store_cache = DocumentStore.from_collection(collection)
+        except Exception as e:
+            print(f"⚠️  文档存储构建失败，回退到 ChromaDB 读取: {e}")
+        finally:
+            cls._doc_store_loaded = True
+    
+    @classmethod
+    def _load_gazetteer(cls, collection):
+        """
+        从集合元数据构建关键词提取的片名/导演词典（只执行一次；失败时只使用类型词表）
+        """
+        if cls._gazetteer_loaded:
+            return
+        
+        try:
+            keyword_extractor.load_from_collection(collection)
+            # 集合中没有的变更（只提供元数据的事件）从变更日志补上
+            records, _ = catalog_log.read(0, cls._catalog_position)
+            for record in records:
+                if record['op'] == 'upsert':
+                    keyword_extractor.add(record['metadata'])
+        except Exception as e:
+            print(f"⚠️  片名词典构建失败，关键词提取只使用类型词表: {e}")
+        finally:
+            cls._gazetteer_loaded = True
+    
+    @classmethod
+    def _load_filter_index(cls, collection):
+        """
+        从集合元数据构建位图索引到全局缓存（只执行一次）
+        """
+        with cls._catalog_lock, cls._filter_index_lock:
+            if cls._filter_index_loaded:
+                return
+            try:
+                filter_index = FilterIndex.from_collection(collection)
+                # 集合中没有的变更（只提供元数据的事件）从变更日志补上
+                records, _ = catalog_log.read(0, cls._catalog_position)
+                for record in records:
+                    if record['op'] == 'upsert':
+                        filter_index.upsert(record['id'], record['metadata'])
+                    else:
+                        filter_index.delete(record['id'])
+                cls._filter_index_cache = filter_index
+            except Exception as e:
+                print(f"⚠️  过滤索引构建失败: {e}")
+            finally:
+                cls._filter_index_loaded = True
+    
+    @property
+    def filter_index(self) -> Optional[FilterIndex]:
+        """类型 / 年代 / 评分位图索引（未构建时构建）"""
+        if not Retriever._filter_index_loaded:
+            Retriever._load_filter_index(self.collection)
+        return Retriever._filter_index_cache
+    
+    def _resolve_filter(self, filters: Union[SearchFilter, Dict[str, Any], None]) -> Optional[SearchFilter]:
+        """解析过滤条件（dict 按接口格式解析），有条件时确保位图索引可用"""
+        if isinstance(filters, dict):
+            filters = SearchFilter.from_dict(filters)
+        if filters is None or filters.is_empty:
+            return None
+        if self.filter_index is None:
+            raise RuntimeError("过滤索引不可用")
+        return filters
+    
+    @property
+    def catalog_version(self) -> int:
+        """电影库版本（每应用一次变更事件递增，依赖检索结果的缓存据此判断是否过期）"""
+        if self.doc_store is not None:
+            return self.doc_store.version
+        return self.bm25.version if self.bm25 is not None else 0
+    
+    @property
+    def cache_version(self) -> Tuple:
+        """检索结果缓存的版本（电影库版本 + 当前 BM25 / 向量索引及其版本，任一变化即失效）"""
+        return (
+            self.catalog_version,
+            id(self.bm25), self.bm25.version if self.bm25 is not None else None,
+            id(self.vector_index), self.vector_index.version if self.vector_index is not None else None,
+        )
+    
+    def _cached(self, key: Tuple, compute: Callable[[], Any],
+                cacheable: Callable[[Any], bool] = None) -> Any:
+        """通过检索结果缓存执行检索（未启用缓存时直接计算）"""
+        if not Config.RESULT_CACHE_ENABLED:
+            return compute()
+        return self._result_cache.get_or_compute(key, compute, self.cache_version, cacheable)
+    
+    def cache_stats(self) -> Dict[str, Any]:
+        """检索结果缓存的命中 / 未命中 / 淘汰计数"""
+        stats = self._result_cache.stats()
+        stats['enabled'] = Config.RESULT_CACHE_ENABLED
+        return stats
+    
+    @classmethod
+    def _segmented(cls, bm25: BM25Index, doc_ids, doc_texts, base_version: str = '',
+                   start: int = None) -> SegmentedBM25Index:
+        """
+        将基础段索引包装为支持增量更新的分段索引
+
+        Args:
+            bm25: 基础段索引
+            doc_ids: 基础段文档 ID
+            doc_texts: 基础段文档文本
+            base_version: 基础段的版本目录名（为空时不跟随其他进程合并的新版本）
+            start: 基础段已包含的变更日志位置（提供时重放该位置到本进程已应用位置之间的变更）
+        """
+        segmented = SegmentedBM25Index(
+            bm25, doc_ids, doc_texts,
+            tokenizer=preprocess_text,
+            index_dir=Config.BM25_INDEX_DIR,
+            tokenizer_signature=TOKENIZER_SIGNATURE,
+            merge_threshold=Config.BM25_DELTA_MERGE_THRESHOLD,
+            base_version=base_version,
+            on_merged=cls._compact_catalog
+        )
+        if start is not None:
+            with cls._catalog_lock:
+                segmented.switch_base(bm25, doc_ids, doc_texts, base_version,
+                                      cls._bm25_changes(start, cls._catalog_position), cls._catalog_position)
+        return segmented
+    
+    @staticmethod
+    def _bm25_changes(start: int, end: int) -> List[Tuple[str, str, Optional[str]]]:
+        """变更日志 [start, end) 之间的记录转换为 BM25 变更 [(op, 文档 ID, 检索文本)]"""
+        records, _ = catalog_log.read(start, end)
+        return [(record['op'], record['id'],
+                 build_search_text(record['metadata']) if record['op'] == 'upsert' else None)
+                for record in records]
+    
+    @staticmethod
+    def _compact_catalog():
+        """
+        压缩变更日志中 BM25 索引和向量索引都已包含的前缀（BM25 合并、向量索引构建或加载后调用）
+
+        以磁盘上各索引 header 的 catalog_offset 最小值为界；索引存在但无法读取时不压缩
+        """
+        try:
+            offsets = []
+            for index_dir, read_index_header in ((Config.BM25_INDEX_DIR, read_bm25_header),
+                                                 (Config.VECTOR_INDEX_DIR, read_vector_header)):
+                if index_exists(index_dir):
+                    offsets.append(read_index_header(index_dir).get('catalog_offset', 0))
+            if offsets:
+                catalog_log.compact(min(offsets), Config.CATALOG_COMPACT_MIN_BYTES)
+        except Exception as e:
+            print(f"⚠️  电影库变更日志压缩失败: {e}")
+    
     @classmethod
     def preload_bm25(cls):
         """
@@ -76,142 +326,729 @@ class Retriever:
         """
         cls._load_bm25_cache()
     
-    def vector_search(self, query: str, top_k: int = 5) -> List[Dict[str, Any]]:
+    def set_bm25_index(self, bm25: BM25Index, doc_ids, doc_texts):
+        """
+        替换 BM25 索引（重建索引后调用）
+        
+        Args:
+            bm25: 新的基础段索引
+            doc_ids: 文档 ID 列表
+            doc_texts: 文档文本列表
+        """
+        # 全量构建的索引不包含只提供元数据的变更：从变更日志开头重放
+        self.bm25 = Retriever._segmented(bm25, doc_ids, doc_texts,
+                                         current_version(Config.BM25_INDEX_DIR), start=0)
+        self.doc_ids = doc_ids
+        self.doc_texts = doc_texts
+    
+    def set_vector_index(self, vector_index: IVFIndex):
+        """
+        替换进程内向量索引（重建索引后调用；传入 None 则回退到 ChromaDB 查询）
+        """
+        self.vector_index = vector_index
+        if vector_index is not None:
+            Retriever._compact_catalog()
+    
+    def apply_catalog_events(self, events: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        将一批电影库变更事件写入变更日志，并应用到 BM25 增量段（以及进程内向量索引、文档存储、
+        过滤位图和片名词典）。整批事件校验通过后才会应用；其他 worker 通过变更日志同步
+        
+        Args:
+            events: [{'op': 'upsert' | 'delete', 'id': 电影ID, 'metadata': 元数据（可选）}]
+                    upsert 未提供 metadata 时从 ChromaDB 读取；启用向量索引或文档存储时
+                    还会读取 embedding / 文档
+        
+        Returns:
+            已应用的变更记录（与 events 一一对应；ChromaDB 中已不存在的 upsert 记为 delete），
+            BM25 索引未加载时返回空列表
+        
+        Raises:
+            ValueError: 任一事件无效（此时不应用任何事件）
+        """
+        records, embeddings, documents = self._resolve_events(events)
+        if self.bm25 is None:
+            print("⚠️  BM25 索引未加载，忽略变更事件")
+            return []
+        
+        with Retriever._catalog_lock:
+            self._reload_merged_bm25()
+            # 先应用其他 worker 已写入日志的变更，保证所有进程按日志顺序应用
+            earlier, position = catalog_log.append(records, Retriever._catalog_position)
+            if earlier:
+                self._apply_records(earlier)
+            self._apply_records(records, embeddings, documents)
+            Retriever._catalog_position = position
+            Retriever._catalog_synced_at = time.monotonic()
+            self.bm25.advance(position)
+        return records
+    
+    def _resolve_events(self, events: List[Dict[str, Any]]) -> Tuple[List[Dict[str, Any]], Dict, Dict]:
+        """
+        校验变更事件并解析为变更日志记录（以 ChromaDB 中已写入的数据为准，保证各结构一致）
+        
+        Returns:
+            (记录列表, {文档 ID: embedding}, {文档 ID: 文档})
+        
+        Raises:
+            ValueError: 任一事件无效
+        """
+        parsed = []
+        for i, event in enumerate(events):
+            op = event.get('op') if isinstance(event, dict) else None
+            doc_id = str(event.get('id', '')) if isinstance(event, dict) else ''
+            if not doc_id or op not in ('upsert', 'delete'):
+                raise ValueError(f"无效的变更事件（第 {i + 1} 个，整批未应用）: {event}")
+            parsed.append((op, doc_id, event.get('metadata')))
+        
+        include = ["metadatas"]
+        if self.vector_index is not None:
+            include.append("embeddings")
+        if self.doc_store is not None:
+            include.append("documents")
+        lookup = list(dict.fromkeys(
+            doc_id for op, doc_id, metadata in parsed
+            if op == 'upsert' and (metadata is None or len(include) > 1)
+        ))
+        stored, embeddings, documents = {}, {}, {}
+        if lookup:
+            results = self.collection.get(ids=lookup, include=include)
+            for i, doc_id in enumerate(results['ids']):
+                stored[doc_id] = results['metadatas'][i]
+                if self.vector_index is not None:
+                    embeddings[doc_id] = results['embeddings'][i]
+                if self.doc_store is not None:
+                    documents[doc_id] = results['documents'][i]
+        
+        records = []
+        lookup = set(lookup)
+        for op, doc_id, metadata in parsed:
+            if op == 'upsert' and doc_id in lookup:
+                if doc_id not in stored:
+                    # 已被删除（事件乱序），按删除处理
+                    records.append({'op': 'delete', 'id': doc_id})
+                    continue
+                metadata = stored[doc_id]
+            records.append({'op': op, 'id': doc_id, 'metadata': metadata} if op == 'upsert'
+                           else {'op': 'delete', 'id': doc_id})
+        return records, embeddings, documents
+    
+    def _apply_records(self, records: List[Dict[str, Any]], embeddings: Dict = None, documents: Dict = None):
+        """
+        按日志顺序将变更记录应用到各检索结构（调用方持有 _catalog_lock）
+        
+        Args:
+            records: 变更日志记录
+            embeddings: 已读取的 {文档 ID: embedding}（缺少的从 ChromaDB 读取）
+            documents: 已读取的 {文档 ID: 文档}（缺少的从 ChromaDB 读取）
+        """
+        if self.vector_index is not None:
+            apply_catalog_events(self.vector_index, self.collection, records, embeddings)
+        
+        documents = dict(documents or {})
+        if self.doc_store is not None:
+            missing = list(dict.fromkeys(
+                record['id'] for record in records if record['op'] == 'upsert' and record['id'] not in documents
+            ))
+            if missing:
+                results = self.collection.get(ids=missing, include=['documents'])
+                documents.update(zip(results['ids'], results['documents']))
+        
+        filter_index = Retriever._filter_index_cache
+        for record in records:
+            doc_id = record['id']
+            if record['op'] == 'delete':
+                self.bm25.delete(doc_id)
+                if self.doc_store is not None:
+                    self.doc_store.delete(doc_id)
+                if filter_index is not None:
+                    filter_index.delete(doc_id)
+                continue
+            
+            metadata = record['metadata']
+            self.bm25.upsert(doc_id, build_search_text(metadata))
+            if self.doc_store is not None:
+                if doc_id in documents:
+                    self.doc_store.upsert(doc_id, documents[doc_id], metadata)
+                else:
+                    self.doc_store.delete(doc_id)
+            if filter_index is not None:
+                filter_index.upsert(doc_id, metadata)
+            if Retriever._gazetteer_loaded:
+                keyword_extractor.add(metadata)
+    
+    def _sync_catalog(self):
+        """
+        应用其他 worker 写入变更日志的新记录（按 Config.CATALOG_SYNC_INTERVAL 节流）；
+        BM25 索引已由其他进程合并为新版本时先切换过去
+        """
+        if time.monotonic() - Retriever._catalog_synced_at < Config.CATALOG_SYNC_INTERVAL:
+            return
+        with Retriever._catalog_lock:
+            if time.monotonic() - Retriever._catalog_synced_at < Config.CATALOG_SYNC_INTERVAL:
+                return
+            Retriever._catalog_synced_at = time.monotonic()
+            if self.bm25 is None:
+                return
+            try:
+                self._reload_merged_bm25()
+                records, position = catalog_log.read(Retriever._catalog_position)
+                if records:
+                    self._apply_records(records)
+                Retriever._catalog_position = position
+                self.bm25.advance(position)
+            except Exception as e:
+                print(f"⚠️  电影库变更日志同步失败: {e}")
+    
+    def _reload_merged_bm25(self):
+        """其他进程已写入新的 BM25 版本时切换过去，并重放该版本之后本进程已应用的变更（调用方持有 _catalog_lock）"""
+        if self.bm25 is None or not self.bm25.base_version:
+            return
+        version = current_version(Config.BM25_INDEX_DIR)
+        if not version or version == self.bm25.base_version:
+            return
+        bm25, doc_ids, doc_texts, header = bm25_builder.load_from_cache()
+        position = Retriever._catalog_position
+        self.bm25.switch_base(bm25, doc_ids, doc_texts, os.path.basename(header['path']),
+                              Retriever._bm25_changes(header.get('catalog_offset', 0), position), position)
+    
+    def vector_search(self, query: str, top_k: int = 5,
+                      filters: Union[SearchFilter, Dict[str, Any]] = None) -> List[Dict[str, Any]]:
         """
         向量检索（使用 embedding 相似度）
         
         Args:
             query: 查询文本
             top_k: 返回前K个结果
+            filters: 过滤条件（SearchFilter 或接口格式的 dict，可选）
             
         Returns:
             检索结果列表
         """
-        # 生成查询的 embedding
+        self._sync_catalog()
+        search_filter = self._resolve_filter(filters)
+        return self._cached(
+            ('vector', normalize_query(query), top_k, search_filter),
+            lambda: self._vector_hits(self._embed_query(query), top_k, search_filter)
+        )
+    
+    def _embed_query(self, query: str) -> np.ndarray:
+        """生成查询的 embedding（一维数组）"""
         query_embedding = embedding_service.encode(query)
         
         # 确保是一维数组
         if query_embedding.ndim > 1:
             query_embedding = query_embedding.flatten()
-        
-        # 在 ChromaDB 中搜索
+        return query_embedding
+    
+    def document_embeddings(self, doc_ids: List[str]) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        读取文档已存储的 embedding（启用进程内向量索引时从索引读取，否则一次 ChromaDB 请求）
+
+        Returns:
+            (float32 向量 (n, d)，未找到的行为 0；每行是否找到)
+        """
+        if self.vector_index is not None:
+            return self.vector_index.get_vectors(doc_ids)
+        vectors = np.zeros((len(doc_ids), Config.EMBEDDING_DIMENSION), dtype=np.float32)
+        found = np.zeros(len(doc_ids), dtype=bool)
+        if not doc_ids:
+            return vectors, found
+        results = self.collection.get(ids=list(dict.fromkeys(doc_ids)), include=['embeddings'])
+        rows = dict(zip(results['ids'], results['embeddings']))
+        for i, doc_id in enumerate(doc_ids):
+            embedding = rows.get(doc_id)
+            if embedding is not None:
+                vectors[i] = embedding
+                found[i] = True
+        return vectors, found
+    
+    def _vector_hits(self, query_embedding: np.ndarray, top_k: int,
+                     search_filter: SearchFilter = None) -> List[Dict[str, Any]]:
+        """使用已生成的查询 embedding 检索（进程内索引或 ChromaDB）"""
+        return self._hydrate(self._vector_stream_hits(query_embedding, top_k, search_filter))
+    
+    def _vector_stream_hits(self, query_embedding: np.ndarray, top_k: int,
+                            search_filter: SearchFilter = None) -> List[Dict[str, Any]]:
+        """融合用的向量检索流（结果可能不含文档，融合结束后统一补充）"""
+        return self._vector_hits_many(query_embedding[np.newaxis, :], top_k, search_filter)[0]
+    
+    def _vector_hits_many(self, query_embeddings: np.ndarray, top_k: int,
+                          search_filter: SearchFilter = None) -> List[List[Dict[str, Any]]]:
+        """
+        多个查询 embedding 的向量检索（ChromaDB 一次多查询请求；进程内索引逐条检索）
+
+        启用文档存储或进程内索引时只返回 ID 和分数，文档由 _hydrate 补充
+        """
+        if self.vector_index is not None:
+            return [self._ivf_hits(embedding, top_k, search_filter) for embedding in query_embeddings]
+        if search_filter is not None:
+            return [self._chroma_filtered_hits(embedding, top_k, search_filter)
+                    for embedding in query_embeddings]
+        return self._chroma_hits(query_embeddings, top_k)
+    
+    def _chroma_hits(self, query_embeddings: np.ndarray, top_k: int) -> List[List[Dict[str, Any]]]:
+        """在 ChromaDB 中检索（一次多查询请求）"""
+        # 有文档存储时只取距离，避免读取和转换文档
+        with_documents = self.doc_store is None
         results = self.collection.query(
-            query_embeddings=[query_embedding.tolist()],
+            query_embeddings=query_embeddings.tolist(),
             n_results=top_k,
-            include=["documents", "metadatas", "distances"]
+            include=["documents", "metadatas", "distances"] if with_documents else ["distances"]
         )
         
         # 格式化结果
-        retrievals = []
-        for i in range(len(results['ids'][0])):
-            score = 1 - results['distances'][0][i]
-            # 过滤分数低于 0.1 的结果
-            if score >= 0.1:
-                retrievals.append({
-                    'id': results['ids'][0][i],
-                    'document': results['documents'][0][i],
-                    'metadata': results['metadatas'][0][i],
-                    'score': score,
-                    'method': 'vector'
-                })
+        batch = []
+        for row in range(len(results['ids'])):
+            retrievals = []
+            for i in range(len(results['ids'][row])):
+                score = 1 - results['distances'][row][i]
+                # 过滤分数低于 0.1 的结果
+                if score >= 0.1:
+                    hit = {
+                        'id': results['ids'][row][i],
+                        'score': score,
+                        'method': 'vector'
+                    }
+                    if with_documents:
+                        hit['document'] = results['documents'][row][i]
+                        hit['metadata'] = results['metadatas'][row][i]
+                    retrievals.append(hit)
+            batch.append(retrievals)
         
-        return retrievals
+        return batch
     
-    def bm25_search(self, query: str, top_k: int = 5) -> List[Dict[str, Any]]:
+    def _chroma_filtered_hits(self, query_embedding: np.ndarray, top_k: int,
+                              search_filter: SearchFilter) -> List[Dict[str, Any]]:
+        """
+        带允许列表的 ChromaDB 检索
+
+        ChromaDB 的 query 不支持按 ID 限定范围（类型字符串和发行日期也无法用 where 表达），
+        这里按允许列表过滤并逐步加深 n_results，直到凑满 top_k 或遍历完集合，保证 top_k 准确。
+        需要频繁过滤时建议使用进程内向量索引（VECTOR_BACKEND=ivf），过滤在扫描时完成。
+        """
+        allowed = self.filter_index.allowed_ids(search_filter)
+        if not allowed:
+            return []
+        total = self.collection.count()
+        n_results = min(top_k * 4, total)
+        while True:
+            raw = self._chroma_hits(query_embedding[np.newaxis, :], n_results)[0]
+            hits = [hit for hit in raw if hit['id'] in allowed]
+            # 凑满 top_k、已遍历完集合，或后续结果分数已低于阈值时停止
+            if len(hits) >= top_k or n_results >= total or len(raw) < n_results:
+                return hits[:top_k]
+            n_results = min(n_results * 4, total)
+    
+    def _ivf_hits(self, query_embedding: np.ndarray, top_k: int,
+                  search_filter: SearchFilter = None) -> List[Dict[str, Any]]:
+        """在进程内向量索引中检索，返回 [{'id', 'score'}]（文档由 _hydrate 补充）"""
+        allowed, accept = None, None
+        if search_filter is not None:
+            allowed = self.filter_index.mask_for(self.vector_index.doc_ids, search_filter)
+            accept = lambda doc_id: self.filter_index.matches(doc_id, search_filter)
+        hits = []
+        for doc_id, distance in self.vector_index.search(query_embedding, top_k,
+                                                         allowed=allowed, accept=accept):
+            score = 1 - distance
+            # 过滤分数低于 0.1 的结果（与 ChromaDB 路径一致）
+            if score >= 0.1:
+                hits.append({'id': doc_id, 'score': score, 'method': 'vector'})
+        return hits
+    
+    def _vector_scores(self, query_embedding: np.ndarray, doc_ids: List[str]) -> Dict[str, float]:
+        """
+        指定文档的向量检索分数（融合时随机读取；分数定义与检索结果一致：1 - 距离，低于 0.1 的不返回）
+        """
+        vectors, found = self.document_embeddings(doc_ids)
+        similarity = vectors @ np.asarray(query_embedding, dtype=np.float32).ravel()
+        space = self.vector_index.space if self.vector_index is not None else collection_space(self.collection)
+        # 向量已归一化：l2 距离 = 2 - 2 * 内积，cosine / ip 距离 = 1 - 内积
+        scores = 2 * similarity - 1 if space == 'l2' else similarity
+        return {doc_id: float(score) for doc_id, score, ok in zip(doc_ids, scores, found) if ok and score >= 0.1}
+    
+    def _bm25_scores(self, tokenized_query: List[str], doc_ids: List[str]) -> Dict[str, float]:
+        """指定文档的 BM25 分数（融合时随机读取）"""
+        return self.bm25.score(tokenized_query, doc_ids)
+    
+    def bm25_search(self, query: str, top_k: int = 5,
+                    filters: Union[SearchFilter, Dict[str, Any]] = None) -> List[Dict[str, Any]]:
         """
         BM25 检索（关键词匹配）
 
         Args:
             query: 查询文本（中文）
             top_k: 返回前K个结果
+            filters: 过滤条件（SearchFilter 或接口格式的 dict，可选）
 
         Returns:
             检索结果列表
         """
+        self._sync_catalog()
         if self.bm25 is None:
             raise RuntimeError("BM25 模型未初始化，请先构建索引")
 
-        # 从查询中提取关键词（电影类型、名称等，不发散）
-        keywords = extract_movie_keywords(query)
+        search_filter = self._resolve_filter(filters)
+        state = {}
 
-        # 查询分词（带预处理）
-        tokenized_query = preprocess_text(keywords)
-        
-        # BM25 检索
-        scores = self.bm25.get_scores(tokenized_query)
-        top_indices = np.argsort(scores)[::-1][:top_k]
-        
-        # 获取结果
-        results = self.collection.get(
-            ids=[self.doc_ids[i] for i in top_indices],
-            include=["documents", "metadatas"]
+        def compute():
+            tokens, state['keyword_source'] = self._bm25_tokens(query)
+            return self._hydrate(self._bm25_hits(tokens, top_k, search_filter))
+
+        # LLM 关键词提取失败时使用的是原查询，结果不缓存（下次请求重新提取）
+        return self._cached(
+            ('bm25', normalize_query(query), top_k, search_filter), compute,
+            cacheable=lambda results: state.get('keyword_source') not in DEGRADED_SOURCES
         )
+    
+    def _bm25_tokens(self, query: str) -> Tuple[List[str], str]:
+        """
+        从查询中提取关键词并分词
+
+        Returns:
+            (查询词, 关键词来源)；来源在 DEGRADED_SOURCES 中表示 LLM 回退失败、使用了原查询
+        """
+        # 从查询中提取关键词（电影类型、名称等，不发散）；本地词典未命中时才调用 LLM
+        if Config.KEYWORD_EXTRACTOR == 'local':
+            keywords, source = keyword_extractor.extract_with_source(query)
+        else:
+            keywords, source = extract_movie_keywords(query), 'llm'
+
+        # 查询分词（带预处理）
+        return preprocess_text(keywords), source
+    
+    def _bm25_hits(self, tokenized_query: List[str], top_k: int,
+                   search_filter: SearchFilter = None) -> List[Dict[str, Any]]:
+        """BM25 打分（只累加命中查询词的倒排表，包含增量段），返回 [{'id', 'score'}]"""
+        hits = self.bm25.search(tokenized_query, top_k, pruning=Config.BM25_PRUNING,
+                                **self._bm25_filter_args(search_filter))
+        return [{'id': doc_id, 'score': score, 'method': 'bm25'} for doc_id, score in hits]
+    
+    def _bm25_filter_args(self, search_filter: SearchFilter = None) -> Dict[str, Any]:
+        """BM25 的过滤参数：基础段掩码（倒排表中跳过不满足条件的文档）和增量段过滤函数"""
+        if search_filter is None:
+            return {}
+        filter_index = self.filter_index
+        return {
+            'allowed': lambda doc_ids: filter_index.mask_for(doc_ids, search_filter),
+            'accept': lambda doc_id: filter_index.matches(doc_id, search_filter),
+        }
+    
+    def _hydrate(self, hits: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        为命中结果补充文档和元数据（已有 document 的结果不再读取）
+
+        优先从文档存储读取，存储中没有的再从 ChromaDB 读取（并补充到存储中）
+        """
+        missing = list(dict.fromkeys(hit['id'] for hit in hits if 'document' not in hit))
+        rows = {}
+        if missing and self.doc_store is not None:
+            rows = self.doc_store.get_many(missing)
+            missing = [doc_id for doc_id in missing if doc_id not in rows]
+        if missing:
+            results = self.collection.get(
+                ids=missing,
+                include=["documents", "metadatas"]
+            )
+            fetched = {
+                doc_id: (results['documents'][idx], results['metadatas'][idx])
+                for idx, doc_id in enumerate(results['ids'])
+            }
+            if self.doc_store is not None:
+                self.doc_store.fill(fetched)
+            rows.update(fetched)
         
-        # 格式化结果
+        # 格式化结果（按分数顺序，ChromaDB 不保证返回顺序）
         retrievals = []
-        for idx, doc_id in enumerate(results['ids']):
-            original_idx = top_indices[idx]
-            retrievals.append({
-                'id': doc_id,
-                'document': results['documents'][idx],
-                'metadata': results['metadatas'][idx],
-                'score': float(scores[original_idx]),
-                'method': 'bm25'
-            })
+        for hit in hits:
+            if 'document' not in hit:
+                if hit['id'] not in rows:
+                    continue
+                hit['document'], hit['metadata'] = rows[hit['id']]
+            retrievals.append(hit)
         
         return retrievals
     
     def hybrid_search(self, query: str, top_k: int = 5,
-                     alpha: float = 0.5, separate: bool = False) -> Dict[str, List[Dict[str, Any]]]:
+                     alpha: float = 0.5, separate: bool = False,
+                     fusion: str = None,
+                     filters: Union[SearchFilter, Dict[str, Any]] = None) -> Dict[str, List[Dict[str, Any]]]:
         """
         混合检索（向量 + BM25）
 
+        两路检索并行执行并逐步加深，使用阈值算法融合：各路只拉取到
+        融合后的 top_k 可以确定为止（见 src.fusion）。结果按规范化查询
+        缓存，有检索路超时的部分结果不缓存。
+
         Args:
             query: 查询文本
             top_k: 返回前K个结果
-            alpha: 向量检索权重 (0-1)
+            alpha: 向量检索权重 (0-1)，BM25 权重为 1 - alpha
             separate: 是否分别返回向量检索和BM25结果
+            fusion: 融合方式 ('weighted' / 'rrf')，默认使用 Config.FUSION_METHOD
+            filters: 过滤条件（SearchFilter 或接口格式的 dict，可选），两路检索都在检索前过滤
 
         Returns:
-            如果 separate=True，返回 {'vector_results': ..., 'bm25_results': ..., 'combined_results': ...}
+            如果 separate=True，返回 {'vector_results': ..., 'bm25_results': ..., 'combined_results': ...,
+                                      'partial': 是否有检索路未在时限内完成, 'missing_legs': [...],
+                                      'fusion': 融合统计, 'query_embedding': 查询 embedding（向量检索未完成时为 None）,
+                                      'keyword_source': BM25 关键词来源}
             如果 separate=False，返回合并后的检索结果列表
         """
+        self._sync_catalog()
         if self.bm25 is None:
             raise RuntimeError("BM25 模型未初始化，请先构建索引")
 
-        # 分别获取两种检索结果
-        vector_results = self.vector_search(query, top_k * 2)
-        bm25_results = self.bm25_search(query, top_k * 2)
+        fusion = fusion or Config.FUSION_METHOD
+        search_filter = self._resolve_filter(filters)
+        results = self._cached(
+            ('hybrid', normalize_query(query), top_k, alpha, fusion, search_filter),
+            lambda: self._hybrid_search(query, top_k, alpha, fusion, search_filter),
+            cacheable=lambda results: not results['partial']
+            and results.get('keyword_source') not in DEGRADED_SOURCES
+        )
 
-        # 合并结果 (只做去重合并)
-        combined_docs = {}
+        # 根据参数返回不同格式
+        return results if separate else results['combined_results']
 
-        # 添加向量检索结果
-        for result in vector_results:
-            doc_id = result['id']
-            combined_docs[doc_id] = result
+    def _hybrid_search(self, query: str, top_k: int, alpha: float, fusion: str,
+                       search_filter: SearchFilter = None) -> Dict[str, Any]:
+        """执行混合检索（不经过缓存），返回 separate=True 格式的结果"""
+        depth = top_k
+        state = {}
 
-        # 添加 BM25 检索结果 (不改变向量结果)
-        for result in bm25_results:
-            doc_id = result['id']
-            if doc_id not in combined_docs:
-                combined_docs[doc_id] = result
+        def vector_hits(d):
+            return self._vector_stream_hits(state['embedding'], d, search_filter)
 
-        # 转换为列表并返回 top_k
-        combined_results = list(combined_docs.values())[:top_k]
+        def vector_leg():
+            state['embedding'] = self._embed_query(query)
+            return vector_hits(depth)
 
-        # 根据参数返回不同格式
-        if separate:
+        def bm25_leg():
+            state['tokens'], state['keyword_source'] = self._bm25_tokens(query)
+            return self._bm25_hits(state['tokens'], depth, search_filter)
+
+        # 首轮：两路检索并行执行，各自有独立的时限（含查询 embedding 和关键词提取）
+        (vector_results, bm25_results), missing_legs = self._run_legs([
+            ('vector', vector_leg, Config.VECTOR_SEARCH_TIMEOUT),
+            ('bm25', bm25_leg, Config.BM25_SEARCH_TIMEOUT),
+        ])
+
+        streams = []
+        if 'vector' not in missing_legs:
+            stream = RankedStream('vector', alpha, vector_hits,
+                                  lookup=lambda ids: self._vector_scores(state['embedding'], ids))
+            stream.set_items(vector_results, depth)
+            streams.append(stream)
+        if 'bm25' not in missing_legs:
+            stream = RankedStream('bm25', 1 - alpha,
+                                  lambda d: self._bm25_hits(state['tokens'], d, search_filter),
+                                  lookup=lambda ids: self._bm25_scores(state['tokens'], ids))
+            stream.set_items(bm25_results, depth)
+            streams.append(stream)
+
+        # 逐步加深，直到融合后的 top_k 确定
+        fused = threshold_fusion(
+            streams, top_k, method=fusion,
+            rrf_k=Config.FUSION_RRF_K,
+            max_depth=max(Config.FUSION_MAX_DEPTH, top_k),
+            deepen=self._deepen_streams
+        )
+        streams = {stream.name: stream for stream in streams}
+        vector_results = streams['vector'].items[:top_k] if 'vector' in streams else []
+        bm25_results = streams['bm25'].items[:top_k] if 'bm25' in streams else []
+
+        # 只为最终用到的结果补充文档（一次读取，原地填充；已被删除的结果丢弃）
+        self._hydrate(vector_results + bm25_results + fused['results'])
+        vector_results = [hit for hit in vector_results if 'document' in hit]
+        bm25_results = [hit for hit in bm25_results if 'document' in hit]
+        combined_results = [item for item in fused['results'] if 'document' in item]
+
+        return {
+            'vector_results': vector_results,
+            'bm25_results': bm25_results,
+            'combined_results': combined_results,
+            'partial': bool(missing_legs),
+            'missing_legs': missing_legs,
+            'fusion': fused['stats'],
+            'query_embedding': state.get('embedding'),
+            'keyword_source': state.get('keyword_source')
+        }
+    
+    def _deepen_streams(self, streams: List[RankedStream], depth: int):
+        """并行加深多路检索流（超时或失败的流标记为 stalled，不再加深）"""
+        results, missing = self._run_legs([
+            (stream.name, lambda s=stream: s.fetch(depth),
+             Config.VECTOR_SEARCH_TIMEOUT if stream.name == 'vector' else Config.BM25_SEARCH_TIMEOUT)
+            for stream in streams
+        ], raise_on_failure=False)
+        for stream, items in zip(streams, results):
+            if stream.name in missing:
+                stream.stalled = True
+            else:
+                stream.set_items(items, depth)
+    
+    @classmethod
+    def executor_stats(cls) -> Dict[str, Any]:
+        """检索线程池的排队数、运行数和超时后仍在运行的检索路数"""
+        with cls._legs_lock:
             return {
-                'vector_results': vector_results,
-                'bm25_results': bm25_results,
-                'combined_results': combined_results
+                'max_workers': Config.RETRIEVAL_MAX_WORKERS,
+                'queued': cls._legs_queued,
+                'running': cls._legs_running,
+                'abandoned': cls._legs_abandoned,
+                'timeouts': cls._legs_timeouts,
             }
+    
+    @classmethod
+    def _submit_leg(cls, fn: Callable[[], Any]) -> Tuple[Any, Dict[str, bool]]:
+        """提交一路检索并计入排队 / 运行数，返回 (future, 状态)；调用方超时后把状态标记为 abandoned"""
+        leg = {'abandoned': False, 'finished': False}
+        with cls._legs_lock:
+            cls._legs_queued += 1
+
+        def run():
+            with cls._legs_lock:
+                cls._legs_queued -= 1
+                cls._legs_running += 1
+            try:
+                return fn()
+            finally:
+                with cls._legs_lock:
+                    cls._legs_running -= 1
+                    leg['finished'] = True
+                    if leg['abandoned']:
+                        cls._legs_abandoned -= 1
+
+        return cls._executor.submit(run), leg
+    
+    @classmethod
+    def _abandon_leg(cls, future, leg: Dict[str, bool]):
+        """调用方超过时限不再等待：尚未开始的取消，已在运行的计为 abandoned 直到结束"""
+        with cls._legs_lock:
+            cls._legs_timeouts += 1
+            if future.cancel():
+                cls._legs_queued -= 1
+            elif not leg['finished']:
+                leg['abandoned'] = True
+                cls._legs_abandoned += 1
+    
+    def _run_legs(self, legs: List[Tuple[str, Callable[[], List[Dict[str, Any]]], float]],
+                  raise_on_failure: bool = True) -> Tuple[List[List[Dict[str, Any]]], List[str]]:
+        """
+        在共享线程池中并行执行多路检索
+        
+        Args:
+            legs: [(名称, 检索函数, 时限秒数), ...]
+            raise_on_failure: 全部失败时是否抛出异常
+        
+        Returns:
+            (每一路的结果列表, 超时或失败的检索路名称)
+            超时或失败的检索路结果为空列表
+        """
+        start = time.monotonic()
+        futures = [(name, *self._submit_leg(fn), timeout) for name, fn, timeout in legs]
+        
+        results, missing, errors = [], [], []
+        for name, future, leg, timeout in futures:
+            remaining = max(0.0, start + timeout - time.monotonic())
+            try:
+                results.append(future.result(timeout=remaining))
+            except FutureTimeoutError:
+                self._abandon_leg(future, leg)  # 尚未开始则取消；已在运行的结果将被丢弃
+                print(f"⚠️  {name} 检索超过时限 {timeout}s，返回部分结果")
+                results.append([])
+                missing.append(name)
+            except Exception as e:
+                print(f"⚠️  {name} 检索失败: {e}")
+                results.append([])
+                missing.append(name)
+                errors.append(e)
+        
+        if raise_on_failure and len(missing) == len(legs) and errors:
+            raise errors[0]
+        return results, missing
+    
+    def search_many(self, queries: List[str], method: str = 'hybrid', top_k: int = 5,
+                    alpha: float = 0.5, fusion: str = None,
+                    filters: Union[SearchFilter, Dict[str, Any]] = None) -> List[List[Dict[str, Any]]]:
+        """
+        批量检索（离线评测、分类货架等批量场景）
+
+        所有查询的 embedding 一次批量编码，向量检索一次多查询请求，
+        BM25 一次稀疏矩阵乘法，最终结果的文档一次读取。混合检索逐查询
+        做阈值融合，首轮拉取更深，大多数查询无需再逐条加深。
+
+        Args:
+            queries: 查询文本列表
+            method: 检索方法 ('vector', 'bm25', 'hybrid')
+            top_k: 每个查询返回前K个结果
+            alpha: 向量检索权重 (0-1)，仅混合检索使用
+            fusion: 融合方式 ('weighted' / 'rrf')，默认使用 Config.FUSION_METHOD
+            filters: 过滤条件（对所有查询生效，可选）
+
+        Returns:
+            与 queries 一一对应的检索结果列表
+        """
+        self._sync_catalog()
+        if method not in ('vector', 'bm25', 'hybrid'):
+            raise ValueError(f"不支持的检索方法: {method}")
+        if method != 'vector' and self.bm25 is None:
+            raise RuntimeError("BM25 模型未初始化，请先构建索引")
+        if not queries:
+            return []
+
+        fusion = fusion or Config.FUSION_METHOD
+        search_filter = self._resolve_filter(filters)
+        max_depth = max(Config.FUSION_MAX_DEPTH, top_k)
+        depth = min(top_k * 4, max_depth) if method == 'hybrid' else top_k
+
+        # 关键词提取（可能调用 LLM）在线程池中并发执行，同时在当前线程批量编码
+        token_futures = []
+        if method != 'vector':
+            token_futures = [self._tokenize_executor.submit(self._bm25_tokens, query) for query in queries]
+
+        embeddings, vector_batch = None, [[] for _ in queries]
+        if method != 'bm25':
+            embeddings = np.asarray(embedding_service.encode(list(queries)), dtype=np.float32)
+            vector_batch = self._vector_hits_many(embeddings, depth, search_filter)
+
+        tokens, bm25_batch = None, [[] for _ in queries]
+        if token_futures:
+            tokens = [future.result()[0] for future in token_futures]
+            bm25_batch = [
+                [{'id': doc_id, 'score': score, 'method': 'bm25'} for doc_id, score in hits]
+                for hits in self.bm25.search_many(tokens, depth, **self._bm25_filter_args(search_filter))
+            ]
+
+        if method == 'vector':
+            batch = [hits[:top_k] for hits in vector_batch]
+        elif method == 'bm25':
+            batch = [hits[:top_k] for hits in bm25_batch]
         else:
-            return combined_results
+            batch = []
+            for i in range(len(queries)):
+                vector_stream = RankedStream(
+                    'vector', alpha, lambda d, e=embeddings[i]: self._vector_stream_hits(e, d, search_filter),
+                    lookup=lambda ids, e=embeddings[i]: self._vector_scores(e, ids))
+                vector_stream.set_items(vector_batch[i], depth)
+                bm25_stream = RankedStream(
+                    'bm25', 1 - alpha, lambda d, t=tokens[i]: self._bm25_hits(t, d, search_filter),
+                    lookup=lambda ids, t=tokens[i]: self._bm25_scores(t, ids))
+                bm25_stream.set_items(bm25_batch[i], depth)
+                fused = threshold_fusion(
+                    [vector_stream, bm25_stream], top_k, method=fusion,
+                    rrf_k=Config.FUSION_RRF_K, max_depth=max_depth
+                )
+                batch.append(fused['results'])
+
+        # 所有查询的结果一次读取文档（原地填充；已被删除的结果丢弃）
+        self._hydrate([item for results in batch for item in results])
+        return [[item for item in results if 'document' in item] for results in batch]
     
     def search(self, query: str, method: str = 'hybrid', 
-               top_k: int = 3, **kwargs) -> List[Dict[str, Any]]:
+               top_k: int = 3, filters: Union[SearchFilter, Dict[str, Any]] = None,
+               **kwargs) -> List[Dict[str, Any]]:
         """
         统一检索接口
         
@@ -219,20 +1056,21 @@ class Retriever:
             query: 查询文本
             method: 检索方法 ('vector', 'bm25', 'hybrid')
             top_k: 返回前K个结果
+            filters: 过滤条件，如 {'genres': ['Sci-Fi'], 'year_max': 1989, 'rating_min': 4.0}
             **kwargs: 其他参数
             
         Returns:
             检索结果列表
         """
         if method == 'vector':
-            return self.vector_search(query, top_k)
+            return self.vector_search(query, top_k, filters=filters)
         elif method == 'bm25':
-            return self.bm25_search(query, top_k)
+            return self.bm25_search(query, top_k, filters=filters)
         elif method == 'hybrid':
-            return self.hybrid_search(query, top_k, **kwargs)
+            return self.hybrid_search(query, top_k, filters=filters, **kwargs)
         else:
             raise ValueError(f"不支持的检索方法: {method}")
 
 
-# 创建全局实例（空初始化，需要手动加载 BM25）
-retriever = Retriever()
+# 创建全局实例（第一次使用或预热时初始化：连接数据库并加载索引）
+retriever = warmup.register('retriever', Retriever)
@@ -0,0 +1,404 @@
+"""
+检索预过滤 - 按类型 / 年份 / 评分过滤检索结果（在检索前生效，保证 top_k）
+
+启动后从集合读取全部元数据，为每个取值预先计算位图（np.packbits 压缩）：
+    类型        每个类型一张位图（genres 按逗号拆分，忽略大小写）
+    年代        release_date 中的年份按年代（1990 表示 1990-1999）分桶
+    评分        avg_rating 按 0.5 分一档分桶
+
+过滤条件先对整桶位图做按位或 / 与，只有跨越过滤边界的桶才逐行比较年份或评分。
+得到的掩码交给 BM25（倒排表中直接跳过）和向量检索（允许列表），过滤越严格，
+需要打分的文档越少。
+
+电影库变更写入覆盖表并标记墓碑（与 DocumentStore 相同），覆盖表中的文档逐条判断。
+"""
+import math
+import re
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+
+
+_YEAR = re.compile(r'(\d{4})')
+
+RATING_BUCKET = 0.5
+MASK_CACHE_SIZE = 8
+
+
+class SearchFilter(NamedTuple):
+    """检索过滤条件（可哈希，可作为缓存键的一部分）"""
+    genres: Tuple[str, ...] = ()  # 任一类型匹配即可（小写）
+    year_min: Optional[int] = None
+    year_max: Optional[int] = None
+    rating_min: Optional[float] = None
+    rating_max: Optional[float] = None
+
+    @classmethod
+    def from_dict(cls, data: Optional[Dict[str, Any]]) -> Optional['SearchFilter']:
+        """
+        解析接口中的过滤参数
+
+        Args:
+            data: {'genres': [...], 'year_min': 1900, 'year_max': 1989, 'rating_min': 4.0, 'rating_max': 5.0}
+                  所有字段可选；genres 也可以是逗号分隔的字符串
+
+        Returns:
+            过滤条件，没有任何条件时返回 None
+
+        Raises:
+            ValueError: 参数格式错误
+        """
+        if not data:
+            return None
+        if not isinstance(data, dict):
+            raise ValueError("filters 必须是对象")
+        unknown = set(data) - set(cls._fields)
+        if unknown:
+            raise ValueError(f"不支持的过滤字段: {', '.join(sorted(unknown))}")
+
+        genres = data.get('genres') or ()
+        if isinstance(genres, str):
+            genres = genres.split(',')
+        if not isinstance(genres, (list, tuple)):
+            raise ValueError("genres 必须是字符串列表")
+        genres = tuple(sorted({str(g).strip().casefold() for g in genres if str(g).strip()}))
+
+        def number(name, kind):
+            value = data.get(name)
+            if value is None:
+                return None
+            try:
+                return kind(value)
+            except (TypeError, ValueError):
+                raise ValueError(f"{name} 必须是数字")
+
+        search_filter = cls(
+            genres=genres,
+            year_min=number('year_min', int),
+            year_max=number('year_max', int),
+            rating_min=number('rating_min', float),
+            rating_max=number('rating_max', float),
+        )
+        return None if search_filter.is_empty else search_filter
+
+    @property
+    def is_empty(self) -> bool:
+        return not self.genres and all(
+            value is None for value in (self.year_min, self.year_max, self.rating_min, self.rating_max)
+        )
+
+
+class _Record(NamedTuple):
+    """单个文档的可过滤字段"""
+    genres: frozenset
+    year: int  # 0 表示未知
+    rating: float  # nan 表示未知
+
+
+def parse_metadata(metadata: Optional[Dict[str, Any]]) -> _Record:
+    """从元数据中解析类型、年份、评分（导入脚本使用 genres，后端使用 genre）"""
+    metadata = metadata or {}
+    genres = metadata.get('genres') or metadata.get('genre') or ''
+    if isinstance(genres, str):
+        genres = genres.split(',')
+    genres = frozenset(str(g).strip().casefold() for g in genres if str(g).strip())
+
+    year = metadata.get('year')
+    if year is None:
+        match = _YEAR.search(str(metadata.get('release_date') or ''))
+        year = match.group(1) if match else 0
+    try:
+        year = int(year)
+    except (TypeError, ValueError):
+        year = 0
+
+    rating = metadata.get('avg_rating')
+    try:
+        rating = float(rating) if rating is not None else math.nan
+    except (TypeError, ValueError):
+        rating = math.nan
+    return _Record(genres, year, rating)
+
+
+def _matches(record: _Record, search_filter: SearchFilter) -> bool:
+    """逐条判断（覆盖表中的文档）"""
+    if search_filter.genres and not record.genres.intersection(search_filter.genres):
+        return False
+    if search_filter.year_min is not None or search_filter.year_max is not None:
+        if not record.year:
+            return False
+        if search_filter.year_min is not None and record.year < search_filter.year_min:
+            return False
+        if search_filter.year_max is not None and record.year > search_filter.year_max:
+            return False
+    if search_filter.rating_min is not None or search_filter.rating_max is not None:
+        if math.isnan(record.rating):
+            return False
+        if search_filter.rating_min is not None and record.rating < search_filter.rating_min:
+            return False
+        if search_filter.rating_max is not None and record.rating > search_filter.rating_max:
+            return False
+    return True
+
+
+class FilterIndex:
+    """类型 / 年代 / 评分位图索引"""
+
+    def __init__(self, doc_ids: Sequence[str], metadatas: Iterable[Optional[Dict[str, Any]]]):
+        """
+        构建位图
+
+        Args:
+            doc_ids: 文档 ID
+            metadatas: 与 doc_ids 对应的元数据
+        """
+        self.doc_ids = list(doc_ids)
+        self.num_docs = len(self.doc_ids)
+        self._rows: Dict[str, int] = {doc_id: row for row, doc_id in enumerate(self.doc_ids)}
+
+        records = [parse_metadata(metadata) for metadata in metadatas]
+        self._years = np.fromiter((r.year for r in records), dtype=np.int32, count=self.num_docs)
+        self._ratings = np.fromiter((r.rating for r in records), dtype=np.float32, count=self.num_docs)
+
+        genre_rows: Dict[str, List[int]] = {}
+        for row, record in enumerate(records):
+            for genre in record.genres:
+                genre_rows.setdefault(genre, []).append(row)
+        self._genres = {genre: self._bitmap(rows) for genre, rows in genre_rows.items()}
+
+        known_years = np.flatnonzero(self._years > 0)
+        decades = self._years[known_years] // 10  # 桶号 199 表示 1990-1999
+        self._decades = {int(d): self._bitmap(known_years[decades == d]) for d in np.unique(decades)}
+
+        known_ratings = np.flatnonzero(~np.isnan(self._ratings))
+        buckets = np.floor(self._ratings[known_ratings] / RATING_BUCKET).astype(np.int32)
+        self._rating_buckets = {int(b): self._bitmap(known_ratings[buckets == b]) for b in np.unique(buckets)}
+
+        self._lock = threading.RLock()
+        self._overlay: Dict[str, _Record] = {}
+        self._tombstones = np.zeros(self.num_docs, dtype=bool)
+        self._num_tombstones = 0
+        self._row_maps: Dict[int, Tuple[Sequence[str], np.ndarray, Dict[str, int]]] = {}
+        self._masks: 'OrderedDict[Tuple, Tuple[Sequence[str], np.ndarray]]' = OrderedDict()  # 最近使用的过滤掩码
+        self.version = 0
+
+    @classmethod
+    def from_collection(cls, collection, page_size: int = 5000) -> 'FilterIndex':
+        """分页读取集合中的全部元数据"""
+        doc_ids, metadatas = [], []
+        offset = 0
+        while True:
+            page = collection.get(include=['metadatas'], limit=page_size, offset=offset)
+            if not page['ids']:
+                break
+            doc_ids.extend(page['ids'])
+            metadatas.extend(page['metadatas'])
+            offset += len(page['ids'])
+        return cls(doc_ids, metadatas)
+
+    def _bitmap(self, rows) -> np.ndarray:
+        mask = np.zeros(self.num_docs, dtype=bool)
+        mask[np.asarray(rows, dtype=np.int64)] = True
+        return np.packbits(mask)
+
+    def _unpack(self, bitmap: np.ndarray) -> np.ndarray:
+        return np.unpackbits(bitmap, count=self.num_docs).view(bool)
+
+    # ------------------------------------------------------------------
+    # 过滤
+    # ------------------------------------------------------------------
+
+    def _range_bitmap(self, buckets: Dict[int, np.ndarray], width: float, column: np.ndarray,
+                      low: Optional[float], high: Optional[float]) -> np.ndarray:
+        """整桶位于范围内的桶直接按位或，跨越边界的桶逐行比较"""
+        low = -math.inf if low is None else low
+        high = math.inf if high is None else high
+        packed = np.zeros((self.num_docs + 7) // 8, dtype=np.uint8)
+        partial = np.zeros(self.num_docs, dtype=bool)
+        for key, bitmap in buckets.items():
+            start = key * width
+            end = start + width  # 桶覆盖 [start, end)
+            if end <= low or start > high:
+                continue
+            if low <= start and end <= high:
+                np.bitwise_or(packed, bitmap, out=packed)
+            else:
+                rows = np.flatnonzero(self._unpack(bitmap))
+                values = column[rows]
+                partial[rows[(values >= low) & (values <= high)]] = True
+        if partial.any():
+            np.bitwise_or(packed, np.packbits(partial), out=packed)
+        return packed
+
+    def mask(self, search_filter: SearchFilter) -> np.ndarray:
+        """
+        基础文档的过滤掩码（已删除或已更新的文档为 False，覆盖表中的文档见 matches）
+
+        Returns:
+            长度为 num_docs 的布尔数组
+        """
+        packed = np.full((self.num_docs + 7) // 8, 0xFF, dtype=np.uint8)
+        if search_filter.genres:
+            genres = np.zeros_like(packed)
+            for genre in search_filter.genres:
+                bitmap = self._genres.get(genre)
+                if bitmap is not None:
+                    np.bitwise_or(genres, bitmap, out=genres)
+            np.bitwise_and(packed, genres, out=packed)
+        if search_filter.year_min is not None or search_filter.year_max is not None:
+            years = self._range_bitmap(self._decades, 10, self._years,
+                                       search_filter.year_min, search_filter.year_max)
+            np.bitwise_and(packed, years, out=packed)
+        if search_filter.rating_min is not None or search_filter.rating_max is not None:
+            ratings = self._range_bitmap(self._rating_buckets, RATING_BUCKET, self._ratings,
+                                         search_filter.rating_min, search_filter.rating_max)
+            np.bitwise_and(packed, ratings, out=packed)
+
+        mask = self._unpack(packed).copy()
+        with self._lock:
+            if self._num_tombstones:
+                mask &= ~self._tombstones
+        return mask
+
+    def matches(self, doc_id: str, search_filter: SearchFilter) -> bool:
+        """判断单个文档是否满足过滤条件"""
+        with self._lock:
+            record = self._overlay.get(doc_id)
+            if record is None:
+                row = self._rows.get(doc_id)
+                if row is None or self._tombstones[row]:
+                    return False
+        if record is not None:
+            return _matches(record, search_filter)
+        return bool(self.mask_rows(np.array([row]), search_filter)[0])
+
+    def mask_rows(self, rows: np.ndarray, search_filter: SearchFilter) -> np.ndarray:
+        """少量基础文档逐行判断（不展开整张位图）"""
+        keep = np.ones(len(rows), dtype=bool)
+        if search_filter.genres:
+            genre_keep = np.zeros(len(rows), dtype=bool)
+            for genre in search_filter.genres:
+                bitmap = self._genres.get(genre)
+                if bitmap is not None:
+                    genre_keep |= ((bitmap[rows >> 3] >> (7 - (rows & 7))) & 1).astype(bool)
+            keep &= genre_keep
+        if search_filter.year_min is not None or search_filter.year_max is not None:
+            years = self._years[rows]
+            keep &= years > 0
+            if search_filter.year_min is not None:
+                keep &= years >= search_filter.year_min
+            if search_filter.year_max is not None:
+                keep &= years <= search_filter.year_max
+        if search_filter.rating_min is not None or search_filter.rating_max is not None:
+            ratings = self._ratings[rows]
+            keep &= ~np.isnan(ratings)
+            if search_filter.rating_min is not None:
+                keep &= ratings >= search_filter.rating_min
+            if search_filter.rating_max is not None:
+                keep &= ratings <= search_filter.rating_max
+        return keep
+
+    def _row_map(self, doc_ids: Sequence[str]) -> Tuple[np.ndarray, Dict[str, int]]:
+        """其他索引的文档顺序 -> 本索引行号（-1 表示不在基础文档中），按序列对象缓存"""
+        cached = self._row_maps.get(id(doc_ids))
+        if cached is not None and cached[0] is doc_ids:
+            return cached[1], cached[2]
+        rows = np.fromiter((self._rows.get(doc_id, -1) for doc_id in doc_ids),
+                           dtype=np.int64, count=len(doc_ids))
+        positions = {doc_id: pos for pos, doc_id in enumerate(doc_ids)}
+        if len(self._row_maps) >= 4:
+            self._row_maps.clear()
+        self._row_maps[id(doc_ids)] = (doc_ids, rows, positions)
+        return rows, positions
+
+    def mask_for(self, doc_ids: Sequence[str], search_filter: SearchFilter) -> np.ndarray:
+        """
+        按其他索引的文档顺序生成过滤掩码（例如 BM25 基础段、向量索引基础段）
+
+        最近使用的 MASK_CACHE_SIZE 个掩码按 (目标序列, 过滤条件, 版本) 缓存，
+        热门过滤条件和混合检索的逐步加深不会重复计算；返回值只读
+
+        Args:
+            doc_ids: 目标索引的文档 ID 序列（同一序列对象的行号映射会被缓存）
+            search_filter: 过滤条件
+
+        Returns:
+            与 doc_ids 对齐的布尔数组
+        """
+        key = (id(doc_ids), search_filter, self.version)
+        with self._lock:
+            cached = self._masks.get(key)
+            if cached is not None and cached[0] is doc_ids:
+                self._masks.move_to_end(key)
+                return cached[1]
+
+        base_mask = self.mask(search_filter)
+        rows, positions = self._row_map(doc_ids)
+        result = np.zeros(len(doc_ids), dtype=bool)
+        known = rows >= 0
+        result[known] = base_mask[rows[known]]
+        with self._lock:
+            overlay = list(self._overlay.items())
+        for doc_id, record in overlay:
+            pos = positions.get(doc_id)
+            if pos is not None:
+                result[pos] = _matches(record, search_filter)
+
+        result.setflags(write=False)
+        with self._lock:
+            self._masks[key] = (doc_ids, result)  # 持有序列引用，保证 id 不被复用
+            while len(self._masks) > MASK_CACHE_SIZE:
+                self._masks.popitem(last=False)
+        return result
+
+    def allowed_ids(self, search_filter: SearchFilter) -> set:
+        """满足过滤条件的全部文档 ID（允许列表）"""
+        allowed = {self.doc_ids[row] for row in np.flatnonzero(self.mask(search_filter))}
+        with self._lock:
+            overlay = list(self._overlay.items())
+        allowed.update(doc_id for doc_id, record in overlay if _matches(record, search_filter))
+        return allowed
+
+    # ------------------------------------------------------------------
+    # 变更
+    # ------------------------------------------------------------------
+
+    def _tombstone(self, doc_id: str):
+        row = self._rows.get(doc_id)
+        if row is not None and not self._tombstones[row]:
+            self._tombstones[row] = True
+            self._num_tombstones += 1
+
+    def upsert(self, doc_id: str, metadata: Dict[str, Any]):
+        """新增或更新文档"""
+        with self._lock:
+            self._tombstone(doc_id)
+            self._overlay[doc_id] = parse_metadata(metadata)
+            self.version += 1
+
+    def delete(self, doc_id: str):
+        """删除文档"""
+        with self._lock:
+            self._tombstone(doc_id)
+            self._overlay.pop(doc_id, None)
+            self.version += 1
+
+    # ------------------------------------------------------------------
+    # 状态
+    # ------------------------------------------------------------------
+
+    def status(self) -> Dict:
+        """位图索引状态"""
+        with self._lock:
+            bitmaps = [*self._genres.values(), *self._decades.values(), *self._rating_buckets.values()]
+            return {
+                'version': self.version,
+                'num_docs': self.num_docs - self._num_tombstones + len(self._overlay),
+                'overlay_docs': len(self._overlay),
+                'tombstones': self._num_tombstones,
+                'genres': sorted(self._genres),
+                'decades': [decade * 10 for decade in sorted(self._decades)],
+                'bitmap_bytes': sum(bitmap.nbytes for bitmap in bitmaps),
+            }
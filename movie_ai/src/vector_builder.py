@@ -0,0 +1,205 @@
+"""
+向量索引构建器 - 从 ChromaDB 集合中已有的 embedding 构建 IVF 索引
+
+索引 header 记录构建时的电影库变更日志位置（catalog_offset）。加载已有索引后从该位置
+重放变更日志（增量变更只保存在内存中，重启后由日志恢复），再检查索引中的文档 ID
+集合是否与集合一致，不一致时重建。
+"""
+import os
+from typing import Any, Dict, List, Sequence, Tuple
+
+import numpy as np
+
+from src.catalog_log import catalog_log
+from src.config import Config
+from src.index_store import IndexFormatError, index_exists
+from src.vector_index import IVFIndex, id_set_hash, open_vector_index, write_vector_index
+
+
+# 模型签名（只取模型目录名，部署路径变化不影响已有索引）
+EMBEDDING_MODEL_SIGNATURE = os.path.basename(os.path.normpath(Config.EMBEDDING_MODEL_NAME))
+
+
+def fetch_embeddings(collection, page_size: int = 5000) -> Tuple[List[str], np.ndarray]:
+    """
+    分页读取集合中的全部向量
+
+    Returns:
+        (文档 ID 列表, float32 向量矩阵)
+    """
+    doc_ids, chunks = [], []
+    offset = 0
+    while True:
+        page = collection.get(include=['embeddings'], limit=page_size, offset=offset)
+        if not page['ids']:
+            break
+        doc_ids.extend(page['ids'])
+        chunks.append(np.asarray(page['embeddings'], dtype=np.float32))
+        offset += len(page['ids'])
+    if not chunks:
+        return [], np.empty((0, Config.EMBEDDING_DIMENSION), dtype=np.float32)
+    return doc_ids, np.concatenate(chunks)
+
+
+def fetch_ids(collection, page_size: int = 50000) -> List[str]:
+    """分页读取集合中的全部文档 ID（不读取向量）"""
+    doc_ids = []
+    while True:
+        page = collection.get(include=[], limit=page_size, offset=len(doc_ids))
+        if not page['ids']:
+            break
+        doc_ids.extend(page['ids'])
+    return doc_ids
+
+
+def apply_catalog_events(index: IVFIndex, collection, records: Sequence[Dict[str, Any]],
+                         embeddings: Dict[str, Any] = None, replay: bool = False):
+    """
+    将电影库变更记录应用到向量索引
+
+    Args:
+        index: 向量索引
+        collection: ChromaDB 集合对象（读取 upsert 的向量；集合中已不存在的按删除处理）
+        records: 变更记录 [{'op', 'id', ...}]（按日志顺序）
+        embeddings: 已读取的 {文档 ID: 向量}（缺少的批量从集合读取）
+        replay: 重放日志时为 True：记录只用于确定涉及的文档，每个文档按集合当前状态更新一次
+            （删除后未经事件重新导入的文档仍保留）
+    """
+    embeddings = dict(embeddings or {})
+    if replay:
+        records = [{'op': 'upsert', 'id': doc_id} for doc_id in dict.fromkeys(r['id'] for r in records)]
+    missing = list(dict.fromkeys(
+        record['id'] for record in records if record['op'] == 'upsert' and record['id'] not in embeddings
+    ))
+    if missing:
+        results = collection.get(ids=missing, include=['embeddings'])
+        embeddings.update(zip(results['ids'], results['embeddings']))
+
+    for record in records:
+        embedding = embeddings.get(record['id']) if record['op'] == 'upsert' else None
+        if embedding is None:
+            index.delete(record['id'])
+        else:
+            index.upsert(record['id'], np.asarray(embedding, dtype=np.float32))
+
+
+def collection_space(collection) -> str:
+    """ChromaDB 集合的距离定义（未设置时为 l2）"""
+    metadata = getattr(collection, 'metadata', None) or {}
+    return metadata.get('hnsw:space', 'l2')
+
+
+class VectorIndexBuilder:
+    """向量索引构建器"""
+    
+    def __init__(self, index_dir: str = None):
+        """
+        初始化构建器
+        
+        Args:
+            index_dir: 索引目录
+        """
+        if index_dir is None:
+            index_dir = Config.VECTOR_INDEX_DIR
+        self.index_dir = index_dir
+    
+    def build_from_collection(self, collection, nlist: int = None) -> IVFIndex:
+        """
+        从 ChromaDB 集合构建向量索引（复用集合中已有的 embedding，不重新编码）
+
+        Args:
+            collection: ChromaDB 集合对象
+            nlist: 簇数，默认使用 Config.VECTOR_IVF_NLIST（0 为自动）
+
+        Returns:
+            IVFIndex
+        """
+        print("\n" + "=" * 50)
+        print("开始构建向量索引 (IVF + int8 + float16 重排)")
+        print("=" * 50)
+        
+        print("\n1. 从 ChromaDB 导出向量...")
+        # 先记录日志位置再导出：之后的变更在加载时重放，重复应用无副作用
+        catalog_offset = catalog_log.end()
+        doc_ids, vectors = fetch_embeddings(collection)
+        if not doc_ids:
+            raise ValueError("集合为空，无法构建向量索引")
+        print(f"   ✓ 导出 {len(doc_ids)} 条向量（维度 {vectors.shape[1]}）")
+        
+        print("\n2. 训练簇中心并量化...")
+        index = IVFIndex.build(
+            vectors, doc_ids,
+            nlist=nlist or Config.VECTOR_IVF_NLIST or None,
+            space=collection_space(collection),
+            nprobe=Config.VECTOR_IVF_NPROBE,
+            refine=Config.VECTOR_IVF_REFINE
+        )
+        print(f"   ✓ 簇数 {index.nlist}，距离 {index.space}")
+        
+        print("\n3. 写入索引...")
+        os.makedirs(self.index_dir, exist_ok=True)
+        version_dir = write_vector_index(
+            self.index_dir, index, EMBEDDING_MODEL_SIGNATURE, catalog_offset=catalog_offset
+        )
+        print(f"   ✓ 索引已写入: {version_dir}")
+        
+        print("\n" + "=" * 50)
+        print("✅ 向量索引构建完成")
+        print("=" * 50)
+        
+        return index
+    
+    def load_from_cache(self, collection=None, position: int = None) -> IVFIndex:
+        """
+        从索引目录加载向量索引（内存映射）
+
+        Args:
+            collection: ChromaDB 集合对象（提供时从 header 记录的位置重放电影库变更日志，
+                再检查索引中的文档数和 ID 集合是否与集合一致）
+            position: 重放到的变更日志位置（默认日志末尾）
+
+        Raises:
+            IndexFormatError: 索引不存在、未写完、损坏或已过期
+        """
+        index, header = open_vector_index(
+            self.index_dir,
+            embedding_model=EMBEDDING_MODEL_SIGNATURE,
+            nprobe=Config.VECTOR_IVF_NPROBE,
+            refine=Config.VECTOR_IVF_REFINE
+        )
+        if collection is not None:
+            records, _ = catalog_log.read(header['catalog_offset'], position)
+            if records:
+                apply_catalog_events(index, collection, records, replay=True)
+                print(f"   重放电影库变更日志 {len(records)} 条")
+            # 先比较文档数（开销小），一致时再比较 ID 集合
+            num_vectors = index.num_vectors
+            if collection.count() != num_vectors:
+                raise IndexFormatError(f"向量索引已过期：文档数 {num_vectors} 与集合 {collection.count()} 不一致")
+            live_hash = id_set_hash(index.live_ids()) if records else header['id_hash']
+            if id_set_hash(fetch_ids(collection)) != live_hash:
+                raise IndexFormatError("向量索引已过期：文档 ID 与集合不一致")
+        print(f"✅ 向量索引加载成功 ({header['num_vectors']} 条向量，版本 {header['build_id']})")
+        return index
+    
+    def build_or_load(self, collection, force_rebuild: bool = False, position: int = None) -> IVFIndex:
+        """
+        构建或加载向量索引
+        
+        Args:
+            collection: ChromaDB 集合对象
+            force_rebuild: 是否强制重建
+            position: 加载已有索引时重放到的变更日志位置（默认日志末尾；重建的索引直接取自集合，无需重放）
+        """
+        if force_rebuild or not index_exists(self.index_dir):
+            return self.build_from_collection(collection)
+
+        try:
+            return self.load_from_cache(collection, position)
+        except IndexFormatError as e:
+            print(f"⚠️  现有向量索引不可用（{e}），重新构建...")
+            return self.build_from_collection(collection)
+
+
+# 创建全局实例
+vector_builder = VectorIndexBuilder()
@@ -0,0 +1,491 @@
+"""
+进程内向量索引 - IVF（倒排文件）+ int8 标量量化
+
+用 k-means 把向量划分为 nlist 个簇，每个向量按所属簇连续存放并量化为 int8
+（每个维度一个缩放系数）。查询时只扫描与查询最接近的 nprobe 个簇，
+用 int8 码近似计算内积；refine > 0 时取前 k * refine 个候选，再用 float16
+原始向量精确重算内积后取 top-k。文档内容和元数据仍从 ChromaDB 读取。
+
+索引以版本化目录保存（格式见 src.index_store），与 BM25 索引并列存放，
+全部数组内存映射打开。增量变更（新增/更新/删除）在内存中维护：
+被覆盖或删除的基础向量以墓碑标记，新向量保存在增量表中精确计算，
+重建索引后合并；重启后由电影库变更日志重放（见 src.vector_builder）。
+
+返回的距离与 ChromaDB 集合的距离定义（hnsw:space）一致，向量需已归一化：
+    l2      平方欧氏距离 = 2 - 2 * 内积
+    cosine  1 - 内积
+    ip      1 - 内积
+"""
+import hashlib
+import math
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from src.index_store import (
+    IndexFormatError, StringTable, load_arrays, read_header,
+    string_table_arrays, write_version
+)
+
+
+FORMAT_NAME = 'movie-ai-ivf'
+FORMAT_VERSION = 3  # v2：header 增加 id_hash；v3：增加 catalog_offset
+
+# 数组及其数据类型
+IVF_ARRAYS = {
+    'centroids': np.float32,
+    'list_indptr': np.int64,
+    'codes': np.int8,
+    'scales': np.float32,
+    'vectors': np.float16,
+}
+
+DISTANCE_SPACES = ('l2', 'cosine', 'ip')
+
+
+def id_set_hash(doc_ids: Iterable[str]) -> str:
+    """
+    文档 ID 集合的哈希（与顺序无关：每个 ID 的 64 位哈希求和取模），用于判断索引与集合是否一致
+
+    Returns:
+        16 位十六进制字符串
+    """
+    total = 0
+    for doc_id in doc_ids:
+        digest = hashlib.blake2b(doc_id.encode('utf-8'), digest_size=8).digest()
+        total = (total + int.from_bytes(digest, 'little')) & 0xFFFFFFFFFFFFFFFF
+    return f"{total:016x}"
+
+
+def default_nlist(num_vectors: int) -> int:
+    """默认簇数：约 4 * sqrt(N)，且平均每个簇不少于 32 个向量"""
+    return max(1, min(int(4 * math.sqrt(max(num_vectors, 0))), num_vectors // 32))
+
+
+def _assign(vectors: np.ndarray, centroids: np.ndarray, chunk_size: int = 8192) -> np.ndarray:
+    """将每个向量分配到内积最大的簇中心"""
+    assign = np.empty(len(vectors), dtype=np.int32)
+    for start in range(0, len(vectors), chunk_size):
+        chunk = np.asarray(vectors[start:start + chunk_size], dtype=np.float32)
+        assign[start:start + len(chunk)] = np.argmax(chunk @ centroids.T, axis=1)
+    return assign
+
+
+def train_centroids(vectors: np.ndarray, nlist: int, iterations: int = 10,
+                    sample_size: int = None, seed: int = 0) -> np.ndarray:
+    """
+    球面 k-means 训练簇中心
+
+    Args:
+        vectors: 已归一化的向量 (N, d)
+        nlist: 簇数
+        iterations: 迭代次数
+        sample_size: 训练样本数，默认 64 * nlist
+        seed: 随机种子
+
+    Returns:
+        归一化的簇中心 (nlist, d)
+    """
+    rng = np.random.default_rng(seed)
+    n = len(vectors)
+    sample_size = min(n, sample_size or 64 * nlist)
+    sample = np.asarray(vectors[np.sort(rng.choice(n, sample_size, replace=False))], dtype=np.float32)
+    centroids = sample[rng.choice(len(sample), nlist, replace=False)].copy()
+
+    for _ in range(iterations):
+        assign = _assign(sample, centroids)
+        order = np.argsort(assign, kind='stable')
+        counts = np.bincount(assign, minlength=nlist)
+        sums = np.zeros_like(centroids)
+        present = counts > 0
+        starts = np.concatenate(([0], np.cumsum(counts)[:-1]))[present]
+        sums[present] = np.add.reduceat(sample[order], starts, axis=0)
+
+        # 空簇用随机样本重新初始化
+        empty = ~present
+        if empty.any():
+            sums[empty] = sample[rng.choice(len(sample), int(empty.sum()))]
+
+        norms = np.linalg.norm(sums, axis=1, keepdims=True)
+        centroids = sums / np.maximum(norms, 1e-12)
+
+    return centroids.astype(np.float32)
+
+
+def quantize(vectors: np.ndarray, scales: np.ndarray = None) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    int8 对称标量量化（每个维度一个缩放系数）
+
+    Returns:
+        (int8 码, float32 缩放系数)
+    """
+    vectors = np.asarray(vectors, dtype=np.float32)
+    if scales is None:
+        scales = np.abs(vectors).max(axis=0) / 127.0 if len(vectors) else np.ones(vectors.shape[1])
+        scales = np.where(scales > 0, scales, 1.0).astype(np.float32)
+    codes = np.clip(np.rint(vectors / scales), -127, 127).astype(np.int8)
+    return codes, scales
+
+
+class IVFIndex:
+    """IVF + int8 量化的向量索引（基础段只读，增量变更保存在内存中）"""
+
+    def __init__(self, centroids: np.ndarray, list_indptr: np.ndarray, codes: np.ndarray,
+                 scales: np.ndarray, doc_ids: Sequence[str], vectors: np.ndarray = None,
+                 space: str = 'l2', nprobe: int = 16, refine: int = 0):
+        """
+        初始化索引
+
+        Args:
+            centroids: 簇中心 (nlist, d)
+            list_indptr: 簇 i 的向量为 codes[list_indptr[i]:list_indptr[i+1]]
+            codes: 按簇连续存放的 int8 码 (N, d)
+            scales: 每个维度的缩放系数 (d,)
+            doc_ids: 与 codes 行对应的文档 ID
+            vectors: 与 codes 行对应的 float16 原始向量（用于精确重排，可选）
+            space: 距离定义（与 ChromaDB 集合一致）
+            nprobe: 每次查询扫描的簇数
+            refine: 精确重排的候选倍数（0 表示只用 int8 近似分数）
+        """
+        if space not in DISTANCE_SPACES:
+            raise ValueError(f"不支持的距离定义: {space}")
+        self.centroids = centroids
+        self.list_indptr = list_indptr
+        self.codes = codes
+        self.scales = scales
+        self.doc_ids = doc_ids
+        self.vectors = vectors
+        self.space = space
+        self.nprobe = nprobe
+        self.refine = refine
+
+        self._lock = threading.RLock()
+        self._rows: Optional[Dict[str, int]] = None
+        self._tombstones = np.zeros(len(doc_ids), dtype=bool)
+        self._num_tombstones = 0
+        self._delta: 'OrderedDict[str, np.ndarray]' = OrderedDict()
+        self.version = 0
+
+    @classmethod
+    def build(cls, vectors: np.ndarray, doc_ids: Sequence[str], nlist: int = None,
+              space: str = 'l2', nprobe: int = 16, refine: int = 0,
+              iterations: int = 10, seed: int = 0) -> 'IVFIndex':
+        """
+        从向量构建索引
+
+        Args:
+            vectors: 已归一化的向量 (N, d)
+            doc_ids: 文档 ID
+            nlist: 簇数，默认见 default_nlist
+            space: 距离定义
+            nprobe: 默认扫描簇数
+            refine: 默认精确重排倍数
+            iterations: k-means 迭代次数
+            seed: 随机种子
+        """
+        vectors = np.asarray(vectors, dtype=np.float32)
+        nlist = min(nlist or default_nlist(len(vectors)), max(len(vectors), 1))
+        centroids = train_centroids(vectors, nlist, iterations=iterations, seed=seed)
+        assign = _assign(vectors, centroids)
+
+        # 按簇连续存放
+        order = np.argsort(assign, kind='stable')
+        list_indptr = np.zeros(nlist + 1, dtype=np.int64)
+        np.cumsum(np.bincount(assign, minlength=nlist), out=list_indptr[1:])
+        ordered = vectors[order]
+        codes, scales = quantize(ordered)
+        return cls(centroids, list_indptr, codes, scales, [doc_ids[i] for i in order],
+                   vectors=ordered.astype(np.float16), space=space, nprobe=nprobe, refine=refine)
+
+    # ------------------------------------------------------------------
+    # 状态
+    # ------------------------------------------------------------------
+
+    @property
+    def nlist(self) -> int:
+        return len(self.centroids)
+
+    @property
+    def dimension(self) -> int:
+        return self.centroids.shape[1]
+
+    @property
+    def num_vectors(self) -> int:
+        """当前有效向量数"""
+        with self._lock:
+            return len(self.doc_ids) - self._num_tombstones + len(self._delta)
+
+    def status(self) -> Dict:
+        """索引状态"""
+        with self._lock:
+            return {
+                'version': self.version,
+                'num_vectors': len(self.doc_ids) - self._num_tombstones + len(self._delta),
+                'base_vectors': len(self.doc_ids),
+                'delta_vectors': len(self._delta),
+                'tombstones': self._num_tombstones,
+                'nlist': self.nlist,
+                'nprobe': self.nprobe,
+                'refine': self.refine,
+                'dimension': self.dimension,
+                'space': self.space,
+            }
+
+    # ------------------------------------------------------------------
+    # 增量变更
+    # ------------------------------------------------------------------
+
+    def _base_row(self, doc_id: str) -> int:
+        if self._rows is None:
+            self._rows = {doc_id: row for row, doc_id in enumerate(self.doc_ids)}
+        return self._rows.get(doc_id, -1)
+
+    def _tombstone(self, doc_id: str):
+        row = self._base_row(doc_id)
+        if row >= 0 and not self._tombstones[row]:
+            self._tombstones[row] = True
+            self._num_tombstones += 1
+
+    def upsert(self, doc_id: str, vector: np.ndarray):
+        """新增或更新向量（向量需已归一化）"""
+        vector = np.asarray(vector, dtype=np.float32).ravel()
+        if vector.shape[0] != self.dimension:
+            raise ValueError(f"向量维度不一致: {vector.shape[0]} != {self.dimension}")
+        with self._lock:
+            self._tombstone(doc_id)
+            self._delta.pop(doc_id, None)
+            self._delta[doc_id] = vector
+            self.version += 1
+
+    def delete(self, doc_id: str):
+        """删除向量"""
+        with self._lock:
+            self._tombstone(doc_id)
+            self._delta.pop(doc_id, None)
+            self.version += 1
+
+    def live_ids(self) -> List[str]:
+        """当前可见的文档 ID（未删除的基础段文档 + 增量表）"""
+        with self._lock:
+            base = [self.doc_ids[int(row)] for row in np.flatnonzero(~self._tombstones)]
+            return base + list(self._delta)  # 被更新的基础段文档已标记墓碑，不会重复
+
+    # ------------------------------------------------------------------
+    # 查询
+    # ------------------------------------------------------------------
+
+    def get_vectors(self, doc_ids: Sequence[str]) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        按文档 ID 读取向量（增量段优先；基础段有 float16 原始向量时使用原始向量，否则反量化 int8 码）
+
+        Returns:
+            (float32 向量 (n, d)，未找到的行为 0；每行是否找到)
+        """
+        vectors = np.zeros((len(doc_ids), self.dimension), dtype=np.float32)
+        found = np.zeros(len(doc_ids), dtype=bool)
+        with self._lock:
+            for i, doc_id in enumerate(doc_ids):
+                vector = self._delta.get(doc_id)
+                if vector is None:
+                    row = self._base_row(doc_id)
+                    if row < 0 or self._tombstones[row]:
+                        continue
+                    vector = self.vectors[row] if self.vectors is not None else self.codes[row] * self.scales
+                vectors[i] = vector
+                found[i] = True
+        return vectors, found
+
+    def to_distance(self, similarity: np.ndarray) -> np.ndarray:
+        """内积转换为 ChromaDB 的距离"""
+        if self.space == 'l2':
+            return 2.0 - 2.0 * similarity
+        return 1.0 - similarity
+
+    def _probe_lists(self, query: np.ndarray, nprobe: int) -> np.ndarray:
+        """与查询最接近的 nprobe 个簇"""
+        centroid_scores = self.centroids @ query
+        if nprobe >= self.nlist:
+            return np.arange(self.nlist)
+        return np.argpartition(-centroid_scores, nprobe - 1)[:nprobe]
+
+    def _scan(self, query: np.ndarray, nprobe: int) -> Tuple[np.ndarray, np.ndarray]:
+        """扫描候选簇，返回 (行号, 近似内积)"""
+        weighted_query = (query * self.scales).astype(np.float32)
+        rows, scores = [], []
+        for list_id in self._probe_lists(query, nprobe):
+            start, end = int(self.list_indptr[list_id]), int(self.list_indptr[list_id + 1])
+            if start == end:
+                continue
+            rows.append(np.arange(start, end))
+            scores.append(np.asarray(self.codes[start:end], dtype=np.float32) @ weighted_query)
+        if not rows:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        return np.concatenate(rows), np.concatenate(scores)
+
+    def _refine(self, query: np.ndarray, rows: np.ndarray, scores: np.ndarray,
+                candidates: int) -> Tuple[np.ndarray, np.ndarray]:
+        """取近似分数最高的 candidates 个候选，用原始向量精确重算内积"""
+        if len(rows) > candidates:
+            keep = np.argpartition(-scores, candidates - 1)[:candidates]
+            rows = np.sort(rows[keep])  # 顺序读取内存映射
+        exact = np.asarray(self.vectors[rows], dtype=np.float32) @ query
+        return rows, exact
+
+    def _exact(self, query: np.ndarray, rows: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """对指定行精确计算内积（有 float16 原始向量时使用原始向量，否则使用 int8 码）"""
+        if self.vectors is not None:
+            return rows, np.asarray(self.vectors[rows], dtype=np.float32) @ query
+        weighted_query = (query * self.scales).astype(np.float32)
+        return rows, np.asarray(self.codes[rows], dtype=np.float32) @ weighted_query
+
+    def search(self, query: np.ndarray, k: int, nprobe: int = None,
+               refine: int = None, allowed: Optional[np.ndarray] = None,
+               accept: Optional[Callable[[str], bool]] = None) -> List[Tuple[str, float]]:
+        """
+        近似 top-k 检索
+
+        提供 allowed 时只返回允许列表中的文档：允许的文档数不超过 nprobe 个簇的
+        规模时直接对这些文档精确打分（过滤越严格越快），否则扫描簇时跳过不允许的行，
+        扫描结果不足 k 条时再对允许的文档精确打分。
+
+        Args:
+            query: 已归一化的查询向量
+            k: 返回数量
+            nprobe: 扫描簇数，默认使用构造时的 nprobe
+            refine: 精确重排倍数，默认使用构造时的 refine
+            allowed: 基础向量的允许掩码（与 doc_ids 对齐，可选）
+            accept: 增量向量的过滤函数（文档 ID -> 是否允许，可选）
+
+        Returns:
+            [(文档 ID, 距离)]，按距离升序
+        """
+        query = np.asarray(query, dtype=np.float32).ravel()
+        nprobe = max(1, nprobe or self.nprobe)
+        refine = self.refine if refine is None else refine
+
+        exact = False
+        if allowed is not None:
+            with self._lock:
+                allowed = allowed & ~self._tombstones if self._num_tombstones else allowed
+            allowed_rows = np.flatnonzero(allowed)
+            scanned = len(self.doc_ids) * min(nprobe, self.nlist) / max(self.nlist, 1)
+            if len(allowed_rows) <= scanned:
+                rows, scores = self._exact(query, allowed_rows)
+                exact = True
+            else:
+                rows, scores = self._scan(query, nprobe)
+                keep = allowed[rows]
+                rows, scores = rows[keep], scores[keep]
+                if len(rows) < k:
+                    rows, scores = self._exact(query, allowed_rows)
+                    exact = True
+        else:
+            rows, scores = self._scan(query, nprobe)
+
+        with self._lock:
+            if self._num_tombstones and len(rows):
+                alive = ~self._tombstones[rows]
+                rows, scores = rows[alive], scores[alive]
+            if refine > 0 and self.vectors is not None and len(rows) and not exact:
+                rows, scores = self._refine(query, rows, scores, k * refine)
+            delta_ids = [doc_id for doc_id in self._delta if accept is None or accept(doc_id)]
+            delta_scores = (np.stack([self._delta[doc_id] for doc_id in delta_ids]) @ query
+                            if delta_ids else np.empty(0, dtype=np.float32))
+
+        all_scores = np.concatenate([scores, delta_scores.astype(np.float32)])
+        if k <= 0 or len(all_scores) == 0:
+            return []
+        top = np.argpartition(-all_scores, min(k, len(all_scores)) - 1)[:k]
+        top = top[np.argsort(-all_scores[top], kind='stable')]
+
+        distances = self.to_distance(all_scores[top])
+        results = []
+        for idx, distance in zip(top.tolist(), distances.tolist()):
+            if idx < len(rows):
+                doc_id = self.doc_ids[int(rows[idx])]
+            else:
+                doc_id = delta_ids[idx - len(rows)]
+            results.append((doc_id, distance))
+        return results
+
+
+def write_vector_index(index_dir: str, index: IVFIndex, embedding_model: str = '',
+                       catalog_offset: int = 0) -> str:
+    """
+    将索引写入新的版本目录，并原子切换 CURRENT（增量变更不会写入，需重建）
+
+    Args:
+        index_dir: 索引根目录
+        index: 向量索引
+        embedding_model: 生成向量的模型名（模型变化时索引需重建）
+        catalog_offset: 索引已包含的电影库变更日志位置（加载时从该位置开始重放）
+
+    Returns:
+        新版本目录路径
+    """
+    arrays = {name: np.asarray(getattr(index, name), dtype=dtype) for name, dtype in IVF_ARRAYS.items()}
+    arrays.update(string_table_arrays('doc_ids', index.doc_ids))
+    header = {
+        'embedding_model': embedding_model,
+        'space': index.space,
+        'dimension': index.dimension,
+        'nlist': index.nlist,
+        'num_vectors': len(index.doc_ids),
+        'id_hash': id_set_hash(index.doc_ids),
+        'catalog_offset': int(catalog_offset),
+    }
+    return write_version(index_dir, FORMAT_NAME, FORMAT_VERSION, arrays, header)
+
+
+def read_vector_header(index_dir: str) -> Dict:
+    """
+    读取并校验当前版本的 header
+
+    Raises:
+        IndexFormatError: 索引不存在、未写完、格式不兼容或 header 损坏
+    """
+    return read_header(index_dir, FORMAT_NAME, FORMAT_VERSION)
+
+
+def open_vector_index(index_dir: str, embedding_model: str = None, nprobe: int = 16,
+                      refine: int = 0, verify: bool = True) -> Tuple[IVFIndex, Dict]:
+    """
+    以内存映射方式打开当前版本的向量索引
+
+    Args:
+        index_dir: 索引根目录
+        embedding_model: 期望的模型名（不一致时视为过期）
+        nprobe: 默认扫描簇数
+        refine: 默认精确重排倍数
+        verify: 是否校验每个文件的 CRC32
+
+    Returns:
+        (IVFIndex, header)
+
+    Raises:
+        IndexFormatError: 索引缺失、未写完、损坏或过期
+    """
+    header = read_header(index_dir, FORMAT_NAME, FORMAT_VERSION)
+    if embedding_model is not None and header['embedding_model'] != embedding_model:
+        raise IndexFormatError("向量索引已过期：embedding 模型不一致，请重建索引")
+
+    arrays = load_arrays(header, verify)
+    missing = [name for name in IVF_ARRAYS if name not in arrays]
+    if missing:
+        raise IndexFormatError(f"向量索引缺少数组: {', '.join(missing)}")
+
+    index = IVFIndex(
+        centroids=np.asarray(arrays['centroids']),  # 簇中心很小，读入内存
+        list_indptr=arrays['list_indptr'],
+        codes=arrays['codes'],
+        scales=np.asarray(arrays['scales']),
+        doc_ids=StringTable.from_arrays(arrays, 'doc_ids'),
+        vectors=arrays['vectors'],
+        space=header['space'],
+        nprobe=nprobe,
+        refine=refine
+    )
+    return index, header
+
@@ -0,0 +1,239 @@
+"""
+冷启动管理 - 重量级组件懒加载 + 后台预热 + 启动耗时分析
+
+    组件    检索器、重排序器、RAG 链、embedding 模型等在模块中注册为懒加载组件，
+            模块导入时不再创建；第一次使用或后台预热时才初始化（只初始化一次）
+    预热    服务启动后在后台线程中按注册顺序初始化全部组件，进程可以立即接收请求，
+            就绪接口（/ai/ready）报告哪些组件已经可用
+    分析    ImportProfiler 记录每个模块的导入耗时（累计 / 自身），与组件初始化耗时
+            一起给出冷启动的耗时分布（见 scripts/profile_startup.py）
+"""
+import builtins
+import importlib.util
+import sys
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+
+# ----------------------------------------------------------------------
+# 懒加载组件
+# ----------------------------------------------------------------------
+
+class Component:
+    """一个懒加载组件（线程安全，只初始化一次）"""
+
+    def __init__(self, name: str, factory: Callable[[], Any], required: bool = True):
+        """
+        Args:
+            name: 组件名
+            factory: 创建组件的函数
+            required: 是否为服务就绪的必要组件
+        """
+        self.name = name
+        self.factory = factory
+        self.required = required
+        self.state = 'cold'  # cold / loading / warm / failed
+        self.seconds = None
+        self.error = None
+        self._instance = None
+        self._lock = threading.Lock()
+
+    def get(self) -> Any:
+        """获取组件实例（未初始化时初始化；初始化失败时抛出异常，下次调用重试）"""
+        if self.state == 'warm':
+            return self._instance
+        with self._lock:
+            if self.state != 'warm':
+                self.state = 'loading'
+                start = time.perf_counter()
+                try:
+                    self._instance = self.factory()
+                except Exception as e:
+                    self.state, self.error = 'failed', str(e)
+                    raise
+                finally:
+                    self.seconds = time.perf_counter() - start
+                self.state, self.error = 'warm', None
+        return self._instance
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            'state': self.state,
+            'required': self.required,
+            'seconds': round(self.seconds, 3) if self.seconds is not None else None,
+            'error': self.error,
+        }
+
+
+class LazyInstance:
+    """组件实例的代理：第一次访问属性时初始化组件，之后直接转发"""
+
+    def __init__(self, component: Component):
+        object.__setattr__(self, '_component', component)
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._component.get(), name)
+
+    def __setattr__(self, name: str, value: Any):
+        setattr(self._component.get(), name, value)
+
+    def __repr__(self) -> str:
+        return f"<LazyInstance {self._component.name} ({self._component.state})>"
+
+
+class Warmup:
+    """组件注册表 + 后台预热"""
+
+    def __init__(self):
+        self._components: Dict[str, Component] = {}
+        self._thread: Optional[threading.Thread] = None
+        self.started_at = None
+        self.finished_at = None
+
+    def register(self, name: str, factory: Callable[[], Any], required: bool = True) -> LazyInstance:
+        """
+        注册懒加载组件
+
+        Args:
+            name: 组件名（预热按注册顺序进行）
+            factory: 创建组件的函数
+            required: 是否为服务就绪的必要组件
+
+        Returns:
+            组件实例的代理（可直接当作实例使用）
+        """
+        component = self._components.get(name)
+        if component is None:
+            component = self._components[name] = Component(name, factory, required)
+        return LazyInstance(component)
+
+    def get(self, name: str) -> Any:
+        """获取组件实例（未初始化时初始化）"""
+        return self._components[name].get()
+
+    def is_warm(self, name: str) -> bool:
+        component = self._components.get(name)
+        return component is not None and component.state == 'warm'
+
+    def warm_all(self) -> Dict[str, float]:
+        """
+        按注册顺序初始化全部组件（失败的组件只记录错误）
+
+        Returns:
+            {组件名: 初始化耗时（秒）}
+        """
+        self.started_at = time.time()
+        for name, component in list(self._components.items()):
+            try:
+                component.get()
+            except Exception as e:
+                print(f"⚠️  组件 {name} 预热失败: {e}")
+        self.finished_at = time.time()
+        return {name: component.seconds for name, component in self._components.items()}
+
+    def start(self) -> threading.Thread:
+        """在后台线程中预热全部组件（重复调用只启动一次）"""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self.warm_all, name='warmup', daemon=True)
+            self._thread.start()
+        return self._thread
+
+    @property
+    def ready(self) -> bool:
+        """必要组件是否都已初始化"""
+        return all(c.state == 'warm' for c in self._components.values() if c.required)
+
+    def status(self) -> Dict[str, Any]:
+        """各组件的状态与初始化耗时"""
+        return {
+            'ready': self.ready,
+            'warming': self._thread is not None and self._thread.is_alive(),
+            'components': {name: component.status() for name, component in self._components.items()},
+        }
+
+
+# ----------------------------------------------------------------------
+# 导入耗时分析
+# ----------------------------------------------------------------------
+
+class ImportProfiler:
+    """
+    记录每个模块第一次导入的耗时（替换 builtins.__import__）
+
+    累计耗时包含它导入的其他模块，自身耗时只计算模块本身的执行时间。
+    """
+
+    def __init__(self):
+        self.records: Dict[str, Tuple[float, float]] = {}  # 模块 -> (累计, 自身)
+        self._original = None
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    def install(self):
+        if self._original is None:
+            self._original = builtins.__import__
+            builtins.__import__ = self._import
+
+    def uninstall(self):
+        if self._original is not None:
+            builtins.__import__ = self._original
+            self._original = None
+
+    def __enter__(self) -> 'ImportProfiler':
+        self.install()
+        return self
+
+    def __exit__(self, *exc):
+        self.uninstall()
+
+    def _import(self, name, globals=None, locals=None, fromlist=(), level=0):
+        fullname = name
+        if level:
+            try:
+                fullname = importlib.util.resolve_name('.' * level + name, (globals or {}).get('__package__'))
+            except (ImportError, ValueError):
+                pass
+        if fullname in sys.modules:
+            return self._original(name, globals, locals, fromlist, level)
+
+        stack = self._local.__dict__.setdefault('stack', [])
+        stack.append(0.0)  # 子模块耗时
+        start = time.perf_counter()
+        try:
+            return self._original(name, globals, locals, fromlist, level)
+        finally:
+            elapsed = time.perf_counter() - start
+            children = stack.pop()
+            if stack:
+                stack[-1] += elapsed
+            with self._lock:
+                if fullname not in self.records:
+                    self.records[fullname] = (elapsed, elapsed - children)
+
+    def top(self, n: int = 20, by: str = 'cumulative') -> List[Tuple[str, float, float]]:
+        """
+        耗时最多的模块
+
+        Args:
+            n: 数量
+            by: 'cumulative' 按累计耗时，'self' 按自身耗时
+
+        Returns:
+            [(模块, 累计秒, 自身秒), ...]
+        """
+        key = 0 if by == 'cumulative' else 1
+        with self._lock:
+            items = sorted(self.records.items(), key=lambda item: item[1][key], reverse=True)
+        return [(name, cumulative, own) for name, (cumulative, own) in items[:n]]
+
+    def report(self, n: int = 20, by: str = 'cumulative') -> str:
+        """格式化的导入耗时表"""
+        lines = [f"{'模块':<48} {'累计 ms':>10} {'自身 ms':>10}"]
+        for name, cumulative, own in self.top(n, by):
+            lines.append(f"{name:<48} {cumulative * 1000:10.1f} {own * 1000:10.1f}")
+        return "\n".join(lines)
+
+
+# 创建全局实例
+warmup = Warmup()
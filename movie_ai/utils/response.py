@@ -57,6 +57,7 @@ class RAGResponse:
     # 元数据
     timestamp: str
     status: str = "success"
+    cached: bool = False  # LLM 内容是否来自语义响应缓存
 
     def to_dict(self) -> Dict:
         """转换为字典格式（去除retrieval字段）"""
@@ -79,6 +80,7 @@ class RAGResponse:
         return {
             'query': self.query,
             'status': self.status,
+            'cached': self.cached,
             'timestamp': self.timestamp,
             'recommended_movie_ids': self.recommended_movie_ids,
             'retrieval_details': {
@@ -107,9 +109,16 @@ class RAGResponse:
         vector_results: List[Dict],
         bm25_results: List[Dict],
         rerank_results: List[Dict],
-        llm_content: str
+        llm_content: str,
+        status: str = "success",
+        cached: bool = False
     ) -> 'RAGResponse':
-        """从搜索结果创建响应实例"""
+        """从搜索结果创建响应实例
+
+        status: 'success'，'partial'（有检索路超时，只使用了部分检索结果），
+                或 'degraded'（重排序不可用，推荐为融合检索顺序的前 N 个）
+        cached: LLM 内容是否来自语义响应缓存
+        """
         # 构建检索结果项
         vector_items = cls._build_retrieval_items(vector_results, 'vector')
         bm25_items = cls._build_retrieval_items(bm25_results, 'bm25')
@@ -142,7 +151,9 @@ class RAGResponse:
             rerank=rerank,
             recommended_movie_ids=recommended_ids,
             llm_content=llm_content,
-            timestamp=datetime.now().isoformat()
+            timestamp=datetime.now().isoformat(),
+            status=status,
+            cached=cached
         )
 
     @staticmethod
@@ -259,3 +270,19 @@ class RAGResponse:
 
         return rerank_details, final_results, recommended_ids
 
+
+@dataclass
+class RAGEvent:
+    """流式推荐事件：retrieval / rerank / llm_chunk / complete"""
+    type: str
+    data: Dict[str, Any]
+    # 完整响应对象（只在 complete 事件中设置，不随事件发送给客户端）
+    response: Optional[RAGResponse] = None
+
+    def to_dict(self) -> Dict:
+        """转换为事件字典（不含 response）"""
+        return {'type': self.type, 'data': self.data}
+
+    def to_sse(self) -> str:
+        """转换为 Server-Sent Events 的一条消息"""
+        return f"data: {json.dumps(self.to_dict(), ensure_ascii=False)}\n\n"
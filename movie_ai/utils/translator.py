@@ -1,22 +1,94 @@
 """
 Qwen Max 翻译工具
+
+进程内共用一个翻译器和一个保持长连接的 OpenAI 客户端（连接池），
+翻译和关键词提取的结果写入两级记忆缓存（内存 LRU + SQLite，见 src.memo_cache），
+同一输入的并发请求只调用一次上游。
 """
+import threading
 from typing import Optional
 from src.config import Config
+from src.keyword_extractor import genre_prompt_table
+from src.memo_cache import MemoCache, memo_key
+from src.result_cache import normalize_query
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client():
+    """
+    获取进程共享的 OpenAI 客户端（连接池 + keep-alive，线程安全）
+    """
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                import httpx
+                from openai import OpenAI
+
+                _client = OpenAI(
+                    api_key=Config.QWEN_API_KEY,
+                    base_url=Config.QWEN_API_URL,
+                    timeout=Config.QWEN_TIMEOUT,
+                    max_retries=Config.QWEN_MAX_RETRIES,
+                    http_client=httpx.Client(
+                        limits=httpx.Limits(
+                            max_connections=Config.QWEN_MAX_CONNECTIONS,
+                            max_keepalive_connections=Config.QWEN_MAX_CONNECTIONS,
+                            keepalive_expiry=Config.QWEN_KEEPALIVE_EXPIRY
+                        ),
+                        timeout=Config.QWEN_TIMEOUT
+                    )
+                )
+    return _client
 
 
 class QwenTranslator:
     """Qwen Max 翻译器封装"""
 
-    def __init__(self):
-        """初始化翻译器"""
-        from openai import OpenAI
+    def __init__(self, client=None, cache: MemoCache = None):
+        """
+        初始化翻译器
 
-        self.client = OpenAI(
-            api_key=Config.QWEN_API_KEY,
-            base_url=Config.QWEN_API_URL
-        )
+        Args:
+            client: OpenAI 客户端（默认使用进程共享的客户端）
+            cache: 记忆缓存（默认按 Config.TRANSLATION_CACHE_* 创建）
+        """
+        self.client = client or get_client()
         self.model = Config.QWEN_MODEL
+        self.cache = cache or MemoCache(
+            Config.TRANSLATION_CACHE_PATH,
+            max_entries=Config.TRANSLATION_CACHE_MAX_ENTRIES,
+            ttl=Config.TRANSLATION_CACHE_TTL
+        )
+
+    def _complete(self, kind: str, cache_input: str, prompt: str,
+                  temperature: float, max_tokens: int) -> Optional[str]:
+        """
+        调用 LLM（经过记忆缓存；空结果返回 None 且不缓存，调用失败时抛出异常）
+
+        Args:
+            kind: 请求类型（缓存键的一部分）
+            cache_input: 规范化后的输入（缓存键的一部分）
+            prompt: 完整提示词
+            temperature: 温度
+            max_tokens: 最大生成长度
+        """
+        def call():
+            completion = self.client.chat.completions.create(
+                model=self.model,
+                messages=[{"role": "user", "content": prompt}],
+                temperature=temperature,
+                max_tokens=max_tokens
+            )
+            return completion.choices[0].message.content.strip() or None
+
+        # 提示词模板变化时缓存自然失效
+        template = prompt.replace(cache_input, '') if cache_input else prompt
+        key = memo_key(kind, self.model, temperature, max_tokens, memo_key(template), cache_input)
+        return self.cache.get_or_compute(key, call)
 
     def translate(self, text: str, from_lang: str = 'zh', to_lang: str = 'en') -> Optional[str]:
         """
@@ -41,16 +113,11 @@ class QwenTranslator:
         from_name = lang_names.get(from_lang, from_lang)
         to_name = lang_names.get(to_lang, to_lang)
 
+        text = text.strip()
         prompt = f"请将以下{from_name}文本翻译成{to_name}，只返回翻译结果，不要添加任何额外说明：\n\n{text}"
 
         try:
-            completion = self.client.chat.completions.create(
-                model=self.model,
-                messages=[{"role": "user", "content": prompt}],
-                temperature=0.3,
-                max_tokens=500
-            )
-            return completion.choices[0].message.content.strip()
+            return self._complete('translate', text, prompt, temperature=0.3, max_tokens=500)
 
         except Exception as e:
             print(f"❌ Qwen翻译失败: {e}")
@@ -68,76 +135,69 @@ class QwenTranslator:
         """
         result = self.translate(text, from_lang='zh', to_lang='en')
         return result if result else text
-    
+
     def extract_movie_keywords(self, query: str) -> str:
         """
         从用户查询中提取电影相关关键词（电影类型、名称等）
         用于精确的 BM25 查询
-        
+
         Args:
             query: 用户查询（中文）
-        
+
         Returns:
             提取出的关键词，用空格隔开
         """
         if not query or not query.strip():
             return query
-        
+
+        # 规范化（全角、大小写、空白）后作为提示词输入，等价的查询共用缓存
+        query = normalize_query(query)
         prompt = """从以下用户查询中提取电影相关的关键词（如电影类型、电影名称等）。
 
 重要提示：
 1. 只返回提取出的关键词，用空格隔开，不要返回其他文字
 2. 如果有中文关键词，要翻译成英文
 3. **电影类型映射表（必须遵守）**：
-   - 爱情片/浪漫片 -> Romance
-   - 科幻片 -> Sci-Fi
-   - 动作片 -> Action
-   - 喜剧片 -> Comedy
-   - 恐怖片 -> Horror
-   - 惊悚片 -> Thriller
-   - 剧情片 -> Drama
-   - 动画片 -> Animation
-   - 冒险片 -> Adventure
-   - 犯罪片 -> Crime
-   - 战争片 -> War
-   - 奇幻片 -> Fantasy
-   - 音乐片 -> Musical
-   - 悬疑片 -> Mystery
-   - 西部片 -> Western
-   - 儿童片 -> Children's
-   - 纪录片 -> Documentary
-   - 黑色电影 -> Film-Noir
+{}
 4. 如果无法提取，返回原查询的关键部分
 
 用户查询：{}
 
-关键词：""".format(query)
-        
+关键词：""".format(genre_prompt_table(), query)
+
         try:
-            completion = self.client.chat.completions.create(
-                model=self.model,
-                messages=[{"role": "user", "content": prompt}],
-                temperature=0.1,
-                max_tokens=100
-            )
-            keywords = completion.choices[0].message.content.strip()
+            keywords = self._complete('keywords', query, prompt, temperature=0.1, max_tokens=100)
             return keywords if keywords else query
-        
+
         except Exception as e:
             print(f"⚠️  关键词提取失败: {e}")
             # 失败时降级为翻译
             return self.translate_to_english(query)
 
 
-# 创建全局实例
+# 全局实例（首次使用时创建，所有调用共用同一个客户端和缓存）
+_translator = None
+_translator_lock = threading.Lock()
+
+
 def get_translator() -> QwenTranslator:
     """
-    获取翻译器实例
+    获取翻译器实例（进程内单例）
 
     Returns:
         QwenTranslator实例
     """
-    return QwenTranslator()
+    global _translator
+    if _translator is None:
+        with _translator_lock:
+            if _translator is None:
+                _translator = QwenTranslator()
+    return _translator
+
+
+def cache_stats() -> Optional[dict]:
+    """翻译 / 关键词提取缓存的统计（翻译器尚未创建时返回 None）"""
+    return _translator.cache.stats() if _translator is not None else None
 
 
 # 便揋函数
@@ -158,10 +218,10 @@ def translate_to_english(text: str) -> str:
 def extract_movie_keywords(query: str) -> str:
     """
     从查询中提取电影相关关键词（便揋函数）
-    
+
     Args:
         query: 用户查询
-    
+
     Returns:
         提取出的关键词
     """
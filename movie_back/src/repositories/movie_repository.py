@@ -4,6 +4,7 @@ Movie Repository - 电影数据访问层
 """
 from src.config.database import db
 from src.models.movie_model import MovieModel
+from src.services.ai_service import ai_service
 
 
 class MovieRepository:
@@ -21,6 +22,7 @@ class MovieRepository:
                 documents=[""],  # 占位文档
                 metadatas=[movie.to_metadata()]
             )
+            ai_service.publish_catalog_event('upsert', movie.id, movie.to_metadata())
             return movie
         except Exception as e:
             print(f"❌ 创建电影失败: {str(e)}")
@@ -188,6 +190,7 @@ class MovieRepository:
                 documents=[""],
                 metadatas=[movie.to_metadata()]
             )
+            ai_service.publish_catalog_event('upsert', movie.id, movie.to_metadata())
             return movie
         except Exception as e:
             print(f"❌ 更新电影失败: {str(e)}")
@@ -197,6 +200,7 @@ class MovieRepository:
         """删除电影"""
         try:
             self.collection.delete(ids=[str(movie_id)])
+            ai_service.publish_catalog_event('delete', movie_id)
             return True
         except Exception as e:
             print(f"❌ 删除电影失败: {str(e)}")
@@ -5,6 +5,9 @@ import requests
 from typing import List, Dict, Any, Optional
 import json
 import os
+import queue
+import threading
+import time
 from dotenv import load_dotenv
 
 # 加载环境变量
@@ -27,6 +30,12 @@ class AIService:
         self.base_url = base_url.rstrip('/')
         self.timeout = int(os.getenv('AI_SERVICE_TIMEOUT', '30'))
 
+        # 电影库变更事件（后台线程发送，不阻塞数据库写入）
+        self._event_queue = queue.Queue(maxsize=10000)
+        self._event_worker = None
+        self._event_lock = threading.Lock()
+        self.event_retry_max_delay = float(os.getenv('AI_EVENT_RETRY_MAX_DELAY', '60'))  # 发送失败时重试间隔的上限（秒）
+
     def health_check(self) -> Dict[str, Any]:
         """
         健康检查
@@ -243,6 +252,81 @@ class AIService:
         except requests.exceptions.RequestException as e:
             raise RuntimeError(f"调用重排序服务失败: {str(e)}")
 
+    def publish_catalog_event(self, op: str, movie_id, metadata: Optional[Dict[str, Any]] = None):
+        """
+        发布电影库变更事件（异步，供 AI 服务更新 BM25 增量索引）
+
+        Args:
+            op: 'upsert' 或 'delete'
+            movie_id: 电影ID
+            metadata: 电影元数据（upsert 时提供，避免 AI 服务回查数据库）
+        """
+        event = {'op': op, 'id': str(movie_id)}
+        if metadata is not None:
+            event['metadata'] = metadata
+
+        try:
+            self._event_queue.put_nowait(event)
+        except queue.Full:
+            print(f"⚠️  变更事件队列已满（AI 服务长时间不可用），丢弃事件: {event['op']} {event['id']}，"
+                  f"恢复后需重建 AI 服务的索引")
+            return
+
+        with self._event_lock:
+            if self._event_worker is None or not self._event_worker.is_alive():
+                self._event_worker = threading.Thread(
+                    target=self._send_catalog_events, name='catalog-events', daemon=True
+                )
+                self._event_worker.start()
+
+    def _send_catalog_events(self):
+        """
+        后台发送变更事件（批量合并队列中已有的事件）
+
+        发送失败（网络错误、超时或 AI 服务 5xx）时保留未发送的事件，按指数退避重试
+        （间隔上限 event_retry_max_delay 秒），之后的事件在队列中等待，保证发送顺序；
+        整批被拒绝（400，批中有无效事件，AI 服务不会应用其中任何事件）时改为逐条发送，只丢弃无效的事件
+        """
+        pending, batch_size, delay = [], 100, 1.0
+        while True:
+            if not pending:
+                pending, batch_size = [self._event_queue.get()], 100
+                while len(pending) < 100:
+                    try:
+                        pending.append(self._event_queue.get_nowait())
+                    except queue.Empty:
+                        break
+
+            batch = pending[:batch_size]
+            try:
+                response = requests.post(
+                    f"{self.base_url}/ai/index/events",
+                    json={'events': batch},
+                    timeout=5
+                )
+                response.raise_for_status()
+            except requests.exceptions.HTTPError as e:
+                if e.response is not None and e.response.status_code == 400:
+                    if len(batch) > 1:
+                        batch_size = 1  # 逐条重发，找出无效的事件
+                        continue
+                    print(f"⚠️  电影库变更事件无效，已丢弃: {batch[0]}: {e.response.text[:200]}")
+                    pending = pending[1:]
+                    continue
+                delay = self._wait_retry(len(pending), e, delay)
+                continue
+            except requests.exceptions.RequestException as e:
+                delay = self._wait_retry(len(pending), e, delay)
+                continue
+
+            pending, delay = pending[len(batch):], 1.0
+
+    def _wait_retry(self, count: int, error: Exception, delay: float) -> float:
+        """发送失败后等待重试，返回下一次的等待时间（指数退避，有上限）"""
+        print(f"⚠️  发布电影库变更事件失败（{count} 条待发送），{delay:.0f} 秒后重试: {str(error)}")
+        time.sleep(delay)
+        return min(delay * 2, self.event_retry_max_delay)
+
 
 # 创建全局实例
 ai_service = AIService()